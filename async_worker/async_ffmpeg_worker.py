@@ -14,6 +14,9 @@
 # ==============================================================================
 """gRPC server that places a ffmpeg task in a Google Cloud Tasks queue.
 
+Alternatively, tasks are placed in a SQLite queue, from which FFmpeg workers
+pull them when they have free job slots. This needs no Google Cloud services.
+
 To deploy this server, an API key must be created for the FFmpeg worker service.
 The key and the URL of the FFmpeg worker service are sent to Google Cloud Tasks.
 
@@ -23,36 +26,85 @@ https://cloud.google.com/tasks/docs/creating-http-target-tasks#sa
 """
 
 from concurrent import futures
+import logging
 import os
+import threading
+import time
+from typing import List
+from typing import Optional
 
 import grpc
+from google.api_core import exceptions
 from google.cloud import tasks_v2
 from google.protobuf import json_format
 
 from async_worker.async_ffmpeg_worker_pb2 import AsyncFFmpegRequest
 from async_worker.async_ffmpeg_worker_pb2 import AsyncFFmpegResponse
+from async_worker.async_ffmpeg_worker_pb2 import BatchAsyncFFmpegRequest
+from async_worker.async_ffmpeg_worker_pb2 import BatchAsyncFFmpegResponse
+from async_worker.async_ffmpeg_worker_pb2 import BatchAsyncFFmpegResult
+from async_worker.async_ffmpeg_worker_pb2 import GetTaskRequest
+from async_worker.async_ffmpeg_worker_pb2 import WaitTasksRequest
+from async_worker.async_ffmpeg_worker_pb2 import WaitTasksResponse
 from async_worker import async_ffmpeg_worker_pb2_grpc
+from worker.ffmpeg_worker_pb2 import FFmpegRequest
+from worker.ffmpeg_worker_pb2 import JobState
+from worker.job_queue import JobQueue
+from worker.job_queue import QueueError
+from worker.job_queue import SqliteJobQueue
+from worker.job_state import FINISHED_STATES
+from worker.job_state import JobStateStore
+from worker.job_state import create_store
+from worker.job_state import queued_state
+
+_LOGGER = logging.getLogger(__name__)
 
-PROJECT = os.environ['PROJECT']
-QUEUE = os.environ['QUEUE']
-LOCATION = os.environ['LOCATION']
-HOST = os.environ['SERVICE_IP']
-API_KEY = os.environ['FFMPEG_API_KEY']
+# Either 'cloud-tasks' to push jobs to the FFmpeg service through Google Cloud
+# Tasks, or 'sqlite' to add them to a SQLite database at SQLITE_QUEUE_PATH,
+# from which FFmpeg workers with the same PULL_QUEUE_PATH lease them.
+QUEUE_BACKEND = os.environ.get('QUEUE_BACKEND', 'cloud-tasks')
+SQLITE_QUEUE_PATH = os.environ.get('SQLITE_QUEUE_PATH')
+PROJECT = os.environ.get('PROJECT')
+QUEUE = os.environ.get('QUEUE')
+LOCATION = os.environ.get('LOCATION')
+HOST = os.environ.get('SERVICE_IP')
+API_KEY = os.environ.get('FFMPEG_API_KEY')
 URL = f'http://{HOST}:8080/FFmpeg/transcode?key={API_KEY}'
+# The maximum number of tasks created at once across all batch requests.
+BATCH_PARALLELISM = int(os.environ.get('BATCH_PARALLELISM', 32))
+# If set, tasks are created through an insecure channel to this address, such
+# as a local fake of the Cloud Tasks API, instead of Google Cloud Tasks.
+TASKS_ENDPOINT = os.environ.get('TASKS_ENDPOINT')
+# If set, the states of jobs are recorded in the job state store at this path,
+# which the FFmpeg workers must also set as JOB_STATE_STORE. It is either a
+# SQLite database, such as SQLITE_QUEUE_PATH, or a directory, such as one on
+# the gcsfuse mount.
+JOB_STATE_STORE = os.environ.get('JOB_STATE_STORE')
+# waitTasks waits at most this many seconds, and checks the states of the
+# tasks every _WAIT_INTERVAL seconds.
+_MAX_WAIT = 60
+_WAIT_INTERVAL = 1
+# The number of threads serving requests. At most _MAX_WAITERS of them wait in
+# waitTasks at once, so that the others keep serving the other methods; more
+# waitTasks requests are rejected with RESOURCE_EXHAUSTED.
+_SERVER_THREADS = 10
+_MAX_WAITERS = 5
 
 
-class AsyncFFmpegServicer(async_ffmpeg_worker_pb2_grpc.AsyncFFmpegServicer):  # pylint: disable=too-few-public-methods
-    """Implements AsyncFFmpeg service"""
+class CloudTasksQueue(JobQueue):
+    """Pushes jobs to the FFmpeg service through a Google Cloud Tasks queue.
 
-    def transcode(self, request: AsyncFFmpegRequest,
-                  context) -> AsyncFFmpegResponse:
-        """Creates FFmpeg task on Google Cloud Tasks queue.
+    A single Cloud Tasks client, and with it a single channel, is shared by
+    all requests.
+    """
 
-        The task contains the HTTP target to call and the payload.
-        """
-        client = tasks_v2.CloudTasksClient()
-        parent = client.queue_path(PROJECT, LOCATION, QUEUE)
-        payload = json_format.MessageToJson(request.request,
+    def __init__(self, client: tasks_v2.CloudTasksClient):
+        self._client = client
+        self._parent = client.queue_path(PROJECT, LOCATION, QUEUE)
+
+    def enqueue(self, request: FFmpegRequest) -> str:
+        """Creates a task with the HTTP target to call and the payload."""
+        payload = json_format.MessageToJson(request,
                                             preserving_proto_field_name=True)
         task = {
             'http_request': {
@@ -61,14 +113,148 @@ class AsyncFFmpegServicer(async_ffmpeg_worker_pb2_grpc.AsyncFFmpegServicer):  #
                 'body': payload.encode()
             }
         }
-        response = client.create_task(parent, task)
-        return AsyncFFmpegResponse(task_name=response.name)
+        try:
+            return self._client.create_task(parent=self._parent,
+                                            task=task).name
+        except exceptions.GoogleAPIError as error:
+            raise QueueError(str(error)) from error
+
+
+class AsyncFFmpegServicer(async_ffmpeg_worker_pb2_grpc.AsyncFFmpegServicer):
+    """Implements AsyncFFmpeg service"""
+
+    def __init__(self,
+                 queue: JobQueue,
+                 batch_parallelism: int = BATCH_PARALLELISM,
+                 store: JobStateStore = None,
+                 max_waiters: int = _MAX_WAITERS):
+        self._queue = queue
+        self._store = store
+        self._waiters = threading.BoundedSemaphore(max_waiters)
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=batch_parallelism)
+
+    def transcode(self, request: AsyncFFmpegRequest,
+                  context) -> AsyncFFmpegResponse:
+        """Adds an FFmpeg job to the queue."""
+        try:
+            return AsyncFFmpegResponse(
+                task_name=self._enqueue(request.request))
+        except QueueError as error:
+            context.abort(grpc.StatusCode.UNAVAILABLE, str(error))
+
+    def batchTranscode(self, request: BatchAsyncFFmpegRequest,
+                       context) -> BatchAsyncFFmpegResponse:
+        """Adds an FFmpeg job to the queue for every request in the batch.
+
+        Jobs are added concurrently. A job that cannot be added does not
+        affect the others; its result holds the error instead of a task name.
+        """
+        results = self._executor.map(self._try_enqueue, request.requests)
+        return BatchAsyncFFmpegResponse(results=list(results))
+
+    def _try_enqueue(self, request: AsyncFFmpegRequest
+                    ) -> BatchAsyncFFmpegResult:
+        try:
+            return BatchAsyncFFmpegResult(
+                task_name=self._enqueue(request.request))
+        except QueueError as error:
+            return BatchAsyncFFmpegResult(error=str(error))
+
+    def getTask(self, request: GetTaskRequest, context) -> JobState:
+        """Returns the recorded state of a task."""
+        state = self._get_states(context, [request.task_name])[0]
+        if state is None:
+            context.abort(grpc.StatusCode.NOT_FOUND,
+                          f'Task {request.task_name} is unknown.')
+        state.name = request.task_name
+        return state
+
+    def waitTasks(self, request: WaitTasksRequest,
+                  context) -> WaitTasksResponse:
+        """Waits until every task has finished or the timeout expires.
+
+        The states are read again every _WAIT_INTERVAL seconds, with a single
+        query for all tasks. The request is rejected with RESOURCE_EXHAUSTED
+        if too many others are already waiting.
+        """
+        if not self._waiters.acquire(blocking=False):
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                          'Too many waitTasks requests are in progress.')
+        try:
+            return self._wait(request, context)
+        finally:
+            self._waiters.release()
+
+    def _wait(self, request: WaitTasksRequest,
+              context) -> WaitTasksResponse:
+        timeout = min(request.timeout.ToTimedelta().total_seconds(), _MAX_WAIT)
+        deadline = time.monotonic() + timeout
+        names = list(request.task_names)
+        while True:
+            states = self._get_states(context, names)
+            finished = all(state is not None and state.state in FINISHED_STATES
+                           for state in states)
+            remaining = deadline - time.monotonic()
+            if finished or remaining <= 0 or not context.is_active():
+                break
+            time.sleep(min(_WAIT_INTERVAL, remaining))
+        response = WaitTasksResponse()
+        for name, state in zip(names, states):
+            response.states.add().CopyFrom(state or JobState())
+            response.states[-1].name = name
+        return response
+
+    def _enqueue(self, request: FFmpegRequest) -> str:
+        """Adds a job to the queue and records it as queued.
+
+        A worker may record the job as running or finished before it is
+        recorded as queued, in which case its state is kept.
+        """
+        name = self._queue.enqueue(request)
+        if self._store is not None:
+            try:
+                self._store.update(name, queued_state(name), keep_state=True)
+            except QueueError:
+                _LOGGER.exception('Failed to record the state of job %s.',
+                                  name)
+        return name
+
+    def _get_states(self, context, names: List[str]
+                   ) -> List[Optional[JobState]]:
+        if self._store is None:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION,
+                          'Job states are not recorded.')
+        try:
+            return self._store.get(names)
+        except QueueError as error:
+            context.abort(grpc.StatusCode.UNAVAILABLE, str(error))
+
+
+def create_queue() -> JobQueue:
+    """Creates the queue selected by QUEUE_BACKEND."""
+    if QUEUE_BACKEND == 'sqlite':
+        return SqliteJobQueue(SQLITE_QUEUE_PATH)
+    if TASKS_ENDPOINT:
+        return CloudTasksQueue(
+            tasks_v2.CloudTasksClient(
+                channel=grpc.insecure_channel(TASKS_ENDPOINT)))
+    return CloudTasksQueue(tasks_v2.CloudTasksClient())
+
+
+def create_job_state_store() -> Optional[JobStateStore]:
+    """Opens the store at JOB_STATE_STORE, if set."""
+    if not JOB_STATE_STORE:
+        return None
+    return create_store(JOB_STATE_STORE)
 
 
 if __name__ == '__main__':
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    logging.basicConfig(level=logging.INFO)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=_SERVER_THREADS))
     async_ffmpeg_worker_pb2_grpc.add_AsyncFFmpegServicer_to_server(
-        AsyncFFmpegServicer(), server)
+        AsyncFFmpegServicer(create_queue(), BATCH_PARALLELISM,
+                            create_job_state_store()), server)
     server.add_insecure_port('[::]:8080')
     server.start()
     server.wait_for_termination()
@@ -11,6 +11,7 @@ from google.protobuf import symbol_database as _symbol_database
 _sym_db = _symbol_database.Default()
 
 
+from google.protobuf import duration_pb2 as google_dot_protobuf_dot_duration__pb2
 from worker import ffmpeg_worker_pb2 as worker_dot_ffmpeg__worker__pb2
 
 
@@ -20,9 +21,9 @@ DESCRIPTOR = _descriptor.FileDescriptor(
   syntax='proto3',
   serialized_options=None,
   create_key=_descriptor._internal_create_key,
-  serialized_pb=b'\n&async_worker/async_ffmpeg_worker.proto\x1a\x1aworker/ffmpeg_worker.proto\"5\n\x12\x41syncFFmpegRequest\x12\x1f\n\x07request\x18\x01 \x01(\x0b\x32\x0e.FFmpegRequest\"(\n\x13\x41syncFFmpegResponse\x12\x11\n\ttask_name\x18\x01 \x01(\t2G\n\x0b\x41syncFFmpeg\x12\x38\n\ttranscode\x12\x13.AsyncFFmpegRequest\x1a\x14.AsyncFFmpegResponse\"\x00\x62\x06proto3'
+  serialized_pb=b'\n&async_worker/async_ffmpeg_worker.proto\x1a\x1egoogle/protobuf/duration.proto\x1a\x1aworker/ffmpeg_worker.proto\"5\n\x12\x41syncFFmpegRequest\x12\x1f\n\x07request\x18\x01 \x01(\x0b\x32\x0e.FFmpegRequest\"(\n\x13\x41syncFFmpegResponse\x12\x11\n\ttask_name\x18\x01 \x01(\t\"@\n\x17\x42\x61tchAsyncFFmpegRequest\x12%\n\x08requests\x18\x01 \x03(\x0b\x32\x13.AsyncFFmpegRequest\"D\n\x18\x42\x61tchAsyncFFmpegResponse\x12(\n\x07results\x18\x01 \x03(\x0b\x32\x17.BatchAsyncFFmpegResult\":\n\x16\x42\x61tchAsyncFFmpegResult\x12\x11\n\ttask_name\x18\x01 \x01(\t\x12\r\n\x05\x65rror\x18\x02 \x01(\t\"#\n\x0eGetTaskRequest\x12\x11\n\ttask_name\x18\x01 \x01(\t\"R\n\x10WaitTasksRequest\x12\x12\n\ntask_names\x18\x01 \x03(\t\x12*\n\x07timeout\x18\x02 \x01(\x0b\x32\x19.google.protobuf.Duration\".\n\x11WaitTasksResponse\x12\x19\n\x06states\x18\x01 \x03(\x0b\x32\t.JobState2\xef\x01\n\x0b\x41syncFFmpeg\x12\x38\n\ttranscode\x12\x13.AsyncFFmpegRequest\x1a\x14.AsyncFFmpegResponse\"\x00\x12G\n\x0e\x62\x61tchTranscode\x12\x18.BatchAsyncFFmpegRequest\x1a\x19.BatchAsyncFFmpegResponse\"\x00\x12\'\n\x07getTask\x12\x0f.GetTaskRequest\x1a\t.JobState\"\x00\x12\x34\n\twaitTasks\x12\x11.WaitTasksRequest\x1a\x12.WaitTasksResponse\"\x00\x62\x06proto3'
   ,
-  dependencies=[worker_dot_ffmpeg__worker__pb2.DESCRIPTOR,])
+  dependencies=[google_dot_protobuf_dot_duration__pb2.DESCRIPTOR,worker_dot_ffmpeg__worker__pb2.DESCRIPTOR,])
 
 
 
@@ -54,8 +55,8 @@ _ASYNCFFMPEGREQUEST = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=70,
-  serialized_end=123,
+  serialized_start=102,
+  serialized_end=155,
 )
 
 
@@ -86,13 +87,229 @@ _ASYNCFFMPEGRESPONSE = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=125,
-  serialized_end=165,
+  serialized_start=157,
+  serialized_end=197,
+)
+
+
+_BATCHASYNCFFMPEGREQUEST = _descriptor.Descriptor(
+  name='BatchAsyncFFmpegRequest',
+  full_name='BatchAsyncFFmpegRequest',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='requests', full_name='BatchAsyncFFmpegRequest.requests', index=0,
+      number=1, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=199,
+  serialized_end=263,
+)
+
+
+_BATCHASYNCFFMPEGRESPONSE = _descriptor.Descriptor(
+  name='BatchAsyncFFmpegResponse',
+  full_name='BatchAsyncFFmpegResponse',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='results', full_name='BatchAsyncFFmpegResponse.results', index=0,
+      number=1, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=265,
+  serialized_end=333,
+)
+
+
+_BATCHASYNCFFMPEGRESULT = _descriptor.Descriptor(
+  name='BatchAsyncFFmpegResult',
+  full_name='BatchAsyncFFmpegResult',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='task_name', full_name='BatchAsyncFFmpegResult.task_name', index=0,
+      number=1, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='error', full_name='BatchAsyncFFmpegResult.error', index=1,
+      number=2, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=335,
+  serialized_end=393,
+)
+
+
+_GETTASKREQUEST = _descriptor.Descriptor(
+  name='GetTaskRequest',
+  full_name='GetTaskRequest',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='task_name', full_name='GetTaskRequest.task_name', index=0,
+      number=1, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=395,
+  serialized_end=430,
+)
+
+
+_WAITTASKSREQUEST = _descriptor.Descriptor(
+  name='WaitTasksRequest',
+  full_name='WaitTasksRequest',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='task_names', full_name='WaitTasksRequest.task_names', index=0,
+      number=1, type=9, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='timeout', full_name='WaitTasksRequest.timeout', index=1,
+      number=2, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=432,
+  serialized_end=514,
+)
+
+
+_WAITTASKSRESPONSE = _descriptor.Descriptor(
+  name='WaitTasksResponse',
+  full_name='WaitTasksResponse',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='states', full_name='WaitTasksResponse.states', index=0,
+      number=1, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=516,
+  serialized_end=562,
 )
 
 _ASYNCFFMPEGREQUEST.fields_by_name['request'].message_type = worker_dot_ffmpeg__worker__pb2._FFMPEGREQUEST
+_BATCHASYNCFFMPEGREQUEST.fields_by_name['requests'].message_type = _ASYNCFFMPEGREQUEST
+_BATCHASYNCFFMPEGRESPONSE.fields_by_name['results'].message_type = _BATCHASYNCFFMPEGRESULT
+_WAITTASKSREQUEST.fields_by_name['timeout'].message_type = google_dot_protobuf_dot_duration__pb2._DURATION
+_WAITTASKSRESPONSE.fields_by_name['states'].message_type = worker_dot_ffmpeg__worker__pb2._JOBSTATE
 DESCRIPTOR.message_types_by_name['AsyncFFmpegRequest'] = _ASYNCFFMPEGREQUEST
 DESCRIPTOR.message_types_by_name['AsyncFFmpegResponse'] = _ASYNCFFMPEGRESPONSE
+DESCRIPTOR.message_types_by_name['BatchAsyncFFmpegRequest'] = _BATCHASYNCFFMPEGREQUEST
+DESCRIPTOR.message_types_by_name['BatchAsyncFFmpegResponse'] = _BATCHASYNCFFMPEGRESPONSE
+DESCRIPTOR.message_types_by_name['BatchAsyncFFmpegResult'] = _BATCHASYNCFFMPEGRESULT
+DESCRIPTOR.message_types_by_name['GetTaskRequest'] = _GETTASKREQUEST
+DESCRIPTOR.message_types_by_name['WaitTasksRequest'] = _WAITTASKSREQUEST
+DESCRIPTOR.message_types_by_name['WaitTasksResponse'] = _WAITTASKSRESPONSE
 _sym_db.RegisterFileDescriptor(DESCRIPTOR)
 
 AsyncFFmpegRequest = _reflection.GeneratedProtocolMessageType('AsyncFFmpegRequest', (_message.Message,), {
@@ -109,6 +326,48 @@ AsyncFFmpegResponse = _reflection.GeneratedProtocolMessageType('AsyncFFmpegRespo
   })
 _sym_db.RegisterMessage(AsyncFFmpegResponse)
 
+BatchAsyncFFmpegRequest = _reflection.GeneratedProtocolMessageType('BatchAsyncFFmpegRequest', (_message.Message,), {
+  'DESCRIPTOR' : _BATCHASYNCFFMPEGREQUEST,
+  '__module__' : 'async_worker.async_ffmpeg_worker_pb2'
+  # @@protoc_insertion_point(class_scope:BatchAsyncFFmpegRequest)
+  })
+_sym_db.RegisterMessage(BatchAsyncFFmpegRequest)
+
+BatchAsyncFFmpegResponse = _reflection.GeneratedProtocolMessageType('BatchAsyncFFmpegResponse', (_message.Message,), {
+  'DESCRIPTOR' : _BATCHASYNCFFMPEGRESPONSE,
+  '__module__' : 'async_worker.async_ffmpeg_worker_pb2'
+  # @@protoc_insertion_point(class_scope:BatchAsyncFFmpegResponse)
+  })
+_sym_db.RegisterMessage(BatchAsyncFFmpegResponse)
+
+BatchAsyncFFmpegResult = _reflection.GeneratedProtocolMessageType('BatchAsyncFFmpegResult', (_message.Message,), {
+  'DESCRIPTOR' : _BATCHASYNCFFMPEGRESULT,
+  '__module__' : 'async_worker.async_ffmpeg_worker_pb2'
+  # @@protoc_insertion_point(class_scope:BatchAsyncFFmpegResult)
+  })
+_sym_db.RegisterMessage(BatchAsyncFFmpegResult)
+
+GetTaskRequest = _reflection.GeneratedProtocolMessageType('GetTaskRequest', (_message.Message,), {
+  'DESCRIPTOR' : _GETTASKREQUEST,
+  '__module__' : 'async_worker.async_ffmpeg_worker_pb2'
+  # @@protoc_insertion_point(class_scope:GetTaskRequest)
+  })
+_sym_db.RegisterMessage(GetTaskRequest)
+
+WaitTasksRequest = _reflection.GeneratedProtocolMessageType('WaitTasksRequest', (_message.Message,), {
+  'DESCRIPTOR' : _WAITTASKSREQUEST,
+  '__module__' : 'async_worker.async_ffmpeg_worker_pb2'
+  # @@protoc_insertion_point(class_scope:WaitTasksRequest)
+  })
+_sym_db.RegisterMessage(WaitTasksRequest)
+
+WaitTasksResponse = _reflection.GeneratedProtocolMessageType('WaitTasksResponse', (_message.Message,), {
+  'DESCRIPTOR' : _WAITTASKSRESPONSE,
+  '__module__' : 'async_worker.async_ffmpeg_worker_pb2'
+  # @@protoc_insertion_point(class_scope:WaitTasksResponse)
+  })
+_sym_db.RegisterMessage(WaitTasksResponse)
+
 
 
 _ASYNCFFMPEG = _descriptor.ServiceDescriptor(
@@ -118,8 +377,8 @@ _ASYNCFFMPEG = _descriptor.ServiceDescriptor(
   index=0,
   serialized_options=None,
   create_key=_descriptor._internal_create_key,
-  serialized_start=167,
-  serialized_end=238,
+  serialized_start=565,
+  serialized_end=804,
   methods=[
   _descriptor.MethodDescriptor(
     name='transcode',
@@ -131,6 +390,36 @@ _ASYNCFFMPEG = _descriptor.ServiceDescriptor(
     serialized_options=None,
     create_key=_descriptor._internal_create_key,
   ),
+  _descriptor.MethodDescriptor(
+    name='batchTranscode',
+    full_name='AsyncFFmpeg.batchTranscode',
+    index=1,
+    containing_service=None,
+    input_type=_BATCHASYNCFFMPEGREQUEST,
+    output_type=_BATCHASYNCFFMPEGRESPONSE,
+    serialized_options=None,
+    create_key=_descriptor._internal_create_key,
+  ),
+  _descriptor.MethodDescriptor(
+    name='getTask',
+    full_name='AsyncFFmpeg.getTask',
+    index=2,
+    containing_service=None,
+    input_type=_GETTASKREQUEST,
+    output_type=worker_dot_ffmpeg__worker__pb2._JOBSTATE,
+    serialized_options=None,
+    create_key=_descriptor._internal_create_key,
+  ),
+  _descriptor.MethodDescriptor(
+    name='waitTasks',
+    full_name='AsyncFFmpeg.waitTasks',
+    index=3,
+    containing_service=None,
+    input_type=_WAITTASKSREQUEST,
+    output_type=_WAITTASKSRESPONSE,
+    serialized_options=None,
+    create_key=_descriptor._internal_create_key,
+  ),
 ])
 _sym_db.RegisterServiceDescriptor(_ASYNCFFMPEG)
 
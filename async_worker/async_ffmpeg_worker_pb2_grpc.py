@@ -3,6 +3,7 @@
 import grpc
 
 from async_worker import async_ffmpeg_worker_pb2 as async__worker_dot_async__ffmpeg__worker__pb2
+from worker import ffmpeg_worker_pb2 as worker_dot_ffmpeg__worker__pb2
 
 
 class AsyncFFmpegStub(object):
@@ -19,6 +20,21 @@ class AsyncFFmpegStub(object):
                 request_serializer=async__worker_dot_async__ffmpeg__worker__pb2.AsyncFFmpegRequest.SerializeToString,
                 response_deserializer=async__worker_dot_async__ffmpeg__worker__pb2.AsyncFFmpegResponse.FromString,
                 )
+        self.batchTranscode = channel.unary_unary(
+                '/AsyncFFmpeg/batchTranscode',
+                request_serializer=async__worker_dot_async__ffmpeg__worker__pb2.BatchAsyncFFmpegRequest.SerializeToString,
+                response_deserializer=async__worker_dot_async__ffmpeg__worker__pb2.BatchAsyncFFmpegResponse.FromString,
+                )
+        self.getTask = channel.unary_unary(
+                '/AsyncFFmpeg/getTask',
+                request_serializer=async__worker_dot_async__ffmpeg__worker__pb2.GetTaskRequest.SerializeToString,
+                response_deserializer=worker_dot_ffmpeg__worker__pb2.JobState.FromString,
+                )
+        self.waitTasks = channel.unary_unary(
+                '/AsyncFFmpeg/waitTasks',
+                request_serializer=async__worker_dot_async__ffmpeg__worker__pb2.WaitTasksRequest.SerializeToString,
+                response_deserializer=async__worker_dot_async__ffmpeg__worker__pb2.WaitTasksResponse.FromString,
+                )
 
 
 class AsyncFFmpegServicer(object):
@@ -30,6 +46,28 @@ class AsyncFFmpegServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def batchTranscode(self, request, context):
+        """Creates a task for every request concurrently.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def getTask(self, request, context):
+        """Returns the state of a task, or NOT_FOUND if nothing is known about it.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def waitTasks(self, request, context):
+        """Returns the states of many tasks once they have all finished, or once
+        the timeout expires.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_AsyncFFmpegServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -38,6 +76,21 @@ def add_AsyncFFmpegServicer_to_server(servicer, server):
                     request_deserializer=async__worker_dot_async__ffmpeg__worker__pb2.AsyncFFmpegRequest.FromString,
                     response_serializer=async__worker_dot_async__ffmpeg__worker__pb2.AsyncFFmpegResponse.SerializeToString,
             ),
+            'batchTranscode': grpc.unary_unary_rpc_method_handler(
+                    servicer.batchTranscode,
+                    request_deserializer=async__worker_dot_async__ffmpeg__worker__pb2.BatchAsyncFFmpegRequest.FromString,
+                    response_serializer=async__worker_dot_async__ffmpeg__worker__pb2.BatchAsyncFFmpegResponse.SerializeToString,
+            ),
+            'getTask': grpc.unary_unary_rpc_method_handler(
+                    servicer.getTask,
+                    request_deserializer=async__worker_dot_async__ffmpeg__worker__pb2.GetTaskRequest.FromString,
+                    response_serializer=worker_dot_ffmpeg__worker__pb2.JobState.SerializeToString,
+            ),
+            'waitTasks': grpc.unary_unary_rpc_method_handler(
+                    servicer.waitTasks,
+                    request_deserializer=async__worker_dot_async__ffmpeg__worker__pb2.WaitTasksRequest.FromString,
+                    response_serializer=async__worker_dot_async__ffmpeg__worker__pb2.WaitTasksResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'AsyncFFmpeg', rpc_method_handlers)
@@ -63,3 +116,51 @@ class AsyncFFmpeg(object):
             async__worker_dot_async__ffmpeg__worker__pb2.AsyncFFmpegResponse.FromString,
             options, channel_credentials,
             call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def batchTranscode(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/AsyncFFmpeg/batchTranscode',
+            async__worker_dot_async__ffmpeg__worker__pb2.BatchAsyncFFmpegRequest.SerializeToString,
+            async__worker_dot_async__ffmpeg__worker__pb2.BatchAsyncFFmpegResponse.FromString,
+            options, channel_credentials,
+            call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def getTask(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/AsyncFFmpeg/getTask',
+            async__worker_dot_async__ffmpeg__worker__pb2.GetTaskRequest.SerializeToString,
+            worker_dot_ffmpeg__worker__pb2.JobState.FromString,
+            options, channel_credentials,
+            call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def waitTasks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/AsyncFFmpeg/waitTasks',
+            async__worker_dot_async__ffmpeg__worker__pb2.WaitTasksRequest.SerializeToString,
+            async__worker_dot_async__ffmpeg__worker__pb2.WaitTasksResponse.FromString,
+            options, channel_credentials,
+            call_credentials, compression, wait_for_ready, timeout, metadata)
@@ -0,0 +1,178 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the async FFmpeg worker.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest async_worker.async_ffmpeg_worker_test
+"""
+
+from concurrent import futures
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import grpc
+from google.cloud import tasks_v2
+from google.cloud.tasks_v2.proto import cloudtasks_pb2_grpc
+from google.protobuf.duration_pb2 import Duration
+
+from async_worker import async_ffmpeg_worker
+from async_worker.async_ffmpeg_worker import AsyncFFmpegServicer
+from async_worker.async_ffmpeg_worker import CloudTasksQueue
+from async_worker.async_ffmpeg_worker_pb2 import AsyncFFmpegRequest
+from async_worker.async_ffmpeg_worker_pb2 import BatchAsyncFFmpegRequest
+from async_worker.async_ffmpeg_worker_pb2 import GetTaskRequest
+from async_worker.async_ffmpeg_worker_pb2 import WaitTasksRequest
+from async_worker.fake_cloud_tasks import FakeCloudTasksServicer
+from worker.ffmpeg_worker_pb2 import ExitStatus
+from worker.ffmpeg_worker_pb2 import FFmpegRequest
+from worker.ffmpeg_worker_pb2 import FFmpegResponse
+from worker.ffmpeg_worker_pb2 import JobState
+from worker.job_queue import JobQueue
+from worker.job_state import JobRecorder
+from worker.job_state import SqliteJobStateStore
+from worker.job_state import queued_state
+
+
+class _FinishingQueue(JobQueue):
+    """Runs every job to completion before enqueue returns."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def enqueue(self, request: FFmpegRequest) -> str:
+        name = 'projects/p/locations/l/queues/q/tasks/job'
+        recorder = JobRecorder(self._store, name)
+        list(recorder.record([FFmpegResponse(exit_status=ExitStatus())]))
+        return name
+
+
+class _FailingCloudTasksServicer(FakeCloudTasksServicer):
+    """Fails to create the tasks of commands that mention 'fail'."""
+
+    def CreateTask(self, request, context):  # pylint: disable=invalid-name
+        if b'fail' in request.task.http_request.body:
+            context.abort(grpc.StatusCode.UNAVAILABLE, 'Injected failure.')
+        return super().CreateTask(request, context)
+
+
+class BatchTranscodeTest(unittest.TestCase):
+    """Batches of jobs pushed to a fake of the Cloud Tasks API."""
+
+    def setUp(self):
+        for name, value in (('PROJECT', 'p'), ('LOCATION', 'l'),
+                            ('QUEUE', 'q')):
+            patcher = mock.patch.object(async_ffmpeg_worker, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.tasks = _FailingCloudTasksServicer()
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=8))
+        cloudtasks_pb2_grpc.add_CloudTasksServicer_to_server(self.tasks, server)
+        port = server.add_insecure_port('127.0.0.1:0')
+        server.start()
+        self.addCleanup(server.stop, None)
+        channel = grpc.insecure_channel(f'127.0.0.1:{port}')
+        self.addCleanup(channel.close)
+        queue = CloudTasksQueue(tasks_v2.CloudTasksClient(channel=channel))
+        self.servicer = AsyncFFmpegServicer(queue, batch_parallelism=4)
+
+    def batch(self, commands):
+        request = BatchAsyncFFmpegRequest()
+        for command in commands:
+            request.requests.add().request.ffmpeg_arguments.extend(command)
+        return self.servicer.batchTranscode(request, None).results
+
+    def test_every_job_is_created_in_order(self):
+        commands = [['-i', f'in{index}.mp4', f'out{index}.mp4']
+                    for index in range(10)]
+        results = self.batch(commands)
+        self.assertEqual(len(self.tasks.tasks), 10)
+        names = {task.name: task for task in self.tasks.tasks}
+        for command, result in zip(commands, results):
+            self.assertEqual(result.error, '')
+            self.assertTrue(
+                result.task_name.startswith('projects/p/locations/l/queues/q/'))
+            self.assertIn(command[1].encode(),
+                          names[result.task_name].http_request.body)
+
+    def test_failed_jobs_do_not_affect_the_others(self):
+        results = self.batch([['-i', 'in.mp4', 'out.mp4'],
+                              ['-i', 'fail.mp4', 'out.mp4'],
+                              ['-i', 'in.mp4', 'out2.mp4']])
+        self.assertEqual([bool(result.task_name) for result in results],
+                         [True, False, True])
+        self.assertIn('Injected failure.', results[1].error)
+        self.assertEqual(results[0].error, '')
+        self.assertEqual(len(self.tasks.tasks), 2)
+
+
+class EnqueueTest(unittest.TestCase):
+
+    def test_job_finished_before_it_is_recorded_as_queued(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = SqliteJobStateStore(os.path.join(directory, 'states.db'))
+            servicer = AsyncFFmpegServicer(_FinishingQueue(store), store=store)
+            name = servicer.transcode(AsyncFFmpegRequest(), None).task_name
+            state = servicer.getTask(GetTaskRequest(task_name=name), None)
+        self.assertEqual(state.state, JobState.SUCCEEDED)
+        self.assertTrue(state.HasField('enqueue_time'))
+
+
+class WaitTasksTest(unittest.TestCase):
+
+    """Requests waiting for the states of tasks."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = SqliteJobStateStore(
+            os.path.join(directory.name, 'states.db'))
+        self.store.update('job', queued_state('job'))
+        self.servicer = AsyncFFmpegServicer(_FinishingQueue(self.store),
+                                            store=self.store,
+                                            max_waiters=1)
+
+    def wait(self, seconds):
+        context = mock.Mock()
+        context.is_active.return_value = True
+        context.abort.side_effect = grpc.RpcError
+        request = WaitTasksRequest(task_names=['job'],
+                                   timeout=Duration(seconds=seconds))
+        return self.servicer.waitTasks(request, context)
+
+    def test_waiters_beyond_the_limit_are_rejected(self):
+        with futures.ThreadPoolExecutor(max_workers=1) as executor:
+            waiting = executor.submit(self.wait, 2)
+            # Wait for the first request to start waiting.
+            while self.servicer._waiters.acquire(blocking=False):
+                self.servicer._waiters.release()
+                time.sleep(0.01)
+            context = mock.Mock()
+            context.abort.side_effect = grpc.RpcError
+            with self.assertRaises(grpc.RpcError):
+                self.servicer.waitTasks(
+                    WaitTasksRequest(task_names=['job']), context)
+            context.abort.assert_called_once_with(
+                grpc.StatusCode.RESOURCE_EXHAUSTED, mock.ANY)
+            response = waiting.result()
+        self.assertEqual(response.states[0].state, JobState.QUEUED)
+        response = self.wait(0)
+        self.assertEqual(response.states[0].state, JobState.QUEUED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""A local fake of the Cloud Tasks API for testing the async worker.
+
+Only CreateTask is implemented. Created tasks are kept in memory and are
+never dispatched. Start the async worker with TASKS_ENDPOINT set to the
+address of this server to enqueue tasks without Google Cloud:
+
+python3 -m async_worker.fake_cloud_tasks --port 8123
+"""
+
+import argparse
+from concurrent import futures
+import itertools
+import logging
+import random
+import threading
+import time
+
+import grpc
+from google.cloud.tasks_v2.proto import cloudtasks_pb2_grpc
+from google.cloud.tasks_v2.proto import task_pb2
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class FakeCloudTasksServicer(cloudtasks_pb2_grpc.CloudTasksServicer):
+    """Creates tasks in memory after an optional delay.
+
+    Attributes:
+        tasks: The created tasks in creation order.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0):
+        self._latency = latency
+        self._error_rate = error_rate
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.tasks = []
+
+    def CreateTask(self, request, context):  # pylint: disable=invalid-name
+        """Stores the task under a new name in the requested queue."""
+        time.sleep(self._latency)
+        if random.random() < self._error_rate:
+            context.abort(grpc.StatusCode.UNAVAILABLE, 'Injected failure.')
+        task = task_pb2.Task()
+        task.CopyFrom(request.task)
+        task.name = f'{request.parent}/tasks/{next(self._ids)}'
+        with self._lock:
+            self.tasks.append(task)
+            if len(self.tasks) % 1000 == 0:
+                _LOGGER.info('Created %d tasks.', len(self.tasks))
+        return task
+
+
+def main():
+    """Serves the fake until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8123)
+    parser.add_argument('--latency',
+                        type=float,
+                        default=0.0,
+                        help='seconds to wait before creating each task')
+    parser.add_argument('--error-rate',
+                        type=float,
+                        default=0.0,
+                        help='fraction of requests that fail with UNAVAILABLE')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=64))
+    cloudtasks_pb2_grpc.add_CloudTasksServicer_to_server(
+        FakeCloudTasksServicer(args.latency, args.error_rate), server)
+    server.add_insecure_port(f'[::]:{args.port}')
+    server.start()
+    server.wait_for_termination()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""A stand-in for the ffmpeg binary that writes logs at a controlled rate.
+
+It writes log lines to stderr the way ffmpeg does: status lines end with a
+carriage return and other lines end with a newline. It also honours ffmpeg's
+-progress option when it is the first argument.
+
+With --cpu-seconds, it first burns that much CPU time split across one
+process per thread, like an encoder whose work is divided among its threads.
+The number of threads is given by ffmpeg's -threads option and defaults to
+the number of CPUs of the host, as in ffmpeg.
+
+The following command writes 1000 lines as fast as possible:
+python3 fake_ffmpeg.py --lines 1000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+
+def main(args):
+    """Writes the requested log lines and exits with the requested code."""
+    if args.cpu_seconds:
+        _burn(args.cpu_seconds, args.threads or os.cpu_count() or 1)
+    progress_file = None
+    if args.progress is not None:
+        progress_file = os.fdopen(int(args.progress.split(':')[1]), 'w')
+    lines = args.lines
+    if args.duration is not None:
+        lines = int(args.rate * args.duration)
+    interval = 1 / args.rate if args.rate else 0
+    padding = 'x' * args.line_length
+    start_time = time.monotonic()
+    for frame in range(lines):
+        if frame % args.status_every == 0:
+            line = f'frame={frame:5d} fps=25 q=28.0 size=N/A {padding}\r'
+        else:
+            line = f'[libx264 @ 0x5581] frame {frame} {padding}\n'
+        sys.stderr.write(line)
+        if progress_file is not None and frame % args.status_every == 0:
+            _write_progress(progress_file, frame, 'continue')
+        if interval:
+            sys.stderr.flush()
+            delay = start_time + (frame + 1) * interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+    sys.stderr.flush()
+    if progress_file is not None:
+        _write_progress(progress_file, lines, 'end')
+        progress_file.close()
+    return args.exit_code
+
+
+def _burn(cpu_seconds, threads):
+    """Spends cpu_seconds of CPU time in total across threads processes."""
+    children = []
+    for _ in range(threads):
+        pid = os.fork()
+        if pid == 0:
+            while time.process_time() < cpu_seconds / threads:
+                pass
+            os._exit(0)  # pylint: disable=protected-access
+        children.append(pid)
+    for pid in children:
+        os.waitpid(pid, 0)
+
+
+def _write_progress(progress_file, frame, state):
+    out_time_us = frame * 40000
+    progress_file.write(f'frame={frame}\n'
+                        'fps=25.0\n'
+                        'bitrate= 512.0kbits/s\n'
+                        f'total_size={frame * 2560}\n'
+                        f'out_time_us={out_time_us}\n'
+                        f'out_time_ms={out_time_us}\n'
+                        'speed=1.0x\n'
+                        f'progress={state}\n')
+    progress_file.flush()
+
+
+def _parse_args(argv):
+    # Abbreviations are not allowed, so that ffmpeg's -t is not taken for
+    # -threads.
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument('-progress',
+                        help='ffmpeg progress URL, which must be pipe:FD')
+    parser.add_argument('-threads',
+                        type=int,
+                        help='ffmpeg thread count; the last one is used')
+    parser.add_argument('--lines',
+                        default=100,
+                        type=int,
+                        help='number of log lines to write')
+    parser.add_argument('--rate',
+                        default=0,
+                        type=float,
+                        help='log lines per second; 0 writes without pausing')
+    parser.add_argument('--duration',
+                        type=float,
+                        help=('seconds to run for at the given --rate'
+                              '; overrides --lines'))
+    parser.add_argument('--exit-code',
+                        default=0,
+                        type=int,
+                        help='exit code of the process')
+    parser.add_argument('--line-length',
+                        default=40,
+                        type=int,
+                        help='number of padding characters in each line')
+    parser.add_argument('--cpu-seconds',
+                        default=0,
+                        type=float,
+                        help='CPU time to spend before writing the log lines')
+    parser.add_argument('--status-every',
+                        default=2,
+                        type=int,
+                        help='write a carriage-return status line every N lines')
+    # Unknown arguments are real ffmpeg arguments and are ignored.
+    args, _ = parser.parse_known_args(argv)
+    if args.duration is not None and not args.rate:
+        parser.error('--duration requires a non-zero --rate.')
+    return args
+
+
+if __name__ == '__main__':
+    sys.exit(main(_parse_args(sys.argv[1:])))
@@ -0,0 +1,105 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Measures the per-line overhead of reading ffmpeg's output.
+
+The line-buffered text reader that the worker used to use is compared with
+worker.ffmpeg_worker.Process. Both read the output of fake_ffmpeg.py, which
+writes lines as fast as possible. Results are written as JSON.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m benchmark.line_reader_benchmark --lines 200000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from worker.ffmpeg_worker import Process
+
+_FAKE_FFMPEG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'fake_ffmpeg.py')
+
+
+def read_text_lines(args):
+    """Reads lines the way the worker did before LineReader was added."""
+    process = subprocess.Popen(args,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT,
+                               universal_newlines=True,
+                               bufsize=1)
+    count = sum(1 for _ in process.stdout)
+    process.wait()
+    return count
+
+
+def read_process_lines(args):
+    """Reads lines with worker.ffmpeg_worker.Process."""
+    return sum(len(lines) for lines in Process(args))
+
+
+def measure(reader, args):
+    """Runs reader on args and returns its timing statistics."""
+    start_usage = resource.getrusage(resource.RUSAGE_SELF)
+    start_time = time.perf_counter()
+    lines = reader(args)
+    wall_time = time.perf_counter() - start_time
+    end_usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_time = (end_usage.ru_utime - start_usage.ru_utime +
+                end_usage.ru_stime - start_usage.ru_stime)
+    return {
+        'lines': lines,
+        'wall_time': wall_time,
+        'reader_cpu_time': cpu_time,
+        'reader_cpu_ns_per_line': cpu_time / lines * 10**9,
+        'lines_per_second': lines / wall_time,
+    }
+
+
+def main(args):
+    """Runs every reader the requested number of times."""
+    ffmpeg_args = [
+        sys.executable, _FAKE_FFMPEG, '--lines',
+        str(args.lines), '--line-length',
+        str(args.line_length)
+    ]
+    results = {}
+    for name, reader in (('text', read_text_lines),
+                         ('process', read_process_lines)):
+        results[name] = [
+            measure(reader, ffmpeg_args) for _ in range(args.repetitions)
+        ]
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines',
+                        default=100000,
+                        type=int,
+                        help='number of lines written by the fake ffmpeg')
+    parser.add_argument('--line-length',
+                        default=40,
+                        type=int,
+                        help='number of padding characters in each line')
+    parser.add_argument('--repetitions',
+                        default=3,
+                        type=int,
+                        help='number of times each reader is run')
+    main(parser.parse_args())
@@ -0,0 +1,177 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Measures CPU throttling of concurrent ffmpeg processes by thread policy.
+
+Every policy runs the same jobs, a fixed number at a time, through
+ffmpeg_worker.Process:
+  default: ffmpeg picks its threads, one per host CPU.
+  auto: the CPU quota is shared out as -threads and -filter_threads.
+  pinned: as auto, with every process pinned to CPUs of its own.
+
+By default, fake_ffmpeg.py burns a fixed amount of CPU time split across its
+threads, so that only the scheduling of the threads differs between the
+policies. A real ffmpeg and command can be given with --ffmpeg and
+--ffmpeg-args.
+
+The throttling counters of the container's cgroup are read before and after
+every policy. Outside a container with a CPU quota they are null, and the
+involuntary context switches of the jobs show the contention instead.
+
+This should be run when `ffmpeg-on-cloud` is the working directory, inside a
+container with the CPU limit of the worker:
+python3 -m benchmark.threads_benchmark --jobs 16 --concurrency 2 \
+    --cpu-seconds 2
+"""
+
+import argparse
+from concurrent import futures
+import json
+import os
+import shlex
+import sys
+import tempfile
+import time
+
+from worker import ffmpeg_worker
+from worker.cpu_allocator import CpuAllocator
+from worker.cpu_allocator import effective_cpus
+
+_FAKE_FFMPEG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'fake_ffmpeg.py')
+_CGROUP_ROOT = '/sys/fs/cgroup/'
+# The cpu.stat files of cgroup v2 and v1, and the unit of their throttled
+# time in seconds.
+_CPU_STATS = (('cpu.stat', 'throttled_usec', 1e-6),
+              ('cpu/cpu.stat', 'throttled_time', 1e-9))
+POLICIES = ('default', 'auto', 'pinned')
+
+
+def read_throttling():
+    """Returns the cgroup's CFS periods and throttling, or None if unknown."""
+    for path, throttled_key, unit in _CPU_STATS:
+        try:
+            with open(os.path.join(_CGROUP_ROOT, path)) as stat_file:
+                stats = dict(line.split() for line in stat_file)
+            return {
+                'periods': int(stats['nr_periods']),
+                'throttled_periods': int(stats['nr_throttled']),
+                'throttled_seconds': int(stats[throttled_key]) * unit,
+            }
+        except (OSError, KeyError, ValueError):
+            continue
+    return None
+
+
+def run_policy(binary, ffmpeg_args, allocator, jobs, concurrency):
+    """Runs the jobs and returns their statistics."""
+
+    def run_job(_):
+        process = ffmpeg_worker.Process([binary, *ffmpeg_args],
+                                        cpu_allocator=allocator)
+        for _ in process:
+            pass
+        return process
+
+    start_throttling = read_throttling()
+    start_time = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        processes = list(executor.map(run_job, range(jobs)))
+    wall_time = time.perf_counter() - start_time
+    end_throttling = read_throttling()
+    latencies = sorted(process.real_time for process in processes)
+    throttling = None
+    if start_throttling is not None and end_throttling is not None:
+        throttling = {
+            key: end_throttling[key] - start_throttling[key]
+            for key in start_throttling
+        }
+    return {
+        'wall_time': wall_time,
+        'failed_jobs': sum(process.returncode != 0 for process in processes),
+        'latency_p50': _percentile(latencies, 50),
+        'latency_p99': _percentile(latencies, 99),
+        'cpu_time': sum(process.rusage.ru_utime + process.rusage.ru_stime
+                        for process in processes),
+        'involuntary_context_switches': sum(
+            process.rusage.ru_nivcsw for process in processes),
+        'throttling': throttling,
+    }
+
+
+def _percentile(values, percent):
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+
+def _write_fake_ffmpeg(directory, cpu_seconds):
+    """Writes an executable that runs fake_ffmpeg.py.
+
+    The worker runs ffmpeg without PATH, so the interpreter is referred to by
+    its absolute path.
+    """
+    path = os.path.join(directory, 'ffmpeg')
+    with open(path, 'w') as script:
+        script.write('#!/bin/sh\n'
+                     f'exec {sys.executable} {_FAKE_FFMPEG} '
+                     f'--cpu-seconds {cpu_seconds} --lines 10 "$@"\n')
+    os.chmod(path, 0o755)
+    return path
+
+
+def main(args):
+    """Runs the jobs under every policy."""
+    cpus = args.cpus or effective_cpus()
+    allocators = {
+        'default': None,
+        'auto': CpuAllocator(cpus),
+        'pinned': CpuAllocator(cpus, True, cpus / args.concurrency),
+    }
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        binary = args.ffmpeg or _write_fake_ffmpeg(directory, args.cpu_seconds)
+        for policy in args.policies.split(','):
+            result = run_policy(binary, shlex.split(args.ffmpeg_args),
+                                allocators[policy], args.jobs, args.concurrency)
+            results.append({'policy': policy, **result})
+    config = {'cpus': cpus, **vars(args)}
+    json.dump({'config': config, 'results': results}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--policies',
+                        default=','.join(POLICIES),
+                        help='comma-separated thread policies to compare')
+    parser.add_argument('--jobs',
+                        default=8,
+                        type=int,
+                        help='number of jobs run under every policy')
+    parser.add_argument('--concurrency',
+                        default=2,
+                        type=int,
+                        help='number of jobs running at once')
+    parser.add_argument('--cpus',
+                        type=float,
+                        help=('CPUs to share out; defaults to the CPU quota '
+                              'and affinity of this process'))
+    parser.add_argument('--cpu-seconds',
+                        default=1,
+                        type=float,
+                        help='CPU time every fake ffmpeg job spends')
+    parser.add_argument('--ffmpeg', help='a real ffmpeg to run instead')
+    parser.add_argument('--ffmpeg-args',
+                        default='-i input.mp4 -c:v libx264 output.mp4',
+                        help='the arguments of every job')
+    main(parser.parse_args())
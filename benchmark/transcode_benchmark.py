@@ -0,0 +1,289 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Measures how many concurrent transcode streams the worker sustains.
+
+The FFmpeg servicer runs in this process on a local port, with fake_ffmpeg.py
+in place of ffmpeg. For every concurrency level, a client in a child process
+keeps that many transcode streams open until the requested number of
+requests has finished. Only the server runs in this process, so its CPU time
+is the servicer's own; the fake ffmpeg processes are not counted.
+
+Results are written as JSON, one object per concurrency level, so that runs
+of different releases can be diffed.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m benchmark.transcode_benchmark --streams 1,16,64 --rate 100 \
+    --duration 2
+"""
+
+import argparse
+import asyncio
+from concurrent import futures
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import grpc
+from grpc import aio
+
+from worker import ffmpeg_worker
+from worker import ffmpeg_worker_pb2_grpc
+from worker.ffmpeg_worker_pb2 import FFmpegRequest
+from worker.scheduler import SlotScheduler
+
+_FAKE_FFMPEG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'fake_ffmpeg.py')
+
+
+class _Server:
+    """Runs the FFmpeg servicer in this process."""
+
+    def __init__(self, mode, slots):
+        scheduler = SlotScheduler(slots, slots)
+        self._loop = None
+        if mode == 'asyncio':
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, daemon=True).start()
+            self._server = self._run(self._create_aio_server(scheduler))
+        else:
+            self._server = grpc.server(
+                futures.ThreadPoolExecutor(max_workers=2 * slots))
+            ffmpeg_worker_pb2_grpc.add_FFmpegServicer_to_server(
+                ffmpeg_worker.FFmpegServicer(scheduler), self._server)
+            self.port = self._server.add_insecure_port('127.0.0.1:0')
+            self._server.start()
+
+    async def _create_aio_server(self, scheduler):
+        server = aio.server()
+        ffmpeg_worker_pb2_grpc.add_FFmpegServicer_to_server(
+            ffmpeg_worker.AioFFmpegServicer(scheduler), server)
+        self.port = server.add_insecure_port('127.0.0.1:0')
+        await server.start()
+        return server
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def stop(self):
+        if self._loop is None:
+            self._server.stop(None)
+        else:
+            self._run(self._server.stop(None))
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def run_client(port, streams, requests, request):
+    """Sends requests over streams concurrent transcode calls.
+
+    Returns:
+        The wall time of the run and, for every request, its latency, its
+        time to first response, its number of responses and log lines, and
+        whether it failed.
+    """
+    channel = grpc.insecure_channel(f'127.0.0.1:{port}')
+    stub = ffmpeg_worker_pb2_grpc.FFmpegStub(channel)
+    remaining = iter(range(requests))
+    lock = threading.Lock()
+
+    def send():
+        results = []
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return results
+            start_time = time.perf_counter()
+            first_response_time = None
+            messages = lines = 0
+            exit_code = None
+            try:
+                for response in stub.transcode(request):
+                    if first_response_time is None:
+                        first_response_time = time.perf_counter()
+                    messages += 1
+                    field = response.WhichOneof('status')
+                    if field == 'log_line':
+                        lines += 1
+                    elif field == 'log_batch':
+                        lines += len(response.log_batch.log_lines)
+                    elif field == 'exit_status':
+                        exit_code = response.exit_status.exit_code
+            except grpc.RpcError:
+                pass
+            end_time = time.perf_counter()
+            results.append({
+                'latency': end_time - start_time,
+                'time_to_first_response': ((first_response_time or end_time) -
+                                           start_time),
+                'messages': messages,
+                'log_lines': lines,
+                'failed': exit_code != 0,
+            })
+
+    start_time = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=streams) as executor:
+        workers = [executor.submit(send) for _ in range(streams)]
+        results = [result for worker in workers for result in worker.result()]
+    return {'wall_time': time.perf_counter() - start_time, 'requests': results}
+
+
+def summarize(streams, client, cpu_time):
+    """Computes the statistics of one concurrency level."""
+    results = client['requests']
+    wall_time = client['wall_time']
+    latencies = sorted(result['latency'] for result in results)
+    first_responses = sorted(
+        result['time_to_first_response'] for result in results)
+    messages = sum(result['messages'] for result in results)
+    lines = sum(result['log_lines'] for result in results)
+    return {
+        'streams': streams,
+        'requests': len(results),
+        'failed_requests': sum(result['failed'] for result in results),
+        'wall_time': wall_time,
+        'requests_per_second': len(results) / wall_time,
+        'latency_p50': _percentile(latencies, 50),
+        'latency_p99': _percentile(latencies, 99),
+        'time_to_first_response_p50': _percentile(first_responses, 50),
+        'time_to_first_response_p99': _percentile(first_responses, 99),
+        'messages_per_second': messages / wall_time,
+        'log_lines_per_second': lines / wall_time,
+        'server_cpu_time': cpu_time,
+        'server_cpu_time_per_request': cpu_time / len(results),
+        'server_cpu_utilization_per_stream': cpu_time / wall_time / streams,
+    }
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+
+def _write_fake_ffmpeg(directory, args):
+    """Writes an executable that runs fake_ffmpeg.py with the fake's options.
+
+    The worker runs ffmpeg without PATH, so the interpreter is referred to by
+    its absolute path.
+    """
+    fake_args = ['--rate', str(args.rate), '--line-length',
+                 str(args.line_length), '--exit-code', str(args.exit_code)]
+    if args.duration is not None:
+        fake_args += ['--duration', str(args.duration)]
+    else:
+        fake_args += ['--lines', str(args.lines)]
+    path = os.path.join(directory, 'ffmpeg')
+    with open(path, 'w') as script:
+        script.write('#!/bin/sh\n'
+                     f'exec {sys.executable} {_FAKE_FFMPEG} '
+                     f'{" ".join(fake_args)} "$@"\n')
+    os.chmod(path, 0o755)
+    return path
+
+
+def main(args):
+    """Runs the client at every concurrency level against one server."""
+    request = FFmpegRequest(ffmpeg_arguments=['-i', 'input.mp4', 'output.mp4'],
+                            batch_log_lines=args.batch_log_lines,
+                            report_progress=args.report_progress)
+    levels = [int(streams) for streams in args.streams.split(',')]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        ffmpeg_worker.FFMPEG_BINARY = _write_fake_ffmpeg(directory, args)
+        server = _Server(args.server_mode, max(levels))
+        try:
+            for streams in levels:
+                start_usage = resource.getrusage(resource.RUSAGE_SELF)
+                client = subprocess.run(
+                    [
+                        sys.executable, '-m', 'benchmark.transcode_benchmark',
+                        '--client-port', str(server.port), '--streams',
+                        str(streams), '--requests',
+                        str(max(args.requests, streams))
+                    ],
+                    input=request.SerializeToString(),
+                    stdout=subprocess.PIPE,
+                    check=True)
+                end_usage = resource.getrusage(resource.RUSAGE_SELF)
+                cpu_time = (end_usage.ru_utime - start_usage.ru_utime +
+                            end_usage.ru_stime - start_usage.ru_stime)
+                results.append(
+                    summarize(streams, json.loads(client.stdout), cpu_time))
+        finally:
+            server.stop()
+    config = {
+        name: value
+        for name, value in vars(args).items()
+        if name != 'client_port'
+    }
+    json.dump({'config': config, 'results': results}, sys.stdout, indent=2)
+    print()
+
+
+def _client_main(args):
+    """Runs the client against the server of the parent process."""
+    request = FFmpegRequest.FromString(sys.stdin.buffer.read())
+    json.dump(
+        run_client(args.client_port, int(args.streams), args.requests,
+                   request), sys.stdout)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--streams',
+                        default='1,8,32',
+                        help='comma-separated numbers of concurrent streams')
+    parser.add_argument('--requests',
+                        default=64,
+                        type=int,
+                        help=('number of requests at every concurrency level'
+                              ', at least one per stream'))
+    parser.add_argument('--server-mode',
+                        default='threads',
+                        choices=['threads', 'asyncio'],
+                        help='serve with a thread per request or grpc.aio')
+    parser.add_argument('--batch-log-lines', action='store_true')
+    parser.add_argument('--report-progress', action='store_true')
+    parser.add_argument('--lines',
+                        default=100,
+                        type=int,
+                        help='number of log lines written by the fake ffmpeg')
+    parser.add_argument('--rate',
+                        default=0,
+                        type=float,
+                        help=('log lines per second of the fake ffmpeg'
+                              '; 0 writes without pausing'))
+    parser.add_argument('--duration',
+                        type=float,
+                        help=('seconds the fake ffmpeg runs for at the given '
+                              '--rate; overrides --lines'))
+    parser.add_argument('--line-length',
+                        default=40,
+                        type=int,
+                        help='number of padding characters in each line')
+    parser.add_argument('--exit-code',
+                        default=0,
+                        type=int,
+                        help='exit code of the fake ffmpeg')
+    parser.add_argument('--client-port', type=int, help=argparse.SUPPRESS)
+    parsed_args = parser.parse_args()
+    if parsed_args.client_port is not None:
+        _client_main(parsed_args)
+    else:
+        main(parsed_args)
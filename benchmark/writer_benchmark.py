@@ -0,0 +1,149 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Measures the throughput of the client's output writers.
+
+Every writer writes the same synthetic responses: a number of commands, each
+with batched log lines, progress reports and an exit status. The output goes
+to os.devnull through a regular buffered text file, so that the cost of
+formatting and of the writes themselves is measured rather than that of a
+disk or terminal. Results are written as JSON.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m benchmark.writer_benchmark --commands 2000 --lines 200
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+
+import client
+from worker.ffmpeg_worker_pb2 import ExitStatus
+from worker.ffmpeg_worker_pb2 import FFmpegResponse
+from worker.ffmpeg_worker_pb2 import LogBatch
+from worker.ffmpeg_worker_pb2 import Progress
+
+FORMATS = ('normal', 'json', 'ndjson', 'tsv')
+
+
+class _CountingFile:
+    """Passes writes on to a file, counting them and the characters written."""
+
+    def __init__(self, output_file):
+        self._output_file = output_file
+        self.writes = 0
+        self.characters = 0
+
+    def write(self, text):
+        self.writes += 1
+        self.characters += len(text)
+        return self._output_file.write(text)
+
+    def flush(self):
+        self._output_file.flush()
+
+    def close(self):
+        self._output_file.close()
+
+
+def make_responses(args):
+    """Returns the responses of a single synthetic command."""
+    line = 'frame=  120 fps= 60 q=28.0 size=     512kB time=00:00:05.00 ' + (
+        'x' * args.line_length) + '\n'
+    responses = []
+    for index in range(0, args.lines, args.batch_size):
+        batch = [line] * min(args.batch_size, args.lines - index)
+        responses.append(FFmpegResponse(log_batch=LogBatch(log_lines=batch)))
+        for _ in range(args.progress_per_batch):
+            responses.append(
+                FFmpegResponse(progress=Progress(
+                    frame=index, fps=60, bitrate=819.2, total_size=524288)))
+    exit_status = ExitStatus(exit_code=0)
+    exit_status.real_time.FromMilliseconds(5000)
+    exit_status.resource_usage.ru_utime = 4.5
+    exit_status.resource_usage.ru_maxrss = 123456
+    responses.append(FFmpegResponse(exit_status=exit_status))
+    return responses
+
+
+def measure(output_format, responses, args):
+    """Writes every command with a writer and returns its statistics."""
+    output_file = _CountingFile(open(os.devnull, 'w'))
+    command = ['ffmpeg', '-i', 'input.mp4', 'output.mp4']
+    start_usage = resource.getrusage(resource.RUSAGE_SELF)
+    start_time = time.perf_counter()
+    writer = client._get_writer(output_format, output_file)
+    for _ in range(args.commands):
+        writer.write_command(command, responses)
+    writer.close()
+    wall_time = time.perf_counter() - start_time
+    end_usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_time = (end_usage.ru_utime - start_usage.ru_utime +
+                end_usage.ru_stime - start_usage.ru_stime)
+    return {
+        'format': output_format,
+        'wall_time': wall_time,
+        'cpu_time': cpu_time,
+        'records_per_second': args.commands / wall_time,
+        'lines_per_second': args.commands * args.lines / wall_time,
+        'megabytes_per_second': output_file.characters / wall_time / 2**20,
+        'writes_per_record': output_file.writes / args.commands,
+    }
+
+
+def main(args):
+    """Runs every writer the requested number of times."""
+    responses = make_responses(args)
+    results = [
+        measure(output_format, responses, args)
+        for output_format in args.formats.split(',')
+        for _ in range(args.repetitions)
+    ]
+    json.dump({'config': vars(args), 'results': results}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--formats',
+                        default=','.join(FORMATS),
+                        help='comma-separated output formats to compare')
+    parser.add_argument('--commands',
+                        default=1000,
+                        type=int,
+                        help='number of commands written by each writer')
+    parser.add_argument('--lines',
+                        default=100,
+                        type=int,
+                        help='number of log lines of each command')
+    parser.add_argument('--batch-size',
+                        default=10,
+                        type=int,
+                        help='number of log lines in each response')
+    parser.add_argument('--progress-per-batch',
+                        default=1,
+                        type=int,
+                        help='number of progress reports after each batch')
+    parser.add_argument('--line-length',
+                        default=40,
+                        type=int,
+                        help='number of padding characters in each line')
+    parser.add_argument('--repetitions',
+                        default=3,
+                        type=int,
+                        help='number of times each writer is run')
+    main(parser.parse_args())
@@ -19,44 +19,118 @@ python3 client.py server-ip ffmpeg-argument ...
 
 The following is a sample command:
 python3 client.py 127.0.0.1 -i my-bucket-1/input.mp4 my-bucket-2/output.avi
+
+Commands can be spread over several workers, given as addresses or as host
+names that resolve to every worker, such as that of a headless Service:
+python3 client.py -j 16 -i commands.txt 10.0.0.1,10.0.0.2:8080,workers.local
+
+Local files can be streamed to and from ffmpeg, which reads them from pipe:0
+and writes them to pipe:1, instead of going through the buckets:
+python3 client.py 127.0.0.1 --upload input.mp4 --download output.avi \
+    -i pipe:0 -f avi pipe:1
+
+Commands that fail because a worker is shutting down or busy are retried with
+backoff. With --hedge-delay, a command that has not started responding in time
+is also sent a second time, most likely to another worker, and whichever
+attempt responds first is kept:
+python3 client.py 127.0.0.1 --hedge-delay 2 -i input.mp4 output.avi
 """
 
 import argparse
-import contextlib
+from concurrent import futures
 import json
 import os
+import queue
+import random
 import shlex
+import socket
 import sys
+import threading
+import time
+import uuid
 
+from google.protobuf import text_format
 from google.protobuf.json_format import MessageToJson
 import grpc
 
+from worker.ffmpeg_worker_pb2 import ExitStatus
 from worker.ffmpeg_worker_pb2 import FFmpegRequest
+from worker.ffmpeg_worker_pb2 import TranscodeStreamRequest
 from worker import ffmpeg_worker_pb2_grpc
 
+# The size of the chunks in which an uploaded file is sent.
+_UPLOAD_CHUNK_SIZE = 2**16
+# Every attempt of a command carries the same key in this header, so that the
+# worker can recognize retried and hedged attempts.
+_IDEMPOTENCY_KEY_HEADER = 'idempotency-key'
+# Workers send UNAVAILABLE when shutting down, RESOURCE_EXHAUSTED when their
+# queue is full and ABORTED while another attempt of the command is running.
+# Commands predicted to need more memory than a worker has are rejected with
+# FAILED_PRECONDITION, which is not retried since every attempt fails alike.
+_RETRIED_CODES = (grpc.StatusCode.UNAVAILABLE,
+                  grpc.StatusCode.RESOURCE_EXHAUSTED, grpc.StatusCode.ABORTED)
+# Workers send their load when a request arrives in this header.
+_LOAD_HEADER = 'ffmpeg-worker-load'
+# An endpoint whose calls fail this many times in a row with UNAVAILABLE is
+# ejected from the pool, for a time that doubles with every ejection.
+_MAX_FAILURES = 3
+_EJECTION_SECONDS = 10
+_MAX_EJECTION_SECONDS = 300
+# Host names are resolved again this often, so that new workers are used.
+_RESOLVE_INTERVAL = 30
+
 
 def main(args, api_key):
     """Main driver for CLI."""
-    channel = grpc.insecure_channel(f'{args.ip}:{args.port}')
-    stub = ffmpeg_worker_pb2_grpc.FFmpegStub(channel)
-    writer = _get_writer(args.format, args.output_file)
+    pool = ChannelPool(_parse_addresses(args.ip, args.port))
+    # Commands run one at a time are written as they run, so that they can be
+    # followed.
+    writer = _get_writer(args.format, args.output_file, args.parallel == 1)
+    template = FFmpegRequest(batch_log_lines=True,
+                             report_progress=args.progress,
+                             progress_only=args.progress_only,
+                             segments=args.segments,
+                             sample_interval=args.sample_interval,
+                             priority=args.priority)
+    dispatcher = Dispatcher(
+        pool, writer, api_key, template, args.parallel, args.upload,
+        args.download,
+        RetryPolicy(args.retries, args.retry_delay, args.max_retry_delay),
+        args.hedge_delay)
     try:
-        for ffmpeg_arguments in _get_ffmpeg_commands(args):
-            responses = stub.transcode(
-                FFmpegRequest(ffmpeg_arguments=ffmpeg_arguments),
-                metadata=[('x-api-key', api_key)])
-            writer.write_command(ffmpeg_arguments, responses)
+        dispatcher.run(_get_ffmpeg_commands(args))
     except KeyboardInterrupt:
-        responses.cancel()
+        dispatcher.cancel()
     writer.close()
+    pool.close()
+    for local_file in (args.upload, args.download):
+        if local_file is not None:
+            local_file.close()
 
 
-def _get_writer(output_format, output_file):
+def _get_writer(output_format, output_file, live=False):
     if output_format == 'json':
         return JsonWriter(output_file)
+    elif output_format == 'ndjson':
+        return NdjsonWriter(output_file)
     elif output_format == 'tsv':
         return TSVWriter(output_file)
-    return NormalWriter(output_file)
+    return NormalWriter(output_file, live)
+
+
+def _parse_addresses(text, default_port):
+    """Returns the (host, port) pairs of comma-separated addresses."""
+    addresses = []
+    for address in text.split(','):
+        if address.startswith('['):
+            host, _, port = address[1:].partition(']')
+            port = port[1:]
+        elif address.count(':') == 1:
+            host, _, port = address.partition(':')
+        else:
+            host, port = address, ''
+        addresses.append((host, int(port) if port else default_port))
+    return addresses
 
 
 def _get_ffmpeg_commands(args):
@@ -68,8 +142,462 @@ def _get_ffmpeg_commands(args):
         yield args.ffmpeg_arguments
 
 
+class Dispatcher:
+    """Sends ffmpeg commands to the service with bounded concurrency.
+
+    At most `parallel` transcode streams are in flight at once over the
+    channels of `pool`. With more than one stream in flight, each command's responses are
+    collected before being handed to the writer so that the output of
+    different commands is never interleaved.
+
+    Every request is a copy of `template` with a command's ffmpeg arguments
+    added. If `upload` or `download` is set, requests are sent with
+    transcodeStream: the `upload` file is streamed to ffmpeg's stdin, and
+    ffmpeg's stdout is written to the `download` file.
+
+    Other requests that fail before their first response are retried as
+    `retry_policy` says, and, if `hedge_delay` is set, sent a second time if
+    they have not responded after that many seconds. Retries and hedges go to
+    other endpoints than the earlier attempts if the pool has any. Streamed requests are sent once, since their
+    upload cannot be read again.
+    """
+
+    def __init__(self,
+                 pool,
+                 writer,
+                 api_key,
+                 template,
+                 parallel=1,
+                 upload=None,
+                 download=None,
+                 retry_policy=None,
+                 hedge_delay=None):
+        if hedge_delay is not None and hedge_delay <= 0:
+            # Every command would be sent twice at once.
+            raise ValueError('hedge_delay must be greater than 0.')
+        self._pool = pool
+        self._template = template
+        self._writer = writer
+        self._metadata = [('x-api-key', api_key)]
+        self._parallel = parallel
+        self._slots = threading.BoundedSemaphore(parallel)
+        self._write_lock = threading.Lock()
+        self._calls_lock = threading.Lock()
+        self._calls = set()
+        self._cancelled = threading.Event()
+        self._upload = upload
+        self._download = download
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._hedge_delay = hedge_delay
+
+    def run(self, commands):
+        """Runs every command and writes its responses."""
+        if self._parallel == 1:
+            for ffmpeg_arguments in commands:
+                self._writer.write_command(
+                    ffmpeg_arguments,
+                    self._save_output(self._responses(ffmpeg_arguments)))
+            return
+        executor = futures.ThreadPoolExecutor(max_workers=self._parallel)
+        pending = set()
+        try:
+            for ffmpeg_arguments in commands:
+                self._slots.acquire()
+                if self._cancelled.is_set():
+                    break
+                future = executor.submit(self._transcode, ffmpeg_arguments)
+                future.add_done_callback(lambda _: self._slots.release())
+                pending.add(future)
+                pending = _check_done(pending)
+            futures.wait(pending)
+            _check_done(pending)
+        except KeyboardInterrupt:
+            self.cancel()
+            raise
+        finally:
+            executor.shutdown()
+
+    def cancel(self):
+        """Cancels every live transcode stream."""
+        self._cancelled.set()
+        with self._calls_lock:
+            calls = list(self._calls)
+        for call in calls:
+            call.cancel()
+
+    def _responses(self, ffmpeg_arguments):
+        """Yields the responses to a command, retrying it if it fails.
+
+        An attempt is only retried if it fails before its first response, so
+        that responses are yielded as they arrive and belong to one attempt.
+        """
+        request = FFmpegRequest()
+        request.CopyFrom(self._template)
+        request.ffmpeg_arguments.extend(ffmpeg_arguments)
+        if self._upload is not None or self._download is not None:
+            endpoint = self._pool.acquire()
+            call = endpoint.stub.transcodeStream(
+                _stream_requests(request, self._upload),
+                metadata=self._metadata)
+            yield from self._track(endpoint, call)
+            return
+        metadata = [*self._metadata, (_IDEMPOTENCY_KEY_HEADER, uuid.uuid4().hex)]
+        # The endpoints of the attempts so far.
+        used = []
+        retry = 0
+        while True:
+            if self._hedge_delay is None:
+                endpoint = self._pool.acquire(used)
+                used.append(endpoint)
+                attempt = self._track(
+                    endpoint, endpoint.stub.transcode(request, metadata=metadata))
+            else:
+                attempt = self._hedge(request, metadata, used)
+            responded = False
+            try:
+                for response in attempt:
+                    responded = True
+                    yield response
+                return
+            except grpc.RpcError as error:
+                if (responded or self._cancelled.is_set() or
+                        error.code() not in _RETRIED_CODES or
+                        retry >= self._retry_policy.retries):
+                    raise
+                delay = self._retry_policy.delay(retry)
+                retry += 1
+                sys.stderr.write(f'Retrying {shlex.join(ffmpeg_arguments)} in '
+                                 f'{delay:.1f} seconds after '
+                                 f'{error.code().name}: {error.details()}\n')
+                if self._cancelled.wait(delay):
+                    raise
+
+    def _track(self, endpoint, call):
+        """Yields the responses of a call, which cancel() cancels meanwhile."""
+        self._add_call(call)
+        try:
+            yield from call
+        finally:
+            self._end(endpoint, call)
+
+    def _hedge(self, request, metadata, used):
+        """Yields the responses of the first of two attempts to respond.
+
+        The second attempt is only sent if the first has not responded within
+        the hedge delay, and the attempt that does not respond first is
+        cancelled. Errors are only raised once every attempt has failed.
+        """
+        events = queue.Queue()
+        # The endpoints of the calls that have not ended.
+        calls = {}
+        started = 0
+
+        def start():
+            nonlocal started
+            endpoint = self._pool.acquire(used)
+            used.append(endpoint)
+            call = endpoint.stub.transcode(request, metadata=metadata)
+            self._add_call(call)
+            calls[call] = endpoint
+            started += 1
+            threading.Thread(target=_pump, args=(call, events),
+                             daemon=True).start()
+
+        start()
+        hedge_time = time.monotonic() + self._hedge_delay
+        hedged = False
+        failed = 0
+        winner = None
+        try:
+            while True:
+                timeout = None
+                if not hedged:
+                    timeout = max(0, hedge_time - time.monotonic())
+                try:
+                    call, event = events.get(timeout=timeout)
+                except queue.Empty:
+                    hedged = True
+                    if not self._cancelled.is_set():
+                        start()
+                    continue
+                if winner is not None and call is not winner:
+                    continue
+                if isinstance(event, grpc.RpcError):
+                    self._end(calls.pop(call), call)
+                    failed += 1
+                    if call is winner or failed == started:
+                        raise event
+                    continue
+                if winner is None:
+                    winner = call
+                    hedged = True
+                    for loser in list(calls):
+                        if loser is not winner:
+                            self._end(calls.pop(loser), loser)
+                if event is None:
+                    return
+                yield event
+        finally:
+            for call, endpoint in calls.items():
+                self._end(endpoint, call)
+
+    def _end(self, endpoint, call):
+        """Cancels a call unless it has ended and returns it to the pool."""
+        call.cancel()
+        self._remove_call(call)
+        self._pool.release(endpoint, call)
+
+    def _add_call(self, call):
+        with self._calls_lock:
+            self._calls.add(call)
+
+    def _remove_call(self, call):
+        with self._calls_lock:
+            self._calls.discard(call)
+
+    def _save_output(self, responses):
+        """Writes output chunks to the download file and yields the rest."""
+        for response in responses:
+            if response.HasField('output_chunk'):
+                if self._download is not None:
+                    self._download.write(response.output_chunk)
+                continue
+            yield response
+
+    def _transcode(self, ffmpeg_arguments):
+        """Runs a single command and writes its buffered responses."""
+        if self._cancelled.is_set():
+            return
+        try:
+            collected = list(
+                self._save_output(self._responses(ffmpeg_arguments)))
+        except grpc.RpcError:
+            if self._cancelled.is_set():
+                return
+            raise
+        with self._write_lock:
+            self._writer.write_command(ffmpeg_arguments, iter(collected))
+
+
+class ChannelPool:
+    """Keeps a channel to every address of the FFmpeg service.
+
+    Every call goes to the endpoint with the fewest calls of this client in
+    flight, and among those to the one whose worker last reported the lowest
+    load. Endpoints whose calls keep failing with UNAVAILABLE are ejected for
+    a while; if every endpoint is ejected, the one ejected first is used.
+
+    Host names are resolved to all of their addresses, such as the pods
+    behind a headless Service, and resolved again every _RESOLVE_INTERVAL
+    seconds.
+    """
+
+    def __init__(self, addresses):
+        """Initializes the pool.
+
+        Args:
+            addresses: The (host, port) pairs of the service.
+
+        Raises:
+            ValueError: None of the addresses could be resolved.
+        """
+        self._addresses = addresses
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._resolve_time = 0
+        self._resolve()
+        if not self._endpoints:
+            raise ValueError('None of the addresses could be resolved.')
+
+    def acquire(self, exclude=()):
+        """Returns the endpoint for a call, counting the call as in flight.
+
+        Endpoints in exclude, such as those of earlier attempts of the call,
+        are only used if there are no others.
+        """
+        with self._lock:
+            if time.monotonic() >= self._resolve_time + _RESOLVE_INTERVAL:
+                self._resolve()
+            now = time.monotonic()
+            candidates = [
+                endpoint for endpoint in self._endpoints.values()
+                if endpoint not in exclude
+            ] or list(self._endpoints.values())
+            available = [
+                endpoint for endpoint in candidates
+                if endpoint.ejected_until <= now
+            ]
+            if available:
+                endpoint = min(available,
+                               key=lambda endpoint:
+                               (endpoint.in_flight, endpoint.load))
+            else:
+                endpoint = min(candidates,
+                               key=lambda endpoint: endpoint.ejected_until)
+            endpoint.in_flight += 1
+            return endpoint
+
+    def release(self, endpoint, call):
+        """Records the outcome of a call that has ended."""
+        code = call.code()
+        load = _load_hint(call.initial_metadata())
+        with self._lock:
+            endpoint.in_flight -= 1
+            if load is not None:
+                endpoint.load = load
+            now = time.monotonic()
+            if code == grpc.StatusCode.OK:
+                endpoint.failures = 0
+                endpoint.ejections = 0
+            elif (code == grpc.StatusCode.UNAVAILABLE and
+                  endpoint.ejected_until <= now):
+                endpoint.failures += 1
+                if endpoint.failures >= _MAX_FAILURES:
+                    seconds = min(_MAX_EJECTION_SECONDS,
+                                  _EJECTION_SECONDS * 2**endpoint.ejections)
+                    sys.stderr.write(f'Ejecting {endpoint.target} for '
+                                     f'{seconds} seconds.\n')
+                    endpoint.ejected_until = now + seconds
+                    endpoint.ejections += 1
+                    # A single failure ejects the endpoint again once it is
+                    # back.
+                    endpoint.failures = _MAX_FAILURES - 1
+            if endpoint.removed and not endpoint.in_flight:
+                endpoint.channel.close()
+
+    def close(self):
+        """Closes the channels of every endpoint."""
+        with self._lock:
+            for endpoint in self._endpoints.values():
+                endpoint.channel.close()
+
+    def _resolve(self):
+        """Updates the endpoints to the current addresses of the hosts.
+
+        The endpoints are kept as they are if no host can be resolved.
+        """
+        self._resolve_time = time.monotonic()
+        targets = []
+        for host, port in self._addresses:
+            try:
+                infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            except OSError as error:
+                sys.stderr.write(f'Could not resolve {host}: {error}\n')
+                continue
+            for family, _, _, _, sockaddr in infos:
+                if family == socket.AF_INET6:
+                    targets.append(f'[{sockaddr[0]}]:{port}')
+                else:
+                    targets.append(f'{sockaddr[0]}:{port}')
+        if not targets:
+            return
+        for target in targets:
+            if target not in self._endpoints:
+                self._endpoints[target] = _Endpoint(target)
+        for target in list(self._endpoints):
+            if target not in targets:
+                # Calls in flight keep the channel until they have ended.
+                endpoint = self._endpoints.pop(target)
+                endpoint.removed = True
+                if not endpoint.in_flight:
+                    endpoint.channel.close()
+
+
+class _Endpoint:  # pylint: disable=too-few-public-methods
+    """A channel to an address of the service and the state of its calls."""
+
+    def __init__(self, target):
+        self.target = target
+        self.channel = grpc.insecure_channel(target)
+        self.stub = ffmpeg_worker_pb2_grpc.FFmpegStub(self.channel)
+        self.in_flight = 0
+        # Unknown loads count as idle, so that new workers are tried.
+        self.load = 0.0
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.removed = False
+
+
+def _load_hint(initial_metadata):
+    """Returns the load sent by a worker, or None if it sent none."""
+    for key, value in initial_metadata or ():
+        if key == _LOAD_HEADER:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+class RetryPolicy:
+    """Retries requests that fail with a transient status, with backoff.
+
+    The delay before a retry is drawn uniformly between zero and an
+    exponentially growing bound, so that clients failing at once do not retry
+    at once.
+
+    Attributes:
+        retries: The maximum number of retries of a request.
+        initial_delay: The bound of the delay before the first retry.
+        max_delay: The largest bound of a delay.
+    """
+
+    def __init__(self, retries=0, initial_delay=1.0, max_delay=30.0):
+        self.retries = retries
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+
+    def delay(self, retry):
+        """Returns the seconds to wait before the given retry, from zero."""
+        return random.uniform(0, min(self.max_delay,
+                                     self.initial_delay * 2**retry))
+
+
+def _pump(call, events):
+    """Puts the responses of a call into events, then its error or None."""
+    try:
+        for response in call:
+            events.put((call, response))
+    except grpc.RpcError as error:
+        events.put((call, error))
+        return
+    events.put((call, None))
+
+
+def _stream_requests(request, upload):
+    """Yields the request and then the upload file in chunks.
+
+    The file is read as gRPC sends the messages, so it is never held in
+    memory as a whole.
+    """
+    yield TranscodeStreamRequest(request=request)
+    if upload is None:
+        return
+    while True:
+        chunk = upload.read(_UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield TranscodeStreamRequest(input_chunk=chunk)
+
+
+def _check_done(pending):
+    """Re-raises errors of finished futures and returns the unfinished ones."""
+    remaining = set()
+    for future in pending:
+        if future.done():
+            future.result()
+        else:
+            remaining.add(future)
+    return remaining
+
+
 class ResponseWriter:
-    """Base class for all writer classes."""
+    """Base class for all writer classes.
+
+    Writers build every record in memory and write it with a single call,
+    rather than printing it piece by piece.
+    """
 
     def __init__(self, output_file):
         self.output_file = output_file
@@ -83,24 +611,50 @@ class ResponseWriter:
 
 
 class NormalWriter(ResponseWriter):
-    """Writes output in human-readable format."""
+    """Writes output in human-readable format.
+
+    Like the other writers, it writes every record with a single call, unless
+    live is set. Then every response is written as soon as it arrives, so
+    that a running command can be followed.
+    """
+
+    def __init__(self, output_file, live=False):
+        super().__init__(output_file)
+        self._live = live
 
     def write_command(self, command, responses):
         """Writes command and its responses in human-readable format."""
-        with contextlib.redirect_stdout(self.output_file):
-            print(command)
-            for response in responses:
-                if response.HasField('log_line'):
-                    print(response.log_line, end='')
-                else:
-                    exit_code = _convert_exit_code(
-                        response.exit_status.exit_code)
-                    if exit_code >= 0:
-                        print(f'Exited with code {exit_code}')
-                    else:
-                        print(f'Killed by signal {-exit_code}')
-                    print(response.exit_status.resource_usage)
-                    print(f'Real time: {response.exit_status.real_time}')
+        if not self._live:
+            self.output_file.write(''.join(
+                [f'{command}\n', *map(_format_response, responses)]))
+            self.output_file.flush()
+            return
+        self.output_file.write(f'{command}\n')
+        for response in responses:
+            self.output_file.write(_format_response(response))
+        self.output_file.flush()
+
+
+def _format_response(response):
+    """Returns the human-readable text of a response."""
+    if response.HasField('progress'):
+        return 'Progress: ' + text_format.MessageToString(
+            response.progress, as_one_line=True) + '\n'
+    if response.HasField('resource_sample'):
+        return 'Resources: ' + text_format.MessageToString(
+            response.resource_sample, as_one_line=True) + '\n'
+    if not response.HasField('exit_status'):
+        return ''.join(_get_log_lines(response))
+    exit_code = _convert_exit_code(response.exit_status.exit_code)
+    if exit_code >= 0:
+        parts = [f'Exited with code {exit_code}\n']
+    else:
+        parts = [f'Killed by signal {-exit_code}\n']
+    parts.append(f'{response.exit_status.resource_usage}\n')
+    parts.append(f'Real time: {response.exit_status.real_time}\n')
+    if response.exit_status.preemptions:
+        parts.append(f'Preemptions: {response.exit_status.preemptions}\n')
+    return ''.join(parts)
 
 
 class JsonWriter(ResponseWriter):
@@ -113,7 +667,7 @@ class JsonWriter(ResponseWriter):
     def __init__(self, output_file):
         super().__init__(output_file)
         self._add_comma = False
-        print('[', end='', file=self.output_file)
+        self.output_file.write('[')
 
     def write_command(self, command, responses):
         """Writes command and its responses in JSON format.
@@ -123,69 +677,115 @@ class JsonWriter(ResponseWriter):
           "command": ["ffmpeg", "-i", "input_file", "output_file"],
           "response": {
             "logs": [...],
+            "progress": [...],
             "exit_status": {...}
           }
         }
 
         The exit_status object follows the structure of the ExitStatus protobuf.
+        The progress array is only present if progress reports were received;
+        its objects follow the structure of the Progress protobuf. The
+        exit status holds the resource samples of the run, if any, so those
+        streamed while ffmpeg ran are not written.
         """
-        with contextlib.redirect_stdout(self.output_file):
-            if self._add_comma:
-                print(',', end='')
-            print(f'{{"command":{json.dumps(command)},"response":', end='')
-            print('{"logs":[', end='')
-            prev_response = next(responses)
-            for response in responses:
-                print(json.dumps(prev_response.log_line), end='')
-                if response.HasField('log_line'):
-                    print(',', end='')
-                prev_response = response
-            print('],', end='')
-            print('"exit_status":', end='')
-            prev_response.exit_status.exit_code = _convert_exit_code(
-                prev_response.exit_status.exit_code)
-            print(MessageToJson(prev_response.exit_status,
-                                including_default_value_fields=True,
-                                preserving_proto_field_name=True),
-                  end='')
-            print('}}', end='')
-            self._add_comma = True
+        record = _json_record(command, responses)
+        self.output_file.write(',' + record if self._add_comma else record)
+        self._add_comma = True
 
     def close(self):
-        """Print a closing bracket to close the array started in __init__"""
-        print(']', end='', file=self.output_file)
+        """Writes a closing bracket to close the array started in __init__"""
+        self.output_file.write(']')
         super().close()
 
 
+class NdjsonWriter(ResponseWriter):
+    """Writes output as newline-delimited JSON.
+
+    Every command is written as a line holding the object described in
+    JsonWriter.write_command as soon as it finishes, so that a reader can
+    process the results while the batch is still running.
+    """
+
+    def write_command(self, command, responses):
+        """Writes command and its responses as a line of JSON."""
+        self.output_file.write(
+            _json_record(command, responses, indent=None) + '\n')
+        self.output_file.flush()
+
+
+def _json_record(command, responses, indent=2):
+    """Returns the JSON object of a command, as in JsonWriter.write_command.
+
+    Args:
+        command: The ffmpeg command.
+        responses: The responses to the command.
+        indent: The indent of the exit_status object, or None to write it on
+            a single line.
+    """
+    exit_status = ExitStatus()
+    logs = []
+    progress = []
+    for response in responses:
+        if response.HasField('exit_status'):
+            exit_status = response.exit_status
+        elif response.HasField('progress'):
+            progress.append(
+                MessageToJson(response.progress,
+                              indent=None,
+                              preserving_proto_field_name=True))
+        else:
+            logs.extend(_get_log_lines(response))
+    exit_status.exit_code = _convert_exit_code(exit_status.exit_code)
+    parts = [
+        f'{{"command":{json.dumps(command)},"response":{{"logs":',
+        json.dumps(logs, separators=(',', ':')), ','
+    ]
+    if progress:
+        parts += ['"progress":[', ','.join(progress), '],']
+    parts += [
+        '"exit_status":',
+        MessageToJson(exit_status,
+                      indent=indent,
+                      including_default_value_fields=True,
+                      preserving_proto_field_name=True), '}}'
+    ]
+    return ''.join(parts)
+
+
 class TSVWriter(ResponseWriter):
     """Writes exit status of responses in tsv format."""
 
     def __init__(self, output_file):
         super().__init__(output_file)
-        print('Command',
-              'Exit Code',
-              'Real Time',
-              'User Time',
-              'System Time',
-              'Max RSS',
-              sep='\t',
-              file=self.output_file)
-
+        self.output_file.write('\t'.join([
+            'Command', 'Exit Code', 'Real Time', 'User Time', 'System Time',
+            'Max RSS'
+        ]) + '\n')
 
     def write_command(self, command, responses):
         for response in responses:
             if response.HasField('exit_status'):
-                print(command,
-                      response.exit_status.exit_code,
-                      response.exit_status.real_time.ToNanoseconds() / 10**9,
-                      response.exit_status.resource_usage.ru_utime,
-                      response.exit_status.resource_usage.ru_stime,
-                      response.exit_status.resource_usage.ru_maxrss,
-                      sep='\t',
-                      file=self.output_file)
+                exit_status = response.exit_status
+                fields = [
+                    command, exit_status.exit_code,
+                    exit_status.real_time.ToNanoseconds() / 10**9,
+                    exit_status.resource_usage.ru_utime,
+                    exit_status.resource_usage.ru_stime,
+                    exit_status.resource_usage.ru_maxrss
+                ]
+                self.output_file.write('\t'.join(map(str, fields)) + '\n')
                 return
 
 
+def _get_log_lines(response):
+    """Returns the log lines in a response, whether batched or not."""
+    if response.HasField('log_batch'):
+        return response.log_batch.log_lines
+    if response.HasField('log_line'):
+        return [response.log_line]
+    return []
+
+
 def _convert_exit_code(exit_code):
     """Converts exit code returned by server to more understandable format"""
     if os.WIFEXITED(exit_code):
@@ -202,7 +802,11 @@ def get_api_key():
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
-    parser.add_argument('ip', help='IP address of the FFmpeg service')
+    parser.add_argument('ip',
+                        help=('comma-separated IP addresses or host names of'
+                              ' the FFmpeg service, each with an optional'
+                              ' :port; host names are resolved to all of'
+                              ' their addresses'))
     parser.add_argument('--port',
                         '-p',
                         default=80,
@@ -220,14 +824,80 @@ if __name__ == '__main__':
                         help='output file for ffmpeg service responses')
     parser.add_argument('--format',
                         '-f',
-                        choices=['normal', 'json', 'tsv'],
+                        choices=['normal', 'json', 'ndjson', 'tsv'],
                         default='normal',
                         help=('format for ffmpeg service responses'
+                              '; ndjson writes a line per finished command'
                               '; tsv just has certain exit status fields'))
+    parser.add_argument('--progress',
+                        action='store_true',
+                        help='request progress reports from ffmpeg')
+    parser.add_argument('--progress-only',
+                        action='store_true',
+                        help=('request progress reports from ffmpeg'
+                              ' instead of its logs'))
+    parser.add_argument('--parallel',
+                        '-j',
+                        default=1,
+                        type=int,
+                        help='maximum number of commands to run concurrently')
+    parser.add_argument('--segments',
+                        default=0,
+                        type=int,
+                        help=('split each input at keyframes into up to this'
+                              ' many concurrently transcoded segments'))
+    parser.add_argument('--sample-interval',
+                        default=0,
+                        type=float,
+                        help=('sample the resource usage of ffmpeg every this'
+                              ' many seconds'))
+    parser.add_argument('--priority',
+                        default=0,
+                        type=int,
+                        help=('priority of the commands; workers run queued'
+                              ' commands of higher priority first'))
+    parser.add_argument('--upload',
+                        type=argparse.FileType('rb'),
+                        help=('local file to stream to ffmpeg, which reads it'
+                              ' from pipe:0'))
+    parser.add_argument('--download',
+                        type=argparse.FileType('wb'),
+                        help=('local file to write the output that ffmpeg'
+                              ' writes to pipe:1 to'))
+    parser.add_argument('--retries',
+                        default=3,
+                        type=int,
+                        help=('maximum number of retries of a command when a'
+                              ' worker is unavailable or busy before it starts'
+                              ' the command'))
+    parser.add_argument('--retry-delay',
+                        default=1,
+                        type=float,
+                        help=('upper bound in seconds of the random delay'
+                              ' before the first retry, doubled every retry'))
+    parser.add_argument('--max-retry-delay',
+                        default=30,
+                        type=float,
+                        help='largest upper bound of the delay before a retry')
+    parser.add_argument('--hedge-delay',
+                        type=float,
+                        help=('send a command again if it has not responded'
+                              ' after this many seconds, keeping whichever'
+                              ' attempt responds first; must be greater'
+                              ' than 0'))
     parser.add_argument('ffmpeg_arguments',
                         nargs=argparse.REMAINDER,
                         help='arguments to pass to ffmpeg')
     arguments = parser.parse_args()
     if arguments.input_file is not None and len(arguments.ffmpeg_arguments) > 0:
         parser.error('Cannot use both an input file and an explicit command.')
+    if arguments.input_file is not None and (arguments.upload is not None or
+                                             arguments.download is not None):
+        parser.error('Cannot stream local files for an input file of commands.')
+    if arguments.parallel < 1:
+        parser.error('--parallel must be at least 1.')
+    if arguments.retries < 0:
+        parser.error('--retries cannot be negative.')
+    if arguments.hedge_delay is not None and arguments.hedge_delay <= 0:
+        parser.error('--hedge-delay must be greater than 0.')
     main(arguments, get_api_key())
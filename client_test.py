@@ -0,0 +1,449 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the client CLI.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest client_test
+"""
+
+from concurrent import futures
+import io
+import json
+import socket
+import threading
+import time
+import unittest
+from unittest import mock
+
+import grpc
+
+import client
+from worker import ffmpeg_worker_pb2_grpc
+from worker.ffmpeg_worker_pb2 import ExitStatus
+from worker.ffmpeg_worker_pb2 import FFmpegRequest
+from worker.ffmpeg_worker_pb2 import FFmpegResponse
+from worker.ffmpeg_worker_pb2 import LogBatch
+from worker.ffmpeg_worker_pb2 import Progress
+
+_RESPONSES = (
+    FFmpegResponse(log_batch=LogBatch(log_lines=['a\n', 'b\n'])),
+    FFmpegResponse(progress=Progress(frame=1)),
+    FFmpegResponse(log_line='c\n'),
+    FFmpegResponse(exit_status=ExitStatus()),
+)
+
+
+class _FlakyServicer(ffmpeg_worker_pb2_grpc.FFmpegServicer):
+    """Fails the first attempts of every command with a status code.
+
+    An attempt that fails after responding sends a log line first.
+    """
+
+    def __init__(self, code, failures=1, respond_first=False):
+        self.code = code
+        self.failures = failures
+        self.respond_first = respond_first
+        self.attempts = 0
+
+    def transcode(self, request, context):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            if self.respond_first:
+                yield FFmpegResponse(log_line=f'attempt {self.attempts}\n')
+            context.abort(self.code, 'failed')
+        yield FFmpegResponse(log_line=f'attempt {self.attempts}\n')
+        yield FFmpegResponse(exit_status=ExitStatus())
+
+
+class _SlowServicer(ffmpeg_worker_pb2_grpc.FFmpegServicer):
+    """Sends log lines a while apart, and counts the calls in flight."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def transcode(self, request, context):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            for index in range(3):
+                time.sleep(0.02)
+                yield FFmpegResponse(
+                    log_line=f'{request.ffmpeg_arguments[0]} {index}\n')
+            yield FFmpegResponse(exit_status=ExitStatus())
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def _run_commands(test, servicer, commands, **kwargs):
+    """Runs commands against servicer and returns the written output."""
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=8))
+    ffmpeg_worker_pb2_grpc.add_FFmpegServicer_to_server(servicer, server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+    test.addCleanup(server.stop, None)
+    pool = client.ChannelPool([('127.0.0.1', port)])
+    test.addCleanup(pool.close)
+    output = io.StringIO()
+    dispatcher = client.Dispatcher(pool, client.NormalWriter(output), 'key',
+                                   FFmpegRequest(), **kwargs)
+    with mock.patch('sys.stderr', io.StringIO()):
+        dispatcher.run(commands)
+    return output.getvalue()
+
+
+class ParallelTest(unittest.TestCase):
+    """Commands run with several transcode streams in flight."""
+
+    def test_streams_in_flight_are_bounded(self):
+        servicer = _SlowServicer()
+        commands = [[f'command{index}'] for index in range(6)]
+        output = _run_commands(self, servicer, commands, parallel=2)
+        self.assertEqual(servicer.max_in_flight, 2)
+        # The records of the commands are not interleaved.
+        lines = output.splitlines()
+        self.assertEqual(sorted(lines[::7]),
+                         [str(command) for command in commands])
+        for start in range(0, len(lines), 7):
+            name = lines[start][2:-2]
+            self.assertEqual(lines[start + 1:start + 4],
+                             [f'{name} {index}' for index in range(3)])
+            self.assertEqual(lines[start + 4], 'Exited with code 0')
+
+    def test_sequential_commands_are_written_in_order(self):
+        commands = [[f'command{index}'] for index in range(3)]
+        output = _run_commands(self, _SlowServicer(), commands)
+        self.assertEqual(
+            [line for line in output.splitlines() if line.startswith('[')],
+            [str(command) for command in commands])
+
+
+class DispatcherTest(unittest.TestCase):
+    """Commands sent to a worker whose first attempts fail."""
+
+    def run_commands(self, servicer, commands, parallel=1, retries=2):
+        """Runs commands against servicer and returns the written output."""
+        return _run_commands(self,
+                             servicer,
+                             commands,
+                             parallel=parallel,
+                             retry_policy=client.RetryPolicy(retries, 0, 0))
+
+    def test_rejected_attempt_is_retried(self):
+        servicer = _FlakyServicer(grpc.StatusCode.UNAVAILABLE)
+        output = self.run_commands(servicer, [['-version']])
+        self.assertEqual(servicer.attempts, 2)
+        self.assertIn('attempt 2\n', output)
+
+    def test_attempt_that_responded_is_not_retried(self):
+        servicer = _FlakyServicer(grpc.StatusCode.UNAVAILABLE,
+                                  respond_first=True)
+        with self.assertRaises(grpc.RpcError):
+            self.run_commands(servicer, [['-version']], parallel=2)
+        self.assertEqual(servicer.attempts, 1)
+
+    def test_failed_precondition_is_not_retried(self):
+        servicer = _FlakyServicer(grpc.StatusCode.FAILED_PRECONDITION)
+        with self.assertRaises(grpc.RpcError):
+            self.run_commands(servicer, [['-version']], parallel=2)
+        self.assertEqual(servicer.attempts, 1)
+
+    def test_hedge_delay_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            client.Dispatcher(None, None, 'key', FFmpegRequest(),
+                              hedge_delay=0)
+
+
+class _HedgedServicer(ffmpeg_worker_pb2_grpc.FFmpegServicer):
+    """Holds the first attempt of a command back until it is cancelled.
+
+    If code is set, every attempt fails with it instead, the first one after
+    a while. Otherwise later attempts respond at once.
+    """
+
+    def __init__(self, code=None):
+        self.code = code
+        self.keys = []
+        self.first_cancelled = threading.Event()
+
+    def transcode(self, request, context):
+        self.keys.append(dict(context.invocation_metadata())['idempotency-key'])
+        attempt = len(self.keys)
+        if attempt == 1:
+            deadline = time.monotonic() + 0.5
+            while context.is_active():
+                if self.code is not None and time.monotonic() > deadline:
+                    context.abort(self.code, 'failed')
+                time.sleep(0.01)
+            self.first_cancelled.set()
+            return
+        if self.code is not None:
+            context.abort(self.code, 'failed')
+        yield FFmpegResponse(log_line=f'attempt {attempt}\n')
+        yield FFmpegResponse(exit_status=ExitStatus())
+
+
+class HedgeTest(unittest.TestCase):
+    """Commands sent again when they have not responded in time."""
+
+    def test_first_attempt_to_respond_is_kept(self):
+        servicer = _HedgedServicer()
+        output = _run_commands(self, servicer, [['-version']],
+                               hedge_delay=0.05)
+        self.assertIn('attempt 2\n', output)
+        self.assertTrue(servicer.first_cancelled.wait(5))
+        self.assertEqual(len(servicer.keys), 2)
+        self.assertEqual(servicer.keys[0], servicer.keys[1])
+
+    def test_prompt_attempt_is_not_hedged(self):
+        servicer = _SlowServicer()
+        output = _run_commands(self, servicer, [['-version']], hedge_delay=5)
+        self.assertIn('-version 2\n', output)
+        self.assertEqual(servicer.max_in_flight, 1)
+
+    def test_error_waits_for_the_other_attempt(self):
+        servicer = _HedgedServicer(grpc.StatusCode.INTERNAL)
+        with self.assertRaises(grpc.RpcError) as context:
+            _run_commands(self, servicer, [['-version']], hedge_delay=0.05)
+        self.assertEqual(context.exception.code(), grpc.StatusCode.INTERNAL)
+        self.assertEqual(len(servicer.keys), 2)
+
+
+class RetryPolicyTest(unittest.TestCase):
+    """Delays before the retries of a command."""
+
+    def test_delays_grow_up_to_the_maximum(self):
+        policy = client.RetryPolicy(retries=5, initial_delay=1, max_delay=6)
+        with mock.patch.object(client.random, 'uniform',
+                               side_effect=lambda low, high: high):
+            self.assertEqual([policy.delay(retry) for retry in range(5)],
+                             [1, 2, 4, 6, 6])
+
+    def test_delays_are_jittered(self):
+        policy = client.RetryPolicy(retries=1, initial_delay=1)
+        delays = {policy.delay(0) for _ in range(20)}
+        self.assertGreater(len(delays), 1)
+        self.assertTrue(all(0 <= delay <= 1 for delay in delays))
+
+
+class _EndedCall:
+    """A call that has ended with a status code and sent a load."""
+
+    def __init__(self, code=grpc.StatusCode.OK, load=None):
+        self._code = code
+        self._load = load
+
+    def code(self):
+        return self._code
+
+    def initial_metadata(self):
+        if self._load is None:
+            return ()
+        return (('ffmpeg-worker-load', self._load),)
+
+
+def _address_infos(*hosts):
+    return [(socket.AF_INET, socket.SOCK_STREAM, 0, '', (host, 0))
+            for host in hosts]
+
+
+class ChannelPoolTest(unittest.TestCase):
+    """Endpoints picked for calls among the addresses of the service."""
+
+    def setUp(self):
+        patcher = mock.patch.object(client.socket,
+                                    'getaddrinfo',
+                                    return_value=_address_infos(
+                                        '10.0.0.1', '10.0.0.2'))
+        self.getaddrinfo = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('sys.stderr', io.StringIO())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = client.ChannelPool([('workers', 8080)])
+        self.addCleanup(self.pool.close)
+
+    def test_least_busy_endpoint_is_used(self):
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        self.assertNotEqual(first, second)
+        self.pool.release(first, _EndedCall(load='0.5'))
+        self.pool.release(second, _EndedCall(load='2'))
+        self.assertEqual(self.pool.acquire(), first)
+        self.assertEqual(self.pool.acquire(), second)
+
+    def test_excluded_endpoints_are_a_last_resort(self):
+        first = self.pool.acquire()
+        self.pool.release(first, _EndedCall(load='0.1'))
+        second = self.pool.acquire([first])
+        self.assertNotEqual(second, first)
+        self.assertEqual(self.pool.acquire([first, second]), first)
+
+    def test_failing_endpoint_is_ejected(self):
+        failing = self.pool.acquire()
+        other = self.pool.acquire()
+        self.pool.release(other, _EndedCall(load='5'))
+        for _ in range(client._MAX_FAILURES):
+            self.pool.release(failing, _EndedCall(grpc.StatusCode.UNAVAILABLE))
+            if failing.ejected_until:
+                break
+            self.assertEqual(self.pool.acquire(), failing)
+        self.assertGreater(failing.ejected_until, time.monotonic())
+        self.assertEqual(failing.ejections, 1)
+        self.assertEqual(self.pool.acquire(), other)
+
+    def test_ejected_endpoints_are_used_if_there_is_no_other(self):
+        endpoints = list(self.pool._endpoints.values())
+        endpoints[0].ejected_until = time.monotonic() + 20
+        endpoints[1].ejected_until = time.monotonic() + 10
+        self.assertEqual(self.pool.acquire(), endpoints[1])
+
+    def test_success_resets_the_failures(self):
+        endpoint = self.pool.acquire()
+        self.pool.release(endpoint, _EndedCall(grpc.StatusCode.UNAVAILABLE))
+        self.pool.acquire([endpoint])
+        self.pool.release(endpoint, _EndedCall())
+        self.assertEqual((endpoint.failures, endpoint.ejections), (0, 0))
+
+    def test_hosts_are_resolved_again(self):
+        self.getaddrinfo.return_value = _address_infos('10.0.0.2', '10.0.0.3')
+        with mock.patch.object(client, '_RESOLVE_INTERVAL', 0):
+            self.pool.acquire()
+        self.assertEqual(sorted(self.pool._endpoints),
+                         ['10.0.0.2:8080', '10.0.0.3:8080'])
+
+    def test_unresolved_hosts_keep_the_endpoints(self):
+        self.getaddrinfo.side_effect = OSError('no such host')
+        with mock.patch.object(client, '_RESOLVE_INTERVAL', 0):
+            self.pool.acquire()
+        self.assertEqual(sorted(self.pool._endpoints),
+                         ['10.0.0.1:8080', '10.0.0.2:8080'])
+        with self.assertRaises(ValueError):
+            client.ChannelPool([('workers', 8080)])
+
+
+class AddressTest(unittest.TestCase):
+    """Addresses and load hints given to the client."""
+
+    def test_parse_addresses(self):
+        self.assertEqual(
+            client._parse_addresses('a,b:9000,[::1]:7000,[::1],10.0.0.1',
+                                    8080),
+            [('a', 8080), ('b', 9000), ('::1', 7000), ('::1', 8080),
+             ('10.0.0.1', 8080)])
+
+    def test_load_hint(self):
+        self.assertEqual(
+            client._load_hint((('other', 'x'), ('ffmpeg-worker-load', '1.5'))),
+            1.5)
+        self.assertIsNone(client._load_hint((('ffmpeg-worker-load', 'x'),)))
+        self.assertIsNone(client._load_hint(None))
+
+
+class _CountingFile(io.StringIO):
+    """Counts the calls to write."""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+
+class WriterTest(unittest.TestCase):
+    """Records written by every output format."""
+
+    def count_writes(self, output_format, live=False):
+        """Returns the writes of each of two records and the output."""
+        output = _CountingFile()
+        writer = client._get_writer(output_format, output, live)
+        writes = []
+        for command in (['-i', 'a.mp4', 'b.mp4'], ['-i', 'c.mp4', 'd.mp4']):
+            before = output.writes
+            writer.write_command(command, iter(_RESPONSES))
+            writes.append(output.writes - before)
+        return writes, output.getvalue()
+
+    def test_every_record_is_a_single_write(self):
+        for output_format in ('normal', 'json', 'ndjson', 'tsv'):
+            writes, _ = self.count_writes(output_format)
+            self.assertEqual(writes, [1, 1], output_format)
+
+    def test_live_normal_output_is_written_per_response(self):
+        writes, output = self.count_writes('normal', live=True)
+        self.assertEqual(writes, [5, 5])
+        self.assertEqual(output, self.count_writes('normal')[1])
+
+    def test_normal_output(self):
+        output = io.StringIO()
+        client.NormalWriter(output).write_command(['-version'], [
+            FFmpegResponse(log_line='a\n'),
+            FFmpegResponse(exit_status=ExitStatus(exit_code=9, preemptions=1))
+        ])
+        self.assertEqual(
+            output.getvalue(), "['-version']\na\nKilled by signal 9\n\n"
+            'Real time: \nPreemptions: 1\n')
+
+    def test_json_output_is_an_array(self):
+        output = io.StringIO()
+        writer = client.JsonWriter(output)
+        writer.write_command(['-i', 'a.mp4'], iter(_RESPONSES))
+        writer.write_command(['-i', 'b.mp4'],
+                             [FFmpegResponse(exit_status=ExitStatus(
+                                 exit_code=1 << 8))])
+        # Keeps the output readable once the writer has closed it.
+        with mock.patch.object(output, 'close'):
+            writer.close()
+        records = json.loads(output.getvalue())
+        self.assertEqual([record['command'] for record in records],
+                         [['-i', 'a.mp4'], ['-i', 'b.mp4']])
+        self.assertEqual(records[0]['response']['logs'], ['a\n', 'b\n', 'c\n'])
+        self.assertEqual(records[0]['response']['progress'], [{'frame': '1'}])
+        self.assertEqual(records[1]['response']['exit_status']['exit_code'],
+                         1)
+        self.assertNotIn('progress', records[1]['response'])
+
+    def test_ndjson_output_has_a_record_per_line(self):
+        output = io.StringIO()
+        writer = client.NdjsonWriter(output)
+        for command in (['-i', 'a.mp4'], ['-i', 'b.mp4']):
+            writer.write_command(command, iter(_RESPONSES))
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[1])['command'], ['-i', 'b.mp4'])
+        self.assertEqual(json.loads(lines[0])['response']['logs'],
+                         ['a\n', 'b\n', 'c\n'])
+
+    def test_tsv_output_has_a_row_per_command(self):
+        output = io.StringIO()
+        writer = client.TSVWriter(output)
+        exit_status = ExitStatus(exit_code=3 << 8)
+        exit_status.real_time.FromMilliseconds(1500)
+        exit_status.resource_usage.ru_maxrss = 1024
+        writer.write_command('ffmpeg -version',
+                             [FFmpegResponse(exit_status=exit_status)])
+        self.assertEqual(output.getvalue().splitlines(), [
+            'Command\tExit Code\tReal Time\tUser Time\tSystem Time\tMax RSS',
+            'ffmpeg -version\t768\t1.5\t0.0\t0.0\t1024'
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
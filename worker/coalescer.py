@@ -0,0 +1,262 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Shares the run of a request with identical requests that are in flight.
+
+Retried and duplicated requests would otherwise start another ffmpeg that
+races the first to write the same outputs. Requests are identical if their
+normalized ffmpeg arguments, the identity of their input files and the
+options that shape their responses are. A request identical to one in flight
+subscribes to its run: it receives every response sent so far and then the
+rest as they come, ending with the shared exit status.
+
+Attempts of a request sent with the same idempotency key also share a run,
+even if their inputs cannot be identified. A run is registered under all of
+its keys.
+
+A run is not tied to any of its requests. It is cancelled once all of its
+subscribers have gone.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+from typing import Tuple
+
+from worker.ffmpeg_args import FFmpegArguments
+from worker.ffmpeg_args import is_file_url
+from worker.ffmpeg_worker_pb2 import FFmpegRequest
+from worker.ffmpeg_worker_pb2 import FFmpegResponse
+
+# How often a waiting subscriber checks whether its request was cancelled.
+_POLL_INTERVAL = 0.25
+
+
+def coalescing_key(request: FFmpegRequest) -> Optional[str]:
+    """Returns the key shared by identical requests.
+
+    Returns:
+        The key, or None if an input file cannot be found, in which case the
+        request is run on its own.
+    """
+    arguments = FFmpegArguments(request.ffmpeg_arguments)
+    inputs = []
+    for url in arguments.inputs:
+        if not is_file_url(url):
+            inputs.append(url)
+            continue
+        try:
+            stat = os.stat(url)
+        except OSError:
+            return None
+        inputs.append([os.path.abspath(url), stat.st_size, stat.st_mtime_ns])
+    key = json.dumps([
+        arguments.normalized(), inputs, request.batch_log_lines,
+        request.report_progress, request.progress_only, request.sample_interval
+    ])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class CoalescedRun:
+    """The responses of a run on its own thread, shared by its subscribers.
+
+    Attributes:
+        cancel_event: Set once every subscriber has gone before the run
+            finished.
+    """
+
+    def __init__(self):
+        self.cancel_event = threading.Event()
+        self._condition = threading.Condition()
+        self._responses = []
+        self._error = None
+        self._finished = False
+        self._subscribers = 0
+
+    def attach(self) -> bool:
+        """Adds a subscriber, returning False if the run has ended."""
+        with self._condition:
+            if self._finished or self.cancel_event.is_set():
+                return False
+            self._subscribers += 1
+            return True
+
+    def publish(self, response: FFmpegResponse):
+        """Sends a response to every subscriber."""
+        with self._condition:
+            self._responses.append(response)
+            self._condition.notify_all()
+
+    def finish(self, error: Optional[Exception] = None):
+        """Ends the run, raising error in every subscriber if it is set."""
+        with self._condition:
+            if self._finished:
+                return
+            self._finished = True
+            self._error = error
+            self._condition.notify_all()
+
+    def subscribe(self, cancel_event: threading.Event):
+        """Yields the responses of the run for an attached subscriber.
+
+        Args:
+            cancel_event: Set when the subscriber's request is cancelled.
+
+        Raises:
+            The error the run was finished with, if any.
+        """
+        index = 0
+        try:
+            while not cancel_event.is_set():
+                with self._condition:
+                    if index == len(self._responses) and not self._finished:
+                        self._condition.wait(_POLL_INTERVAL)
+                    responses = self._responses[index:]
+                    finished = self._finished
+                index += len(responses)
+                yield from responses
+                if finished and index == len(self._responses):
+                    if self._error is not None:
+                        raise self._error
+                    return
+        finally:
+            self._detach()
+
+    def _detach(self):
+        with self._condition:
+            self._subscribers -= 1
+            if not self._subscribers and not self._finished:
+                self.cancel_event.set()
+
+
+class AioCoalescedRun:
+    """The responses of a run in an asyncio task, shared by its subscribers.
+
+    Attributes:
+        task: The task of the run, which is cancelled once every subscriber
+            has gone before the run finished.
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+        self._responses = []
+        self._error = None
+        self._finished = False
+        self._cancelled = False
+        self._subscribers = 0
+
+    def attach(self) -> bool:
+        """Adds a subscriber, returning False if the run has ended."""
+        if self._finished or self._cancelled:
+            return False
+        self._subscribers += 1
+        return True
+
+    def publish(self, response: FFmpegResponse):
+        """Sends a response to every subscriber."""
+        self._responses.append(response)
+        self._notify()
+
+    def finish(self, error: Optional[Exception] = None):
+        """Ends the run, raising error in every subscriber if it is set."""
+        if self._finished:
+            return
+        self._finished = True
+        self._error = error
+        self._notify()
+
+    async def subscribe(self):
+        """Yields the responses of the run for an attached subscriber.
+
+        Raises:
+            The error the run was finished with, if any.
+        """
+        index = 0
+        try:
+            while True:
+                while index < len(self._responses):
+                    index += 1
+                    yield self._responses[index - 1]
+                if self._finished:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                await self._changed.wait()
+        finally:
+            self._subscribers -= 1
+            if not self._subscribers and not self._finished:
+                self._cancelled = True
+                self.task.cancel()
+
+    def _notify(self):
+        # Waiting subscribers hold the old event, so it is set once.
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+def idempotency_alias(idempotency_key: Optional[str]) -> Optional[str]:
+    """Returns the key of the runs of an idempotency key, if it is set."""
+    return f'idempotency-key:{idempotency_key}' if idempotency_key else None
+
+
+class RunRegistry:
+    """Finds the run in flight for any of a request's keys."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = {}
+
+    def join(self, keys: Iterable[Optional[str]],
+             create: Callable) -> Tuple[object, bool]:
+        """Attaches to the run of one of the keys, or to a new one.
+
+        The run is registered under every key that is not None and has no
+        run, so that requests sharing any of the keys find it.
+
+        Args:
+            keys: The coalescing key and idempotency alias of the request,
+                either of which may be None.
+            create: Called without arguments to create a run.
+
+        Returns:
+            The run and whether it was created.
+        """
+        keys = [key for key in keys if key is not None]
+        with self._lock:
+            for key in keys:
+                run = self._runs.get(key)
+                if run is not None and run.attach():
+                    break
+            else:
+                run = create()
+                run.attach()
+                for key in keys:
+                    self._runs[key] = run
+                return run, True
+            for key in keys:
+                self._runs.setdefault(key, run)
+            return run, False
+
+    def remove(self, run):
+        """Forgets a run once it has ended."""
+        with self._lock:
+            keys = [key for key, value in self._runs.items() if value is run]
+            for key in keys:
+                del self._runs[key]
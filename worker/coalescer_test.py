@@ -0,0 +1,218 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the coalescing of identical requests.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.coalescer_test
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+from worker.coalescer import AioCoalescedRun
+from worker.coalescer import CoalescedRun
+from worker.coalescer import RunRegistry
+from worker.coalescer import coalescing_key
+from worker.coalescer import idempotency_alias
+from worker.ffmpeg_worker_pb2 import FFmpegRequest
+from worker.ffmpeg_worker_pb2 import FFmpegResponse
+
+
+def _response(line: str) -> FFmpegResponse:
+    return FFmpegResponse(log_line=line)
+
+
+class CoalescingKeyTest(unittest.TestCase):
+    """The keys shared by identical requests."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.input = os.path.join(directory.name, 'in.mp4')
+        with open(self.input, 'wb') as f:
+            f.write(b'video')
+
+    def _request(self, *arguments, **kwargs) -> FFmpegRequest:
+        return FFmpegRequest(ffmpeg_arguments=list(arguments), **kwargs)
+
+    def test_identical_requests_share_a_key(self):
+        first = coalescing_key(self._request('-i', self.input, 'out.mp4'))
+        second = coalescing_key(self._request('-i', self.input, 'out.mp4'))
+        self.assertIsNotNone(first)
+        self.assertEqual(first, second)
+
+    def test_response_options_change_the_key(self):
+        plain = coalescing_key(self._request('-i', self.input, 'out.mp4'))
+        progress = coalescing_key(
+            self._request('-i', self.input, 'out.mp4', report_progress=True))
+        self.assertNotEqual(plain, progress)
+
+    def test_changed_input_changes_the_key(self):
+        before = coalescing_key(self._request('-i', self.input, 'out.mp4'))
+        with open(self.input, 'ab') as f:
+            f.write(b'more')
+        after = coalescing_key(self._request('-i', self.input, 'out.mp4'))
+        self.assertNotEqual(before, after)
+
+    def test_missing_input_has_no_key(self):
+        missing = os.path.join(os.path.dirname(self.input), 'missing.mp4')
+        self.assertIsNone(
+            coalescing_key(self._request('-i', missing, 'out.mp4')))
+
+    def test_idempotency_alias(self):
+        self.assertEqual(idempotency_alias('a'), 'idempotency-key:a')
+        self.assertIsNone(idempotency_alias(''))
+        self.assertIsNone(idempotency_alias(None))
+
+
+class CoalescedRunTest(unittest.TestCase):
+    """Runs on their own threads shared by subscribers."""
+
+    def test_late_subscriber_receives_every_response(self):
+        run = CoalescedRun()
+        self.assertTrue(run.attach())
+        run.publish(_response('a'))
+        self.assertTrue(run.attach())
+        run.publish(_response('b'))
+        run.finish()
+        for _ in range(2):
+            responses = run.subscribe(threading.Event())
+            self.assertEqual([response.log_line for response in responses],
+                             ['a', 'b'])
+        self.assertFalse(run.attach())
+        self.assertFalse(run.cancel_event.is_set())
+
+    def test_error_is_raised_in_subscribers(self):
+        run = CoalescedRun()
+        run.attach()
+        run.publish(_response('a'))
+        run.finish(ValueError('failed'))
+        responses = run.subscribe(threading.Event())
+        self.assertEqual(next(responses).log_line, 'a')
+        with self.assertRaises(ValueError):
+            next(responses)
+
+    def test_run_is_cancelled_once_every_subscriber_has_gone(self):
+        run = CoalescedRun()
+        run.attach()
+        run.attach()
+        run.publish(_response('a'))
+        cancelled = threading.Event()
+        cancelled.set()
+        list(run.subscribe(cancelled))
+        self.assertFalse(run.cancel_event.is_set())
+        responses = run.subscribe(threading.Event())
+        next(responses)
+        responses.close()
+        self.assertTrue(run.cancel_event.is_set())
+        self.assertFalse(run.attach())
+
+    def test_subscriber_waits_for_responses(self):
+        run = CoalescedRun()
+        run.attach()
+        timer = threading.Timer(0.1, run.publish, [_response('a')])
+        timer.start()
+        self.addCleanup(timer.join)
+        responses = run.subscribe(threading.Event())
+        self.assertEqual(next(responses).log_line, 'a')
+        run.finish()
+        self.assertEqual(list(responses), [])
+
+
+class AioCoalescedRunTest(unittest.TestCase):
+    """Runs in asyncio tasks shared by subscribers."""
+
+    def test_subscribers_receive_every_response(self):
+
+        async def test():
+            run = AioCoalescedRun()
+
+            async def produce():
+                run.publish(_response('a'))
+                await asyncio.sleep(0.05)
+                run.publish(_response('b'))
+                run.finish()
+
+            async def subscribe():
+                return [
+                    response.log_line async for response in run.subscribe()
+                ]
+
+            run.attach()
+            run.attach()
+            run.task = asyncio.ensure_future(produce())
+            results = await asyncio.gather(subscribe(), subscribe())
+            await run.task
+            return results
+
+        self.assertEqual(asyncio.run(test()), [['a', 'b'], ['a', 'b']])
+
+    def test_run_is_cancelled_once_every_subscriber_has_gone(self):
+
+        async def test():
+            run = AioCoalescedRun()
+            run.attach()
+            run.task = asyncio.ensure_future(asyncio.sleep(60))
+            run.publish(_response('a'))
+            responses = run.subscribe()
+            await responses.__anext__()
+            await responses.aclose()
+            with self.assertRaises(asyncio.CancelledError):
+                await run.task
+            self.assertFalse(run.attach())
+
+        asyncio.run(test())
+
+
+class RunRegistryTest(unittest.TestCase):
+    """The runs in flight found by the keys of requests."""
+
+    def test_requests_sharing_any_key_join_a_run(self):
+        registry = RunRegistry()
+        run, created = registry.join(['a', None], CoalescedRun)
+        self.assertTrue(created)
+        self.assertEqual(registry.join(['b', 'a'], CoalescedRun),
+                         (run, False))
+        self.assertEqual(registry.join(['b'], CoalescedRun), (run, False))
+
+    def test_ended_runs_are_replaced(self):
+        registry = RunRegistry()
+        run, _ = registry.join(['a'], CoalescedRun)
+        run.finish()
+        other, created = registry.join(['a'], CoalescedRun)
+        self.assertTrue(created)
+        self.assertIsNot(other, run)
+
+    def test_removed_runs_are_forgotten(self):
+        registry = RunRegistry()
+        run, _ = registry.join(['a', 'b'], CoalescedRun)
+        registry.remove(run)
+        other, created = registry.join(['b'], CoalescedRun)
+        self.assertTrue(created)
+        self.assertIsNot(other, run)
+
+    def test_requests_without_keys_run_alone(self):
+        registry = RunRegistry()
+        run, _ = registry.join([None], CoalescedRun)
+        other, created = registry.join([None], CoalescedRun)
+        self.assertTrue(created)
+        self.assertIsNot(other, run)
+
+
+if __name__ == '__main__':
+    unittest.main()
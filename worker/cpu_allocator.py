@@ -0,0 +1,122 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Sizes the thread pools of ffmpeg processes to the container's CPU quota.
+
+ffmpeg starts a thread per core of the host, not per CPU of the container's
+quota. With a quota of one CPU on a 32-core host, each process then runs
+dozens of threads that exhaust the quota early in every CFS period and are
+throttled for the rest of it. CpuAllocator instead gives every running
+process an equal share of the quota as its -threads and -filter_threads, and
+can pin processes to disjoint sets of the CPUs the worker may run on.
+"""
+
+import math
+import os
+import threading
+from typing import FrozenSet
+from typing import List
+from typing import Optional
+
+from worker.ffmpeg_args import FFmpegArguments
+from worker.scheduler import cpu_limit
+
+
+class CpuAllocation:  # pylint: disable=too-few-public-methods
+    """The CPU share of a running process.
+
+    Attributes:
+        threads: The number of threads the process should run.
+        cpus: The CPUs the process is pinned to, or None if it is not pinned.
+    """
+
+    def __init__(self, threads: int, cpus: Optional[FrozenSet[int]]):
+        self.threads = threads
+        self.cpus = cpus
+
+
+class CpuAllocator:
+    """Divides the worker's CPUs among the processes that are running."""
+
+    def __init__(self,
+                 cpus: float,
+                 pin_cpus: bool = False,
+                 cpus_per_job: float = 1.0):
+        """Initializes the allocator.
+
+        Args:
+            cpus: The number of CPUs the worker may use, such as
+                effective_cpus().
+            pin_cpus: Whether to pin every process to CPUs of its own, as long
+                as enough of them are free.
+            cpus_per_job: The number of CPUs every pinned process gets,
+                rounded up.
+        """
+        self._cpus = cpus
+        self._pin_size = max(1, math.ceil(cpus_per_job))
+        self._free = sorted(os.sched_getaffinity(0)) if pin_cpus else []
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def allocate(self) -> CpuAllocation:
+        """Allocates a share of the CPUs to a process that is starting.
+
+        The share is the CPU quota divided by the number of running
+        processes, including the new one. Processes that are already running
+        keep their threads.
+        """
+        with self._lock:
+            self._running += 1
+            threads = max(1, math.floor(self._cpus / self._running))
+            cpus = None
+            if len(self._free) >= self._pin_size:
+                cpus = frozenset(self._free[:self._pin_size])
+                del self._free[:self._pin_size]
+                threads = min(threads, len(cpus))
+        return CpuAllocation(threads, cpus)
+
+    def release(self, allocation: CpuAllocation):
+        """Returns the share of a process that has finished."""
+        with self._lock:
+            self._running -= 1
+            if allocation.cpus is not None:
+                self._free = sorted([*self._free, *allocation.cpus])
+
+
+def effective_cpus() -> float:
+    """Returns the CPUs this process may use under its quota and affinity."""
+    cpus = len(os.sched_getaffinity(0))
+    quota = cpu_limit()
+    return cpus if quota is None else min(cpus, quota)
+
+
+def thread_arguments(ffmpeg_arguments: List[str], threads: int) -> List[str]:
+    """Limits the threads of a command unless it already does.
+
+    -threads is given before every input, for its decoder, and before every
+    output, for its encoders. -filter_threads and -filter_complex_threads
+    limit the filter graphs.
+    """
+    arguments = FFmpegArguments(ffmpeg_arguments)
+    args = list(arguments.args)
+    if not arguments.has_option('threads'):
+        positions = [index - 1 for index in arguments.input_indices]
+        positions += arguments.output_indices
+        for position in sorted(positions, reverse=True):
+            args[position:position] = ['-threads', str(threads)]
+    global_options = []
+    for option in ('filter_threads', 'filter_complex_threads'):
+        if not arguments.has_option(option):
+            global_options += [f'-{option}', str(threads)]
+    return [*global_options, *args]
@@ -0,0 +1,108 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the CPU allocator.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.cpu_allocator_test
+"""
+
+import unittest
+from unittest import mock
+
+from worker import cpu_allocator
+from worker.cpu_allocator import CpuAllocator
+from worker.cpu_allocator import effective_cpus
+from worker.cpu_allocator import thread_arguments
+
+
+class CpuAllocatorTest(unittest.TestCase):
+    """Shares of the CPUs given to running processes."""
+
+    def test_quota_is_shared_by_running_processes(self):
+        allocator = CpuAllocator(4)
+        first = allocator.allocate()
+        second = allocator.allocate()
+        third = allocator.allocate()
+        self.assertEqual([first.threads, second.threads, third.threads],
+                         [4, 2, 1])
+        self.assertIsNone(first.cpus)
+        allocator.release(first)
+        allocator.release(second)
+        self.assertEqual(allocator.allocate().threads, 2)
+
+    def test_processes_get_at_least_one_thread(self):
+        allocator = CpuAllocator(0.5)
+        self.assertEqual(allocator.allocate().threads, 1)
+
+    def test_processes_are_pinned_while_cpus_are_free(self):
+        with mock.patch.object(cpu_allocator.os,
+                               'sched_getaffinity',
+                               return_value={0, 1, 2, 3, 4}):
+            allocator = CpuAllocator(5, pin_cpus=True, cpus_per_job=1.5)
+        first = allocator.allocate()
+        second = allocator.allocate()
+        third = allocator.allocate()
+        self.assertEqual(first.cpus, frozenset([0, 1]))
+        self.assertEqual(second.cpus, frozenset([2, 3]))
+        self.assertIsNone(third.cpus)
+        self.assertEqual([first.threads, second.threads, third.threads],
+                         [2, 2, 1])
+        allocator.release(first)
+        self.assertEqual(allocator.allocate().cpus, frozenset([0, 1]))
+
+
+class EffectiveCpusTest(unittest.TestCase):
+    """The CPUs the worker may use."""
+
+    def test_quota_limits_the_affinity(self):
+        with mock.patch.object(cpu_allocator.os,
+                               'sched_getaffinity',
+                               return_value={0, 1, 2, 3}):
+            with mock.patch.object(cpu_allocator,
+                                   'cpu_limit',
+                                   return_value=1.5):
+                self.assertEqual(effective_cpus(), 1.5)
+            with mock.patch.object(cpu_allocator,
+                                   'cpu_limit',
+                                   return_value=None):
+                self.assertEqual(effective_cpus(), 4)
+
+
+class ThreadArgumentsTest(unittest.TestCase):
+    """Thread options added to ffmpeg commands."""
+
+    def test_threads_are_set_for_every_input_and_output(self):
+        self.assertEqual(
+            thread_arguments(
+                ['-ss', '5', '-i', 'in.mp4', '-c:v', 'libx264', 'out.mp4'],
+                2), [
+                    '-filter_threads', '2', '-filter_complex_threads', '2',
+                    '-ss', '5', '-threads', '2', '-i', 'in.mp4', '-c:v',
+                    'libx264', '-threads', '2', 'out.mp4'
+                ])
+
+    def test_existing_thread_options_are_kept(self):
+        self.assertEqual(
+            thread_arguments([
+                '-filter_threads', '4', '-i', 'in.mp4', '-threads', '1',
+                'out.mp4'
+            ], 2), [
+                '-filter_complex_threads', '2', '-filter_threads', '4', '-i',
+                'in.mp4', '-threads', '1', 'out.mp4'
+            ])
+
+
+if __name__ == '__main__':
+    unittest.main()
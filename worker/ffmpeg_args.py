@@ -0,0 +1,147 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Helpers for inspecting ffmpeg command-line arguments.
+
+ffmpeg's argument grammar depends on which options take a value. Options are
+assumed to take exactly one value unless they are listed in _FLAGS, which
+covers the value-less options that are commonly used in transcoding commands.
+"""
+
+from typing import Dict
+from typing import List
+from typing import Optional
+
+# Options that do not take a value.
+_FLAGS = frozenset([
+    'y', 'n', 'nostdin', 'stdin', 'hide_banner', 'stats', 'nostats', 'an',
+    'vn', 'sn', 'dn', 're', 'shortest', 'copyts', 'start_at_zero',
+    'accurate_seek', 'noaccurate_seek', 'benchmark', 'benchmark_all', 'dump',
+    'hex', 'ignore_unknown', 'copy_unknown', 'xerror', 'report', 'autorotate',
+    'noautorotate', 'debug_ts', 'version', 'formats', 'codecs', 'encoders',
+    'decoders', 'filters', 'pix_fmts'
+])
+# Options that only affect ffmpeg's own logging and interaction, and not what
+# it writes to its outputs.
+_LOGGING_FLAGS = frozenset(
+    ['y', 'nostdin', 'stdin', 'hide_banner', 'stats', 'nostats', 'report'])
+_LOGGING_OPTIONS = frozenset(['loglevel', 'v', 'progress', 'stats_period'])
+
+
+class FFmpegArguments:
+    """ffmpeg arguments split into inputs, outputs and options.
+
+    Attributes:
+        args: The arguments, without the ffmpeg executable.
+        input_indices: Indices in args of the values of -i options.
+        output_indices: Indices in args of output URLs.
+    """
+
+    def __init__(self, args: List[str]):
+        self.args = list(args)
+        self.input_indices = []
+        self.output_indices = []
+        option_values = set()
+        for index, name in self._options():
+            if name not in _FLAGS:
+                option_values.add(index + 1)
+            if name == 'i' and index + 1 < len(self.args):
+                self.input_indices.append(index + 1)
+        for index, arg in enumerate(self.args):
+            if _option_name(arg) is None and index not in option_values:
+                self.output_indices.append(index)
+
+    @property
+    def inputs(self) -> List[str]:
+        """The input URLs in the order they are given."""
+        return [self.args[index] for index in self.input_indices]
+
+    @property
+    def outputs(self) -> List[str]:
+        """The output URLs in the order they are given."""
+        return [self.args[index] for index in self.output_indices]
+
+    def get_option(self, name: str) -> Optional[str]:
+        """Returns the value of the last occurrence of an option, if any.
+
+        Stream specifiers are ignored, so that 'c' matches both -c and -c:v.
+        """
+        value = None
+        for index, option in self._options():
+            if option == name and index + 1 < len(self.args):
+                value = self.args[index + 1]
+        return value
+
+    def input_options(self, input_index: int) -> Dict[str, str]:
+        """Returns the options that apply to an input, by name.
+
+        These are the options between the previous input or output and the
+        -i option. Flags are mapped to an empty string.
+
+        Args:
+            input_index: The index in args of the value of the -i option.
+        """
+        previous = [
+            index for index in self.input_indices + self.output_indices
+            if index < input_index
+        ]
+        start = max(previous, default=-1)
+        return {
+            name: '' if name in _FLAGS else self.args[index + 1]
+            for index, name in self._options()
+            if start < index < input_index - 1
+        }
+
+    def has_option(self, name: str) -> bool:
+        """Returns whether an option occurs, with any stream specifier."""
+        return any(option == name for _, option in self._options())
+
+    def normalized(self) -> List[str]:
+        """Returns the arguments without options that only affect logging."""
+        skipped = set()
+        for index, option in self._options():
+            if option in _LOGGING_FLAGS:
+                skipped.add(index)
+            elif option in _LOGGING_OPTIONS:
+                skipped.update((index, index + 1))
+        return [
+            arg for index, arg in enumerate(self.args) if index not in skipped
+        ]
+
+    def _options(self):
+        """Yields the index and name of every option."""
+        index = 0
+        while index < len(self.args):
+            name = _option_name(self.args[index])
+            if name is None:
+                index += 1
+                continue
+            yield index, name
+            index += 1 if name in _FLAGS else 2
+
+
+def is_file_url(url: str) -> bool:
+    """Returns whether an input or output URL names a local file."""
+    return url != '-' and ':' not in url.split('/', 1)[0]
+
+
+def _option_name(arg: str) -> Optional[str]:
+    """Returns the name of an option without its stream specifier.
+
+    None is returned for arguments that are not options, such as output URLs.
+    A lone - is an output URL that refers to stdout.
+    """
+    if not arg.startswith('-') or arg == '-':
+        return None
+    return arg[1:].split(':', 1)[0]
@@ -0,0 +1,76 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the helpers for ffmpeg arguments.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.ffmpeg_args_test
+"""
+
+import unittest
+
+from worker.ffmpeg_args import FFmpegArguments
+from worker.ffmpeg_args import is_file_url
+
+_ARGS = [
+    '-y', '-ss', '10', '-i', 'in.mp4', '-re', '-i', 'gs://bucket/in.wav',
+    '-c:v', 'libx264', '-an', 'out.mp4', '-c', 'copy', '-'
+]
+
+
+class FFmpegArgumentsTest(unittest.TestCase):
+    """Arguments split into inputs, outputs and options."""
+
+    def test_inputs_and_outputs(self):
+        arguments = FFmpegArguments(_ARGS)
+        self.assertEqual(arguments.inputs, ['in.mp4', 'gs://bucket/in.wav'])
+        self.assertEqual(arguments.outputs, ['out.mp4', '-'])
+        self.assertEqual(arguments.input_indices, [4, 7])
+        self.assertEqual(arguments.output_indices, [11, 14])
+
+    def test_get_option_ignores_stream_specifiers(self):
+        arguments = FFmpegArguments(_ARGS)
+        self.assertEqual(arguments.get_option('c'), 'copy')
+        self.assertEqual(arguments.get_option('ss'), '10')
+        self.assertIsNone(arguments.get_option('t'))
+        self.assertTrue(arguments.has_option('an'))
+        self.assertFalse(arguments.has_option('vn'))
+
+    def test_input_options(self):
+        arguments = FFmpegArguments(_ARGS)
+        self.assertEqual(arguments.input_options(4), {'y': '', 'ss': '10'})
+        self.assertEqual(arguments.input_options(7), {'re': ''})
+
+    def test_normalized_drops_logging_options(self):
+        arguments = FFmpegArguments([
+            '-hide_banner', '-loglevel', 'error', '-i', 'in.mp4',
+            '-progress', 'pipe:1', '-vn', 'out.mp4'
+        ])
+        self.assertEqual(arguments.normalized(),
+                         ['-i', 'in.mp4', '-vn', 'out.mp4'])
+
+
+class IsFileUrlTest(unittest.TestCase):
+    """URLs that name local files."""
+
+    def test_is_file_url(self):
+        self.assertTrue(is_file_url('in.mp4'))
+        self.assertTrue(is_file_url('/mnt/videos/a:b.mp4'))
+        self.assertFalse(is_file_url('gs://bucket/in.mp4'))
+        self.assertFalse(is_file_url('pipe:1'))
+        self.assertFalse(is_file_url('-'))
+
+
+if __name__ == '__main__':
+    unittest.main()
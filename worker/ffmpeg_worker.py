@@ -15,34 +15,377 @@
 """A server that runs FFmpeg on files in Google Cloud Storage.
 """
 
+import asyncio
+import collections
 from concurrent import futures
+import contextlib
+import functools
+import io
 import logging
 import os
+import selectors
 import signal
 import subprocess
 import sys
 import tempfile
 import threading
 import time
+from typing import Dict
 from typing import Iterator
 from typing import List
+from typing import Optional
 
 from google.protobuf.duration_pb2 import Duration
 import grpc
+from grpc import aio
 
 from worker.ffmpeg_worker_pb2 import ExitStatus
 from worker.ffmpeg_worker_pb2 import FFmpegRequest
 from worker.ffmpeg_worker_pb2 import FFmpegResponse
+from worker.ffmpeg_worker_pb2 import LadderRequest
+from worker.ffmpeg_worker_pb2 import LogBatch
+from worker.ffmpeg_worker_pb2 import Progress
+from worker.ffmpeg_worker_pb2 import ResourceSample
 from worker.ffmpeg_worker_pb2 import ResourceUsage
+from worker.ffmpeg_worker_pb2 import TranscodeStreamRequest
 from worker import ffmpeg_worker_pb2_grpc
+from worker.cpu_allocator import CpuAllocator
+from worker.cpu_allocator import effective_cpus
+from worker.cpu_allocator import thread_arguments
+from worker.coalescer import AioCoalescedRun
+from worker.coalescer import CoalescedRun
+from worker.coalescer import RunRegistry
+from worker.coalescer import coalescing_key
+from worker.coalescer import idempotency_alias
+from worker.ffmpeg_args import FFmpegArguments
+from worker.idempotency import DuplicateRequestError
+from worker.idempotency import IdempotencyKeys
+from worker.input_stager import InputStager
+from worker.job_history import JobEstimate
+from worker.job_history import JobHistory
+from worker.job_queue import Job
+from worker.job_queue import PullQueue
+from worker.job_queue import QueueError
+from worker.job_queue import SqliteJobQueue
+from worker.job_state import JobRecorder
+from worker.job_state import JobStateStore
+from worker.job_state import create_store
+from worker import ladder
+from worker.ladder import LadderError
+from worker.input_stager import StagedInputs
+from worker import metrics
+from worker.preemption import PreemptibleJob
+from worker.preemption import Preemptor
+from worker.preemption import REQUEUE
+from worker.resource_sampler import ResourceSampler
+from worker.result_cache import ResultCache
+from worker.scheduler import LoadEstimator
+from worker.scheduler import QueueFullError
+from worker.scheduler import SlotScheduler
+from worker.scheduler import available_slots
+from worker.scheduler import memory_limit
+from worker import segmenter
+from worker.segmenter import SegmentationError
 
 MOUNT_POINT = '/buckets/'
+# The ffmpeg executable, which benchmarks replace with a fake.
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
 _LOGGER = logging.getLogger(__name__)
 _ABORT_EVENT = threading.Event()
 _GRACE_PERIOD = 20
+# Resources a single ffmpeg process is expected to use. Together with the
+# container's cgroup limits, these determine how many jobs run at once.
+_CPUS_PER_JOB = float(os.environ.get('CPUS_PER_JOB', 1))
+_MEMORY_PER_JOB = int(os.environ.get('MEMORY_PER_JOB', 2**30))
+# Unless AUTO_THREADS is 0, ffmpeg processes that do not set -threads or
+# -filter_threads get an equal share of the CPU quota as their threads. If
+# PIN_CPUS is set, every process is also pinned to CPUS_PER_JOB CPUs of its
+# own. Benchmarks replace the allocator.
+CPU_ALLOCATOR: Optional[CpuAllocator] = None
+if os.environ.get('AUTO_THREADS', '1') != '0':
+    CPU_ALLOCATOR = CpuAllocator(effective_cpus(),
+                                 bool(os.environ.get('PIN_CPUS')),
+                                 _CPUS_PER_JOB)
+# Maximum number of requests waiting for a free slot before new requests are
+# rejected with RESOURCE_EXHAUSTED.
+_MAX_QUEUE_DEPTH = int(os.environ.get('MAX_QUEUE_DEPTH', 10))
+# A batch of log lines is sent once it has this many lines or once its first
+# line is this many seconds old.
+_LOG_BATCH_SIZE = 64
+_LOG_BATCH_DELAY = 0.25
+# The most output of a streamed request that is read at once.
+_OUTPUT_CHUNK_SIZE = 2**16
+# If set, the outputs of successful runs are cached in this directory, up to
+# _RESULT_CACHE_BYTES in total, and identical requests are served from it.
+# Input files are identified by size and mtime, and also by a hash of their
+# content if _RESULT_CACHE_HASH_INPUTS is set.
+_RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR')
+_RESULT_CACHE_BYTES = int(os.environ.get('RESULT_CACHE_BYTES', 10 * 2**30))
+_RESULT_CACHE_HASH_INPUTS = bool(os.environ.get('RESULT_CACHE_HASH_INPUTS'))
+# If set, input files under MOUNT_POINT are copied to this local directory
+# before ffmpeg runs, in chunks of _STAGING_CHUNK_BYTES with up to
+# _STAGING_PARALLELISM chunks copied at once. Staged files are shared between
+# requests and evicted once they exceed _STAGING_BYTES.
+_STAGING_DIR = os.environ.get('STAGING_DIR')
+_STAGING_BYTES = int(os.environ.get('STAGING_BYTES', 20 * 2**30))
+_STAGING_CHUNK_BYTES = int(os.environ.get('STAGING_CHUNK_BYTES', 64 * 2**20))
+_STAGING_PARALLELISM = int(os.environ.get('STAGING_PARALLELISM', 8))
+# If set, the segments of segmented requests are sent to the workers at this
+# gRPC target, such as a headless service, instead of running on this worker.
+_SEGMENT_WORKERS = os.environ.get('SEGMENT_WORKERS')
+_SEGMENT_POLL_INTERVAL = 0.5
+# ffmpeg exits with this code once it has handled a termination signal.
+_SIGNAL_EXIT_CODE = 255
+# Requests with more segments are rejected with INVALID_ARGUMENT. Segments
+# that run on this worker are further limited to its free job slots.
+_MAX_SEGMENTS = 64
+# If set, jobs are also leased from the SQLite job queue at this path whenever
+# a job slot is free. An empty queue is checked every _PULL_INTERVAL seconds.
+_PULL_QUEUE_PATH = os.environ.get('PULL_QUEUE_PATH')
+_PULL_INTERVAL = 1
+_LEASE_SECONDS = 60
+# If set, the states of async jobs are recorded in the job state store at this
+# path, which must be shared with the async worker. Jobs pushed by Cloud Tasks
+# are identified by their task name header.
+_JOB_STATE_STORE = os.environ.get('JOB_STATE_STORE')
+_TASK_NAME_HEADER = 'x-cloudtasks-taskname'
+# If set, the resource usage of successful jobs is recorded in a SQLite
+# database at this path, and used to predict the runtime and memory of new
+# jobs. Queued jobs are then admitted by _SCHEDULING_POLICY, one of 'fifo',
+# 'sjf' for shortest predicted runtime first, or 'aging-sjf', which also
+# lowers the predicted runtime of a job by _AGING_RATE for every second it has
+# waited. Jobs predicted to use more than _MAX_JOB_MEMORY bytes, by default
+# the container's memory limit, are rejected with FAILED_PRECONDITION.
+_JOB_HISTORY_PATH = os.environ.get('JOB_HISTORY_PATH')
+_SCHEDULING_POLICY = os.environ.get('SCHEDULING_POLICY', 'fifo')
+_AGING_RATE = float(os.environ.get('AGING_RATE', 1))
+_MAX_JOB_MEMORY = int(os.environ.get('MAX_JOB_MEMORY', 0)) or memory_limit()
+# If set, a request that has to queue preempts the running request of the
+# lowest priority below its own, whose ffmpeg is either stopped until a slot is
+# free, if this is 'suspend', or killed and run again, if it is 'requeue'.
+_PREEMPTION_POLICY = os.environ.get('PREEMPTION_POLICY')
+# Attempts of a request retried or hedged by a client carry the same key in
+# this header. The exit status of a finished attempt is sent to later ones
+# for _IDEMPOTENCY_TTL seconds instead of running ffmpeg again.
+_IDEMPOTENCY_KEY_HEADER = 'idempotency-key'
+_IDEMPOTENCY_TTL = float(os.environ.get('IDEMPOTENCY_TTL', 3600))
+# The load of the worker when a request arrives, as in SlotScheduler.load, is
+# sent in this initial metadata header so that clients can balance requests.
+_LOAD_HEADER = 'ffmpeg-worker-load'
+# Either 'threads' for a thread per request or 'asyncio' for grpc.aio.
+_SERVER_MODE = os.environ.get('SERVER_MODE', 'threads')
+# Metrics are served in the Prometheus text format at /metrics on this port,
+# unless it is empty.
+_METRICS_PORT = os.environ.get('METRICS_PORT', '9090')
+# The duration of a job assumed by the backlog estimate until jobs finish.
+_EXPECTED_JOB_SECONDS = float(os.environ.get('EXPECTED_JOB_SECONDS', 60))
 
+_METRICS = metrics.Registry()
+_REQUESTS_IN_FLIGHT = _METRICS.gauge(
+    'ffmpeg_worker_requests_in_flight',
+    'Transcode requests being served, including queued ones.')
+_REQUEST_DURATION = _METRICS.histogram(
+    'ffmpeg_worker_request_duration_seconds',
+    'Time from receiving a transcode request until its last response.',
+    [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600])
+_TIME_TO_FIRST_LOG = _METRICS.histogram(
+    'ffmpeg_worker_time_to_first_log_seconds',
+    'Time from receiving a transcode request until its first log line.',
+    [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60])
+_FFMPEG_REAL_TIME = _METRICS.histogram(
+    'ffmpeg_worker_ffmpeg_real_time_seconds',
+    'Wall-clock time of ffmpeg processes.',
+    [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600])
+_FFMPEG_USER_TIME = _METRICS.histogram(
+    'ffmpeg_worker_ffmpeg_user_cpu_seconds',
+    'User CPU time of ffmpeg processes (ru_utime).',
+    [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600])
+_FFMPEG_SYSTEM_TIME = _METRICS.histogram(
+    'ffmpeg_worker_ffmpeg_system_cpu_seconds',
+    'System CPU time of ffmpeg processes (ru_stime).',
+    [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300])
+_FFMPEG_MAX_RSS = _METRICS.histogram(
+    'ffmpeg_worker_ffmpeg_max_rss_bytes',
+    'Peak resident set size of ffmpeg processes (ru_maxrss).',
+    [2**power for power in range(24, 35)])
+_LOG_LINES = _METRICS.counter('ffmpeg_worker_log_lines',
+                              'Lines of ffmpeg output streamed to clients.')
+_LOG_BYTES = _METRICS.counter(
+    'ffmpeg_worker_log_bytes',
+    'Characters of ffmpeg output streamed to clients, which are bytes for '
+    'ASCII output.')
+_CANCELLATIONS = _METRICS.counter(
+    'ffmpeg_worker_cancellations',
+    'Transcode requests cancelled by their clients before finishing.')
+_SIGTERM_ABORTS = _METRICS.counter(
+    'ffmpeg_worker_sigterm_aborts',
+    'Transcode requests stopped because the worker received SIGTERM.')
+_DUPLICATE_REQUESTS = _METRICS.counter(
+    'ffmpeg_worker_duplicate_requests',
+    'Transcode requests whose idempotency key was running or had finished.')
+_COALESCED_REQUESTS = _METRICS.counter(
+    'ffmpeg_worker_coalesced_requests',
+    'Transcode requests served by the run of an identical request in flight.')
+_PREEMPTIONS = _METRICS.counter(
+    'ffmpeg_worker_preemptions',
+    'Times a running transcode gave up its job slot to one of higher priority.')
+_CACHE_HITS = _METRICS.counter(
+    'ffmpeg_worker_cache_hits',
+    'Cacheable transcode requests served from the result cache.')
+_CACHE_MISSES = _METRICS.counter(
+    'ffmpeg_worker_cache_misses',
+    'Cacheable transcode requests not found in the result cache.')
+# Set once the server has started.
+_LOAD_ESTIMATOR: Optional[LoadEstimator] = None
 
-class FFmpegServicer(ffmpeg_worker_pb2_grpc.FFmpegServicer):  # pylint: disable=too-few-public-methods
+
+class _Servicer(ffmpeg_worker_pb2_grpc.FFmpegServicer):  # pylint: disable=too-few-public-methods
+    """Admission, recording and results of requests, shared by the servicers.
+
+    The methods here do not block on the request or on ffmpeg, and signal
+    that a request must be aborted with _AbortError. Subclasses do the I/O
+    and abort the request where the error reaches its RPC method.
+    """
+
+    def __init__(self,
+                 scheduler: SlotScheduler,
+                 cache: ResultCache = None,
+                 stager: InputStager = None,
+                 segmented: 'SegmentedTranscoder' = None,
+                 store: JobStateStore = None,
+                 history: JobHistory = None,
+                 preemptor: Preemptor = None):
+        self._scheduler = scheduler
+        self._cache = cache
+        self._stager = stager
+        self._segmented = segmented or SegmentedTranscoder(scheduler, cache)
+        self._store = store
+        self._history = history
+        self._preemptor = preemptor
+        self._keys = IdempotencyKeys(_IDEMPOTENCY_TTL)
+        self._runs = RunRegistry()
+
+    def _begin_attempt(self, request, context):
+        """Starts an attempt of a request under its idempotency key.
+
+        An attempt that arrives while another one runs subscribes to its run
+        in _coalesce.
+
+        Returns:
+            The idempotency key, or None if the request has none, and the
+            exit status of a finished attempt with the key, if there is one.
+
+        Raises:
+            _AbortError: An attempt of the segmented request is running.
+        """
+        key = _metadata_value(context, _IDEMPOTENCY_KEY_HEADER)
+        if not key:
+            return None, None
+        try:
+            exit_status, running = self._keys.begin(
+                key, exclusive=request.segments > 1)
+        except DuplicateRequestError as error:
+            _DUPLICATE_REQUESTS.inc()
+            raise _AbortError(grpc.StatusCode.ABORTED, str(error))
+        if running or exit_status is not None:
+            _DUPLICATE_REQUESTS.inc()
+        if exit_status is not None:
+            _LOGGER.info('Serving transcode of a finished attempt.')
+        return key, exit_status
+
+    def _task_name(self, context) -> Optional[str]:
+        """Returns the name of the async job to record, if there is one."""
+        if self._store is None:
+            return None
+        return _metadata_value(context, _TASK_NAME_HEADER)
+
+    def _coalescing_keys(self, request_key, context):
+        """Returns the keys under which identical requests share a run.
+
+        Attempts with the same idempotency key are identical.
+        """
+        return (request_key,
+                idempotency_alias(
+                    _metadata_value(context, _IDEMPOTENCY_KEY_HEADER)))
+
+    def _join(self, keys, run_class):
+        """Joins the run of an identical request, creating it if there is none.
+
+        Returns:
+            The run, and whether it was created and has to be produced.
+        """
+        run, created = self._runs.join(keys, run_class)
+        if not created:
+            _LOGGER.info('Joining the run of an identical request.')
+            _COALESCED_REQUESTS.inc()
+        return run, created
+
+    def _finish_produce(self, run, error):
+        self._runs.remove(run)
+        run.finish(error)
+
+    def _admit(self, estimate):
+        """Checks whether a request can run at all before it takes a slot.
+
+        Raises:
+            _AbortError: The request needs more memory than a job may use.
+        """
+        if _exceeds_memory(estimate):
+            raise _AbortError(grpc.StatusCode.FAILED_PRECONDITION,
+                              _memory_error(estimate))
+
+    def _check_acquired(self, acquired: bool):
+        """Checks a wait for a job slot that was not cancelled.
+
+        Raises:
+            _AbortError: The worker is shutting down. The slot is released.
+        """
+        if _ABORT_EVENT.is_set():
+            _LOGGER.info('Stopping transcode due to SIGTERM.')
+            if acquired:
+                self._scheduler.release()
+            raise _AbortError(grpc.StatusCode.UNAVAILABLE,
+                              'Request was killed with SIGTERM.')
+
+    def _begin_preempt(self, job) -> Optional[bool]:
+        """Decides how a job whose preempt_event is set gives up its slot.
+
+        Returns:
+            None if the job keeps its slot, since the job that preempted it
+            got a slot freed meanwhile. Otherwise whether ffmpeg has to be
+            killed and run again, rather than suspended.
+        """
+        if not self._scheduler.outranked(job.priority):
+            job.preempt_event.clear()
+            return None
+        _LOGGER.info('Preempting ffmpeg process by the %s policy.',
+                     self._preemptor.policy)
+        _PREEMPTIONS.inc()
+        job.preemptions += 1
+        return self._preemptor.policy == REQUEUE
+
+    def _finish_preempt(self, job, process, requeue: bool):
+        """Resumes a preempted job once it has a slot again."""
+        job.preempt_event.clear()
+        if not requeue:
+            _LOGGER.info('Resuming preempted ffmpeg process.')
+            process.resume()
+
+    def _finish_run(self, request, process, job, cache_key,
+                    estimate) -> ExitStatus:
+        """Returns the exit status of ffmpeg, keeping the result of a success.
+
+        This blocks on the file system when the result is kept.
+        """
+        exit_status = _exit_status(process, job)
+        if process.returncode == 0 and not _ABORT_EVENT.is_set():
+            _store(self._cache, cache_key, request.ffmpeg_arguments,
+                   exit_status)
+            _record_history(self._history, estimate, exit_status)
+        return exit_status
+
+
+class FFmpegServicer(_Servicer):  # pylint: disable=too-few-public-methods
     """Implements FFmpeg service"""
 
     def transcode(self, request: FFmpegRequest, context) -> FFmpegResponse:
@@ -55,6 +398,59 @@ class FFmpegServicer(ffmpeg_worker_pb2_grpc.FFmpegServicer):  # pylint: disable=
         Yields:
             A Log object with a line of ffmpeg's output.
         """
+        yield from self._respond(self._deduplicate(request, context), context)
+
+    def _respond(self, responses, context):
+        """Sends responses, recording the request's metrics."""
+        context.send_initial_metadata(_load_metadata(self._scheduler))
+        request_metrics = _RequestMetrics()
+        try:
+            for response in responses:
+                request_metrics.observe(response)
+                yield response
+        except _AbortError as error:
+            context.abort(error.code, error.details)
+        finally:
+            request_metrics.finish(cancelled=not context.is_active())
+
+    def _deduplicate(self, request, context):
+        """Runs a request unless an attempt with its idempotency key has."""
+        key, exit_status = self._begin_attempt(request, context)
+        if exit_status is not None:
+            yield FFmpegResponse(exit_status=exit_status)
+            return
+        try:
+            for response in self._record(request, context):
+                if response.HasField('exit_status'):
+                    exit_status = response.exit_status
+                yield response
+        finally:
+            if key:
+                self._keys.finish(key, exit_status)
+
+    def _record(self, request, context):
+        """Runs a request, recording it if it is an async job.
+
+        A request whose ffmpeg is killed by SIGTERM is aborted with
+        UNAVAILABLE, like one that had not started, so that it is retried.
+        The abort comes before the exit status is recorded, so the job is
+        recorded as queued again rather than failed.
+        """
+        task_name = self._task_name(context)
+        responses = self._abort_if_killed(request, context)
+        if task_name:
+            # The job is recorded when the response generator finishes, which
+            # also happens when the request is cancelled.
+            yield from JobRecorder(self._store, task_name).record(responses)
+            return
+        yield from responses
+
+    def _abort_if_killed(self, request, context):
+        for response in self._transcode(request, context):
+            _check_killed(response)
+            yield response
+
+    def _transcode(self, request, context):
         _LOGGER.info('Starting transcode.')
         cancel_event = threading.Event()
 
@@ -63,89 +459,1692 @@ class FFmpegServicer(ffmpeg_worker_pb2_grpc.FFmpegServicer):  # pylint: disable=
             cancel_event.set()
 
         context.add_callback(handle_cancel)
-        process = Process(['ffmpeg', *request.ffmpeg_arguments])
+        cache_key, exit_status = _lookup(self._cache, request.ffmpeg_arguments)
+        if exit_status is not None:
+            _LOGGER.info('Serving transcode from cache.')
+            yield FFmpegResponse(exit_status=exit_status)
+            return
+        if request.segments > 1:
+            with _segment_errors():
+                yield from self._segmented.transcode(request, cancel_event,
+                                                     cache_key)
+            return
+        yield from self._coalesce(request, context, cancel_event, cache_key)
+
+    def _coalesce(self, request, context, cancel_event, cache_key):
+        """Runs a request, or subscribes to the run of an identical one."""
+        run, created = self._join(
+            self._coalescing_keys(coalescing_key(request), context),
+            CoalescedRun)
+        if created:
+            threading.Thread(target=self._produce,
+                             args=(run, request, cache_key),
+                             daemon=True).start()
+        yield from run.subscribe(cancel_event)
+
+    def _produce(self, run, request, cache_key):
+        """Runs a coalesced request, publishing its responses to the run."""
+        error = None
+        try:
+            estimate = _estimate(self._history, request.ffmpeg_arguments)
+            if self._reserve(run.cancel_event, estimate, request.priority):
+                for response in self._run_acquired(request, run.cancel_event,
+                                                   cache_key, estimate):
+                    run.publish(response)
+        except Exception as exception:  # pylint: disable=broad-except
+            # The error is raised in every request subscribed to the run.
+            error = exception
+        finally:
+            self._finish_produce(run, error)
+
+    def transcodeStream(self, request_iterator, context):  # pylint: disable=invalid-name
+        """Runs ffmpeg on input streamed by the client.
+
+        Args:
+            request_iterator: The TranscodeStreamRequest messages. The first
+                holds the FFmpeg request and the rest hold input chunks.
+            context: The gRPC context.
+
+        Yields:
+            FFmpegResponse objects as described in transcode, and the output
+            of ffmpeg in output_chunk responses.
+        """
+        yield from self._respond(
+            self._transcode_stream(request_iterator, context), context)
+
+    def transcodeLadder(self, request: LadderRequest, context):  # pylint: disable=invalid-name
+        """Encodes the renditions of an ABR ladder with one ffmpeg process.
+
+        Args:
+            request: The ladder request.
+            context: The gRPC context.
+
+        Yields:
+            FFmpegResponse objects as described in transcode, with a
+            ladder_result before the exit status of a successful run.
+        """
+        yield from self._respond(self._transcode_ladder(request, context),
+                                 context)
+
+    def _transcode_ladder(self, request, context):
+        for response in self._deduplicate(_compile_ladder(request), context):
+            if _succeeded(response):
+                yield _finish_ladder(request)
+            yield response
+
+    def _transcode_stream(self, request_iterator, context):
+        request = _stream_request(next(request_iterator, None))
+        _LOGGER.info('Starting streamed transcode.')
+        cancel_event = threading.Event()
+        context.add_callback(cancel_event.set)
+        if not self._reserve(cancel_event, None, request.priority):
+            return
+        input_chunks = (message.input_chunk for message in request_iterator)
+        try:
+            yield from self._run(request, request.ffmpeg_arguments,
+                                 cancel_event, None, None, input_chunks)
+        finally:
+            self._scheduler.release()
+
+    def _reserve(self, cancel_event, estimate, priority) -> bool:
+        """Waits for a job slot, returning False if cancel_event was set.
+
+        Raises:
+            _AbortError: The request cannot be run.
+        """
+        self._admit(estimate)
+        with _queue_full_errors():
+            acquired = self._scheduler.acquire(cancel_event,
+                                               _ABORT_EVENT,
+                                               cost=estimate and estimate.seconds,
+                                               priority=priority)
         if cancel_event.is_set():
             _LOGGER.info('Stopping transcode due to cancellation.')
+            if acquired:
+                self._scheduler.release()
+            return False
+        self._check_acquired(acquired)
+        return True
+
+    def run_job(self, request: FFmpegRequest,
+                cancel_event: threading.Event) -> Iterator[FFmpegResponse]:
+        """Runs a request for which the caller has acquired a job slot.
+
+        The slot is released once the request has finished. Segmented
+        requests release it immediately, since their segments acquire their
+        own slots.
+
+        Raises:
+            The exceptions raised by SegmentedTranscoder.transcode.
+        """
+        cache_key, exit_status = _lookup(self._cache, request.ffmpeg_arguments)
+        if exit_status is not None:
+            self._scheduler.release()
+            yield FFmpegResponse(exit_status=exit_status)
             return
-        if _ABORT_EVENT.is_set():
-            _LOGGER.info('Stopping transcode due to SIGTERM.')
-            context.abort(grpc.StatusCode.UNAVAILABLE, 'Request was killed with SIGTERM.')
+        if request.segments > 1:
+            self._scheduler.release()
+            yield from self._segmented.transcode(request, cancel_event,
+                                                 cache_key)
             return
-        for stdout_data in process:
-            if cancel_event.is_set():
+        yield from self._run_acquired(
+            request, cancel_event, cache_key,
+            _estimate(self._history, request.ffmpeg_arguments))
+
+    def _run_acquired(self, request, cancel_event, cache_key, estimate):
+        """Runs ffmpeg and releases the job slot once it has finished."""
+        try:
+            staged = _stage(self._stager, request.ffmpeg_arguments)
+            try:
+                yield from self._run(request, staged.arguments, cancel_event,
+                                     cache_key, estimate)
+            finally:
+                staged.release()
+        finally:
+            self._scheduler.release()
+
+    def _run(self,
+             request,
+             ffmpeg_arguments,
+             cancel_event,
+             cache_key,
+             estimate,
+             input_chunks=None):
+        """Runs ffmpeg while holding a job slot.
+
+        If input_chunks is set, they are piped to ffmpeg and its output is
+        sent back.
+        """
+        process = _create_process(Process, request, ffmpeg_arguments,
+                                  input_chunks)
+        batcher = LogBatcher(_LOG_BATCH_SIZE, _LOG_BATCH_DELAY)
+        job = _start_preemptible(self._preemptor, request, input_chunks)
+        try:
+            while True:
+                requeued = False
+                for stdout_lines in process:
+                    if cancel_event.is_set():
+                        _LOGGER.info(
+                            'Killing ffmpeg process due to cancellation.')
+                        process.terminate()
+                        return
+                    if _ABORT_EVENT.is_set():
+                        _LOGGER.info('Killing ffmpeg process due to SIGTERM.')
+                        process.terminate()
+                        break
+                    if job is not None and job.preempt_event.is_set():
+                        requeued = self._preempt(job, process, cancel_event,
+                                                 estimate)
+                        if requeued:
+                            break
+                    yield from _run_responses(request, process, batcher,
+                                              stdout_lines)
+                if not requeued or _ABORT_EVENT.is_set():
+                    break
+                if cancel_event.is_set():
+                    _LOGGER.info('Stopping transcode due to cancellation.')
+                    return
+                _LOGGER.info('Running preempted ffmpeg process again.')
+                process = _create_process(Process, request,
+                                          _rerun_arguments(ffmpeg_arguments),
+                                          input_chunks)
+        finally:
+            if job is not None:
+                self._preemptor.finish(job)
+            # The response generator is closed without being resumed if the
+            # request is cancelled while a response is being sent.
+            if process.returncode is None:
                 _LOGGER.info('Killing ffmpeg process due to cancellation.')
                 process.terminate()
-                return
-            if _ABORT_EVENT.is_set():
-                _LOGGER.info('Killing ffmpeg process due to SIGTERM.')
+        yield from _final_responses(request, process, batcher)
+        exit_status = self._finish_run(request, process, job, cache_key,
+                                       estimate)
+        yield FFmpegResponse(exit_status=exit_status)
+        _LOGGER.info('Finished transcode.')
+
+    def _preempt(self, job, process, cancel_event, estimate) -> bool:
+        """Gives up the job slot of a preempted job until it gets one back.
+
+        Returns:
+            True if ffmpeg was killed and has to be run again.
+        """
+        requeue = self._begin_preempt(job)
+        if requeue is None:
+            return False
+        if requeue:
+            process.terminate()
+        else:
+            process.suspend()
+        self._scheduler.requeue(cancel_event,
+                                _ABORT_EVENT,
+                                cost=estimate and estimate.seconds,
+                                priority=job.priority)
+        self._finish_preempt(job, process, requeue)
+        return requeue
+
+
+class AioFFmpegServicer(_Servicer):  # pylint: disable=too-few-public-methods
+    """Implements FFmpeg service with grpc.aio.
+
+    Requests do not hold a thread, so many idle or slow streams can be served
+    at once. Cancellation of a request is delivered as asyncio.CancelledError
+    or by closing the response generator, either of which kills ffmpeg.
+    Blocking file operations of the result cache and segmented requests run
+    in the default executor.
+    """
+
+    async def transcode(self, request: FFmpegRequest, context):
+        """Runs ffmpeg according to the request's specification.
+
+        Args:
+            request: The FFmpeg request.
+            context: The gRPC context.
+
+        Yields:
+            FFmpegResponse objects as described in FFmpegServicer.transcode.
+        """
+        async for response in self._respond(
+                self._deduplicate(request, context), context):
+            yield response
+
+    async def _respond(self, responses, context):
+        """As FFmpegServicer._respond."""
+        await context.send_initial_metadata(_load_metadata(self._scheduler))
+        request_metrics = _RequestMetrics()
+        cancelled = False
+        try:
+            async for response in responses:
+                request_metrics.observe(response)
+                yield response
+        except _AbortError as error:
+            await context.abort(error.code, error.details)
+        except (asyncio.CancelledError, GeneratorExit):
+            cancelled = True
+            raise
+        finally:
+            request_metrics.finish(cancelled)
+
+    async def _deduplicate(self, request, context):
+        """As FFmpegServicer._deduplicate."""
+        key, exit_status = self._begin_attempt(request, context)
+        if exit_status is not None:
+            yield FFmpegResponse(exit_status=exit_status)
+            return
+        try:
+            async for response in self._record(request, context):
+                if response.HasField('exit_status'):
+                    exit_status = response.exit_status
+                yield response
+        finally:
+            if key:
+                self._keys.finish(key, exit_status)
+
+    async def _record(self, request, context):
+        """As FFmpegServicer._record."""
+        task_name = self._task_name(context)
+        if not task_name:
+            async for response in self._abort_if_killed(request, context):
+                yield response
+            return
+        loop = asyncio.get_running_loop()
+        recorder = JobRecorder(self._store, task_name)
+        await loop.run_in_executor(None, recorder.start)
+        try:
+            async for response in self._abort_if_killed(request, context):
+                recorder.observe(response)
+                yield response
+        finally:
+            # The finish is recorded even if the request is cancelled.
+            await asyncio.shield(loop.run_in_executor(None, recorder.finish))
+
+    async def _abort_if_killed(self, request, context):
+        async for response in self._transcode(request, context):
+            _check_killed(response)
+            yield response
+
+    async def _transcode(self, request, context):
+        _LOGGER.info('Starting transcode.')
+        loop = asyncio.get_running_loop()
+        cache_key, exit_status = await loop.run_in_executor(
+            None, _lookup, self._cache, request.ffmpeg_arguments)
+        if exit_status is not None:
+            _LOGGER.info('Serving transcode from cache.')
+            yield FFmpegResponse(exit_status=exit_status)
+            return
+        if request.segments > 1:
+            async for response in self._transcode_segments(request, cache_key):
+                yield response
+            return
+        async for response in self._coalesce(request, context, cache_key):
+            yield response
+
+    async def _coalesce(self, request, context, cache_key):
+        """As FFmpegServicer._coalesce."""
+        key = await asyncio.get_running_loop().run_in_executor(
+            None, coalescing_key, request)
+        run, created = self._join(self._coalescing_keys(key, context),
+                                  AioCoalescedRun)
+        if created:
+            run.task = asyncio.ensure_future(
+                self._produce(run, request, cache_key))
+        async for response in run.subscribe():
+            yield response
+
+    async def _produce(self, run, request, cache_key):
+        """Runs a coalesced request, publishing its responses to the run.
+
+        The task is cancelled once every request subscribed to the run has
+        been cancelled.
+        """
+        error = None
+        try:
+            loop = asyncio.get_running_loop()
+            estimate = None
+            if self._history is not None:
+                estimate = await loop.run_in_executor(None, _estimate,
+                                                      self._history,
+                                                      request.ffmpeg_arguments)
+            await self._reserve(estimate, request.priority)
+            try:
+                staging = loop.run_in_executor(None, _stage, self._stager,
+                                               request.ffmpeg_arguments)
+                try:
+                    staged = await asyncio.shield(staging)
+                except asyncio.CancelledError:
+                    staging.add_done_callback(_release_staged)
+                    raise
+                try:
+                    async for response in self._run(request, staged.arguments,
+                                                    cache_key, estimate):
+                        run.publish(response)
+                finally:
+                    staged.release()
+            finally:
+                self._scheduler.release()
+        except Exception as exception:  # pylint: disable=broad-except
+            # The error is raised in every request subscribed to the run.
+            error = exception
+        finally:
+            self._finish_produce(run, error)
+
+    async def transcodeStream(self, request_iterator, context):  # pylint: disable=invalid-name
+        """Runs ffmpeg on input streamed by the client.
+
+        Args:
+            request_iterator: The TranscodeStreamRequest messages, as
+                described in FFmpegServicer.transcodeStream.
+            context: The gRPC context.
+
+        Yields:
+            FFmpegResponse objects as described in
+            FFmpegServicer.transcodeStream.
+        """
+        async for response in self._respond(
+                self._transcode_stream(request_iterator), context):
+            yield response
+
+    async def transcodeLadder(self, request: LadderRequest, context):  # pylint: disable=invalid-name
+        """Encodes the renditions of an ABR ladder with one ffmpeg process.
+
+        Args:
+            request: The ladder request.
+            context: The gRPC context.
+
+        Yields:
+            FFmpegResponse objects as described in
+            FFmpegServicer.transcodeLadder.
+        """
+        async for response in self._respond(
+                self._transcode_ladder(request, context), context):
+            yield response
+
+    async def _transcode_ladder(self, request, context):
+        loop = asyncio.get_running_loop()
+        async for response in self._deduplicate(_compile_ladder(request),
+                                                context):
+            if _succeeded(response):
+                yield await loop.run_in_executor(None, _finish_ladder, request)
+            yield response
+
+    async def _transcode_stream(self, request_iterator):
+        messages = request_iterator.__aiter__()
+        try:
+            first = await messages.__anext__()
+        except StopAsyncIteration:
+            first = None
+        request = _stream_request(first)
+        _LOGGER.info('Starting streamed transcode.')
+        await self._reserve(None, request.priority)
+
+        async def input_chunks():
+            async for message in messages:
+                yield message.input_chunk
+
+        try:
+            async for response in self._run(request, request.ffmpeg_arguments,
+                                            None, None, input_chunks()):
+                yield response
+        finally:
+            self._scheduler.release()
+
+    async def _reserve(self, estimate, priority):
+        """Waits for a job slot.
+
+        Raises:
+            _AbortError: The request cannot be run.
+        """
+        self._admit(estimate)
+        try:
+            with _queue_full_errors():
+                acquired = await self._scheduler.acquire_async(
+                    _ABORT_EVENT,
+                    cost=estimate and estimate.seconds,
+                    priority=priority)
+        except asyncio.CancelledError:
+            _LOGGER.info('Stopping transcode due to cancellation.')
+            raise
+        self._check_acquired(acquired)
+
+    async def _transcode_segments(self, request, cache_key):
+        """Runs a segmented request on a thread of the default executor."""
+        loop = asyncio.get_running_loop()
+        cancel_event = threading.Event()
+        responses = self._segmented.transcode(request, cancel_event, cache_key)
+        pending = None
+        try:
+            with _segment_errors():
+                while True:
+                    pending = loop.run_in_executor(None, next, responses, None)
+                    response = await asyncio.shield(pending)
+                    if response is None:
+                        break
+                    yield response
+        finally:
+            # Closing the generator stops the segments and removes their
+            # outputs. It waits for a pending call to next to return first.
+            cancel_event.set()
+
+            def close(_=None):
+                loop.run_in_executor(None, responses.close)
+
+            if pending is None or pending.done():
+                close()
+            else:
+                pending.add_done_callback(close)
+
+    async def _run(self,
+                   request,
+                   ffmpeg_arguments,
+                   cache_key,
+                   estimate,
+                   input_chunks=None):
+        """Runs ffmpeg while holding a job slot.
+
+        If input_chunks is set, they are piped to ffmpeg and its output is
+        sent back.
+        """
+        process = _create_process(AioProcess, request, ffmpeg_arguments,
+                                  input_chunks)
+        batcher = LogBatcher(_LOG_BATCH_SIZE, _LOG_BATCH_DELAY)
+        job = _start_preemptible(self._preemptor, request, input_chunks)
+        try:
+            while True:
+                requeued = False
+                async for stdout_lines in process:
+                    if _ABORT_EVENT.is_set():
+                        _LOGGER.info('Killing ffmpeg process due to SIGTERM.')
+                        await process.terminate()
+                        break
+                    if job is not None and job.preempt_event.is_set():
+                        requeued = await self._preempt(job, process, estimate)
+                        if requeued:
+                            break
+                    for response in _run_responses(request, process, batcher,
+                                                   stdout_lines):
+                        yield response
+                if not requeued or _ABORT_EVENT.is_set():
+                    break
+                _LOGGER.info('Running preempted ffmpeg process again.')
+                process = _create_process(AioProcess, request,
+                                          _rerun_arguments(ffmpeg_arguments),
+                                          input_chunks)
+        finally:
+            if job is not None:
+                self._preemptor.finish(job)
+            if process.returncode is None:
+                _LOGGER.info('Killing ffmpeg process due to cancellation.')
+                await process.terminate()
+        for response in _final_responses(request, process, batcher):
+            yield response
+        exit_status = await asyncio.get_running_loop().run_in_executor(
+            None, self._finish_run, request, process, job, cache_key,
+            estimate)
+        yield FFmpegResponse(exit_status=exit_status)
+        _LOGGER.info('Finished transcode.')
+
+    async def _preempt(self, job, process, estimate) -> bool:
+        """As FFmpegServicer._preempt."""
+        requeue = self._begin_preempt(job)
+        if requeue is None:
+            return False
+        if requeue:
+            await process.terminate()
+        else:
+            process.suspend()
+        await self._scheduler.requeue_async(_ABORT_EVENT,
+                                            cost=estimate and estimate.seconds,
+                                            priority=job.priority)
+        self._finish_preempt(job, process, requeue)
+        return requeue
+
+
+class SegmentedTranscoder:
+    """Runs requests that set segments.
+
+    Probing the input and joining the segments do not take a job slot. Each
+    segment either takes a slot of this worker, or is sent as a transcode
+    request to the workers behind channel, which queue it themselves.
+
+    Segments that run on this worker are limited to its free slots, since
+    more would only run one after another and add the cost of splitting. A
+    request is not split at all if at most one slot is free.
+    """
+
+    def __init__(self,
+                 scheduler: SlotScheduler,
+                 cache: ResultCache = None,
+                 channel: grpc.Channel = None):
+        self._scheduler = scheduler
+        self._cache = cache
+        self._stub = None
+        if channel is not None:
+            self._stub = ffmpeg_worker_pb2_grpc.FFmpegStub(channel)
+
+    def transcode(self, request: FFmpegRequest, cancel_event: threading.Event,
+                  cache_key) -> Iterator[FFmpegResponse]:
+        """Transcodes the request's input in segments.
+
+        Yields:
+            FFmpegResponse objects as described in FFmpegServicer.transcode.
+
+        Raises:
+            SegmentationError: The command cannot be segmented.
+            QueueFullError: A segment was rejected by this worker's queue.
+            grpc.RpcError: A segment was rejected by another worker.
+        """
+        start_time = time.time()
+        if request.segments > _MAX_SEGMENTS:
+            raise SegmentationError(
+                f'At most {_MAX_SEGMENTS} segments can be requested.')
+        segments = request.segments
+        if self._stub is None:
+            segments = min(segments, self._scheduler.free_slots())
+        if segments > 1:
+            segment_plan = segmenter.plan(request.ffmpeg_arguments, segments)
+        else:
+            segment_plan = segmenter.SegmentPlan(
+                [list(request.ffmpeg_arguments)])
+        try:
+            yield from self._transcode(request, segment_plan, cancel_event,
+                                       cache_key, start_time)
+        finally:
+            segment_plan.cleanup()
+
+    def _transcode(self, request, segment_plan, cancel_event, cache_key,
+                   start_time):
+        count = len(segment_plan.segments)
+        _LOGGER.info('Transcoding in %d segments.', count)
+        report_progress = request.report_progress or request.progress_only
+        run_segment = functools.partial(
+            self._run_local_segment
+            if self._stub is None else self._run_remote_segment,
+            priority=request.priority)
+        reports = [Progress()] * count
+        statuses = [None] * count
+        batcher = LogBatcher(_LOG_BATCH_SIZE, _LOG_BATCH_DELAY)
+        segment_responses = segmenter.run_segments(segment_plan.segments,
+                                                   run_segment, cancel_event,
+                                                   _ABORT_EVENT)
+        # Closing the responses stops the segments that are still running.
+        with contextlib.closing(segment_responses):
+            for index, response in segment_responses:
+                if cancel_event.is_set():
+                    break
+                field = response.WhichOneof('status')
+                if field == 'progress':
+                    reports[index] = response.progress
+                    if report_progress:
+                        yield FFmpegResponse(
+                            progress=segmenter.sum_progress(reports))
+                elif field == 'exit_status':
+                    statuses[index] = response.exit_status
+                    if response.exit_status.exit_code:
+                        break
+                else:
+                    lines = (response.log_batch.log_lines
+                             if field == 'log_batch' else [response.log_line])
+                    yield from _log_responses(
+                        request, batcher,
+                        [f'[segment {index}] {line}' for line in lines])
+        if segment_plan.concat_arguments is not None and all(
+                status is not None and not status.exit_code
+                for status in statuses):
+            statuses.append((yield from self._concat(request, segment_plan,
+                                                     batcher, cancel_event)))
+        if cancel_event.is_set():
+            _LOGGER.info('Stopping segmented transcode due to cancellation.')
+            return
+        yield from _log_responses(request, batcher, None)
+        exit_status = segmenter.sum_exit_statuses(
+            status for status in statuses if status is not None)
+        if not exit_status.exit_code and None in statuses:
+            # Segments stopped by SIGTERM report the wait status of a process
+            # killed by it, like an unsegmented request.
+            exit_status.exit_code = signal.SIGTERM
+        exit_status.real_time.CopyFrom(
+            _time_to_duration(time.time() - start_time))
+        if not exit_status.exit_code and not _ABORT_EVENT.is_set():
+            _store(self._cache, cache_key, request.ffmpeg_arguments,
+                   exit_status)
+            if report_progress:
+                progress = segmenter.sum_progress(reports)
+                progress.end = True
+                yield FFmpegResponse(progress=progress)
+        yield FFmpegResponse(exit_status=exit_status)
+        _LOGGER.info('Finished segmented transcode.')
+
+    def _concat(self, request, segment_plan, batcher, cancel_event):
+        """Joins the outputs of the segments and returns the exit status."""
+        process = Process([FFMPEG_BINARY, *segment_plan.concat_arguments],
+                          idle_timeout=_LOG_BATCH_DELAY)
+        for stdout_lines in process:
+            if cancel_event.is_set() or _ABORT_EVENT.is_set():
+                _LOGGER.info('Killing ffmpeg process due to cancellation or '
+                             'SIGTERM.')
                 process.terminate()
                 break
-            yield FFmpegResponse(log_line=stdout_data)
-        yield FFmpegResponse(exit_status=ExitStatus(
-            exit_code=process.returncode,
-            real_time=_time_to_duration(process.real_time),
-            resource_usage=ResourceUsage(ru_utime=process.rusage.ru_utime,
-                                         ru_stime=process.rusage.ru_stime,
-                                         ru_maxrss=process.rusage.ru_maxrss,
-                                         ru_ixrss=process.rusage.ru_ixrss,
-                                         ru_idrss=process.rusage.ru_idrss,
-                                         ru_isrss=process.rusage.ru_isrss,
-                                         ru_minflt=process.rusage.ru_minflt,
-                                         ru_majflt=process.rusage.ru_majflt,
-                                         ru_nswap=process.rusage.ru_nswap,
-                                         ru_inblock=process.rusage.ru_inblock,
-                                         ru_oublock=process.rusage.ru_oublock,
-                                         ru_msgsnd=process.rusage.ru_msgsnd,
-                                         ru_msgrcv=process.rusage.ru_msgrcv,
-                                         ru_nsignals=process.rusage.ru_nsignals,
-                                         ru_nvcsw=process.rusage.ru_nvcsw,
-                                         ru_nivcsw=process.rusage.ru_nivcsw)))
-        _LOGGER.info('Finished transcode.')
+            yield from _log_responses(
+                request, batcher,
+                [f'[concat] {line}' for line in stdout_lines])
+        return _exit_status(process)
+
+    def _run_local_segment(self, ffmpeg_arguments, stop_events, priority):
+        """Runs a segment on this worker once a job slot is free."""
+        if not self._scheduler.acquire(*stop_events, priority=priority):
+            return
+        try:
+            process = Process([FFMPEG_BINARY, *ffmpeg_arguments],
+                              report_progress=True,
+                              idle_timeout=_LOG_BATCH_DELAY,
+                              cpu_allocator=CPU_ALLOCATOR)
+            for stdout_lines in process:
+                if any(event.is_set() for event in stop_events):
+                    process.terminate()
+                    break
+                yield from _progress_responses(process)
+                if stdout_lines:
+                    yield FFmpegResponse(log_batch=LogBatch(
+                        log_lines=stdout_lines))
+            yield from _progress_responses(process)
+            yield FFmpegResponse(exit_status=_exit_status(process))
+        finally:
+            self._scheduler.release()
+
+    def _run_remote_segment(self, ffmpeg_arguments, stop_events, priority):
+        """Sends a segment to another worker."""
+        call = self._stub.transcode(
+            FFmpegRequest(ffmpeg_arguments=ffmpeg_arguments,
+                          batch_log_lines=True,
+                          report_progress=True,
+                          priority=priority))
+        threading.Thread(target=_cancel_when_set,
+                         args=(call, stop_events),
+                         daemon=True).start()
+        try:
+            yield from call
+        except grpc.RpcError:
+            if not any(event.is_set() for event in stop_events):
+                raise
+
+
+class JobPuller:
+    """Runs jobs leased from a pull queue whenever a job slot is free.
+
+    A job is only leased while a slot is free, and runs only if the slot can
+    be taken without queueing, so a busy worker leaves jobs to other workers
+    and an idle puller never counts as load or takes a place in the queue.
+    Its lease is extended while it runs, and it is returned to the queue if
+    the worker receives SIGTERM first.
+    """
+
+    def __init__(self,
+                 queue: PullQueue,
+                 servicer: FFmpegServicer,
+                 scheduler: SlotScheduler,
+                 store: JobStateStore = None):
+        self._queue = queue
+        self._servicer = servicer
+        self._scheduler = scheduler
+        self._store = store
+
+    def run(self):
+        """Leases and runs jobs one at a time until SIGTERM."""
+        while not _ABORT_EVENT.is_set():
+            if not self._scheduler.has_free_slot():
+                _ABORT_EVENT.wait(_PULL_INTERVAL)
+                continue
+            job = self._lease()
+            if job is None:
+                _ABORT_EVENT.wait(_PULL_INTERVAL)
+                continue
+            if _ABORT_EVENT.is_set() or not self._scheduler.try_acquire():
+                # A request took the slot while the job was being leased.
+                self._return(job)
+                continue
+            self._run(job)
+
+    def _lease(self) -> Optional[Job]:
+        try:
+            return self._queue.lease(_LEASE_SECONDS)
+        except QueueError:
+            _LOGGER.exception('Failed to lease a job.')
+            return None
+
+    def _run(self, job: Job):
+        """Runs a leased job while holding a job slot."""
+        _LOGGER.info('Running job %s.', job.name)
+        request = FFmpegRequest()
+        request.CopyFrom(job.request)
+        # Progress reports arrive regularly even when ffmpeg logs nothing, so
+        # the lease is extended in time.
+        request.report_progress = True
+        request.batch_log_lines = True
+        cancel_event = threading.Event()
+        renew_time = time.monotonic() + _LEASE_SECONDS / 2
+        recorder = JobRecorder(self._store, job.name)
+        recorder.start()
+        try:
+            for response in self._servicer.run_job(request, cancel_event):
+                recorder.observe(response)
+                if time.monotonic() >= renew_time:
+                    if not self._extend(job):
+                        _LOGGER.warning('Lost the lease of job %s.', job.name)
+                        cancel_event.set()
+                    renew_time = time.monotonic() + _LEASE_SECONDS / 2
+        except SegmentationError as error:
+            _LOGGER.exception('Job %s cannot be segmented.', job.name)
+            recorder.fail(str(error))
+            self._complete(job)
+            return
+        except (QueueFullError, grpc.RpcError):
+            _LOGGER.exception('Failed to run job %s.', job.name)
+            recorder.requeue()
+            self._return(job)
+            return
+        if cancel_event.is_set():
+            # The job is recorded by the worker that leased it again.
+            return
+        if _ABORT_EVENT.is_set():
+            recorder.requeue()
+            self._return(job)
+            return
+        _LOGGER.info('Finished job %s.', job.name)
+        recorder.finish()
+        self._complete(job)
+
+    def _complete(self, job: Job):
+        try:
+            self._queue.complete(job)
+        except QueueError:
+            _LOGGER.exception('Failed to complete job %s.', job.name)
+
+    def _extend(self, job: Job) -> bool:
+        try:
+            return self._queue.extend(job, _LEASE_SECONDS)
+        except QueueError:
+            _LOGGER.exception('Failed to extend the lease of job %s.', job.name)
+            return True
+
+    def _return(self, job: Job):
+        """Returns a job to the queue so that it runs again."""
+        try:
+            self._queue.release(job)
+        except QueueError:
+            _LOGGER.exception('Failed to release job %s.', job.name)
+
+
+class _AbortError(Exception):
+    """Raised where a request must be aborted away from its gRPC context."""
+
+    def __init__(self, code: grpc.StatusCode, details: str):
+        super().__init__(details)
+        self.code = code
+        self.details = details
+
+
+class _RequestMetrics:
+    """Records the metrics of a transcode request as its responses pass by."""
+
+    def __init__(self):
+        self._start_time = time.monotonic()
+        self._logged = False
+        self._exit_status = None
+        _REQUESTS_IN_FLIGHT.inc()
+
+    def observe(self, response: FFmpegResponse):
+        """Counts the log lines of a response and keeps its exit status."""
+        field = response.WhichOneof('status')
+        if field == 'log_line':
+            lines = (response.log_line,)
+        elif field == 'log_batch':
+            lines = response.log_batch.log_lines
+        else:
+            if field == 'exit_status':
+                self._exit_status = response.exit_status
+            return
+        if not self._logged:
+            self._logged = True
+            _TIME_TO_FIRST_LOG.observe(time.monotonic() - self._start_time)
+        _LOG_LINES.inc(len(lines))
+        _LOG_BYTES.inc(sum(map(len, lines)))
+
+    def finish(self, cancelled: bool):
+        """Records the end of the request.
+
+        Args:
+            cancelled: Whether the client cancelled the request.
+        """
+        _REQUESTS_IN_FLIGHT.dec()
+        _REQUEST_DURATION.observe(time.monotonic() - self._start_time)
+        succeeded = (self._exit_status is not None and
+                     not self._exit_status.exit_code)
+        if _ABORT_EVENT.is_set() and not succeeded:
+            _SIGTERM_ABORTS.inc()
+        elif cancelled and self._exit_status is None:
+            _CANCELLATIONS.inc()
+
+
+def _metadata_value(context, header: str) -> Optional[str]:
+    """Returns the value of a header of a request, if it was sent."""
+    for key, value in context.invocation_metadata() or ():
+        if key == header:
+            return value
+    return None
+
+
+def _load_metadata(scheduler: SlotScheduler):
+    """Returns the initial metadata that tells a client the worker's load."""
+    return ((_LOAD_HEADER, f'{scheduler.load():.3f}'),)
+
+
+def _killed_by_sigterm(exit_status: ExitStatus) -> bool:
+    """Returns whether ffmpeg was stopped because the worker received SIGTERM.
+
+    The worker passes SIGTERM on to ffmpeg, which either dies from it or
+    handles it and exits with _SIGNAL_EXIT_CODE. Other failures while the
+    worker shuts down are failures of the job itself.
+    """
+    if not _ABORT_EVENT.is_set():
+        return False
+    status = exit_status.exit_code
+    if os.WIFSIGNALED(status):
+        return os.WTERMSIG(status) == signal.SIGTERM
+    return os.WIFEXITED(status) and os.WEXITSTATUS(status) == _SIGNAL_EXIT_CODE
+
+
+def _check_killed(response: FFmpegResponse):
+    """Raises _AbortError with UNAVAILABLE if ffmpeg was killed by SIGTERM."""
+    if (response.HasField('exit_status') and
+            _killed_by_sigterm(response.exit_status)):
+        raise _AbortError(grpc.StatusCode.UNAVAILABLE,
+                          'Request was killed with SIGTERM.')
+
+
+@contextlib.contextmanager
+def _queue_full_errors():
+    """Turns a rejection by a full scheduler queue into an _AbortError."""
+    try:
+        yield
+    except QueueFullError:
+        _LOGGER.info('Rejecting transcode because the queue is full.')
+        raise _AbortError(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                          'Worker queue is full.')
+
+
+@contextlib.contextmanager
+def _segment_errors():
+    """Turns the errors of a segmented request into an _AbortError."""
+    try:
+        yield
+    except SegmentationError as error:
+        raise _AbortError(grpc.StatusCode.INVALID_ARGUMENT, str(error))
+    except QueueFullError:
+        _LOGGER.info('Rejecting segment because the queue is full.')
+        raise _AbortError(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                          'Worker queue is full.')
+    except grpc.RpcError as error:
+        raise _AbortError(error.code(), error.details())
+
+
+def _compile_ladder(request: LadderRequest) -> FFmpegRequest:
+    """As ladder.compile_request, raising _AbortError for a bad ladder."""
+    try:
+        return ladder.compile_request(request)
+    except LadderError as error:
+        raise _AbortError(grpc.StatusCode.INVALID_ARGUMENT, str(error))
+
+
+def _finish_ladder(request: LadderRequest) -> FFmpegResponse:
+    """Returns the ladder_result response of a ladder encoded successfully.
+
+    This blocks on the file system.
+    """
+    try:
+        return FFmpegResponse(ladder_result=ladder.finish(request))
+    except OSError as error:
+        raise _AbortError(grpc.StatusCode.INTERNAL, str(error))
+
+
+def _succeeded(response: FFmpegResponse) -> bool:
+    return (response.HasField('exit_status') and
+            response.exit_status.exit_code == 0)
+
+
+def _cancel_when_set(call, stop_events):
+    """Cancels an RPC once one of the events is set, unless it ends first."""
+    while not call.done():
+        if any(event.is_set() for event in stop_events):
+            call.cancel()
+            return
+        stop_events[0].wait(_SEGMENT_POLL_INTERVAL)
+
+
+def _log_responses(request: FFmpegRequest, batcher: 'LogBatcher',
+                   lines: Optional[List[str]]) -> Iterator[FFmpegResponse]:
+    """Sends log lines as the request asks, flushing the batch if lines is None."""
+    if request.progress_only:
+        return
+    if not request.batch_log_lines:
+        for log_line in lines or []:
+            yield FFmpegResponse(log_line=log_line)
+        return
+    lines = batcher.flush() if lines is None else batcher.add(lines)
+    if lines:
+        yield FFmpegResponse(log_batch=LogBatch(log_lines=lines))
+
+
+def _create_process(process_class, request: FFmpegRequest, ffmpeg_arguments,
+                    input_chunks) -> 'Process':
+    """Creates the ffmpeg process of a request with its reporting options."""
+    return process_class([FFMPEG_BINARY, *ffmpeg_arguments],
+                         report_progress=(request.report_progress or
+                                          request.progress_only),
+                         idle_timeout=_LOG_BATCH_DELAY,
+                         input_chunks=input_chunks,
+                         stream_output=input_chunks is not None,
+                         cpu_allocator=CPU_ALLOCATOR,
+                         sample_interval=request.sample_interval)
+
+
+def _start_preemptible(preemptor: Optional[Preemptor], request: FFmpegRequest,
+                       input_chunks) -> Optional[PreemptibleJob]:
+    """Registers a request whose ffmpeg starts, if it can be preempted.
+
+    Under REQUEUE, streamed requests, whose input cannot be read again, and
+    requests with -n, which would refuse to overwrite the outputs of the
+    killed run, are not preempted.
+    """
+    if preemptor is None:
+        return None
+    if preemptor.policy == REQUEUE and (
+            input_chunks is not None or
+            FFmpegArguments(request.ffmpeg_arguments).has_option('n')):
+        return None
+    return preemptor.start(request.priority)
+
+
+def _rerun_arguments(ffmpeg_arguments) -> List[str]:
+    """Returns the arguments of a killed run, overwriting its outputs."""
+    if FFmpegArguments(ffmpeg_arguments).has_option('y'):
+        return list(ffmpeg_arguments)
+    return ['-y', *ffmpeg_arguments]
+
+
+def _stage(stager: Optional[InputStager], ffmpeg_arguments) -> StagedInputs:
+    """Stages the inputs of a command if staging is enabled."""
+    if stager is None:
+        return StagedInputs(list(ffmpeg_arguments))
+    return stager.stage(ffmpeg_arguments)
+
+
+def _release_staged(staging: asyncio.Future):
+    if not staging.cancelled() and staging.exception() is None:
+        staging.result().release()
+
+
+def _lookup(cache: Optional[ResultCache], ffmpeg_arguments):
+    """Looks a command up in the result cache.
+
+    On a hit, the cached outputs are copied to the command's output paths.
+
+    Returns:
+        The cache key of the command, or None if it is not cacheable, and the
+        cached exit status, or None on a miss.
+    """
+    if cache is None:
+        return None, None
+    key = cache.key(ffmpeg_arguments)
+    if key is None:
+        return None, None
+    exit_status = cache.replay(key, FFmpegArguments(ffmpeg_arguments).outputs)
+    if exit_status is None:
+        _CACHE_MISSES.inc()
+    else:
+        _CACHE_HITS.inc()
+    return key, exit_status
+
+
+def _store(cache: Optional[ResultCache], key, ffmpeg_arguments, exit_status):
+    """Stores the outputs of a successful command in the result cache.
+
+    The outputs are copied in the background, so that the exit status is not
+    delayed by the copies.
+    """
+    if cache is None or key is None:
+        return
+    cache.store(key, FFmpegArguments(ffmpeg_arguments).outputs, exit_status)
+
+
+def _estimate(history: Optional[JobHistory],
+              ffmpeg_arguments) -> Optional[JobEstimate]:
+    """Predicts the cost of a command if a job history is kept."""
+    if history is None:
+        return None
+    return history.estimate(ffmpeg_arguments)
+
+
+def _exceeds_memory(estimate: Optional[JobEstimate]) -> bool:
+    return (estimate is not None and estimate.max_rss is not None and
+            _MAX_JOB_MEMORY is not None and estimate.max_rss > _MAX_JOB_MEMORY)
+
+
+def _memory_error(estimate: JobEstimate) -> str:
+    _LOGGER.info('Rejecting transcode predicted to use %d bytes.',
+                 estimate.max_rss)
+    return (f'The job is predicted to use {estimate.max_rss / 2**20:.0f} MiB of '
+            f'memory, more than the limit of {_MAX_JOB_MEMORY / 2**20:.0f} MiB.')
+
+
+def _record_history(history: Optional[JobHistory],
+                    estimate: Optional[JobEstimate], exit_status: ExitStatus):
+    """Records a successful run in the job history."""
+    if history is None or estimate is None:
+        return
+    try:
+        history.record(estimate.signature, exit_status)
+    except QueueError:
+        _LOGGER.exception('Failed to record the job history.')
+
+
+def _stream_request(
+        message: Optional[TranscodeStreamRequest]) -> FFmpegRequest:
+    """Returns the request in the first message of a transcodeStream call.
+
+    Raises:
+        _AbortError: The message does not hold a request that can be
+            streamed.
+    """
+    if message is None or message.WhichOneof('payload') != 'request':
+        raise _AbortError(grpc.StatusCode.INVALID_ARGUMENT,
+                          'The first message must hold the request.')
+    if message.request.segments > 1:
+        raise _AbortError(grpc.StatusCode.INVALID_ARGUMENT,
+                          'Streamed requests cannot be segmented.')
+    return message.request
+
+
+def _sample_responses(process: 'Process') -> Iterator[FFmpegResponse]:
+    for sample in process.samples():
+        yield FFmpegResponse(resource_sample=sample)
+
+
+def _output_responses(process: 'Process') -> Iterator[FFmpegResponse]:
+    for chunk in process.output():
+        yield FFmpegResponse(output_chunk=chunk)
+
+
+def _progress_responses(process: 'Process') -> Iterator[FFmpegResponse]:
+    for block in process.progress():
+        yield FFmpegResponse(progress=_parse_progress(block))
+
+
+def _run_responses(request: FFmpegRequest, process: 'Process',
+                   batcher: 'LogBatcher',
+                   stdout_lines: List[str]) -> Iterator[FFmpegResponse]:
+    """Returns the responses for what ffmpeg did since the last lines."""
+    yield from _output_responses(process)
+    yield from _sample_responses(process)
+    yield from _progress_responses(process)
+    yield from _log_responses(request, batcher, stdout_lines)
+
+
+def _final_responses(request: FFmpegRequest, process: 'Process',
+                     batcher: 'LogBatcher') -> Iterator[FFmpegResponse]:
+    """Returns the responses left once ffmpeg has exited."""
+    yield from _output_responses(process)
+    yield from _log_responses(request, batcher, None)
+    yield from _progress_responses(process)
+
+
+def _parse_progress(block: Dict[str, str]) -> Progress:
+    """Converts a block of ffmpeg's -progress output to a Progress message.
+
+    Values that ffmpeg reports as N/A are left unset.
+    """
+    progress = Progress(frame=_parse_number(block.get('frame'), int),
+                        fps=_parse_number(block.get('fps'), float),
+                        bitrate=_parse_number(block.get('bitrate'), float,
+                                              'kbits/s'),
+                        speed=_parse_number(block.get('speed'), float, 'x'),
+                        total_size=_parse_number(block.get('total_size'), int),
+                        end=block.get('progress') == 'end')
+    out_time_us = _parse_number(block.get('out_time_us'), int)
+    progress.out_time.FromMicroseconds(out_time_us)
+    return progress
+
+
+def _parse_number(value, number_type, suffix=''):
+    if value is None:
+        return 0
+    value = value.strip()
+    if value.endswith(suffix):
+        value = value[:len(value) - len(suffix)]
+    try:
+        return number_type(value)
+    except ValueError:
+        return 0
+
+
+class LogBatcher:
+    """Groups log lines so that they can be sent in fewer responses."""
+
+    def __init__(self, max_lines: int, max_delay: float):
+        self._max_lines = max_lines
+        self._max_delay = max_delay
+        self._lines = []
+        self._first_line_time = None
+
+    def add(self, lines: List[str]) -> List[str]:
+        """Adds lines and returns the pending lines if they should be sent.
+
+        Adding no lines still returns the pending lines once they are old
+        enough.
+        """
+        if not self._lines:
+            if not lines:
+                return []
+            self._first_line_time = time.monotonic()
+        self._lines.extend(lines)
+        if (len(self._lines) >= self._max_lines or
+                time.monotonic() - self._first_line_time >= self._max_delay):
+            return self.flush()
+        return []
+
+    def flush(self) -> List[str]:
+        """Returns the pending lines and clears them."""
+        lines = self._lines
+        self._lines = []
+        return lines
+
+
+class LineReader:
+    """Reads lines from a file descriptor without line buffering.
+
+    Data is read with large reads into a reusable buffer and split on both
+    carriage returns and newlines, so that ffmpeg's carriage-return terminated
+    status lines are returned as soon as they are written. Only complete lines
+    are decoded, and every returned line ends with a newline.
+    """
+
+    def __init__(self, fd: int, buffer_size: int = 2**16):
+        self.fd = fd
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._size = 0
+        # Set when the last line ended with \r, whose \n may be read next.
+        self._skip_newline = False
+        self.eof = False
+
+    def read_lines(self) -> List[str]:
+        """Reads once from the file descriptor and returns the complete lines.
+
+        At end of file, any remaining partial line is returned and eof is set.
+        """
+        size = os.readv(self.fd, [self._view[self._size:]])
+        if size == 0:
+            self.eof = True
+            if self._size == 0:
+                return []
+            line = str(self._view[:self._size], 'utf-8', 'replace') + '\n'
+            self._size = 0
+            return [line]
+        end = self._size + size
+        start = 0
+        if self._skip_newline and self._buffer[0] == ord('\n'):
+            start = 1
+        self._skip_newline = False
+        last = max(self._buffer.rfind(b'\n', start, end),
+                   self._buffer.rfind(b'\r', start, end)) + 1
+        if last == 0:
+            if end < len(self._buffer):
+                if start:
+                    # Drop the skipped newline from the partial line.
+                    self._buffer[:end - start] = bytes(self._view[start:end])
+                self._size = end - start
+                return []
+            # The buffer is full with a single line, so return it in parts.
+            last = end
+        # Complete lines are decoded at once and split by the C implementation
+        # of universal newlines, which is much cheaper than splitting in Python.
+        text = str(self._view[start:last], 'utf-8', 'replace')
+        lines = io.StringIO(text, newline=None).readlines()
+        if text[-1] == '\r':
+            self._skip_newline = True
+        elif text[-1] != '\n':
+            lines[-1] += '\n'
+        if last < end:
+            # Move the partial last line to the front of the buffer.
+            self._buffer[:end - last] = bytes(self._view[last:end])
+        self._size = end - last
+        return lines
 
 
 class Process:
     """
     Wrapper class around subprocess.Popen class.
     This class records the resource usage of the terminated process.
+
+    Iterating over a Process starts it and yields lists of lines written to
+    stdout and stderr. If idle_timeout is set, an empty list is yielded
+    whenever the process has been silent for that many seconds.
+
+    If sample_interval is set, the resource usage of the process is sampled
+    at that interval. New samples are returned by samples, and an empty list
+    is yielded whenever there are any.
+
+    If cpu_allocator is set, the process runs with the threads it allocates,
+    unless its arguments set them, and on the CPUs it allocates, if any.
+
+    If input_chunks is set, its bytes are written to the process's stdin,
+    which is closed once they run out. If stream_output is set, stdout is
+    read apart from stderr in chunks returned by output. An empty list is
+    yielded after every chunk, so that the chunk can be sent on before the
+    next one is read and the process blocks when its reader falls behind.
     """
 
-    def __init__(self, args):
+    def __init__(self,
+                 args,
+                 report_progress=False,
+                 idle_timeout=None,
+                 input_chunks=None,
+                 stream_output=False,
+                 cpu_allocator=None,
+                 sample_interval=None):
         self._start_time = None
         self._args = args
+        self._sample_interval = sample_interval
+        self._sampler = None
+        self._samples = collections.deque()
+        self._cpu_allocator = cpu_allocator
+        self._cpu_allocation = None
         self._subprocess = None
+        self._suspended = False
+        self._report_progress = report_progress
+        self._idle_timeout = idle_timeout
+        self._input_chunks = input_chunks
+        self._stream_output = stream_output
+        self._stdout_fd = None
+        self._progress_fd = None
+        self._output_fd = None
+        self._output_chunks = collections.deque()
+        self._progress_block = {}
+        self._progress_blocks = collections.deque()
         self.returncode = None
         self.rusage = None
         self.real_time = None
 
     def __iter__(self):
-        self._start_time = time.time()
-        self._subprocess = subprocess.Popen(self._args,
-                                            env={'LD_LIBRARY_PATH': '/usr/grte/v4/lib64/'},
-                                            stdout=subprocess.PIPE,
-                                            stderr=subprocess.STDOUT,
-                                            universal_newlines=True,
-                                            bufsize=1)
-        yield from self._subprocess.stdout
+        input_fd = self._start()
+        if input_fd is not None:
+            threading.Thread(target=_write_input,
+                             args=(input_fd, self._input_chunks),
+                             daemon=True).start()
+        with selectors.DefaultSelector() as selector:
+            stdout_reader = LineReader(self._stdout_fd)
+            selector.register(self._stdout_fd, selectors.EVENT_READ,
+                              stdout_reader)
+            if self._progress_fd is not None:
+                selector.register(self._progress_fd, selectors.EVENT_READ,
+                                  LineReader(self._progress_fd))
+            if self._output_fd is not None:
+                selector.register(self._output_fd, selectors.EVENT_READ, None)
+            while selector.get_map():
+                events = selector.select(self._select_timeout())
+                self._sample_if_due()
+                if not events or self._samples:
+                    yield []
+                for key, _ in events:
+                    reader = key.data
+                    if reader is None:
+                        if not self._read_output(key.fd):
+                            selector.unregister(key.fd)
+                        continue
+                    lines = reader.read_lines()
+                    if reader.eof:
+                        selector.unregister(reader.fd)
+                    if reader is stdout_reader:
+                        if lines:
+                            yield lines
+                    else:
+                        self._add_progress(lines)
+                if self._output_chunks:
+                    yield []
         self.wait()
 
+    def _start(self) -> Optional[int]:
+        """Starts the process with its output going to pipes.
+
+        Returns:
+            The write end of the process's stdin if input_chunks is set.
+        """
+        self._start_time = time.time()
+        args = self._args
+        if self._cpu_allocator is not None:
+            self._cpu_allocation = self._cpu_allocator.allocate()
+            args = [
+                args[0],
+                *thread_arguments(args[1:], self._cpu_allocation.threads)
+            ]
+        pass_fds = ()
+        if self._report_progress:
+            # ffmpeg writes progress reports to a dedicated pipe so that they
+            # are not mixed with its log output.
+            self._progress_fd, progress_write_fd = os.pipe()
+            args = [args[0], '-progress', f'pipe:{progress_write_fd}', *args[1:]]
+            pass_fds = (progress_write_fd,)
+        child_fds = []
+        stdin = input_fd = None
+        if self._input_chunks is not None:
+            stdin, input_fd = os.pipe()
+            child_fds.append(stdin)
+        self._stdout_fd, stdout_write_fd = os.pipe()
+        child_fds.append(stdout_write_fd)
+        stdout, stderr = stdout_write_fd, subprocess.STDOUT
+        if self._stream_output:
+            # The log goes to stderr when the output goes to stdout.
+            self._output_fd, output_write_fd = os.pipe()
+            child_fds.append(output_write_fd)
+            stdout, stderr = output_write_fd, stdout_write_fd
+        try:
+            self._subprocess = subprocess.Popen(args,
+                                                env={'LD_LIBRARY_PATH': '/usr/grte/v4/lib64/'},
+                                                stdin=stdin,
+                                                stdout=stdout,
+                                                stderr=stderr,
+                                                pass_fds=pass_fds)
+        except OSError:
+            if input_fd is not None:
+                os.close(input_fd)
+            self._release_cpus()
+            raise
+        finally:
+            for fd in (*child_fds, *pass_fds):
+                os.close(fd)
+        if self._cpu_allocation is not None and self._cpu_allocation.cpus:
+            try:
+                # ffmpeg starts its threads after probing its inputs, so they
+                # inherit the affinity.
+                os.sched_setaffinity(self._subprocess.pid,
+                                     self._cpu_allocation.cpus)
+            except OSError:
+                _LOGGER.debug('Failed to pin ffmpeg.', exc_info=True)
+        if self._sample_interval:
+            self._sampler = ResourceSampler(self._subprocess.pid,
+                                            self._sample_interval)
+        return input_fd
+
+    def _select_timeout(self) -> Optional[float]:
+        """Returns how long to wait for output before yielding or sampling."""
+        timeouts = [self._idle_timeout]
+        if self._sampler is not None:
+            timeouts.append(self._sampler.timeout())
+        timeouts = [timeout for timeout in timeouts if timeout is not None]
+        return min(timeouts, default=None)
+
+    def _sample_if_due(self):
+        if self._sampler is not None:
+            sample = self._sampler.sample_if_due()
+            if sample is not None:
+                self._samples.append(sample)
+
+    def _release_cpus(self):
+        if self._cpu_allocation is not None:
+            self._cpu_allocator.release(self._cpu_allocation)
+            self._cpu_allocation = None
+
+    def _read_output(self, fd) -> bool:
+        """Reads a chunk of the output, returning False at its end."""
+        chunk = os.read(fd, _OUTPUT_CHUNK_SIZE)
+        if chunk:
+            self._output_chunks.append(chunk)
+        return bool(chunk)
+
+    def progress(self) -> List[Dict[str, str]]:
+        """Returns the progress reports received since the last call.
+
+        Each report is a dictionary of the key-value pairs written by ffmpeg.
+        """
+        blocks = list(self._progress_blocks)
+        self._progress_blocks.clear()
+        return blocks
+
+    def samples(self) -> List[ResourceSample]:
+        """Returns the resource samples taken since the last call."""
+        samples = list(self._samples)
+        self._samples.clear()
+        return samples
+
+    def sample_history(self) -> List[ResourceSample]:
+        """Returns the downsampled resource samples of the whole run."""
+        if self._sampler is None:
+            return []
+        return self._sampler.history()
+
+    def output(self) -> List[bytes]:
+        """Returns the chunks of output read since the last call."""
+        chunks = list(self._output_chunks)
+        self._output_chunks.clear()
+        return chunks
+
+    def _add_progress(self, lines):
+        for line in lines:
+            key, _, value = line.strip().partition('=')
+            self._progress_block[key] = value
+            # Every report ends with a progress key.
+            if key == 'progress':
+                self._progress_blocks.append(self._progress_block)
+                self._progress_block = {}
+
+    def suspend(self):
+        """Stops the process with a SIGSTOP signal."""
+        # os.kill rather than send_signal, which may reap the process and
+        # lose its resource usage.
+        os.kill(self._subprocess.pid, signal.SIGSTOP)
+        self._suspended = True
+
+    def resume(self):
+        """Continues the process with a SIGCONT signal if it is stopped."""
+        if self._suspended:
+            os.kill(self._subprocess.pid, signal.SIGCONT)
+            self._suspended = False
+
     def terminate(self):
         """Terminates the process with a SIGTERM signal."""
         if self._subprocess is None:  # process has not been created yet
             return
-        self._subprocess.terminate()
+        # os.kill rather than Popen.terminate, which may reap the process
+        # before wait collects its exit status and resource usage.
+        os.kill(self._subprocess.pid, signal.SIGTERM)
+        # A stopped process only handles the signal once it is continued.
+        self.resume()
         self.wait()
 
     def wait(self):
         """Waits for the process to finish and collects exit status information."""
-        _, self.returncode, self.rusage = os.wait4(self._subprocess.pid, 0)
+        self._finish(os.wait4(self._subprocess.pid, 0))
+
+    def _finish(self, wait_result):
+        """Records the result of os.wait4 and closes the pipes."""
+        _, self.returncode, self.rusage = wait_result
         self.real_time = time.time() - self._start_time
+        for fd in (self._stdout_fd, self._progress_fd, self._output_fd):
+            if fd is not None:
+                os.close(fd)
+        self._stdout_fd = None
+        self._progress_fd = None
+        self._output_fd = None
+        self._release_cpus()
+
+
+class AioProcess(Process):
+    """Process that runs in an asyncio event loop.
+
+    Iterating over an AioProcess with `async for` starts it and yields lists of
+    lines, like iterating over a Process. terminate and wait are coroutines.
+
+    The process is reaped with os.wait4 rather than asyncio's child watchers so
+    that its resource usage is still recorded. Where pidfds are available, the
+    exit is awaited without a thread.
+    """
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        input_fd = self._start()
+        if input_fd is not None:
+            os.set_blocking(input_fd, False)
+            # The task ends by itself once the input runs out or the process
+            # closes its stdin.
+            asyncio.ensure_future(
+                _write_input_async(loop, input_fd, self._input_chunks))
+        readers = {self._stdout_fd: LineReader(self._stdout_fd)}
+        if self._progress_fd is not None:
+            readers[self._progress_fd] = LineReader(self._progress_fd)
+        if self._output_fd is not None:
+            readers[self._output_fd] = None
+        for fd in readers:
+            os.set_blocking(fd, False)
+        while readers:
+            fd = await _wait_readable(loop, list(readers),
+                                      self._select_timeout())
+            self._sample_if_due()
+            if fd is None or self._samples:
+                yield []
+            if fd is None:
+                continue
+            reader = readers[fd]
+            if reader is None:
+                try:
+                    if not self._read_output(fd):
+                        del readers[fd]
+                except BlockingIOError:
+                    continue
+                yield []
+                continue
+            try:
+                lines = reader.read_lines()
+            except BlockingIOError:
+                continue
+            if reader.eof:
+                del readers[fd]
+            if fd == self._stdout_fd:
+                if lines:
+                    yield lines
+            else:
+                self._add_progress(lines)
+        await self.wait()
+
+    async def terminate(self):  # pylint: disable=invalid-overridden-method
+        """Terminates the process with a SIGTERM signal."""
+        if self._subprocess is None:  # process has not been created yet
+            return
+        os.kill(self._subprocess.pid, signal.SIGTERM)
+        self.resume()
+        await self.wait()
+
+    async def wait(self):  # pylint: disable=invalid-overridden-method
+        """Waits for the process to finish and collects exit status information."""
+        loop = asyncio.get_running_loop()
+        pid = self._subprocess.pid
+        if hasattr(os, 'pidfd_open'):
+            pidfd = os.pidfd_open(pid)
+            try:
+                await _wait_readable(loop, [pidfd])
+            finally:
+                os.close(pidfd)
+            self._finish(os.wait4(pid, 0))
+        else:
+            self._finish(await loop.run_in_executor(None, os.wait4, pid, 0))
+
+
+def _write_input(fd: int, chunks: Iterator[bytes]):
+    """Writes chunks to a pipe and closes it.
+
+    Writing stops early if the reader closes the pipe or the chunks cannot be
+    read, as when the request that sends them is cancelled.
+    """
+    try:
+        for chunk in chunks:
+            view = memoryview(chunk)
+            while view:
+                view = view[os.write(fd, view):]
+    except BrokenPipeError:
+        _LOGGER.debug('ffmpeg closed its input.')
+    except grpc.RpcError:
+        _LOGGER.debug('Stopped reading input due to cancellation.')
+    finally:
+        os.close(fd)
+
+
+async def _write_input_async(loop, fd: int, chunks):
+    """Writes an async iterable of chunks to a nonblocking pipe and closes it."""
+    try:
+        async for chunk in chunks:
+            view = memoryview(chunk)
+            while view:
+                try:
+                    view = view[os.write(fd, view):]
+                except BlockingIOError:
+                    await _wait_writable(loop, fd)
+    except BrokenPipeError:
+        _LOGGER.debug('ffmpeg closed its input.')
+    except Exception:  # pylint: disable=broad-except
+        # The request stream fails once the request has ended.
+        _LOGGER.debug('Stopped reading input.', exc_info=True)
+    finally:
+        os.close(fd)
+
+
+async def _wait_writable(loop, fd):
+    """Waits until fd is writable."""
+    ready = loop.create_future()
+    loop.add_writer(fd, lambda: ready.done() or ready.set_result(None))
+    try:
+        await ready
+    finally:
+        loop.remove_writer(fd)
+
+
+async def _wait_readable(loop, fds, timeout=None):
+    """Waits until one of fds is readable.
+
+    Returns:
+        A readable file descriptor, or None if the timeout expired first.
+    """
+    ready = loop.create_future()
+
+    def set_ready(fd):
+        if not ready.done():
+            ready.set_result(fd)
+
+    for fd in fds:
+        loop.add_reader(fd, set_ready, fd)
+    timer = None
+    if timeout is not None:
+        timer = loop.call_later(timeout, set_ready, None)
+    try:
+        return await ready
+    finally:
+        for fd in fds:
+            loop.remove_reader(fd)
+        if timer is not None:
+            timer.cancel()
 
 
 def serve():
     """Starts the gRPC server"""
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    ffmpeg_worker_pb2_grpc.add_FFmpegServicer_to_server(FFmpegServicer(),
-                                                        server)
+    preemptor = _create_preemptor()
+    scheduler = _create_scheduler(preemptor)
+    _LOGGER.info('Running up to %d ffmpeg processes with %d queued requests.',
+                 scheduler.slots, scheduler.max_queue_depth)
+    max_requests = scheduler.slots + scheduler.max_queue_depth
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_requests),
+                         maximum_concurrent_rpcs=max_requests)
+    cache = _create_cache()
+    store = _create_store()
+    servicer = FFmpegServicer(scheduler, cache, _create_stager(),
+                              _create_segmented_transcoder(scheduler, cache),
+                              store, _create_history(), preemptor)
+    ffmpeg_worker_pb2_grpc.add_FFmpegServicer_to_server(servicer, server)
     server.add_insecure_port('[::]:8080')
 
     def _sigterm_handler(*_):
@@ -155,7 +2154,196 @@ def serve():
 
     signal.signal(signal.SIGTERM, _sigterm_handler)
     server.start()
+    _start_metrics_server(scheduler)
+    pullers = _start_job_pullers(servicer, scheduler, store)
     server.wait_for_termination()
+    # Jobs interrupted by SIGTERM are returned to the queue before exiting.
+    for puller in pullers:
+        puller.join()
+
+
+async def serve_aio():
+    """Starts the gRPC server in an asyncio event loop."""
+    preemptor = _create_preemptor()
+    scheduler = _create_scheduler(preemptor)
+    _LOGGER.info('Running up to %d ffmpeg processes with %d queued requests.',
+                 scheduler.slots, scheduler.max_queue_depth)
+    server = aio.server(maximum_concurrent_rpcs=scheduler.slots +
+                        scheduler.max_queue_depth)
+    cache = _create_cache()
+    stager = _create_stager()
+    segmented = _create_segmented_transcoder(scheduler, cache)
+    store = _create_store()
+    history = _create_history()
+    ffmpeg_worker_pb2_grpc.add_FFmpegServicer_to_server(
+        AioFFmpegServicer(scheduler, cache, stager, segmented, store, history,
+                          preemptor), server)
+    server.add_insecure_port('[::]:8080')
+
+    def _sigterm_handler():
+        _LOGGER.warning('Recieved SIGTERM. Terminating...')
+        _ABORT_EVENT.set()
+        asyncio.ensure_future(server.stop(_GRACE_PERIOD))
+
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM,
+                                                  _sigterm_handler)
+    await server.start()
+    _start_metrics_server(scheduler)
+    # Leased jobs run on threads, like requests of the threaded server.
+    pullers = _start_job_pullers(
+        FFmpegServicer(scheduler,
+                       cache,
+                       stager,
+                       segmented,
+                       history=history,
+                       preemptor=preemptor), scheduler, store)
+    await server.wait_for_termination()
+    for puller in pullers:
+        await asyncio.get_running_loop().run_in_executor(None, puller.join)
+
+
+def _start_metrics_server(scheduler: SlotScheduler):
+    """Serves the worker's metrics if a metrics port is set."""
+    if not _METRICS_PORT:
+        return
+    global _LOAD_ESTIMATOR  # pylint: disable=global-statement
+    _LOAD_ESTIMATOR = LoadEstimator(scheduler, _EXPECTED_JOB_SECONDS)
+    # The autoscaling signals, served to the HorizontalPodAutoscaler through
+    # a custom metrics adapter.
+    _METRICS.gauge('ffmpeg_worker_load',
+                   'Running plus queued jobs per job slot.',
+                   _LOAD_ESTIMATOR.load)
+    _METRICS.gauge(
+        'ffmpeg_worker_backlog_seconds',
+        'Estimated seconds for the job slots to finish the current jobs.',
+        _LOAD_ESTIMATOR.backlog_seconds)
+    _METRICS.gauge('ffmpeg_worker_running_jobs',
+                   'ffmpeg processes holding a job slot.',
+                   lambda: scheduler.running)
+    _METRICS.gauge('ffmpeg_worker_queued_jobs',
+                   'Requests and segments waiting for a job slot.',
+                   lambda: scheduler.queued)
+    _METRICS.gauge('ffmpeg_worker_job_slots',
+                   'The number of ffmpeg processes that may run at once.',
+                   lambda: scheduler.slots)
+    metrics.start_http_server(_METRICS, int(_METRICS_PORT))
+    _LOGGER.info('Serving metrics on port %s.', _METRICS_PORT)
+
+
+def _start_job_pullers(servicer: FFmpegServicer, scheduler: SlotScheduler,
+                       store: Optional[JobStateStore]
+                      ) -> List[threading.Thread]:
+    """Starts a JobPuller thread for every job slot if a pull queue is set."""
+    if not _PULL_QUEUE_PATH:
+        return []
+    _LOGGER.info('Pulling jobs from %s.', _PULL_QUEUE_PATH)
+    puller = JobPuller(SqliteJobQueue(_PULL_QUEUE_PATH), servicer, scheduler,
+                       store)
+    threads = [
+        threading.Thread(target=puller.run, daemon=True)
+        for _ in range(scheduler.slots)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def _create_cache() -> Optional[ResultCache]:
+    if not _RESULT_CACHE_DIR:
+        return None
+    _LOGGER.info('Caching results in %s.', _RESULT_CACHE_DIR)
+    return ResultCache(_RESULT_CACHE_DIR, _RESULT_CACHE_BYTES,
+                       _RESULT_CACHE_HASH_INPUTS)
+
+
+def _create_preemptor() -> Optional[Preemptor]:
+    if not _PREEMPTION_POLICY:
+        return None
+    _LOGGER.info('Preempting jobs by the %s policy.', _PREEMPTION_POLICY)
+    return Preemptor(_PREEMPTION_POLICY)
+
+
+def _create_scheduler(preemptor: Optional[Preemptor] = None) -> SlotScheduler:
+    scheduler = SlotScheduler(available_slots(_CPUS_PER_JOB, _MEMORY_PER_JOB),
+                              _MAX_QUEUE_DEPTH, _SCHEDULING_POLICY, _AGING_RATE,
+                              _EXPECTED_JOB_SECONDS,
+                              preemptor and preemptor.request)
+    _LOGGER.info('Admitting queued jobs by the %s policy.', scheduler.policy)
+    return scheduler
+
+
+def _create_history() -> Optional[JobHistory]:
+    if not _JOB_HISTORY_PATH:
+        return None
+    _LOGGER.info('Recording job history in %s.', _JOB_HISTORY_PATH)
+    return JobHistory(_JOB_HISTORY_PATH)
+
+
+def _create_store() -> Optional[JobStateStore]:
+    if not _JOB_STATE_STORE:
+        return None
+    _LOGGER.info('Recording job states in %s.', _JOB_STATE_STORE)
+    return create_store(_JOB_STATE_STORE)
+
+
+def _create_stager() -> Optional[InputStager]:
+    if not _STAGING_DIR:
+        return None
+    _LOGGER.info('Staging inputs in %s.', _STAGING_DIR)
+    return InputStager(MOUNT_POINT, _STAGING_DIR, _STAGING_BYTES,
+                       _STAGING_CHUNK_BYTES, _STAGING_PARALLELISM)
+
+
+def _create_segmented_transcoder(scheduler: SlotScheduler,
+                                 cache: Optional[ResultCache]
+                                ) -> 'SegmentedTranscoder':
+    if not _SEGMENT_WORKERS:
+        return SegmentedTranscoder(scheduler, cache)
+    _LOGGER.info('Sending segments to %s.', _SEGMENT_WORKERS)
+    # Round robin spreads the segments over every worker behind the target
+    # rather than the one a single connection would reach.
+    channel = grpc.insecure_channel(_SEGMENT_WORKERS,
+                                    options=[('grpc.lb_policy_name',
+                                              'round_robin')])
+    return SegmentedTranscoder(scheduler, cache, channel)
+
+
+def _exit_status(process: 'Process',
+                 job: Optional[PreemptibleJob] = None) -> ExitStatus:
+    """Builds the exit status of a terminated process and records its usage.
+
+    Args:
+        process: The terminated process.
+        job: The job of the process, if it could be preempted.
+    """
+    _FFMPEG_REAL_TIME.observe(process.real_time)
+    _FFMPEG_USER_TIME.observe(process.rusage.ru_utime)
+    _FFMPEG_SYSTEM_TIME.observe(process.rusage.ru_stime)
+    # ru_maxrss is in kilobytes on Linux.
+    _FFMPEG_MAX_RSS.observe(process.rusage.ru_maxrss * 1024)
+    if _LOAD_ESTIMATOR is not None:
+        _LOAD_ESTIMATOR.record_job(process.real_time)
+    return ExitStatus(
+        exit_code=process.returncode,
+        real_time=_time_to_duration(process.real_time),
+        resource_usage=ResourceUsage(ru_utime=process.rusage.ru_utime,
+                                     ru_stime=process.rusage.ru_stime,
+                                     ru_maxrss=process.rusage.ru_maxrss,
+                                     ru_ixrss=process.rusage.ru_ixrss,
+                                     ru_idrss=process.rusage.ru_idrss,
+                                     ru_isrss=process.rusage.ru_isrss,
+                                     ru_minflt=process.rusage.ru_minflt,
+                                     ru_majflt=process.rusage.ru_majflt,
+                                     ru_nswap=process.rusage.ru_nswap,
+                                     ru_inblock=process.rusage.ru_inblock,
+                                     ru_oublock=process.rusage.ru_oublock,
+                                     ru_msgsnd=process.rusage.ru_msgsnd,
+                                     ru_msgrcv=process.rusage.ru_msgrcv,
+                                     ru_nsignals=process.rusage.ru_nsignals,
+                                     ru_nvcsw=process.rusage.ru_nvcsw,
+                                     ru_nivcsw=process.rusage.ru_nivcsw),
+        resource_samples=process.sample_history(),
+        preemptions=0 if job is None else job.preemptions)
 
 
 def _time_to_duration(seconds: float) -> Duration:
@@ -167,4 +2355,7 @@ def _time_to_duration(seconds: float) -> Duration:
 if __name__ == '__main__':
     os.chdir(MOUNT_POINT)
     logging.basicConfig(level=logging.INFO)
-    serve()
+    if _SERVER_MODE == 'asyncio':
+        asyncio.run(serve_aio())
+    else:
+        serve()
@@ -12,6 +12,7 @@ _sym_db = _symbol_database.Default()
 
 
 from google.protobuf import duration_pb2 as google_dot_protobuf_dot_duration__pb2
+from google.protobuf import timestamp_pb2 as google_dot_protobuf_dot_timestamp__pb2
 
 
 DESCRIPTOR = _descriptor.FileDescriptor(
@@ -20,12 +21,126 @@ DESCRIPTOR = _descriptor.FileDescriptor(
   syntax='proto3',
   serialized_options=None,
   create_key=_descriptor._internal_create_key,
-  serialized_pb=b'\n\x1aworker/ffmpeg_worker.proto\x1a\x1egoogle/protobuf/duration.proto\"R\n\x0e\x46\x46mpegResponse\x12\x12\n\x08log_line\x18\x01 \x01(\tH\x00\x12\"\n\x0b\x65xit_status\x18\x02 \x01(\x0b\x32\x0b.ExitStatusH\x00\x42\x08\n\x06status\"u\n\nExitStatus\x12\x11\n\texit_code\x18\x01 \x01(\x05\x12&\n\x0eresource_usage\x18\x02 \x01(\x0b\x32\x0e.ResourceUsage\x12,\n\treal_time\x18\x03 \x01(\x0b\x32\x19.google.protobuf.Duration\"\xbc\x02\n\rResourceUsage\x12\x10\n\x08ru_utime\x18\x01 \x01(\x02\x12\x10\n\x08ru_stime\x18\x02 \x01(\x02\x12\x11\n\tru_maxrss\x18\x03 \x01(\x03\x12\x10\n\x08ru_ixrss\x18\x04 \x01(\x03\x12\x10\n\x08ru_idrss\x18\x05 \x01(\x03\x12\x10\n\x08ru_isrss\x18\x06 \x01(\x03\x12\x11\n\tru_minflt\x18\x07 \x01(\x03\x12\x11\n\tru_majflt\x18\x08 \x01(\x03\x12\x10\n\x08ru_nswap\x18\t \x01(\x03\x12\x12\n\nru_inblock\x18\n \x01(\x03\x12\x12\n\nru_oublock\x18\x0b \x01(\x03\x12\x11\n\tru_msgsnd\x18\x0c \x01(\x03\x12\x11\n\tru_msgrcv\x18\r \x01(\x03\x12\x13\n\x0bru_nsignals\x18\x0e \x01(\x03\x12\x10\n\x08ru_nvcsw\x18\x0f \x01(\x03\x12\x11\n\tru_nivcsw\x18\x10 \x01(\x03\")\n\rFFmpegRequest\x12\x18\n\x10\x66\x66mpeg_arguments\x18\x01 \x03(\t2:\n\x06\x46\x46mpeg\x12\x30\n\ttranscode\x12\x0e.FFmpegRequest\x1a\x0f.FFmpegResponse\"\x00\x30\x01\x62\x06proto3'
+  serialized_pb=b'\n\x1aworker/ffmpeg_worker.proto\x1a\x1egoogle/protobuf/duration.proto\x1a\x1fgoogle/protobuf/timestamp.proto\"]\n\x16TranscodeStreamRequest\x12!\n\x07request\x18\x01 \x01(\x0b\x32\x0e.FFmpegRequestH\x00\x12\x15\n\x0binput_chunk\x18\x02 \x01(\x0cH\x00\x42\t\n\x07payload\"\xfd\x01\n\x0e\x46\x46mpegResponse\x12\x12\n\x08log_line\x18\x01 \x01(\tH\x00\x12\"\n\x0b\x65xit_status\x18\x02 \x01(\x0b\x32\x0b.ExitStatusH\x00\x12\x1e\n\tlog_batch\x18\x03 \x01(\x0b\x32\t.LogBatchH\x00\x12\x1d\n\x08progress\x18\x04 \x01(\x0b\x32\t.ProgressH\x00\x12\x16\n\x0coutput_chunk\x18\x05 \x01(\x0cH\x00\x12&\n\rladder_result\x18\x06 \x01(\x0b\x32\r.LadderResultH\x00\x12*\n\x0fresource_sample\x18\x07 \x01(\x0b\x32\x0f.ResourceSampleH\x00\x42\x08\n\x06status\"\x1d\n\x08LogBatch\x12\x11\n\tlog_lines\x18\x01 \x03(\t\"\x94\x01\n\x08Progress\x12\r\n\x05\x66rame\x18\x01 \x01(\x03\x12\x0b\n\x03\x66ps\x18\x02 \x01(\x02\x12\x0f\n\x07\x62itrate\x18\x03 \x01(\x02\x12+\n\x08out_time\x18\x04 \x01(\x0b\x32\x19.google.protobuf.Duration\x12\r\n\x05speed\x18\x05 \x01(\x02\x12\x12\n\ntotal_size\x18\x06 \x01(\x03\x12\x0b\n\x03\x65nd\x18\x07 \x01(\x08\"\xc5\x01\n\nExitStatus\x12\x11\n\texit_code\x18\x01 \x01(\x05\x12&\n\x0eresource_usage\x18\x02 \x01(\x0b\x32\x0e.ResourceUsage\x12,\n\treal_time\x18\x03 \x01(\x0b\x32\x19.google.protobuf.Duration\x12\x0e\n\x06\x63\x61\x63hed\x18\x04 \x01(\x08\x12)\n\x10resource_samples\x18\x05 \x03(\x0b\x32\x0f.ResourceSample\x12\x13\n\x0bpreemptions\x18\x06 \x01(\x05\"\xb3\x01\n\x0eResourceSample\x12\x0c\n\x04time\x18\x01 \x01(\x02\x12\x13\n\x0b\x63pu_percent\x18\x02 \x01(\x02\x12\x0b\n\x03rss\x18\x03 \x01(\x03\x12\x12\n\nread_bytes\x18\x04 \x01(\x03\x12\x13\n\x0bwrite_bytes\x18\x05 \x01(\x03\x12\"\n\x1avoluntary_context_switches\x18\x06 \x01(\x03\x12$\n\x1cinvoluntary_context_switches\x18\x07 \x01(\x03\"\xbc\x02\n\rResourceUsage\x12\x10\n\x08ru_utime\x18\x01 \x01(\x02\x12\x10\n\x08ru_stime\x18\x02 \x01(\x02\x12\x11\n\tru_maxrss\x18\x03 \x01(\x03\x12\x10\n\x08ru_ixrss\x18\x04 \x01(\x03\x12\x10\n\x08ru_idrss\x18\x05 \x01(\x03\x12\x10\n\x08ru_isrss\x18\x06 \x01(\x03\x12\x11\n\tru_minflt\x18\x07 \x01(\x03\x12\x11\n\tru_majflt\x18\x08 \x01(\x03\x12\x10\n\x08ru_nswap\x18\t \x01(\x03\x12\x12\n\nru_inblock\x18\n \x01(\x03\x12\x12\n\nru_oublock\x18\x0b \x01(\x03\x12\x11\n\tru_msgsnd\x18\x0c \x01(\x03\x12\x11\n\tru_msgrcv\x18\r \x01(\x03\x12\x13\n\x0bru_nsignals\x18\x0e \x01(\x03\x12\x10\n\x08ru_nvcsw\x18\x0f \x01(\x03\x12\x11\n\tru_nivcsw\x18\x10 \x01(\x03\"\xaf\x01\n\rFFmpegRequest\x12\x18\n\x10\x66\x66mpeg_arguments\x18\x01 \x03(\t\x12\x17\n\x0f\x62\x61tch_log_lines\x18\x02 \x01(\x08\x12\x17\n\x0freport_progress\x18\x03 \x01(\x08\x12\x15\n\rprogress_only\x18\x04 \x01(\x08\x12\x10\n\x08segments\x18\x05 \x01(\x05\x12\x17\n\x0fsample_interval\x18\x06 \x01(\x02\x12\x10\n\x08priority\x18\x07 \x01(\x05\"\xd0\x02\n\x08JobState\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x1e\n\x05state\x18\x02 \x01(\x0e\x32\x0f.JobState.State\x12 \n\x0b\x65xit_status\x18\x03 \x01(\x0b\x32\x0b.ExitStatus\x12\x30\n\x0c\x65nqueue_time\x18\x04 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12.\n\nstart_time\x18\x05 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12,\n\x08\x65nd_time\x18\x06 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x10\n\x08log_tail\x18\x07 \x03(\t\"R\n\x05State\x12\x15\n\x11STATE_UNSPECIFIED\x10\x00\x12\n\n\x06QUEUED\x10\x01\x12\x0b\n\x07RUNNING\x10\x02\x12\r\n\tSUCCEEDED\x10\x03\x12\n\n\x06\x46\x41ILED\x10\x04\"\xe0\x02\n\rLadderRequest\x12\r\n\x05input\x18\x01 \x01(\t\x12\x1e\n\nrenditions\x18\x02 \x03(\x0b\x32\n.Rendition\x12+\n\tpackaging\x18\x03 \x01(\x0e\x32\x18.LadderRequest.Packaging\x12\x10\n\x08manifest\x18\x04 \x01(\t\x12\x17\n\x0fsegment_seconds\x18\x05 \x01(\x05\x12\x13\n\x0b\x61udio_codec\x18\x06 \x01(\t\x12\x15\n\raudio_bitrate\x18\x07 \x01(\x05\x12\x17\n\x0f\x62\x61tch_log_lines\x18\x08 \x01(\x08\x12\x17\n\x0freport_progress\x18\t \x01(\x08\x12\x15\n\rprogress_only\x18\n \x01(\x08\x12\x17\n\x0fsample_interval\x18\x0b \x01(\x02\x12\x10\n\x08priority\x18\x0c \x01(\x05\"(\n\tPackaging\x12\x08\n\x04NONE\x10\x00\x12\x07\n\x03HLS\x10\x01\x12\x08\n\x04\x44\x41SH\x10\x02\"\xab\x01\n\tRendition\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\r\n\x05width\x18\x02 \x01(\x05\x12\x0e\n\x06height\x18\x03 \x01(\x05\x12\x13\n\x0bvideo_codec\x18\x04 \x01(\t\x12\x15\n\rvideo_bitrate\x18\x05 \x01(\x05\x12\x0b\n\x03\x63rf\x18\x06 \x01(\x05\x12\x0e\n\x06preset\x18\x07 \x01(\t\x12\x0e\n\x06output\x18\x08 \x01(\t\x12\x18\n\x10output_arguments\x18\t \x03(\t\"\x8f\x01\n\x0cLadderResult\x12\x31\n\nrenditions\x18\x01 \x03(\x0b\x32\x1d.LadderResult.RenditionResult\x1aL\n\x0fRenditionResult\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x0e\n\x06output\x18\x02 \x01(\t\x12\x0c\n\x04size\x18\x03 \x01(\x03\x12\r\n\x05\x66iles\x18\x04 \x01(\x05\x32\xb5\x01\n\x06\x46\x46mpeg\x12\x30\n\ttranscode\x12\x0e.FFmpegRequest\x1a\x0f.FFmpegResponse\"\x00\x30\x01\x12\x41\n\x0ftranscodeStream\x12\x17.TranscodeStreamRequest\x1a\x0f.FFmpegResponse\"\x00(\x01\x30\x01\x12\x36\n\x0ftranscodeLadder\x12\x0e.LadderRequest\x1a\x0f.FFmpegResponse\"\x00\x30\x01\x62\x06proto3'
   ,
-  dependencies=[google_dot_protobuf_dot_duration__pb2.DESCRIPTOR,])
+  dependencies=[google_dot_protobuf_dot_duration__pb2.DESCRIPTOR,google_dot_protobuf_dot_timestamp__pb2.DESCRIPTOR,])
 
 
 
+_JOBSTATE_STATE = _descriptor.EnumDescriptor(
+  name='State',
+  full_name='JobState.State',
+  filename=None,
+  file=DESCRIPTOR,
+  create_key=_descriptor._internal_create_key,
+  values=[
+    _descriptor.EnumValueDescriptor(
+      name='STATE_UNSPECIFIED', index=0, number=0,
+      serialized_options=None,
+      type=None,
+      create_key=_descriptor._internal_create_key),
+    _descriptor.EnumValueDescriptor(
+      name='QUEUED', index=1, number=1,
+      serialized_options=None,
+      type=None,
+      create_key=_descriptor._internal_create_key),
+    _descriptor.EnumValueDescriptor(
+      name='RUNNING', index=2, number=2,
+      serialized_options=None,
+      type=None,
+      create_key=_descriptor._internal_create_key),
+    _descriptor.EnumValueDescriptor(
+      name='SUCCEEDED', index=3, number=3,
+      serialized_options=None,
+      type=None,
+      create_key=_descriptor._internal_create_key),
+    _descriptor.EnumValueDescriptor(
+      name='FAILED', index=4, number=4,
+      serialized_options=None,
+      type=None,
+      create_key=_descriptor._internal_create_key),
+  ],
+  containing_type=None,
+  serialized_options=None,
+  serialized_start=1762,
+  serialized_end=1844,
+)
+_sym_db.RegisterEnumDescriptor(_JOBSTATE_STATE)
+
+_LADDERREQUEST_PACKAGING = _descriptor.EnumDescriptor(
+  name='Packaging',
+  full_name='LadderRequest.Packaging',
+  filename=None,
+  file=DESCRIPTOR,
+  create_key=_descriptor._internal_create_key,
+  values=[
+    _descriptor.EnumValueDescriptor(
+      name='NONE', index=0, number=0,
+      serialized_options=None,
+      type=None,
+      create_key=_descriptor._internal_create_key),
+    _descriptor.EnumValueDescriptor(
+      name='HLS', index=1, number=1,
+      serialized_options=None,
+      type=None,
+      create_key=_descriptor._internal_create_key),
+    _descriptor.EnumValueDescriptor(
+      name='DASH', index=2, number=2,
+      serialized_options=None,
+      type=None,
+      create_key=_descriptor._internal_create_key),
+  ],
+  containing_type=None,
+  serialized_options=None,
+  serialized_start=2159,
+  serialized_end=2199,
+)
+_sym_db.RegisterEnumDescriptor(_LADDERREQUEST_PACKAGING)
+
+
+_TRANSCODESTREAMREQUEST = _descriptor.Descriptor(
+  name='TranscodeStreamRequest',
+  full_name='TranscodeStreamRequest',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='request', full_name='TranscodeStreamRequest.request', index=0,
+      number=1, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='input_chunk', full_name='TranscodeStreamRequest.input_chunk', index=1,
+      number=2, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"",
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+    _descriptor.OneofDescriptor(
+      name='payload', full_name='TranscodeStreamRequest.payload',
+      index=0, containing_type=None,
+      create_key=_descriptor._internal_create_key,
+    fields=[]),
+  ],
+  serialized_start=95,
+  serialized_end=188,
+)
+
 
 _FFMPEGRESPONSE = _descriptor.Descriptor(
   name='FFmpegResponse',
@@ -36,16 +151,514 @@ _FFMPEGRESPONSE = _descriptor.Descriptor(
   create_key=_descriptor._internal_create_key,
   fields=[
     _descriptor.FieldDescriptor(
-      name='log_line', full_name='FFmpegResponse.log_line', index=0,
-      number=1, type=9, cpp_type=9, label=1,
-      has_default_value=False, default_value=b"".decode('utf-8'),
+      name='log_line', full_name='FFmpegResponse.log_line', index=0,
+      number=1, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='exit_status', full_name='FFmpegResponse.exit_status', index=1,
+      number=2, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='log_batch', full_name='FFmpegResponse.log_batch', index=2,
+      number=3, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='progress', full_name='FFmpegResponse.progress', index=3,
+      number=4, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='output_chunk', full_name='FFmpegResponse.output_chunk', index=4,
+      number=5, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"",
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ladder_result', full_name='FFmpegResponse.ladder_result', index=5,
+      number=6, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='resource_sample', full_name='FFmpegResponse.resource_sample', index=6,
+      number=7, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+    _descriptor.OneofDescriptor(
+      name='status', full_name='FFmpegResponse.status',
+      index=0, containing_type=None,
+      create_key=_descriptor._internal_create_key,
+    fields=[]),
+  ],
+  serialized_start=191,
+  serialized_end=444,
+)
+
+
+_LOGBATCH = _descriptor.Descriptor(
+  name='LogBatch',
+  full_name='LogBatch',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='log_lines', full_name='LogBatch.log_lines', index=0,
+      number=1, type=9, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=446,
+  serialized_end=475,
+)
+
+
+_PROGRESS = _descriptor.Descriptor(
+  name='Progress',
+  full_name='Progress',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='frame', full_name='Progress.frame', index=0,
+      number=1, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='fps', full_name='Progress.fps', index=1,
+      number=2, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='bitrate', full_name='Progress.bitrate', index=2,
+      number=3, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='out_time', full_name='Progress.out_time', index=3,
+      number=4, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='speed', full_name='Progress.speed', index=4,
+      number=5, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='total_size', full_name='Progress.total_size', index=5,
+      number=6, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='end', full_name='Progress.end', index=6,
+      number=7, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=478,
+  serialized_end=626,
+)
+
+
+_EXITSTATUS = _descriptor.Descriptor(
+  name='ExitStatus',
+  full_name='ExitStatus',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='exit_code', full_name='ExitStatus.exit_code', index=0,
+      number=1, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='resource_usage', full_name='ExitStatus.resource_usage', index=1,
+      number=2, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='real_time', full_name='ExitStatus.real_time', index=2,
+      number=3, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='cached', full_name='ExitStatus.cached', index=3,
+      number=4, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='resource_samples', full_name='ExitStatus.resource_samples', index=4,
+      number=5, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='preemptions', full_name='ExitStatus.preemptions', index=5,
+      number=6, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=629,
+  serialized_end=826,
+)
+
+
+_RESOURCESAMPLE = _descriptor.Descriptor(
+  name='ResourceSample',
+  full_name='ResourceSample',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='time', full_name='ResourceSample.time', index=0,
+      number=1, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='cpu_percent', full_name='ResourceSample.cpu_percent', index=1,
+      number=2, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='rss', full_name='ResourceSample.rss', index=2,
+      number=3, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='read_bytes', full_name='ResourceSample.read_bytes', index=3,
+      number=4, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='write_bytes', full_name='ResourceSample.write_bytes', index=4,
+      number=5, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='voluntary_context_switches', full_name='ResourceSample.voluntary_context_switches', index=5,
+      number=6, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='involuntary_context_switches', full_name='ResourceSample.involuntary_context_switches', index=6,
+      number=7, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=829,
+  serialized_end=1008,
+)
+
+
+_RESOURCEUSAGE = _descriptor.Descriptor(
+  name='ResourceUsage',
+  full_name='ResourceUsage',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='ru_utime', full_name='ResourceUsage.ru_utime', index=0,
+      number=1, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_stime', full_name='ResourceUsage.ru_stime', index=1,
+      number=2, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_maxrss', full_name='ResourceUsage.ru_maxrss', index=2,
+      number=3, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_ixrss', full_name='ResourceUsage.ru_ixrss', index=3,
+      number=4, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_idrss', full_name='ResourceUsage.ru_idrss', index=4,
+      number=5, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_isrss', full_name='ResourceUsage.ru_isrss', index=5,
+      number=6, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_minflt', full_name='ResourceUsage.ru_minflt', index=6,
+      number=7, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_majflt', full_name='ResourceUsage.ru_majflt', index=7,
+      number=8, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_nswap', full_name='ResourceUsage.ru_nswap', index=8,
+      number=9, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_inblock', full_name='ResourceUsage.ru_inblock', index=9,
+      number=10, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_oublock', full_name='ResourceUsage.ru_oublock', index=10,
+      number=11, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_msgsnd', full_name='ResourceUsage.ru_msgsnd', index=11,
+      number=12, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_msgrcv', full_name='ResourceUsage.ru_msgrcv', index=12,
+      number=13, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_nsignals', full_name='ResourceUsage.ru_nsignals', index=13,
+      number=14, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_nvcsw', full_name='ResourceUsage.ru_nvcsw', index=14,
+      number=15, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='ru_nivcsw', full_name='ResourceUsage.ru_nivcsw', index=15,
+      number=16, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=1011,
+  serialized_end=1327,
+)
+
+
+_FFMPEGREQUEST = _descriptor.Descriptor(
+  name='FFmpegRequest',
+  full_name='FFmpegRequest',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='ffmpeg_arguments', full_name='FFmpegRequest.ffmpeg_arguments', index=0,
+      number=1, type=9, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='exit_status', full_name='FFmpegResponse.exit_status', index=1,
-      number=2, type=11, cpp_type=10, label=1,
-      has_default_value=False, default_value=None,
+      name='batch_log_lines', full_name='FFmpegRequest.batch_log_lines', index=1,
+      number=2, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='report_progress', full_name='FFmpegRequest.report_progress', index=2,
+      number=3, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='progress_only', full_name='FFmpegRequest.progress_only', index=3,
+      number=4, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='segments', full_name='FFmpegRequest.segments', index=4,
+      number=5, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='sample_interval', full_name='FFmpegRequest.sample_interval', index=5,
+      number=6, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='priority', full_name='FFmpegRequest.priority', index=6,
+      number=7, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
@@ -60,51 +673,75 @@ _FFMPEGRESPONSE = _descriptor.Descriptor(
   syntax='proto3',
   extension_ranges=[],
   oneofs=[
-    _descriptor.OneofDescriptor(
-      name='status', full_name='FFmpegResponse.status',
-      index=0, containing_type=None,
-      create_key=_descriptor._internal_create_key,
-    fields=[]),
   ],
-  serialized_start=62,
-  serialized_end=144,
+  serialized_start=1330,
+  serialized_end=1505,
 )
 
 
-_EXITSTATUS = _descriptor.Descriptor(
-  name='ExitStatus',
-  full_name='ExitStatus',
+_JOBSTATE = _descriptor.Descriptor(
+  name='JobState',
+  full_name='JobState',
   filename=None,
   file=DESCRIPTOR,
   containing_type=None,
   create_key=_descriptor._internal_create_key,
   fields=[
     _descriptor.FieldDescriptor(
-      name='exit_code', full_name='ExitStatus.exit_code', index=0,
-      number=1, type=5, cpp_type=1, label=1,
+      name='name', full_name='JobState.name', index=0,
+      number=1, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='state', full_name='JobState.state', index=1,
+      number=2, type=14, cpp_type=8, label=1,
       has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='resource_usage', full_name='ExitStatus.resource_usage', index=1,
-      number=2, type=11, cpp_type=10, label=1,
+      name='exit_status', full_name='JobState.exit_status', index=2,
+      number=3, type=11, cpp_type=10, label=1,
       has_default_value=False, default_value=None,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='real_time', full_name='ExitStatus.real_time', index=2,
-      number=3, type=11, cpp_type=10, label=1,
+      name='enqueue_time', full_name='JobState.enqueue_time', index=3,
+      number=4, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='start_time', full_name='JobState.start_time', index=4,
+      number=5, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='end_time', full_name='JobState.end_time', index=5,
+      number=6, type=11, cpp_type=10, label=1,
       has_default_value=False, default_value=None,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='log_tail', full_name='JobState.log_tail', index=6,
+      number=7, type=9, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
   ],
   extensions=[
   ],
   nested_types=[],
   enum_types=[
+    _JOBSTATE_STATE,
   ],
   serialized_options=None,
   is_extendable=False,
@@ -112,127 +749,241 @@ _EXITSTATUS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=146,
-  serialized_end=263,
+  serialized_start=1508,
+  serialized_end=1844,
 )
 
 
-_RESOURCEUSAGE = _descriptor.Descriptor(
-  name='ResourceUsage',
-  full_name='ResourceUsage',
+_LADDERREQUEST = _descriptor.Descriptor(
+  name='LadderRequest',
+  full_name='LadderRequest',
   filename=None,
   file=DESCRIPTOR,
   containing_type=None,
   create_key=_descriptor._internal_create_key,
   fields=[
     _descriptor.FieldDescriptor(
-      name='ru_utime', full_name='ResourceUsage.ru_utime', index=0,
-      number=1, type=2, cpp_type=6, label=1,
-      has_default_value=False, default_value=float(0),
+      name='input', full_name='LadderRequest.input', index=0,
+      number=1, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_stime', full_name='ResourceUsage.ru_stime', index=1,
-      number=2, type=2, cpp_type=6, label=1,
-      has_default_value=False, default_value=float(0),
+      name='renditions', full_name='LadderRequest.renditions', index=1,
+      number=2, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_maxrss', full_name='ResourceUsage.ru_maxrss', index=2,
-      number=3, type=3, cpp_type=2, label=1,
+      name='packaging', full_name='LadderRequest.packaging', index=2,
+      number=3, type=14, cpp_type=8, label=1,
       has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_ixrss', full_name='ResourceUsage.ru_ixrss', index=3,
-      number=4, type=3, cpp_type=2, label=1,
-      has_default_value=False, default_value=0,
+      name='manifest', full_name='LadderRequest.manifest', index=3,
+      number=4, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_idrss', full_name='ResourceUsage.ru_idrss', index=4,
-      number=5, type=3, cpp_type=2, label=1,
+      name='segment_seconds', full_name='LadderRequest.segment_seconds', index=4,
+      number=5, type=5, cpp_type=1, label=1,
       has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_isrss', full_name='ResourceUsage.ru_isrss', index=5,
-      number=6, type=3, cpp_type=2, label=1,
-      has_default_value=False, default_value=0,
+      name='audio_codec', full_name='LadderRequest.audio_codec', index=5,
+      number=6, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_minflt', full_name='ResourceUsage.ru_minflt', index=6,
-      number=7, type=3, cpp_type=2, label=1,
+      name='audio_bitrate', full_name='LadderRequest.audio_bitrate', index=6,
+      number=7, type=5, cpp_type=1, label=1,
       has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_majflt', full_name='ResourceUsage.ru_majflt', index=7,
-      number=8, type=3, cpp_type=2, label=1,
-      has_default_value=False, default_value=0,
+      name='batch_log_lines', full_name='LadderRequest.batch_log_lines', index=7,
+      number=8, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_nswap', full_name='ResourceUsage.ru_nswap', index=8,
-      number=9, type=3, cpp_type=2, label=1,
-      has_default_value=False, default_value=0,
+      name='report_progress', full_name='LadderRequest.report_progress', index=8,
+      number=9, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_inblock', full_name='ResourceUsage.ru_inblock', index=9,
-      number=10, type=3, cpp_type=2, label=1,
+      name='progress_only', full_name='LadderRequest.progress_only', index=9,
+      number=10, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='sample_interval', full_name='LadderRequest.sample_interval', index=10,
+      number=11, type=2, cpp_type=6, label=1,
+      has_default_value=False, default_value=float(0),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='priority', full_name='LadderRequest.priority', index=11,
+      number=12, type=5, cpp_type=1, label=1,
       has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+    _LADDERREQUEST_PACKAGING,
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=1847,
+  serialized_end=2199,
+)
+
+
+_RENDITION = _descriptor.Descriptor(
+  name='Rendition',
+  full_name='Rendition',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='name', full_name='Rendition.name', index=0,
+      number=1, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_oublock', full_name='ResourceUsage.ru_oublock', index=10,
-      number=11, type=3, cpp_type=2, label=1,
+      name='width', full_name='Rendition.width', index=1,
+      number=2, type=5, cpp_type=1, label=1,
       has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_msgsnd', full_name='ResourceUsage.ru_msgsnd', index=11,
-      number=12, type=3, cpp_type=2, label=1,
+      name='height', full_name='Rendition.height', index=2,
+      number=3, type=5, cpp_type=1, label=1,
       has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_msgrcv', full_name='ResourceUsage.ru_msgrcv', index=12,
-      number=13, type=3, cpp_type=2, label=1,
+      name='video_codec', full_name='Rendition.video_codec', index=3,
+      number=4, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='video_bitrate', full_name='Rendition.video_bitrate', index=4,
+      number=5, type=5, cpp_type=1, label=1,
       has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_nsignals', full_name='ResourceUsage.ru_nsignals', index=13,
-      number=14, type=3, cpp_type=2, label=1,
+      name='crf', full_name='Rendition.crf', index=5,
+      number=6, type=5, cpp_type=1, label=1,
       has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_nvcsw', full_name='ResourceUsage.ru_nvcsw', index=14,
-      number=15, type=3, cpp_type=2, label=1,
+      name='preset', full_name='Rendition.preset', index=6,
+      number=7, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='output', full_name='Rendition.output', index=7,
+      number=8, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='output_arguments', full_name='Rendition.output_arguments', index=8,
+      number=9, type=9, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=2202,
+  serialized_end=2373,
+)
+
+
+_LADDERRESULT_RENDITIONRESULT = _descriptor.Descriptor(
+  name='RenditionResult',
+  full_name='LadderResult.RenditionResult',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='name', full_name='LadderResult.RenditionResult.name', index=0,
+      number=1, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='output', full_name='LadderResult.RenditionResult.output', index=1,
+      number=2, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='size', full_name='LadderResult.RenditionResult.size', index=2,
+      number=3, type=3, cpp_type=2, label=1,
       has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
     _descriptor.FieldDescriptor(
-      name='ru_nivcsw', full_name='ResourceUsage.ru_nivcsw', index=15,
-      number=16, type=3, cpp_type=2, label=1,
+      name='files', full_name='LadderResult.RenditionResult.files', index=3,
+      number=4, type=5, cpp_type=1, label=1,
       has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
@@ -249,22 +1000,21 @@ _RESOURCEUSAGE = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=266,
-  serialized_end=582,
+  serialized_start=2443,
+  serialized_end=2519,
 )
 
-
-_FFMPEGREQUEST = _descriptor.Descriptor(
-  name='FFmpegRequest',
-  full_name='FFmpegRequest',
+_LADDERRESULT = _descriptor.Descriptor(
+  name='LadderResult',
+  full_name='LadderResult',
   filename=None,
   file=DESCRIPTOR,
   containing_type=None,
   create_key=_descriptor._internal_create_key,
   fields=[
     _descriptor.FieldDescriptor(
-      name='ffmpeg_arguments', full_name='FFmpegRequest.ffmpeg_arguments', index=0,
-      number=1, type=9, cpp_type=9, label=3,
+      name='renditions', full_name='LadderResult.renditions', index=0,
+      number=1, type=11, cpp_type=10, label=3,
       has_default_value=False, default_value=[],
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
@@ -272,7 +1022,7 @@ _FFMPEGREQUEST = _descriptor.Descriptor(
   ],
   extensions=[
   ],
-  nested_types=[],
+  nested_types=[_LADDERRESULT_RENDITIONRESULT, ],
   enum_types=[
   ],
   serialized_options=None,
@@ -281,25 +1031,79 @@ _FFMPEGREQUEST = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=584,
-  serialized_end=625,
+  serialized_start=2376,
+  serialized_end=2519,
 )
 
+_TRANSCODESTREAMREQUEST.fields_by_name['request'].message_type = _FFMPEGREQUEST
+_TRANSCODESTREAMREQUEST.oneofs_by_name['payload'].fields.append(
+  _TRANSCODESTREAMREQUEST.fields_by_name['request'])
+_TRANSCODESTREAMREQUEST.fields_by_name['request'].containing_oneof = _TRANSCODESTREAMREQUEST.oneofs_by_name['payload']
+_TRANSCODESTREAMREQUEST.oneofs_by_name['payload'].fields.append(
+  _TRANSCODESTREAMREQUEST.fields_by_name['input_chunk'])
+_TRANSCODESTREAMREQUEST.fields_by_name['input_chunk'].containing_oneof = _TRANSCODESTREAMREQUEST.oneofs_by_name['payload']
 _FFMPEGRESPONSE.fields_by_name['exit_status'].message_type = _EXITSTATUS
+_FFMPEGRESPONSE.fields_by_name['log_batch'].message_type = _LOGBATCH
+_FFMPEGRESPONSE.fields_by_name['progress'].message_type = _PROGRESS
+_FFMPEGRESPONSE.fields_by_name['ladder_result'].message_type = _LADDERRESULT
+_FFMPEGRESPONSE.fields_by_name['resource_sample'].message_type = _RESOURCESAMPLE
 _FFMPEGRESPONSE.oneofs_by_name['status'].fields.append(
   _FFMPEGRESPONSE.fields_by_name['log_line'])
 _FFMPEGRESPONSE.fields_by_name['log_line'].containing_oneof = _FFMPEGRESPONSE.oneofs_by_name['status']
 _FFMPEGRESPONSE.oneofs_by_name['status'].fields.append(
   _FFMPEGRESPONSE.fields_by_name['exit_status'])
 _FFMPEGRESPONSE.fields_by_name['exit_status'].containing_oneof = _FFMPEGRESPONSE.oneofs_by_name['status']
+_FFMPEGRESPONSE.oneofs_by_name['status'].fields.append(
+  _FFMPEGRESPONSE.fields_by_name['log_batch'])
+_FFMPEGRESPONSE.fields_by_name['log_batch'].containing_oneof = _FFMPEGRESPONSE.oneofs_by_name['status']
+_FFMPEGRESPONSE.oneofs_by_name['status'].fields.append(
+  _FFMPEGRESPONSE.fields_by_name['progress'])
+_FFMPEGRESPONSE.fields_by_name['progress'].containing_oneof = _FFMPEGRESPONSE.oneofs_by_name['status']
+_FFMPEGRESPONSE.oneofs_by_name['status'].fields.append(
+  _FFMPEGRESPONSE.fields_by_name['output_chunk'])
+_FFMPEGRESPONSE.fields_by_name['output_chunk'].containing_oneof = _FFMPEGRESPONSE.oneofs_by_name['status']
+_FFMPEGRESPONSE.oneofs_by_name['status'].fields.append(
+  _FFMPEGRESPONSE.fields_by_name['ladder_result'])
+_FFMPEGRESPONSE.fields_by_name['ladder_result'].containing_oneof = _FFMPEGRESPONSE.oneofs_by_name['status']
+_FFMPEGRESPONSE.oneofs_by_name['status'].fields.append(
+  _FFMPEGRESPONSE.fields_by_name['resource_sample'])
+_FFMPEGRESPONSE.fields_by_name['resource_sample'].containing_oneof = _FFMPEGRESPONSE.oneofs_by_name['status']
+_PROGRESS.fields_by_name['out_time'].message_type = google_dot_protobuf_dot_duration__pb2._DURATION
 _EXITSTATUS.fields_by_name['resource_usage'].message_type = _RESOURCEUSAGE
 _EXITSTATUS.fields_by_name['real_time'].message_type = google_dot_protobuf_dot_duration__pb2._DURATION
+_EXITSTATUS.fields_by_name['resource_samples'].message_type = _RESOURCESAMPLE
+_JOBSTATE.fields_by_name['state'].enum_type = _JOBSTATE_STATE
+_JOBSTATE.fields_by_name['exit_status'].message_type = _EXITSTATUS
+_JOBSTATE.fields_by_name['enqueue_time'].message_type = google_dot_protobuf_dot_timestamp__pb2._TIMESTAMP
+_JOBSTATE.fields_by_name['start_time'].message_type = google_dot_protobuf_dot_timestamp__pb2._TIMESTAMP
+_JOBSTATE.fields_by_name['end_time'].message_type = google_dot_protobuf_dot_timestamp__pb2._TIMESTAMP
+_JOBSTATE_STATE.containing_type = _JOBSTATE
+_LADDERREQUEST.fields_by_name['renditions'].message_type = _RENDITION
+_LADDERREQUEST.fields_by_name['packaging'].enum_type = _LADDERREQUEST_PACKAGING
+_LADDERREQUEST_PACKAGING.containing_type = _LADDERREQUEST
+_LADDERRESULT_RENDITIONRESULT.containing_type = _LADDERRESULT
+_LADDERRESULT.fields_by_name['renditions'].message_type = _LADDERRESULT_RENDITIONRESULT
+DESCRIPTOR.message_types_by_name['TranscodeStreamRequest'] = _TRANSCODESTREAMREQUEST
 DESCRIPTOR.message_types_by_name['FFmpegResponse'] = _FFMPEGRESPONSE
+DESCRIPTOR.message_types_by_name['LogBatch'] = _LOGBATCH
+DESCRIPTOR.message_types_by_name['Progress'] = _PROGRESS
 DESCRIPTOR.message_types_by_name['ExitStatus'] = _EXITSTATUS
+DESCRIPTOR.message_types_by_name['ResourceSample'] = _RESOURCESAMPLE
 DESCRIPTOR.message_types_by_name['ResourceUsage'] = _RESOURCEUSAGE
 DESCRIPTOR.message_types_by_name['FFmpegRequest'] = _FFMPEGREQUEST
+DESCRIPTOR.message_types_by_name['JobState'] = _JOBSTATE
+DESCRIPTOR.message_types_by_name['LadderRequest'] = _LADDERREQUEST
+DESCRIPTOR.message_types_by_name['Rendition'] = _RENDITION
+DESCRIPTOR.message_types_by_name['LadderResult'] = _LADDERRESULT
 _sym_db.RegisterFileDescriptor(DESCRIPTOR)
 
+TranscodeStreamRequest = _reflection.GeneratedProtocolMessageType('TranscodeStreamRequest', (_message.Message,), {
+  'DESCRIPTOR' : _TRANSCODESTREAMREQUEST,
+  '__module__' : 'worker.ffmpeg_worker_pb2'
+  # @@protoc_insertion_point(class_scope:TranscodeStreamRequest)
+  })
+_sym_db.RegisterMessage(TranscodeStreamRequest)
+
 FFmpegResponse = _reflection.GeneratedProtocolMessageType('FFmpegResponse', (_message.Message,), {
   'DESCRIPTOR' : _FFMPEGRESPONSE,
   '__module__' : 'worker.ffmpeg_worker_pb2'
@@ -307,6 +1111,20 @@ FFmpegResponse = _reflection.GeneratedProtocolMessageType('FFmpegResponse', (_me
   })
 _sym_db.RegisterMessage(FFmpegResponse)
 
+LogBatch = _reflection.GeneratedProtocolMessageType('LogBatch', (_message.Message,), {
+  'DESCRIPTOR' : _LOGBATCH,
+  '__module__' : 'worker.ffmpeg_worker_pb2'
+  # @@protoc_insertion_point(class_scope:LogBatch)
+  })
+_sym_db.RegisterMessage(LogBatch)
+
+Progress = _reflection.GeneratedProtocolMessageType('Progress', (_message.Message,), {
+  'DESCRIPTOR' : _PROGRESS,
+  '__module__' : 'worker.ffmpeg_worker_pb2'
+  # @@protoc_insertion_point(class_scope:Progress)
+  })
+_sym_db.RegisterMessage(Progress)
+
 ExitStatus = _reflection.GeneratedProtocolMessageType('ExitStatus', (_message.Message,), {
   'DESCRIPTOR' : _EXITSTATUS,
   '__module__' : 'worker.ffmpeg_worker_pb2'
@@ -314,6 +1132,13 @@ ExitStatus = _reflection.GeneratedProtocolMessageType('ExitStatus', (_message.Me
   })
 _sym_db.RegisterMessage(ExitStatus)
 
+ResourceSample = _reflection.GeneratedProtocolMessageType('ResourceSample', (_message.Message,), {
+  'DESCRIPTOR' : _RESOURCESAMPLE,
+  '__module__' : 'worker.ffmpeg_worker_pb2'
+  # @@protoc_insertion_point(class_scope:ResourceSample)
+  })
+_sym_db.RegisterMessage(ResourceSample)
+
 ResourceUsage = _reflection.GeneratedProtocolMessageType('ResourceUsage', (_message.Message,), {
   'DESCRIPTOR' : _RESOURCEUSAGE,
   '__module__' : 'worker.ffmpeg_worker_pb2'
@@ -328,6 +1153,42 @@ FFmpegRequest = _reflection.GeneratedProtocolMessageType('FFmpegRequest', (_mess
   })
 _sym_db.RegisterMessage(FFmpegRequest)
 
+JobState = _reflection.GeneratedProtocolMessageType('JobState', (_message.Message,), {
+  'DESCRIPTOR' : _JOBSTATE,
+  '__module__' : 'worker.ffmpeg_worker_pb2'
+  # @@protoc_insertion_point(class_scope:JobState)
+  })
+_sym_db.RegisterMessage(JobState)
+
+LadderRequest = _reflection.GeneratedProtocolMessageType('LadderRequest', (_message.Message,), {
+  'DESCRIPTOR' : _LADDERREQUEST,
+  '__module__' : 'worker.ffmpeg_worker_pb2'
+  # @@protoc_insertion_point(class_scope:LadderRequest)
+  })
+_sym_db.RegisterMessage(LadderRequest)
+
+Rendition = _reflection.GeneratedProtocolMessageType('Rendition', (_message.Message,), {
+  'DESCRIPTOR' : _RENDITION,
+  '__module__' : 'worker.ffmpeg_worker_pb2'
+  # @@protoc_insertion_point(class_scope:Rendition)
+  })
+_sym_db.RegisterMessage(Rendition)
+
+LadderResult = _reflection.GeneratedProtocolMessageType('LadderResult', (_message.Message,), {
+
+  'RenditionResult' : _reflection.GeneratedProtocolMessageType('RenditionResult', (_message.Message,), {
+    'DESCRIPTOR' : _LADDERRESULT_RENDITIONRESULT,
+    '__module__' : 'worker.ffmpeg_worker_pb2'
+    # @@protoc_insertion_point(class_scope:LadderResult.RenditionResult)
+    })
+  ,
+  'DESCRIPTOR' : _LADDERRESULT,
+  '__module__' : 'worker.ffmpeg_worker_pb2'
+  # @@protoc_insertion_point(class_scope:LadderResult)
+  })
+_sym_db.RegisterMessage(LadderResult)
+_sym_db.RegisterMessage(LadderResult.RenditionResult)
+
 
 
 _FFMPEG = _descriptor.ServiceDescriptor(
@@ -337,8 +1198,8 @@ _FFMPEG = _descriptor.ServiceDescriptor(
   index=0,
   serialized_options=None,
   create_key=_descriptor._internal_create_key,
-  serialized_start=627,
-  serialized_end=685,
+  serialized_start=2522,
+  serialized_end=2703,
   methods=[
   _descriptor.MethodDescriptor(
     name='transcode',
@@ -350,6 +1211,26 @@ _FFMPEG = _descriptor.ServiceDescriptor(
     serialized_options=None,
     create_key=_descriptor._internal_create_key,
   ),
+  _descriptor.MethodDescriptor(
+    name='transcodeStream',
+    full_name='FFmpeg.transcodeStream',
+    index=1,
+    containing_service=None,
+    input_type=_TRANSCODESTREAMREQUEST,
+    output_type=_FFMPEGRESPONSE,
+    serialized_options=None,
+    create_key=_descriptor._internal_create_key,
+  ),
+  _descriptor.MethodDescriptor(
+    name='transcodeLadder',
+    full_name='FFmpeg.transcodeLadder',
+    index=2,
+    containing_service=None,
+    input_type=_LADDERREQUEST,
+    output_type=_FFMPEGRESPONSE,
+    serialized_options=None,
+    create_key=_descriptor._internal_create_key,
+  ),
 ])
 _sym_db.RegisterServiceDescriptor(_FFMPEG)
 
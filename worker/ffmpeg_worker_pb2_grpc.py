@@ -19,6 +19,16 @@ class FFmpegStub(object):
                 request_serializer=worker_dot_ffmpeg__worker__pb2.FFmpegRequest.SerializeToString,
                 response_deserializer=worker_dot_ffmpeg__worker__pb2.FFmpegResponse.FromString,
                 )
+        self.transcodeStream = channel.stream_stream(
+                '/FFmpeg/transcodeStream',
+                request_serializer=worker_dot_ffmpeg__worker__pb2.TranscodeStreamRequest.SerializeToString,
+                response_deserializer=worker_dot_ffmpeg__worker__pb2.FFmpegResponse.FromString,
+                )
+        self.transcodeLadder = channel.unary_stream(
+                '/FFmpeg/transcodeLadder',
+                request_serializer=worker_dot_ffmpeg__worker__pb2.LadderRequest.SerializeToString,
+                response_deserializer=worker_dot_ffmpeg__worker__pb2.FFmpegResponse.FromString,
+                )
 
 
 class FFmpegServicer(object):
@@ -30,6 +40,24 @@ class FFmpegServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def transcodeStream(self, request_iterator, context):
+        """Runs ffmpeg on input sent in the request stream, and sends its output
+        back in the response stream along with its log and progress. The input
+        is piped to ffmpeg's stdin and the output is read from its stdout, so the
+        command reads its input from pipe:0 and writes its output to pipe:1.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def transcodeLadder(self, request, context):
+        """Encodes one input into several renditions with a single ffmpeg process,
+        which decodes the input once and scales it for every rendition.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_FFmpegServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -38,6 +66,16 @@ def add_FFmpegServicer_to_server(servicer, server):
                     request_deserializer=worker_dot_ffmpeg__worker__pb2.FFmpegRequest.FromString,
                     response_serializer=worker_dot_ffmpeg__worker__pb2.FFmpegResponse.SerializeToString,
             ),
+            'transcodeStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.transcodeStream,
+                    request_deserializer=worker_dot_ffmpeg__worker__pb2.TranscodeStreamRequest.FromString,
+                    response_serializer=worker_dot_ffmpeg__worker__pb2.FFmpegResponse.SerializeToString,
+            ),
+            'transcodeLadder': grpc.unary_stream_rpc_method_handler(
+                    servicer.transcodeLadder,
+                    request_deserializer=worker_dot_ffmpeg__worker__pb2.LadderRequest.FromString,
+                    response_serializer=worker_dot_ffmpeg__worker__pb2.FFmpegResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'FFmpeg', rpc_method_handlers)
@@ -63,3 +101,35 @@ class FFmpeg(object):
             worker_dot_ffmpeg__worker__pb2.FFmpegResponse.FromString,
             options, channel_credentials,
             call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def transcodeStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(request_iterator, target, '/FFmpeg/transcodeStream',
+            worker_dot_ffmpeg__worker__pb2.TranscodeStreamRequest.SerializeToString,
+            worker_dot_ffmpeg__worker__pb2.FFmpegResponse.FromString,
+            options, channel_credentials,
+            call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def transcodeLadder(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/FFmpeg/transcodeLadder',
+            worker_dot_ffmpeg__worker__pb2.LadderRequest.SerializeToString,
+            worker_dot_ffmpeg__worker__pb2.FFmpegResponse.FromString,
+            options, channel_credentials,
+            call_credentials, compression, wait_for_ready, timeout, metadata)
@@ -0,0 +1,575 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the FFmpeg worker.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.ffmpeg_worker_test
+"""
+
+import asyncio
+from concurrent import futures
+import os
+import signal
+import stat
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import grpc
+from grpc import aio
+
+from worker import ffmpeg_worker
+from worker import ffmpeg_worker_pb2_grpc
+from worker import segmenter
+from worker.ffmpeg_worker_pb2 import ExitStatus
+from worker.ffmpeg_worker_pb2 import FFmpegRequest
+from worker.ffmpeg_worker_pb2 import JobState
+from worker.ffmpeg_worker_pb2 import LadderRequest
+from worker.ffmpeg_worker_pb2 import TranscodeStreamRequest
+from worker.job_queue import PullQueue
+from worker.job_state import SqliteJobStateStore
+from worker.preemption import Preemptor
+from worker.preemption import REQUEUE
+from worker.preemption import SUSPEND
+from worker.scheduler import SlotScheduler
+
+# Writes a line to the runs file, then a few log lines, and fails.
+_FAKE_FFMPEG = """#!/bin/sh
+echo run >> {runs}
+for i in 1 2 3 4 5; do echo "line $i"; sleep 0.2; done
+exit 3
+"""
+_REQUEST = FFmpegRequest(ffmpeg_arguments=['-i', 'missing.mp4', 'out.mp4'])
+_METADATA = (('idempotency-key', 'key'),)
+
+
+def _log_lines(responses):
+    return [
+        response.log_line
+        for response in responses
+        if response.HasField('log_line')
+    ]
+
+
+def _exit_statuses(responses):
+    return [
+        response.exit_status
+        for response in responses
+        if response.HasField('exit_status')
+    ]
+
+
+class LineReaderTest(unittest.TestCase):
+    """Lines read from ffmpeg's output as it arrives in chunks."""
+
+    def read(self, chunks):
+        """Returns the lines read after each chunk is written, and at EOF."""
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        reader = ffmpeg_worker.LineReader(read_fd)
+        lines = []
+        for chunk in chunks:
+            os.write(write_fd, chunk)
+            lines.append(reader.read_lines())
+        os.close(write_fd)
+        lines.append(reader.read_lines())
+        self.assertTrue(reader.eof)
+        return lines
+
+    def test_splits_on_carriage_returns_and_newlines(self):
+        self.assertEqual(self.read([b'frame=1\rframe=2\r\nend\npart']),
+                         [['frame=1\n', 'frame=2\n', 'end\n'], ['part\n']])
+
+    def test_partial_lines_are_joined(self):
+        self.assertEqual(self.read([b'fra', b'me=1\r', b'x']),
+                         [[], ['frame=1\n'], [], ['x\n']])
+
+    def test_split_carriage_return_newline(self):
+        self.assertEqual(self.read([b'frame=1\r', b'\n']),
+                         [['frame=1\n'], [], []])
+
+    def test_split_carriage_return_newline_before_partial_line(self):
+        self.assertEqual(self.read([b'frame=1\r', b'\nab', b'c\n']),
+                         [['frame=1\n'], [], ['abc\n'], []])
+
+
+class LogBatcherTest(unittest.TestCase):
+    """Log lines grouped into batches."""
+
+    def test_full_batch_is_sent(self):
+        batcher = ffmpeg_worker.LogBatcher(3, 60)
+        self.assertEqual(batcher.add(['a\n', 'b\n']), [])
+        self.assertEqual(batcher.add(['c\n', 'd\n']),
+                         ['a\n', 'b\n', 'c\n', 'd\n'])
+        self.assertEqual(batcher.flush(), [])
+
+    def test_old_lines_are_sent(self):
+        batcher = ffmpeg_worker.LogBatcher(10, 0.25)
+        with mock.patch.object(ffmpeg_worker.time, 'monotonic',
+                               return_value=100.0) as monotonic:
+            self.assertEqual(batcher.add(['a\n']), [])
+            monotonic.return_value = 100.1
+            self.assertEqual(batcher.add([]), [])
+            monotonic.return_value = 100.25
+            self.assertEqual(batcher.add([]), ['a\n'])
+            # The delay starts again with the next line.
+            self.assertEqual(batcher.add([]), [])
+            self.assertEqual(batcher.add(['b\n']), [])
+        self.assertEqual(batcher.flush(), ['b\n'])
+
+
+class _FakeFFmpegTest(unittest.TestCase):
+    """Runs the fake ffmpeg in place of FFMPEG_BINARY."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.runs = os.path.join(directory.name, 'runs')
+        binary = os.path.join(directory.name, 'ffmpeg')
+        with open(binary, 'w') as binary_file:
+            binary_file.write(_FAKE_FFMPEG.format(runs=self.runs))
+        os.chmod(binary, stat.S_IRWXU)
+        patcher = mock.patch.object(ffmpeg_worker, 'FFMPEG_BINARY', binary)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class ProcessTest(_FakeFFmpegTest):
+
+    def test_terminate_collects_exit_status(self):
+        process = ffmpeg_worker.Process([ffmpeg_worker.FFMPEG_BINARY])
+        for lines in process:
+            if lines:
+                process.terminate()
+                break
+        self.assertTrue(os.WIFSIGNALED(process.returncode))
+        self.assertEqual(os.WTERMSIG(process.returncode), signal.SIGTERM)
+        self.assertIsNotNone(process.rusage)
+
+
+class IdempotencyKeyTest(_FakeFFmpegTest):
+    """Attempts of a request sent with the same idempotency key."""
+
+    def assert_shared_run(self, first, second):
+        with open(self.runs) as runs_file:
+            self.assertEqual(runs_file.read(), 'run\n')
+        self.assertEqual(_log_lines(first),
+                         [f'line {index}\n' for index in range(1, 6)])
+        self.assertEqual(_log_lines(second), _log_lines(first))
+        self.assertEqual(len(_exit_statuses(first)), 1)
+        self.assertEqual(_exit_statuses(second), _exit_statuses(first))
+        self.assertEqual(_exit_statuses(first)[0].exit_code, 3 << 8)
+
+    def test_running_attempt_is_shared(self):
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        ffmpeg_worker_pb2_grpc.add_FFmpegServicer_to_server(
+            ffmpeg_worker.FFmpegServicer(SlotScheduler(2, 10)), server)
+        port = server.add_insecure_port('127.0.0.1:0')
+        server.start()
+        self.addCleanup(server.stop, None)
+        with grpc.insecure_channel(f'127.0.0.1:{port}') as channel:
+            stub = ffmpeg_worker_pb2_grpc.FFmpegStub(channel)
+            first_call = stub.transcode(_REQUEST, metadata=_METADATA)
+            first = [next(first_call)]
+            second = list(stub.transcode(_REQUEST, metadata=_METADATA))
+            first.extend(first_call)
+        self.assert_shared_run(first, second)
+
+    def test_running_attempt_is_shared_with_asyncio(self):
+
+        async def transcode():
+            server = aio.server()
+            ffmpeg_worker_pb2_grpc.add_FFmpegServicer_to_server(
+                ffmpeg_worker.AioFFmpegServicer(SlotScheduler(2, 10)), server)
+            port = server.add_insecure_port('127.0.0.1:0')
+            await server.start()
+            try:
+                async with aio.insecure_channel(
+                        f'127.0.0.1:{port}') as channel:
+                    stub = ffmpeg_worker_pb2_grpc.FFmpegStub(channel)
+                    first_call = stub.transcode(_REQUEST, metadata=_METADATA)
+                    first = [await first_call.read()]
+                    second = [
+                        response async for response in stub.transcode(
+                            _REQUEST, metadata=_METADATA)
+                    ]
+                    response = await first_call.read()
+                    while response is not aio.EOF:
+                        first.append(response)
+                        response = await first_call.read()
+            finally:
+                await server.stop(None)
+            return first, second
+
+        self.assert_shared_run(*asyncio.run(transcode()))
+
+
+class AbortTest(unittest.TestCase):
+    """Requests that both servicers reject before running ffmpeg."""
+
+    _MESSAGES = (TranscodeStreamRequest(input_chunk=b'data'),)
+
+    def test_stream_without_request_is_rejected(self):
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+        ffmpeg_worker_pb2_grpc.add_FFmpegServicer_to_server(
+            ffmpeg_worker.FFmpegServicer(SlotScheduler(1, 0)), server)
+        port = server.add_insecure_port('127.0.0.1:0')
+        server.start()
+        self.addCleanup(server.stop, None)
+        with grpc.insecure_channel(f'127.0.0.1:{port}') as channel:
+            call = ffmpeg_worker_pb2_grpc.FFmpegStub(channel).transcodeStream(
+                iter(self._MESSAGES))
+            with self.assertRaises(grpc.RpcError):
+                list(call)
+        self.assertEqual(call.code(), grpc.StatusCode.INVALID_ARGUMENT)
+
+    def test_invalid_ladder_is_rejected(self):
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+        ffmpeg_worker_pb2_grpc.add_FFmpegServicer_to_server(
+            ffmpeg_worker.FFmpegServicer(SlotScheduler(1, 0)), server)
+        port = server.add_insecure_port('127.0.0.1:0')
+        server.start()
+        self.addCleanup(server.stop, None)
+        with grpc.insecure_channel(f'127.0.0.1:{port}') as channel:
+            call = ffmpeg_worker_pb2_grpc.FFmpegStub(channel).transcodeLadder(
+                LadderRequest(input='in.mp4'))
+            with self.assertRaises(grpc.RpcError):
+                list(call)
+        self.assertEqual(call.code(), grpc.StatusCode.INVALID_ARGUMENT)
+        self.assertEqual(call.details(), 'The ladder has no renditions.')
+
+    def test_stream_without_request_is_rejected_with_asyncio(self):
+
+        async def transcode_stream():
+            server = aio.server()
+            ffmpeg_worker_pb2_grpc.add_FFmpegServicer_to_server(
+                ffmpeg_worker.AioFFmpegServicer(SlotScheduler(1, 0)), server)
+            port = server.add_insecure_port('127.0.0.1:0')
+            await server.start()
+            try:
+                async with aio.insecure_channel(
+                        f'127.0.0.1:{port}') as channel:
+                    call = ffmpeg_worker_pb2_grpc.FFmpegStub(
+                        channel).transcodeStream(iter(self._MESSAGES))
+                    with self.assertRaises(aio.AioRpcError):
+                        await call.read()
+                    return await call.code()
+            finally:
+                await server.stop(None)
+
+        self.assertEqual(asyncio.run(transcode_stream()),
+                         grpc.StatusCode.INVALID_ARGUMENT)
+
+
+class RequestMetricsTest(_FakeFFmpegTest):
+    """Metrics recorded as requests are served."""
+
+    def values(self):
+        durations = dict(ffmpeg_worker._REQUEST_DURATION.samples())
+        return (ffmpeg_worker._REQUESTS_IN_FLIGHT.value(),
+                durations['ffmpeg_worker_request_duration_seconds_count'],
+                ffmpeg_worker._LOG_LINES.value(),
+                ffmpeg_worker._LOG_BYTES.value(),
+                ffmpeg_worker._CANCELLATIONS.value())
+
+    def test_finished_and_cancelled_requests(self):
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        ffmpeg_worker_pb2_grpc.add_FFmpegServicer_to_server(
+            ffmpeg_worker.FFmpegServicer(SlotScheduler(2, 10)), server)
+        port = server.add_insecure_port('127.0.0.1:0')
+        server.start()
+        self.addCleanup(server.stop, None)
+        before = self.values()
+        with grpc.insecure_channel(f'127.0.0.1:{port}') as channel:
+            stub = ffmpeg_worker_pb2_grpc.FFmpegStub(channel)
+            list(stub.transcode(_REQUEST))
+            finished = self.values()
+            call = stub.transcode(_REQUEST)
+            next(call)
+            self.assertEqual(self.values()[0], before[0] + 1)
+            call.cancel()
+        while self.values()[1] == finished[1]:
+            threading.Event().wait(0.01)
+        self.assertEqual(
+            [after - value for after, value in zip(finished, before)],
+            [0, 1, 5, 35, 0])
+        cancelled = [
+            after - value for after, value in zip(self.values(), finished)
+        ]
+        # Lines may be counted until the cancellation reaches the server.
+        self.assertEqual(cancelled[:2] + cancelled[4:], [0, 1, 1])
+        self.assertGreaterEqual(cancelled[2], 1)
+
+
+class BatchLogLinesTest(_FakeFFmpegTest):
+    """Requests that ask for their log lines in batches."""
+
+    def test_lines_are_batched(self):
+        for name, value in (('_LOG_BATCH_SIZE', 2), ('_LOG_BATCH_DELAY', 60)):
+            patcher = mock.patch.object(ffmpeg_worker, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        servicer = ffmpeg_worker.FFmpegServicer(SlotScheduler(1, 0))
+        context = mock.Mock()
+        context.invocation_metadata.return_value = ()
+        responses = list(
+            servicer.transcode(
+                FFmpegRequest(ffmpeg_arguments=_REQUEST.ffmpeg_arguments,
+                              batch_log_lines=True), context))
+        self.assertEqual(
+            [list(response.log_batch.log_lines) for response in responses
+             if response.HasField('log_batch')],
+            [['line 1\n', 'line 2\n'], ['line 3\n', 'line 4\n'],
+             ['line 5\n']])
+        self.assertEqual(_log_lines(responses), [])
+        self.assertEqual(_exit_statuses(responses)[0].exit_code, 3 << 8)
+
+
+# Writes a progress report to the pipe of -progress, which comes first.
+_PROGRESS_FFMPEG = """#!/bin/sh
+echo log line
+fd=${2#pipe:}
+printf 'frame=10\\nfps=N/A\\nbitrate= 512.0kbits/s\\n' >&$fd
+printf 'out_time_us=2000000\\nspeed=1.5x\\nprogress=end\\n' >&$fd
+"""
+
+
+class ProgressTest(_FakeFFmpegTest):
+    """Progress reports parsed from ffmpeg's -progress output."""
+
+    def test_parse_progress(self):
+        progress = ffmpeg_worker._parse_progress({
+            'frame': '10',
+            'fps': 'N/A',
+            'bitrate': ' 512.0kbits/s',
+            'out_time_us': '2000000',
+            'speed': '1.5x',
+            'total_size': '1000',
+            'progress': 'continue',
+        })
+        self.assertEqual(
+            (progress.frame, progress.fps, progress.bitrate, progress.speed,
+             progress.total_size, progress.end), (10, 0, 512, 1.5, 1000, False))
+        self.assertEqual(progress.out_time.ToSeconds(), 2)
+
+    def test_progress_only(self):
+        with open(ffmpeg_worker.FFMPEG_BINARY, 'w') as binary_file:
+            binary_file.write(_PROGRESS_FFMPEG)
+        servicer = ffmpeg_worker.FFmpegServicer(SlotScheduler(1, 0))
+        context = mock.Mock()
+        context.invocation_metadata.return_value = ()
+        responses = list(
+            servicer.transcode(
+                FFmpegRequest(ffmpeg_arguments=['-i', 'in.mp4', 'p.mp4'],
+                              progress_only=True), context))
+        self.assertEqual(
+            [response.WhichOneof('status') for response in responses],
+            ['progress', 'exit_status'])
+        progress = responses[0].progress
+        self.assertEqual((progress.frame, progress.bitrate, progress.speed),
+                         (10, 512, 1.5))
+        self.assertTrue(progress.end)
+        self.assertEqual(responses[1].exit_status.exit_code, 0)
+
+
+class SigtermTest(_FakeFFmpegTest):
+    """Async jobs whose ffmpeg fails while the worker shuts down."""
+
+    def test_killed_job_is_recorded_as_queued(self):
+        store = SqliteJobStateStore(os.path.join(self.directory, 'states.db'))
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        ffmpeg_worker_pb2_grpc.add_FFmpegServicer_to_server(
+            ffmpeg_worker.FFmpegServicer(SlotScheduler(2, 10), store=store),
+            server)
+        port = server.add_insecure_port('127.0.0.1:0')
+        server.start()
+        self.addCleanup(server.stop, None)
+        self.addCleanup(ffmpeg_worker._ABORT_EVENT.clear)
+        with grpc.insecure_channel(f'127.0.0.1:{port}') as channel:
+            stub = ffmpeg_worker_pb2_grpc.FFmpegStub(channel)
+            call = stub.transcode(
+                _REQUEST, metadata=(('x-cloudtasks-taskname', 'job'),))
+            next(call)
+            ffmpeg_worker._ABORT_EVENT.set()
+            with self.assertRaises(grpc.RpcError):
+                list(call)
+        self.assertEqual(call.code(), grpc.StatusCode.UNAVAILABLE)
+        self.assertEqual(store.get(['job'])[0].state, JobState.QUEUED)
+
+    def test_only_exits_caused_by_the_signal_are_kills(self):
+        self.addCleanup(ffmpeg_worker._ABORT_EVENT.clear)
+        ffmpeg_worker._ABORT_EVENT.set()
+        for exit_code, killed in ((signal.SIGTERM, True), (255 << 8, True),
+                                  (signal.SIGKILL, False), (1 << 8, False),
+                                  (0, False)):
+            self.assertEqual(
+                ffmpeg_worker._killed_by_sigterm(
+                    ExitStatus(exit_code=exit_code)), killed, exit_code)
+
+
+class PreemptionTest(_FakeFFmpegTest):
+    """A running job preempted by a job of higher priority."""
+
+    def transcode(self, policy):
+        """Runs a job that is preempted and returns the exit statuses.
+
+        Returns:
+            The exit statuses of the preempted job and of the job of higher
+            priority, and the order in which they finished.
+        """
+        preemptor = Preemptor(policy)
+        scheduler = SlotScheduler(1, 1, on_queued=preemptor.request)
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        ffmpeg_worker_pb2_grpc.add_FFmpegServicer_to_server(
+            ffmpeg_worker.FFmpegServicer(scheduler, preemptor=preemptor),
+            server)
+        port = server.add_insecure_port('127.0.0.1:0')
+        server.start()
+        self.addCleanup(server.stop, None)
+        finished = []
+        with grpc.insecure_channel(f'127.0.0.1:{port}') as channel:
+            stub = ffmpeg_worker_pb2_grpc.FFmpegStub(channel)
+            low_call = stub.transcode(_REQUEST)
+            low = [next(low_call)]
+            high_call = stub.transcode(
+                FFmpegRequest(ffmpeg_arguments=['-i', 'missing.mp4', 'hi.mp4'],
+                              priority=1))
+            with futures.ThreadPoolExecutor(max_workers=1) as executor:
+                high_future = executor.submit(list, high_call)
+                high_future.add_done_callback(
+                    lambda _: finished.append('high'))
+                low.extend(low_call)
+                finished.append('low')
+                high = high_future.result()
+        return _exit_statuses(low)[0], _exit_statuses(high)[0], finished
+
+    def test_requeued_job_runs_again(self):
+        low, high, finished = self.transcode(REQUEUE)
+        self.assertEqual(finished, ['high', 'low'])
+        self.assertEqual((low.preemptions, high.preemptions), (1, 0))
+        self.assertEqual(low.exit_code, 3 << 8)
+        with open(self.runs) as runs_file:
+            self.assertEqual(runs_file.read(), 'run\n' * 3)
+
+    def test_suspended_job_continues(self):
+        low, high, finished = self.transcode(SUSPEND)
+        self.assertEqual(finished, ['high', 'low'])
+        self.assertEqual((low.preemptions, high.preemptions), (1, 0))
+        self.assertEqual(low.exit_code, 3 << 8)
+        with open(self.runs) as runs_file:
+            self.assertEqual(runs_file.read(), 'run\n' * 2)
+
+
+class SegmentedTranscoderTest(_FakeFFmpegTest):
+    """Segmented requests for more segments than the worker has slots."""
+
+    def transcode(self, scheduler, segments):
+        request = FFmpegRequest(ffmpeg_arguments=_REQUEST.ffmpeg_arguments,
+                                segments=segments)
+        transcoder = ffmpeg_worker.SegmentedTranscoder(scheduler)
+        return list(transcoder.transcode(request, threading.Event(), None))
+
+    def test_single_slot_does_not_split(self):
+        with mock.patch.object(segmenter, 'plan') as plan:
+            responses = self.transcode(SlotScheduler(1, 0), 8)
+        plan.assert_not_called()
+        with open(self.runs) as runs_file:
+            self.assertEqual(runs_file.read(), 'run\n')
+        self.assertEqual(_exit_statuses(responses)[0].exit_code, 3 << 8)
+
+    def test_segments_are_limited_to_free_slots(self):
+        scheduler = SlotScheduler(4, 0)
+        scheduler.try_acquire()
+        with mock.patch.object(
+                segmenter, 'plan',
+                return_value=segmenter.SegmentPlan(
+                    [list(_REQUEST.ffmpeg_arguments)])) as plan:
+            self.transcode(scheduler, 8)
+        plan.assert_called_once_with(_REQUEST.ffmpeg_arguments, 3)
+
+    def test_too_many_segments_are_rejected(self):
+        with self.assertRaises(segmenter.SegmentationError):
+            self.transcode(SlotScheduler(1, 0),
+                           ffmpeg_worker._MAX_SEGMENTS + 1)
+
+
+class _EmptyQueue(PullQueue):
+    """A pull queue that never has a job, and counts the leases."""
+
+    def __init__(self):
+        self.leases = 0
+
+    def enqueue(self, request):
+        raise NotImplementedError()
+
+    def lease(self, lease_seconds):
+        self.leases += 1
+        return None
+
+    def extend(self, job, lease_seconds):
+        return True
+
+    def complete(self, job):
+        pass
+
+    def release(self, job):
+        pass
+
+
+class JobPullerTest(unittest.TestCase):
+    """Pullers polling a pull queue that has no jobs."""
+
+    def setUp(self):
+        patcher = mock.patch.object(ffmpeg_worker, '_PULL_INTERVAL', 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(ffmpeg_worker._ABORT_EVENT.clear)
+
+    def poll(self, scheduler, queue):
+        """Runs two pullers for a while and returns the loads seen."""
+        pullers = [
+            threading.Thread(target=ffmpeg_worker.JobPuller(
+                queue, None, scheduler).run) for _ in range(2)
+        ]
+        for puller in pullers:
+            puller.start()
+        loads = []
+        for _ in range(20):
+            loads.append((scheduler.load(), scheduler.queued))
+            ffmpeg_worker._ABORT_EVENT.wait(0.005)
+        ffmpeg_worker._ABORT_EVENT.set()
+        for puller in pullers:
+            puller.join()
+        return loads
+
+    def test_idle_pullers_are_not_load(self):
+        queue = _EmptyQueue()
+        loads = self.poll(SlotScheduler(2, 1), queue)
+        self.assertEqual(set(loads), {(0, 0)})
+        self.assertGreater(queue.leases, 0)
+
+    def test_busy_worker_does_not_lease(self):
+        scheduler = SlotScheduler(1, 1)
+        scheduler.try_acquire()
+        queue = _EmptyQueue()
+        loads = self.poll(scheduler, queue)
+        self.assertEqual(set(loads), {(1, 0)})
+        self.assertEqual(queue.leases, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Recognizes retried requests by the idempotency key sent with them.
+
+A client that retries or hedges a request sends every attempt with the same
+key. While an attempt runs, other attempts with its key subscribe to its run,
+so that two ffmpeg processes of this worker never write the same outputs.
+Attempts that cannot share a run, such as segmented ones, are rejected
+instead. Once an attempt has finished, later attempts are answered with its
+exit status instead of running ffmpeg again; its outputs are already in place.
+
+Keys are only known to the worker that served them, and are forgotten after
+a while or once too many keys have been seen since.
+"""
+
+import collections
+import threading
+import time
+from typing import Optional
+from typing import Tuple
+
+from worker.ffmpeg_worker_pb2 import ExitStatus
+
+MAX_KEYS = 4096
+
+
+class DuplicateRequestError(Exception):
+    """Raised when a request with the same key is already running."""
+
+
+class IdempotencyKeys:
+    """Tracks the running and recently finished requests of every key."""
+
+    def __init__(self, ttl: float, max_keys: int = MAX_KEYS):
+        """Initializes the registry.
+
+        Args:
+            ttl: The seconds for which the exit status of a finished request
+                is kept.
+            max_keys: The maximum number of finished requests kept.
+        """
+        self._ttl = ttl
+        self._max_keys = max_keys
+        self._lock = threading.Lock()
+        # The number of running attempts of every key.
+        self._running = collections.Counter()
+        # Keys of finished requests, oldest first, with their exit status
+        # and finish time.
+        self._finished = collections.OrderedDict()
+
+    def begin(self,
+              key: str,
+              exclusive: bool = False) -> Tuple[Optional[ExitStatus], bool]:
+        """Marks a request with the key as running.
+
+        Args:
+            key: The idempotency key of the request.
+            exclusive: Whether the request cannot share the run of another
+                request with the key.
+
+        Returns:
+            The exit status of a finished request with the key, in which case
+            the request is not marked as running, or None; and whether another
+            request with the key is running.
+
+        Raises:
+            DuplicateRequestError: exclusive is set and a request with the key
+                is running.
+        """
+        with self._lock:
+            self._expire()
+            if key in self._finished:
+                return self._finished[key][0], False
+            running = self._running[key] > 0
+            if running and exclusive:
+                raise DuplicateRequestError(
+                    'A request with this idempotency key is already running.')
+            self._running[key] += 1
+            return None, running
+
+    def finish(self, key: str, exit_status: Optional[ExitStatus]):
+        """Marks the running request with the key as ended.
+
+        Args:
+            key: The key passed to begin.
+            exit_status: The exit status of the request, or None if ffmpeg
+                did not finish, in which case the request may be retried.
+        """
+        with self._lock:
+            self._running[key] -= 1
+            if not self._running[key]:
+                del self._running[key]
+            if exit_status is None:
+                return
+            self._finished[key] = (exit_status, time.monotonic())
+            while len(self._finished) > self._max_keys:
+                self._finished.popitem(last=False)
+
+    def _expire(self):
+        deadline = time.monotonic() - self._ttl
+        while self._finished:
+            key, (_, finish_time) = next(iter(self._finished.items()))
+            if finish_time > deadline:
+                return
+            del self._finished[key]
@@ -0,0 +1,88 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the idempotency keys.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.idempotency_test
+"""
+
+import unittest
+from unittest import mock
+
+from worker import idempotency
+from worker.ffmpeg_worker_pb2 import ExitStatus
+from worker.idempotency import DuplicateRequestError
+from worker.idempotency import IdempotencyKeys
+
+_EXIT_STATUS = ExitStatus(exit_code=1 << 8)
+
+
+class IdempotencyKeysTest(unittest.TestCase):
+    """Attempts of requests recognized by their keys."""
+
+    def test_running_attempt_is_reported(self):
+        keys = IdempotencyKeys(60)
+        self.assertEqual(keys.begin('a'), (None, False))
+        self.assertEqual(keys.begin('a'), (None, True))
+        self.assertEqual(keys.begin('b'), (None, False))
+
+    def test_exclusive_attempt_is_rejected_while_one_runs(self):
+        keys = IdempotencyKeys(60)
+        keys.begin('a')
+        with self.assertRaises(DuplicateRequestError):
+            keys.begin('a', exclusive=True)
+        keys.finish('a', None)
+        self.assertEqual(keys.begin('a', exclusive=True), (None, False))
+
+    def test_finished_attempt_answers_later_ones(self):
+        keys = IdempotencyKeys(60)
+        keys.begin('a')
+        keys.finish('a', _EXIT_STATUS)
+        self.assertEqual(keys.begin('a'), (_EXIT_STATUS, False))
+        self.assertEqual(keys.begin('a', exclusive=True),
+                         (_EXIT_STATUS, False))
+
+    def test_attempt_without_exit_status_can_be_retried(self):
+        keys = IdempotencyKeys(60)
+        keys.begin('a')
+        keys.begin('a')
+        keys.finish('a', None)
+        self.assertEqual(keys.begin('a'), (None, True))
+        keys.finish('a', None)
+        keys.finish('a', None)
+        self.assertEqual(keys.begin('a'), (None, False))
+
+    def test_exit_statuses_expire(self):
+        keys = IdempotencyKeys(60)
+        with mock.patch.object(idempotency.time, 'monotonic',
+                               return_value=100.0) as monotonic:
+            keys.begin('a')
+            keys.finish('a', _EXIT_STATUS)
+            monotonic.return_value = 159.0
+            self.assertEqual(keys.begin('a'), (_EXIT_STATUS, False))
+            monotonic.return_value = 160.0
+            self.assertEqual(keys.begin('a'), (None, False))
+
+    def test_oldest_exit_statuses_are_dropped(self):
+        keys = IdempotencyKeys(60, max_keys=2)
+        for key in 'abc':
+            keys.begin(key)
+            keys.finish(key, _EXIT_STATUS)
+        self.assertEqual(keys.begin('a'), (None, False))
+        self.assertEqual(keys.begin('c'), (_EXIT_STATUS, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
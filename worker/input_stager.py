@@ -0,0 +1,252 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Stages input files from the gcsfuse mount to local disk.
+
+Every seek that ffmpeg makes into a file under the gcsfuse mount is a remote
+read, so seek-heavy and multi-pass commands are much faster on local copies.
+Inputs are copied in parallel chunks, shared by concurrent requests and
+evicted in least recently used order once they exceed a byte budget.
+
+Only inputs that are complete in themselves are staged. Playlists, concat
+lists and image sequences refer to other files by paths relative to their
+own, which would not resolve next to a lone local copy, so they are read
+from the mount.
+"""
+
+import collections
+from concurrent import futures
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from typing import List
+
+from worker.ffmpeg_args import FFmpegArguments
+from worker.ffmpeg_args import is_file_url
+
+_LOGGER = logging.getLogger(__name__)
+_BLOCK_SIZE = 2**20
+# Input formats and extensions of files that refer to other files.
+_REFERRING_FORMATS = frozenset(['concat', 'hls', 'dash', 'image2'])
+_REFERRING_EXTENSIONS = frozenset(['.m3u8', '.m3u', '.mpd', '.ffconcat'])
+
+
+class StagedInputs:
+    """ffmpeg arguments that refer to staged inputs.
+
+    The staged files are kept until release is called.
+
+    Attributes:
+        arguments: The ffmpeg arguments with staged inputs replaced by their
+            local copies.
+    """
+
+    def __init__(self, arguments: List[str], stager=None, entries=()):
+        self.arguments = arguments
+        self._stager = stager
+        self._entries = list(entries)
+
+    def release(self):
+        """Allows the staged files to be evicted."""
+        if self._stager is not None:
+            self._stager._release(self._entries)  # pylint: disable=protected-access
+        self._entries = []
+
+
+class _Entry:  # pylint: disable=too-few-public-methods
+
+    def __init__(self, key, path, size):
+        self.key = key
+        self.path = path
+        self.size = size
+        self.references = 1
+        self.ready = threading.Event()
+        self.failed = False
+
+
+class InputStager:
+    """Copies inputs under source_root to a local directory.
+
+    Only regular files under source_root that do not refer to other files
+    are staged. An input that cannot be staged, for example because it does not fit in the budget next to the
+    files in use, is read from its original path.
+    """
+
+    def __init__(self,
+                 source_root: str,
+                 directory: str,
+                 max_bytes: int,
+                 chunk_size: int = 64 * 2**20,
+                 parallelism: int = 8):
+        """Initializes the stager and empties directory.
+
+        Args:
+            source_root: Only inputs under this directory are staged.
+            directory: The directory that holds the staged files.
+            max_bytes: The maximum total size of the staged files.
+            chunk_size: The size of the chunks that are copied in parallel.
+            parallelism: The maximum number of chunks copied at once, across
+                all requests.
+        """
+        self._source_root = os.path.abspath(source_root)
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._chunk_size = chunk_size
+        self._executor = futures.ThreadPoolExecutor(max_workers=parallelism)
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        os.makedirs(directory, exist_ok=True)
+        # Files left by a previous server cannot be trusted to be complete.
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    def stage(self, ffmpeg_arguments: List[str]) -> StagedInputs:
+        """Stages the inputs of a command.
+
+        Blocks until every input is staged, including inputs that are being
+        staged for another request.
+        """
+        arguments = FFmpegArguments(ffmpeg_arguments)
+        staged_arguments = list(arguments.args)
+        entries = []
+        for index in arguments.input_indices:
+            if not _is_self_contained(arguments, index):
+                continue
+            entry = self._stage_file(arguments.args[index])
+            if entry is None:
+                continue
+            entries.append(entry)
+            staged_arguments[index] = entry.path
+        return StagedInputs(staged_arguments, self, entries)
+
+    def _stage_file(self, path):
+        """Returns the entry of a staged file, or None if it is not staged."""
+        source = os.path.abspath(path)
+        if (not is_file_url(path) or
+                os.path.commonpath([source, self._source_root]) !=
+                self._source_root):
+            return None
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return None
+        key = hashlib.sha256(
+            f'{source}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()
+        owner = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.references += 1
+                self._entries.move_to_end(key)
+            else:
+                self._evict(stat.st_size)
+                if self._size + stat.st_size > self._max_bytes:
+                    return None
+                # The extension is kept in case ffmpeg uses it to probe.
+                extension = os.path.splitext(source)[1]
+                entry = _Entry(key,
+                               os.path.join(self._directory, key + extension),
+                               stat.st_size)
+                self._entries[key] = entry
+                self._size += entry.size
+                owner = True
+        if owner:
+            self._copy(source, entry)
+        else:
+            entry.ready.wait()
+        if entry.failed:
+            self._release([entry])
+            return None
+        return entry
+
+    def _copy(self, source, entry):
+        """Copies source to the entry's path in parallel chunks."""
+        temp_path = entry.path + '.tmp'
+        try:
+            with open(temp_path, 'wb') as destination:
+                destination.truncate(entry.size)
+            chunks = [
+                self._executor.submit(_copy_range, source, temp_path, offset,
+                                      min(self._chunk_size, entry.size - offset))
+                for offset in range(0, entry.size, self._chunk_size)
+            ]
+            for chunk in chunks:
+                chunk.result()
+            os.rename(temp_path, entry.path)
+            _LOGGER.info('Staged %s.', source)
+        except Exception:  # pylint: disable=broad-except
+            # Waiting requests read the input from its original path instead.
+            _LOGGER.exception('Failed to stage %s.', source)
+            entry.failed = True
+            with self._lock:
+                self._remove(entry)
+        finally:
+            entry.ready.set()
+
+    def _release(self, entries):
+        with self._lock:
+            for entry in entries:
+                entry.references -= 1
+
+    def _evict(self, needed):
+        """Removes unused files until needed more bytes fit in the budget."""
+        for entry in list(self._entries.values()):
+            if self._size + needed <= self._max_bytes:
+                return
+            if entry.references == 0:
+                self._remove(entry)
+
+    def _remove(self, entry):
+        del self._entries[entry.key]
+        self._size -= entry.size
+        for path in (entry.path, entry.path + '.tmp'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _is_self_contained(arguments: FFmpegArguments, input_index: int) -> bool:
+    """Returns whether an input can be read without the files next to it."""
+    options = arguments.input_options(input_index)
+    path = arguments.args[input_index]
+    return (options.get('f') not in _REFERRING_FORMATS and
+            'pattern_type' not in options and
+            os.path.splitext(path)[1].lower() not in _REFERRING_EXTENSIONS)
+
+
+def _copy_range(source, destination, offset, length):
+    """Copies length bytes at offset from source to the same offset."""
+    source_fd = os.open(source, os.O_RDONLY)
+    try:
+        destination_fd = os.open(destination, os.O_WRONLY)
+        try:
+            end = offset + length
+            while offset < end:
+                data = os.pread(source_fd, min(_BLOCK_SIZE, end - offset), offset)
+                if not data:
+                    raise OSError(f'{source} was truncated while staging.')
+                os.pwrite(destination_fd, data, offset)
+                offset += len(data)
+        finally:
+            os.close(destination_fd)
+    finally:
+        os.close(source_fd)
@@ -0,0 +1,95 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the input stager.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.input_stager_test
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from worker import input_stager
+from worker.input_stager import InputStager
+
+
+class InputStagerTest(unittest.TestCase):
+    """Inputs staged from a directory that stands in for the mount."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.source_root = os.path.join(directory.name, 'buckets')
+        self.staging_dir = os.path.join(directory.name, 'staging')
+        os.makedirs(self.source_root)
+        for name in ('in.mp4', 'list.txt', 'index.m3u8', 'img001.png'):
+            self.write(name, b'data')
+
+    def write(self, name, data):
+        path = os.path.join(self.source_root, name)
+        with open(path, 'wb') as source:
+            source.write(data)
+        return path
+
+    def stage(self, args):
+        stager = InputStager(self.source_root, self.staging_dir, 2**20)
+        staged = stager.stage(args)
+        self.addCleanup(staged.release)
+        return staged.arguments
+
+    def path(self, name):
+        return os.path.join(self.source_root, name)
+
+    def test_media_input_is_staged(self):
+        arguments = self.stage(['-i', self.path('in.mp4'), 'out.mp4'])
+        self.assertEqual(os.path.dirname(arguments[1]), self.staging_dir)
+        with open(arguments[1], 'rb') as staged:
+            self.assertEqual(staged.read(), b'data')
+
+    def test_inputs_that_refer_to_other_files_are_not_staged(self):
+        args = [
+            '-f', 'concat', '-safe', '0', '-i', self.path('list.txt'),
+            '-i', self.path('index.m3u8'),
+            '-pattern_type', 'glob', '-i', self.path('img*.png'),
+            '-f', 'image2', '-i', self.path('img001.png'),
+            '-i', self.path('in.mp4'), 'out.mp4'
+        ]
+        arguments = self.stage(args)
+        self.assertEqual(arguments[:-2], args[:-2])
+        self.assertEqual(os.path.dirname(arguments[-2]), self.staging_dir)
+
+    def test_input_that_fails_to_copy_is_read_in_place(self):
+        args = ['-i', self.path('in.mp4'), 'out.mp4']
+        stager = InputStager(self.source_root, self.staging_dir, 2**20)
+        with mock.patch.object(input_stager, '_copy_range',
+                               side_effect=ValueError('copy failed')):
+            self.assertEqual(stager.stage(args).arguments, args)
+        # The failed entry was removed rather than left for others to await.
+        staged = stager.stage(args)
+        self.addCleanup(staged.release)
+        self.assertEqual(os.path.dirname(staged.arguments[1]), self.staging_dir)
+
+    def test_staging_directory_is_emptied(self):
+        os.makedirs(os.path.join(self.staging_dir, 'directory'))
+        with open(os.path.join(self.staging_dir, 'file.tmp'), 'w'):
+            pass
+        InputStager(self.source_root, self.staging_dir, 2**20)
+        self.assertEqual(os.listdir(self.staging_dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
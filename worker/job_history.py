@@ -0,0 +1,186 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Predicts the runtime and memory use of ffmpeg commands from past runs.
+
+Commands are grouped by a signature: their arguments without logging
+options, with every input replaced by the power of two nearest to its size
+and every output by its extension. Commands with the same codecs, presets,
+resolutions and filters on inputs of similar size therefore share a
+signature. The input size stands in for the input duration, which would take
+a probe of every input to find.
+"""
+
+import math
+import os
+import shlex
+import threading
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from worker.ffmpeg_args import FFmpegArguments
+from worker.ffmpeg_args import is_file_url
+from worker.ffmpeg_worker_pb2 import ExitStatus
+from worker.job_queue import connect
+
+# Memory is only predicted once a signature has this many runs, so that one
+# unusual run does not get jobs refused.
+_MIN_MEMORY_SAMPLES = 3
+
+
+class Prediction:  # pylint: disable=too-few-public-methods
+    """Exponential moving averages of the runs of a signature.
+
+    Attributes:
+        samples: The number of runs.
+        seconds: The wall-clock time of a run.
+        cpu_seconds: The user plus system CPU time of a run.
+        max_rss: The peak resident set size of a run in bytes.
+    """
+
+    def __init__(self, samples: int, seconds: float, cpu_seconds: float,
+                 max_rss: float):
+        self.samples = samples
+        self.seconds = seconds
+        self.cpu_seconds = cpu_seconds
+        self.max_rss = max_rss
+
+
+class JobEstimate:  # pylint: disable=too-few-public-methods
+    """The predicted cost of a command.
+
+    Attributes:
+        signature: The signature under which the command's run is recorded.
+        seconds: The predicted runtime, or the mean runtime of all
+            signatures if the command's has no runs, or None if there are no
+            runs at all.
+        max_rss: The predicted peak resident set size in bytes, or None if
+            the signature has too few runs.
+    """
+
+    def __init__(self, signature: str, seconds: Optional[float],
+                 max_rss: Optional[float]):
+        self.signature = signature
+        self.seconds = seconds
+        self.max_rss = max_rss
+
+
+class JobHistory:
+    """Records the resource usage of successful runs in a SQLite database.
+
+    The history is kept in memory as well, so that predictions do not read
+    the database.
+    """
+
+    def __init__(self, path: str, smoothing: float = 0.2):
+        """Opens the history, creating the database if needed.
+
+        Args:
+            path: The path of the database.
+            smoothing: The weight of each run in the moving averages.
+        """
+        self._path = path
+        self._smoothing = smoothing
+        self._lock = threading.Lock()
+        with connect(path) as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS job_history (
+                    signature TEXT PRIMARY KEY,
+                    samples INTEGER NOT NULL,
+                    seconds REAL NOT NULL,
+                    cpu_seconds REAL NOT NULL,
+                    max_rss REAL NOT NULL
+                )''')
+            rows = connection.execute(
+                'SELECT signature, samples, seconds, cpu_seconds, max_rss '
+                'FROM job_history').fetchall()
+        self._predictions: Dict[str, Prediction] = {
+            row[0]: Prediction(*row[1:]) for row in rows
+        }
+
+    def estimate(self, ffmpeg_arguments: List[str]) -> JobEstimate:
+        """Predicts the cost of a command."""
+        command_signature = signature(ffmpeg_arguments)
+        with self._lock:
+            prediction = self._predictions.get(command_signature)
+            if prediction is not None:
+                seconds = prediction.seconds
+            elif self._predictions:
+                seconds = (sum(prediction.seconds
+                               for prediction in self._predictions.values()) /
+                           len(self._predictions))
+            else:
+                seconds = None
+        max_rss = None
+        if prediction is not None and prediction.samples >= _MIN_MEMORY_SAMPLES:
+            max_rss = prediction.max_rss
+        return JobEstimate(command_signature, seconds, max_rss)
+
+    def record(self, command_signature: str, exit_status: ExitStatus):
+        """Adds a successful run of a command.
+
+        Raises:
+            QueueError: The database could not be updated.
+        """
+        usage = exit_status.resource_usage
+        seconds = exit_status.real_time.ToNanoseconds() / 10**9
+        cpu_seconds = usage.ru_utime + usage.ru_stime
+        # ru_maxrss is in kilobytes on Linux.
+        max_rss = usage.ru_maxrss * 1024
+        with self._lock:
+            prediction = self._predictions.get(command_signature)
+            if prediction is None:
+                prediction = Prediction(0, seconds, cpu_seconds, max_rss)
+                self._predictions[command_signature] = prediction
+            else:
+                prediction.seconds += self._smoothing * (seconds -
+                                                         prediction.seconds)
+                prediction.cpu_seconds += self._smoothing * (
+                    cpu_seconds - prediction.cpu_seconds)
+                prediction.max_rss += self._smoothing * (max_rss -
+                                                         prediction.max_rss)
+            prediction.samples += 1
+            row = (command_signature, prediction.samples, prediction.seconds,
+                   prediction.cpu_seconds, prediction.max_rss)
+        with connect(self._path) as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO job_history '
+                '(signature, samples, seconds, cpu_seconds, max_rss) '
+                'VALUES (?, ?, ?, ?, ?)', row)
+
+
+def signature(ffmpeg_arguments: List[str]) -> str:
+    """Returns the arguments of a command without its file names."""
+    arguments = FFmpegArguments(FFmpegArguments(ffmpeg_arguments).normalized())
+    args = list(arguments.args)
+    for index in arguments.input_indices:
+        args[index] = f'<input {_size_class(args[index])}>'
+    for index in arguments.output_indices:
+        args[index] = f'<output {os.path.splitext(args[index])[1]}>'
+    return ' '.join(shlex.quote(arg) for arg in args)
+
+
+def _size_class(url: str) -> str:
+    """Returns the power of two nearest to the size of an input file."""
+    if not is_file_url(url):
+        return 'stream'
+    try:
+        size = os.stat(url).st_size
+    except OSError:
+        return 'unknown'
+    if size == 0:
+        return '0'
+    return str(2**round(math.log2(size)))
@@ -0,0 +1,131 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the job history.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.job_history_test
+"""
+
+import os
+import tempfile
+import unittest
+
+from worker import job_history
+from worker.ffmpeg_worker_pb2 import ExitStatus
+from worker.ffmpeg_worker_pb2 import ResourceUsage
+from worker.job_history import JobHistory
+
+
+def _exit_status(seconds, max_rss_kb=1024):
+    exit_status = ExitStatus(resource_usage=ResourceUsage(
+        ru_utime=seconds / 2, ru_stime=seconds / 4, ru_maxrss=max_rss_kb))
+    exit_status.real_time.FromNanoseconds(int(seconds * 10**9))
+    return exit_status
+
+
+class SignatureTest(unittest.TestCase):
+    """Signatures of commands that are expected to cost the same."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def input_file(self, name, size):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as input_file:
+            input_file.write(b'\0' * size)
+        return path
+
+    def test_file_names_and_logging_options_are_ignored(self):
+        first = self.input_file('a.mp4', 1000)
+        second = self.input_file('b.mov', 1100)
+        self.assertEqual(
+            job_history.signature(
+                ['-i', first, '-c:v', 'libx264', 'out/a.mp4']),
+            job_history.signature([
+                '-hide_banner', '-loglevel', 'error', '-i', second, '-c:v',
+                'libx264', 'out/b.mp4'
+            ]))
+
+    def test_input_size_and_output_format_matter(self):
+        small = self.input_file('small.mp4', 1000)
+        large = self.input_file('large.mp4', 8000)
+        signature = job_history.signature(['-i', small, 'out.mp4'])
+        self.assertNotEqual(signature,
+                            job_history.signature(['-i', large, 'out.mp4']))
+        self.assertNotEqual(signature,
+                            job_history.signature(['-i', small, 'out.webm']))
+
+    def test_inputs_without_a_size(self):
+        self.assertIn(
+            '<input stream>',
+            job_history.signature(['-i', 'https://example.com/a', 'out.mp4']))
+        self.assertIn(
+            '<input unknown>',
+            job_history.signature(
+                ['-i', os.path.join(self.directory, 'missing'), 'out.mp4']))
+
+
+class JobHistoryTest(unittest.TestCase):
+    """Predictions from the recorded runs of commands."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'history.db')
+        self.history = JobHistory(self.path, smoothing=0.5)
+
+    def test_empty_history_predicts_nothing(self):
+        estimate = self.history.estimate(['-i', 'in.mp4', 'out.mp4'])
+        self.assertIsNone(estimate.seconds)
+        self.assertIsNone(estimate.max_rss)
+
+    def test_runtime_is_a_moving_average(self):
+        signature = job_history.signature(['-i', 'in.mp4', 'out.mp4'])
+        self.history.record(signature, _exit_status(10))
+        self.history.record(signature, _exit_status(20))
+        estimate = self.history.estimate(['-i', 'in.mp4', 'out.mp4'])
+        self.assertEqual(estimate.signature, signature)
+        self.assertAlmostEqual(estimate.seconds, 15)
+
+    def test_unknown_command_gets_the_mean_runtime(self):
+        self.history.record(
+            job_history.signature(['-i', 'in.mp4', 'out.mp4']),
+            _exit_status(10))
+        self.history.record(
+            job_history.signature(['-i', 'in.mp4', 'out.webm']),
+            _exit_status(30))
+        estimate = self.history.estimate(['-i', 'in.mp4', 'out.mkv'])
+        self.assertAlmostEqual(estimate.seconds, 20)
+        self.assertIsNone(estimate.max_rss)
+
+    def test_memory_is_predicted_after_enough_runs(self):
+        arguments = ['-i', 'in.mp4', 'out.mp4']
+        signature = job_history.signature(arguments)
+        for runs in range(1, job_history._MIN_MEMORY_SAMPLES + 1):
+            self.assertIsNone(self.history.estimate(arguments).max_rss, runs)
+            self.history.record(signature, _exit_status(10, max_rss_kb=2048))
+        self.assertEqual(self.history.estimate(arguments).max_rss, 2048 * 1024)
+
+    def test_history_is_kept_in_the_database(self):
+        arguments = ['-i', 'in.mp4', 'out.mp4']
+        self.history.record(job_history.signature(arguments), _exit_status(10))
+        self.assertAlmostEqual(
+            JobHistory(self.path).estimate(arguments).seconds, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
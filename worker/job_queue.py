@@ -0,0 +1,202 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Queues of FFmpeg jobs for asynchronous transcoding.
+
+A JobQueue accepts jobs. A PullQueue additionally lets workers lease jobs
+when they have capacity for them, so that jobs are dispatched no faster than
+they can be run. A leased job that is neither completed nor released before
+its lease expires, for example because its worker died, is leased again.
+"""
+
+import abc
+import sqlite3
+import time
+from typing import Optional
+
+from worker.ffmpeg_worker_pb2 import FFmpegRequest
+
+
+class QueueError(Exception):
+    """Raised when a queue or job state store cannot be reached or updated."""
+
+
+class Job:  # pylint: disable=too-few-public-methods
+    """A leased job.
+
+    Attributes:
+        name: The name returned when the job was enqueued.
+        request: The FFmpeg request to run.
+        lease_id: Identifies the lease, so that a worker whose lease expired
+            cannot complete a job that was leased again.
+    """
+
+    def __init__(self, name: str, request: FFmpegRequest, lease_id: int):
+        self.name = name
+        self.request = request
+        self.lease_id = lease_id
+
+
+class JobQueue(abc.ABC):
+    """A queue that accepts FFmpeg jobs."""
+
+    @abc.abstractmethod
+    def enqueue(self, request: FFmpegRequest) -> str:
+        """Adds a job and returns its name.
+
+        Raises:
+            QueueError: The job could not be added.
+        """
+
+
+class PullQueue(JobQueue):
+    """A queue from which workers lease jobs."""
+
+    @abc.abstractmethod
+    def lease(self, lease_seconds: float) -> Optional[Job]:
+        """Leases the oldest available job, or returns None if there is none."""
+
+    @abc.abstractmethod
+    def extend(self, job: Job, lease_seconds: float) -> bool:
+        """Extends a lease from now.
+
+        Returns:
+            False if the lease has already expired and the job was leased
+            again, in which case it must not be completed.
+        """
+
+    @abc.abstractmethod
+    def complete(self, job: Job):
+        """Removes a leased job from the queue once it has run."""
+
+    @abc.abstractmethod
+    def release(self, job: Job):
+        """Returns a leased job to the queue so that it is leased again."""
+
+
+class SqliteJobQueue(PullQueue):
+    """A PullQueue stored in a SQLite database.
+
+    Every worker on a machine, and the async worker, can share the database
+    file. It must be on a local file system, since SQLite relies on file
+    locks that network file systems such as gcsfuse do not provide.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    request BLOB NOT NULL,
+                    leased_until REAL NOT NULL DEFAULT 0,
+                    lease_id INTEGER NOT NULL DEFAULT 0,
+                    done INTEGER NOT NULL DEFAULT 0
+                )''')
+            connection.execute('''
+                CREATE INDEX IF NOT EXISTS available_jobs
+                ON jobs (done, leased_until, id)''')
+
+    def enqueue(self, request: FFmpegRequest) -> str:
+        with self._connect() as connection:
+            cursor = connection.execute('INSERT INTO jobs (request) VALUES (?)',
+                                        (request.SerializeToString(),))
+            return _job_name(cursor.lastrowid)
+
+    def lease(self, lease_seconds: float) -> Optional[Job]:
+        now = time.time()
+        with self._connect() as connection:
+            # Taking the write lock first keeps two workers from leasing the
+            # same job.
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(
+                '''SELECT id, request, lease_id FROM jobs
+                   WHERE done = 0 AND leased_until < ?
+                   ORDER BY id LIMIT 1''', (now,)).fetchone()
+            if row is None:
+                return None
+            job_id, request, lease_id = row
+            connection.execute(
+                'UPDATE jobs SET leased_until = ?, lease_id = ? WHERE id = ?',
+                (now + lease_seconds, lease_id + 1, job_id))
+        return Job(_job_name(job_id), FFmpegRequest.FromString(request),
+                   lease_id + 1)
+
+    def extend(self, job: Job, lease_seconds: float) -> bool:
+        return self._update_lease(job, 'leased_until = ?',
+                                  time.time() + lease_seconds)
+
+    def complete(self, job: Job):
+        self._update_lease(job, 'done = ?', 1)
+
+    def release(self, job: Job):
+        self._update_lease(job, 'leased_until = ?', 0)
+
+    def _update_lease(self, job, assignment, value):
+        """Updates a job if its lease is still held by job."""
+        with self._connect() as connection:
+            cursor = connection.execute(
+                f'UPDATE jobs SET {assignment} WHERE id = ? AND lease_id = ?',
+                (value, _job_id(job.name), job.lease_id))
+            return cursor.rowcount == 1
+
+    def _connect(self):
+        return connect(self._path)
+
+
+def connect(path: str) -> '_Transaction':
+    """Opens a SQLite connection that commits or rolls back when closed.
+
+    Connections are not shared, since sqlite3 connections may not be used
+    from several threads. sqlite3.Error is raised as QueueError.
+    """
+    try:
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+    except sqlite3.Error as error:
+        raise QueueError(str(error)) from error
+    return _Transaction(connection)
+
+
+class _Transaction:
+    """Context manager that runs statements on a connection and closes it."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        try:
+            if self._connection.in_transaction:
+                if exception_type is None:
+                    self._connection.execute('COMMIT')
+                else:
+                    self._connection.execute('ROLLBACK')
+        finally:
+            self._connection.close()
+        if isinstance(exception, sqlite3.Error):
+            raise QueueError(str(exception)) from exception
+
+    def execute(self, statement, parameters=()):
+        return self._connection.execute(statement, parameters)
+
+
+def _job_name(job_id: int) -> str:
+    return f'jobs/{job_id}'
+
+
+def _job_id(name: str) -> int:
+    return int(name.rsplit('/', 1)[1])
@@ -0,0 +1,100 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the job queues.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.job_queue_test
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from worker import job_queue
+from worker.ffmpeg_worker_pb2 import FFmpegRequest
+from worker.job_queue import QueueError
+from worker.job_queue import SqliteJobQueue
+
+
+def _request(output: str) -> FFmpegRequest:
+    return FFmpegRequest(ffmpeg_arguments=['-i', 'in.mp4', output])
+
+
+class SqliteJobQueueTest(unittest.TestCase):
+    """Jobs leased from a SQLite database."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'jobs.db')
+        self.queue = SqliteJobQueue(self.path)
+        patcher = mock.patch.object(job_queue.time, 'time', return_value=100.0)
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_jobs_are_leased_in_order(self):
+        first = self.queue.enqueue(_request('a.mp4'))
+        second = self.queue.enqueue(_request('b.mp4'))
+        self.assertNotEqual(first, second)
+        job = self.queue.lease(60)
+        self.assertEqual(job.name, first)
+        self.assertEqual(job.request, _request('a.mp4'))
+        self.assertEqual(self.queue.lease(60).name, second)
+        self.assertIsNone(self.queue.lease(60))
+
+    def test_queue_is_shared_through_the_database(self):
+        name = self.queue.enqueue(_request('a.mp4'))
+        self.assertEqual(SqliteJobQueue(self.path).lease(60).name, name)
+        self.assertIsNone(self.queue.lease(60))
+
+    def test_completed_jobs_are_not_leased_again(self):
+        self.queue.enqueue(_request('a.mp4'))
+        self.queue.complete(self.queue.lease(60))
+        self.time.return_value = 200.0
+        self.assertIsNone(self.queue.lease(60))
+
+    def test_released_jobs_are_leased_again(self):
+        self.queue.enqueue(_request('a.mp4'))
+        job = self.queue.lease(60)
+        self.queue.release(job)
+        again = self.queue.lease(60)
+        self.assertEqual(again.name, job.name)
+        self.assertNotEqual(again.lease_id, job.lease_id)
+
+    def test_expired_leases_are_leased_again(self):
+        self.queue.enqueue(_request('a.mp4'))
+        job = self.queue.lease(60)
+        self.time.return_value = 150.0
+        self.assertTrue(self.queue.extend(job, 60))
+        self.time.return_value = 200.0
+        self.assertIsNone(self.queue.lease(60))
+        self.time.return_value = 211.0
+        again = self.queue.lease(60)
+        self.assertEqual(again.name, job.name)
+        # The first worker lost its lease, so it can no longer complete the
+        # job.
+        self.assertFalse(self.queue.extend(job, 60))
+        self.queue.complete(job)
+        self.time.return_value = 300.0
+        self.assertEqual(self.queue.lease(60).name, job.name)
+
+    def test_database_errors_are_queue_errors(self):
+        with self.assertRaises(QueueError):
+            SqliteJobQueue(os.path.join(self.path, 'missing', 'jobs.db'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,260 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Stores the states of asynchronous transcode jobs.
+
+The async worker records a job as queued when it is enqueued, and the FFmpeg
+worker that runs it records when it starts and how it finished. Jobs are
+keyed by the last component of their task name, since Cloud Tasks only tells
+the FFmpeg worker the task ID.
+"""
+
+import abc
+import collections
+import logging
+import os
+import tempfile
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from worker.ffmpeg_worker_pb2 import FFmpegResponse
+from worker.ffmpeg_worker_pb2 import JobState
+from worker.job_queue import QueueError
+from worker.job_queue import connect
+
+_LOGGER = logging.getLogger(__name__)
+_LOG_TAIL_LINES = 20
+# SQLite limits the number of parameters in a statement.
+_MAX_QUERY_NAMES = 500
+FINISHED_STATES = frozenset([JobState.SUCCEEDED, JobState.FAILED])
+
+
+class JobStateStore(abc.ABC):
+    """Stores a JobState for every job."""
+
+    @abc.abstractmethod
+    def update(self, name: str, state: JobState, keep_state: bool = False):
+        """Replaces the fields set in state in the stored state of a job.
+
+        Args:
+            name: The task name of the job.
+            state: The fields to replace.
+            keep_state: If set, the state field is only written if none is
+                stored yet. The job may start, or even finish, before the
+                enqueuer records it as queued.
+
+        Raises:
+            QueueError: The store could not be updated.
+        """
+
+    @abc.abstractmethod
+    def get(self, names: List[str]) -> List[Optional[JobState]]:
+        """Returns the stored states of jobs, with None for unknown jobs.
+
+        Raises:
+            QueueError: The store could not be read.
+        """
+
+
+class SqliteJobStateStore(JobStateStore):
+    """Stores job states in a SQLite database, such as that of the job queue."""
+
+    def __init__(self, path: str):
+        self._path = path
+        with connect(path) as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS job_states (
+                    id TEXT PRIMARY KEY,
+                    state BLOB NOT NULL
+                )''')
+
+    def update(self, name: str, state: JobState, keep_state: bool = False):
+        job_id = _job_id(name)
+        with connect(self._path) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute('SELECT state FROM job_states WHERE id = ?',
+                                     (job_id,)).fetchone()
+            merged = JobState() if row is None else JobState.FromString(row[0])
+            _merge(merged, state, keep_state)
+            connection.execute(
+                'INSERT OR REPLACE INTO job_states (id, state) VALUES (?, ?)',
+                (job_id, merged.SerializeToString()))
+
+    def get(self, names: List[str]) -> List[Optional[JobState]]:
+        job_ids = [_job_id(name) for name in names]
+        states = {}
+        with connect(self._path) as connection:
+            for start in range(0, len(job_ids), _MAX_QUERY_NAMES):
+                chunk = job_ids[start:start + _MAX_QUERY_NAMES]
+                rows = connection.execute(
+                    'SELECT id, state FROM job_states WHERE id IN '
+                    f'({",".join("?" * len(chunk))})', chunk)
+                for job_id, state in rows:
+                    states[job_id] = JobState.FromString(state)
+        return [states.get(job_id) for job_id in job_ids]
+
+
+class DirectoryJobStateStore(JobStateStore):
+    """Stores the state of every job in its own file in a directory.
+
+    The directory can be on the gcsfuse mount, so that every FFmpeg worker
+    and the async worker share it without a database. Every job is updated
+    by one worker at a time, so updates are not locked.
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def update(self, name: str, state: JobState, keep_state: bool = False):
+        merged = self._read(_job_id(name)) or JobState()
+        _merge(merged, state, keep_state)
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix='.tmp', dir=self._directory)
+            with os.fdopen(fd, 'wb') as state_file:
+                state_file.write(merged.SerializeToString())
+            os.replace(temp_path, self._path(_job_id(name)))
+        except OSError as error:
+            raise QueueError(str(error)) from error
+
+    def get(self, names: List[str]) -> List[Optional[JobState]]:
+        return [self._read(_job_id(name)) for name in names]
+
+    def _read(self, job_id):
+        try:
+            with open(self._path(job_id), 'rb') as state_file:
+                return JobState.FromString(state_file.read())
+        except FileNotFoundError:
+            return None
+        except OSError as error:
+            raise QueueError(str(error)) from error
+
+    def _path(self, job_id):
+        return os.path.join(self._directory, job_id + '.pb')
+
+
+def create_store(path: str) -> JobStateStore:
+    """Opens a DirectoryJobStateStore for a directory, or else a SQLite store.
+
+    Paths that end with a slash are treated as directories.
+    """
+    if path.endswith('/') or os.path.isdir(path):
+        return DirectoryJobStateStore(path)
+    return SqliteJobStateStore(path)
+
+
+class JobRecorder:
+    """Records the state of a job as its FFmpeg responses pass through.
+
+    Failures to write the state are logged and do not affect the job. Without
+    a store, nothing is recorded.
+    """
+
+    def __init__(self, store: Optional[JobStateStore], name: str):
+        self._store = store
+        self._name = name
+        self._log_tail = collections.deque(maxlen=_LOG_TAIL_LINES)
+        self._exit_status = None
+
+    def record(self, responses: Iterable[FFmpegResponse]
+              ) -> Iterator[FFmpegResponse]:
+        """Passes responses through while recording the job."""
+        self.start()
+        try:
+            for response in responses:
+                self.observe(response)
+                yield response
+        finally:
+            self.finish()
+
+    def start(self):
+        """Records that the job is running."""
+        state = JobState(state=JobState.RUNNING)
+        state.start_time.GetCurrentTime()
+        self._update(state)
+
+    def observe(self, response: FFmpegResponse):
+        """Keeps the last log lines and the exit status of a response."""
+        field = response.WhichOneof('status')
+        if field == 'log_line':
+            self._log_tail.append(response.log_line)
+        elif field == 'log_batch':
+            self._log_tail.extend(response.log_batch.log_lines)
+        elif field == 'exit_status':
+            self._exit_status = response.exit_status
+
+    def finish(self):
+        """Records how the job finished.
+
+        A job that stopped without an exit status, for example because its
+        worker received SIGTERM, is recorded as queued again.
+        """
+        if self._exit_status is None:
+            self.requeue()
+            return
+        state = JobState(state=(JobState.FAILED if self._exit_status.exit_code
+                                else JobState.SUCCEEDED),
+                         exit_status=self._exit_status,
+                         log_tail=[line.rstrip('\n') for line in self._log_tail])
+        state.end_time.GetCurrentTime()
+        self._update(state)
+
+    def requeue(self):
+        """Records that the job was returned to its queue to run again."""
+        self._update(JobState(state=JobState.QUEUED))
+
+    def fail(self, message: str):
+        """Records that the job failed without running ffmpeg."""
+        state = JobState(state=JobState.FAILED, log_tail=[message])
+        state.end_time.GetCurrentTime()
+        self._update(state)
+
+    def _update(self, state):
+        if self._store is None:
+            return
+        try:
+            self._store.update(self._name, state)
+        except QueueError:
+            _LOGGER.exception('Failed to record the state of job %s.',
+                              self._name)
+
+
+def queued_state(name: str) -> JobState:
+    """Returns the state of a job that has just been enqueued."""
+    state = JobState(name=name, state=JobState.QUEUED)
+    state.enqueue_time.GetCurrentTime()
+    return state
+
+
+def _merge(stored: JobState, state: JobState, keep_state: bool = False):
+    """Replaces the fields of stored that are set in state.
+
+    Unlike MergeFrom, repeated fields such as the log tail are replaced
+    rather than appended to. If keep_state is set, a stored state field is
+    not replaced.
+    """
+    if keep_state and stored.state != JobState.STATE_UNSPECIFIED:
+        state, update = JobState(), state
+        state.CopyFrom(update)
+        state.ClearField('state')
+    for field, _ in state.ListFields():
+        stored.ClearField(field.name)
+    stored.MergeFrom(state)
+
+
+def _job_id(name: str) -> str:
+    return name.rsplit('/', 1)[-1]
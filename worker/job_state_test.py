@@ -0,0 +1,85 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the job state stores.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.job_state_test
+"""
+
+import os
+import tempfile
+import unittest
+
+from worker.ffmpeg_worker_pb2 import ExitStatus
+from worker.ffmpeg_worker_pb2 import FFmpegResponse
+from worker.ffmpeg_worker_pb2 import JobState
+from worker.job_state import DirectoryJobStateStore
+from worker.job_state import JobRecorder
+from worker.job_state import SqliteJobStateStore
+from worker.job_state import queued_state
+
+_NAME = 'projects/p/locations/l/queues/q/tasks/job'
+
+
+class _StoreTest:
+    """Tests shared by every store, which create_store returns."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = self.create_store(directory.name)
+
+    def create_store(self, directory):
+        raise NotImplementedError
+
+    def test_queued_state_after_running_is_ignored(self):
+        JobRecorder(self.store, _NAME).start()
+        self.store.update(_NAME, queued_state(_NAME), keep_state=True)
+        state = self.store.get([_NAME])[0]
+        self.assertEqual(state.state, JobState.RUNNING)
+        self.assertEqual(state.name, _NAME)
+        self.assertTrue(state.HasField('enqueue_time'))
+
+    def test_queued_state_after_finish_is_ignored(self):
+        recorder = JobRecorder(self.store, _NAME)
+        list(recorder.record([FFmpegResponse(exit_status=ExitStatus())]))
+        self.store.update(_NAME, queued_state(_NAME), keep_state=True)
+        self.assertEqual(self.store.get([_NAME])[0].state, JobState.SUCCEEDED)
+
+    def test_queued_state_of_new_job(self):
+        self.store.update(_NAME, queued_state(_NAME), keep_state=True)
+        self.assertEqual(self.store.get([_NAME])[0].state, JobState.QUEUED)
+
+    def test_requeue_after_running(self):
+        recorder = JobRecorder(self.store, _NAME)
+        recorder.start()
+        recorder.requeue()
+        self.assertEqual(self.store.get([_NAME])[0].state, JobState.QUEUED)
+
+
+class SqliteJobStateStoreTest(_StoreTest, unittest.TestCase):
+
+    def create_store(self, directory):
+        return SqliteJobStateStore(os.path.join(directory, 'states.db'))
+
+
+class DirectoryJobStateStoreTest(_StoreTest, unittest.TestCase):
+
+    def create_store(self, directory):
+        return DirectoryJobStateStore(os.path.join(directory, 'states'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,271 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Compiles ABR ladders into a single ffmpeg command.
+
+The input is decoded once, and its video is split and scaled for every
+rendition in one filter graph:
+[0:v]split=2[s0][s1];[s0]scale=1280:720[v0];[s1]scale=640:360[v1]
+Every rendition then only pays for its own scaling and encoding, rather than
+for a decode of its own as when each rendition is a separate request.
+"""
+
+import glob
+import os
+from typing import List
+
+from worker.ffmpeg_worker_pb2 import FFmpegRequest
+from worker.ffmpeg_worker_pb2 import LadderRequest
+from worker.ffmpeg_worker_pb2 import LadderResult
+from worker.ffmpeg_worker_pb2 import Rendition
+
+_DEFAULT_VIDEO_CODEC = 'libx264'
+_DEFAULT_AUDIO_CODEC = 'aac'
+_DEFAULT_SEGMENT_SECONDS = 6
+
+
+class LadderError(Exception):
+    """Raised when a LadderRequest cannot be compiled."""
+
+
+def compile_request(request: LadderRequest) -> FFmpegRequest:
+    """Returns the FFmpeg request that encodes every rendition of a ladder.
+
+    Raises:
+        LadderError: The ladder is invalid.
+    """
+    _validate(request)
+    # Nobody can answer ffmpeg's prompt to overwrite an output.
+    args = [
+        '-y', '-i', request.input, '-filter_complex',
+        _filter_graph(request.renditions)
+    ]
+    if request.packaging == LadderRequest.DASH:
+        args += _dash_output(request)
+    else:
+        for index, rendition in enumerate(request.renditions):
+            args += _output(request, index, rendition)
+    return FFmpegRequest(ffmpeg_arguments=args,
+                         batch_log_lines=request.batch_log_lines,
+                         report_progress=request.report_progress,
+                         progress_only=request.progress_only,
+                         sample_interval=request.sample_interval,
+                         priority=request.priority)
+
+
+def finish(request: LadderRequest) -> LadderResult:
+    """Writes the HLS master playlist, if any, and lists the renditions' files.
+
+    Must be called once the command of compile_request has succeeded.
+
+    Raises:
+        OSError: The master playlist could not be written.
+    """
+    if request.packaging == LadderRequest.HLS:
+        _write_master_playlist(request)
+    result = LadderResult()
+    for index, rendition in enumerate(request.renditions):
+        if request.packaging == LadderRequest.DASH:
+            directory = os.path.dirname(request.manifest)
+            output = request.manifest
+            files = [
+                os.path.join(directory, f'init-stream{index}.m4s'),
+                *glob.glob(
+                    os.path.join(glob.escape(directory),
+                                 f'chunk-stream{index}-*.m4s'))
+            ]
+        elif request.packaging == LadderRequest.HLS:
+            output = rendition.output
+            files = [output, *glob.glob(glob.escape(_segment_base(output)) +
+                                        '_*.ts')]
+        else:
+            output = rendition.output
+            files = [output]
+        sizes = [_size(path) for path in files]
+        result.renditions.add(
+            name=_name(rendition),
+            output=output,
+            size=sum(size for size in sizes if size is not None),
+            files=sum(size is not None for size in sizes))
+    return result
+
+
+def _validate(request):
+    if not request.input:
+        raise LadderError('The ladder has no input.')
+    if not request.renditions:
+        raise LadderError('The ladder has no renditions.')
+    if request.segment_seconds < 0 or request.audio_bitrate < 0:
+        raise LadderError('segment_seconds and audio_bitrate cannot be negative.')
+    dash = request.packaging == LadderRequest.DASH
+    hls = request.packaging == LadderRequest.HLS
+    if (dash or hls) != bool(request.manifest):
+        raise LadderError('A manifest must be set if and only if the ladder '
+                          'is packaged.')
+    if dash and not request.manifest.endswith('.mpd'):
+        raise LadderError('The DASH manifest must be an .mpd file.')
+    if hls and not request.manifest.endswith('.m3u8'):
+        raise LadderError('The HLS master playlist must be an .m3u8 file.')
+    names = set()
+    for rendition in request.renditions:
+        name = _name(rendition)
+        if name in names:
+            raise LadderError(f'Rendition {name} is given more than once.')
+        names.add(name)
+        if rendition.width <= 0 and rendition.height <= 0:
+            raise LadderError(f'Rendition {name} has no width or height.')
+        if min(rendition.width, rendition.height, rendition.video_bitrate,
+               rendition.crf) < 0:
+            raise LadderError(f'Rendition {name} has a negative setting.')
+        if dash and rendition.output:
+            raise LadderError('The renditions of a DASH ladder are written to '
+                              'its manifest and have no output.')
+        if not dash and not rendition.output:
+            raise LadderError(f'Rendition {name} has no output.')
+        if hls and not rendition.output.endswith('.m3u8'):
+            raise LadderError(
+                f'The output of rendition {name} must be an .m3u8 playlist.')
+        if hls and not rendition.video_bitrate:
+            raise LadderError(
+                f'Rendition {name} needs a video_bitrate for HLS packaging.')
+
+
+def _filter_graph(renditions: List[Rendition]) -> str:
+    """Returns a graph with one video output per rendition, [v0] onwards."""
+    scales = [
+        f'scale={rendition.width or -2}:{rendition.height or -2}'
+        for rendition in renditions
+    ]
+    if len(scales) == 1:
+        return f'[0:v]{scales[0]}[v0]'
+    split = f'[0:v]split={len(scales)}' + ''.join(
+        f'[s{index}]' for index in range(len(scales)))
+    return ';'.join([split] + [
+        f'[s{index}]{scale}[v{index}]' for index, scale in enumerate(scales)
+    ])
+
+
+def _output(request, index, rendition) -> List[str]:
+    """Returns the options and output of a rendition with its own output."""
+    args = [
+        '-map', f'[v{index}]', '-map', '0:a:0?',
+        *_video_options(rendition, ''), *_audio_options(request)
+    ]
+    if request.packaging == LadderRequest.HLS:
+        segment_seconds = _segment_seconds(request)
+        args += [
+            *_keyframe_options(segment_seconds, ''), '-f', 'hls', '-hls_time',
+            str(segment_seconds), '-hls_playlist_type', 'vod',
+            '-hls_segment_filename',
+            _segment_base(rendition.output) + '_%05d.ts'
+        ]
+    return [*args, *rendition.output_arguments, rendition.output]
+
+
+def _dash_output(request) -> List[str]:
+    """Returns the options and output of a DASH manifest of every rendition.
+
+    Video streams come first, so the representation ID of a rendition, which
+    names its segments, is its index.
+    """
+    args = []
+    for index in range(len(request.renditions)):
+        args += ['-map', f'[v{index}]']
+    args += ['-map', '0:a:0?']
+    segment_seconds = _segment_seconds(request)
+    for index, rendition in enumerate(request.renditions):
+        specifier = f':{index}'
+        args += [
+            *_video_options(rendition, specifier),
+            *_keyframe_options(segment_seconds, specifier),
+            *rendition.output_arguments
+        ]
+    return [
+        *args, *_audio_options(request), '-f', 'dash', '-seg_duration',
+        str(segment_seconds), '-adaptation_sets',
+        'id=0,streams=v id=1,streams=a', request.manifest
+    ]
+
+
+def _video_options(rendition, specifier) -> List[str]:
+    """Returns the encoding options of a rendition's video stream.
+
+    specifier selects the stream among the video streams of the output.
+    """
+    args = [f'-c:v{specifier}', rendition.video_codec or _DEFAULT_VIDEO_CODEC]
+    if rendition.video_bitrate:
+        bitrate = rendition.video_bitrate
+        args += [
+            f'-b:v{specifier}', f'{bitrate}k', f'-maxrate:v{specifier}',
+            f'{bitrate}k', f'-bufsize:v{specifier}', f'{2 * bitrate}k'
+        ]
+    elif rendition.crf:
+        args += [f'-crf:v{specifier}', str(rendition.crf)]
+    if rendition.preset:
+        args += [f'-preset:v{specifier}', rendition.preset]
+    return args
+
+
+def _audio_options(request) -> List[str]:
+    args = ['-c:a', request.audio_codec or _DEFAULT_AUDIO_CODEC]
+    if request.audio_bitrate:
+        args += ['-b:a', f'{request.audio_bitrate}k']
+    return args
+
+
+def _keyframe_options(segment_seconds, specifier) -> List[str]:
+    """Forces keyframes at segment boundaries, aligning the renditions."""
+    return [
+        f'-force_key_frames:v{specifier}',
+        f'expr:gte(t,n_forced*{segment_seconds})'
+    ]
+
+
+def _write_master_playlist(request):
+    directory = os.path.dirname(request.manifest)
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for rendition in request.renditions:
+        bandwidth = (rendition.video_bitrate + request.audio_bitrate) * 1000
+        attributes = f'BANDWIDTH={bandwidth}'
+        if rendition.width and rendition.height:
+            attributes += f',RESOLUTION={rendition.width}x{rendition.height}'
+        lines += [
+            f'#EXT-X-STREAM-INF:{attributes}',
+            os.path.relpath(rendition.output, directory or os.curdir)
+        ]
+    with open(request.manifest, 'w') as playlist:
+        playlist.write('\n'.join(lines) + '\n')
+
+
+def _segment_seconds(request) -> int:
+    return request.segment_seconds or _DEFAULT_SEGMENT_SECONDS
+
+
+def _segment_base(playlist: str) -> str:
+    return os.path.splitext(playlist)[0]
+
+
+def _name(rendition) -> str:
+    if rendition.name:
+        return rendition.name
+    if rendition.height:
+        return f'{rendition.height}p'
+    return f'{rendition.width}w'
+
+
+def _size(path):
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return None
@@ -0,0 +1,231 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the ABR ladder compiler.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.ladder_test
+"""
+
+import os
+import tempfile
+import unittest
+
+from worker import ladder
+from worker.ffmpeg_worker_pb2 import LadderRequest
+from worker.ffmpeg_worker_pb2 import Rendition
+from worker.ladder import LadderError
+
+
+def _request(packaging=LadderRequest.NONE, manifest='', **kwargs):
+    outputs = {
+        LadderRequest.NONE: ('out/720p.mp4', 'out/360p.mp4'),
+        LadderRequest.HLS: ('out/720p.m3u8', 'out/360p.m3u8'),
+        LadderRequest.DASH: ('', ''),
+    }[packaging]
+    # HLS needs the bitrate of every rendition.
+    bitrate = 800 if packaging == LadderRequest.HLS else 0
+    return LadderRequest(input='in.mp4',
+                         renditions=[
+                             Rendition(width=1280,
+                                       height=720,
+                                       video_bitrate=3000,
+                                       output=outputs[0]),
+                             Rendition(height=360,
+                                       video_bitrate=bitrate,
+                                       crf=28,
+                                       preset='veryfast',
+                                       output=outputs[1]),
+                         ],
+                         packaging=packaging,
+                         manifest=manifest,
+                         **kwargs)
+
+
+def _arguments(request):
+    return list(ladder.compile_request(request).ffmpeg_arguments)
+
+
+class CompileRequestTest(unittest.TestCase):
+    """Commands compiled from valid ladders."""
+
+    def test_input_is_decoded_once(self):
+        args = _arguments(_request())
+        self.assertEqual(args.count('-i'), 1)
+        self.assertEqual(
+            args[:5],
+            ['-y', '-i', 'in.mp4', '-filter_complex',
+             '[0:v]split=2[s0][s1];[s0]scale=1280:720[v0];'
+             '[s1]scale=-2:360[v1]'])
+
+    def test_single_rendition_is_not_split(self):
+        request = _request()
+        del request.renditions[1]
+        args = _arguments(request)
+        self.assertIn('[0:v]scale=1280:720[v0]', args)
+
+    def test_renditions_have_their_own_outputs(self):
+        args = _arguments(_request())
+        first = args.index('out/720p.mp4')
+        self.assertEqual(args[5:first + 1], [
+            '-map', '[v0]', '-map', '0:a:0?', '-c:v', 'libx264', '-b:v',
+            '3000k', '-maxrate:v', '3000k', '-bufsize:v', '6000k', '-c:a',
+            'aac', 'out/720p.mp4'
+        ])
+        self.assertEqual(args[first + 1:], [
+            '-map', '[v1]', '-map', '0:a:0?', '-c:v', 'libx264', '-crf:v',
+            '28', '-preset:v', 'veryfast', '-c:a', 'aac', 'out/360p.mp4'
+        ])
+
+    def test_request_options_are_passed_on(self):
+        ffmpeg_request = ladder.compile_request(
+            _request(batch_log_lines=True, progress_only=True, priority=2))
+        self.assertTrue(ffmpeg_request.batch_log_lines)
+        self.assertTrue(ffmpeg_request.progress_only)
+        self.assertEqual(ffmpeg_request.priority, 2)
+
+    def test_hls_renditions_are_segmented_at_aligned_keyframes(self):
+        args = _arguments(
+            _request(LadderRequest.HLS, 'out/master.m3u8', segment_seconds=4))
+        self.assertEqual(args.count('expr:gte(t,n_forced*4)'), 2)
+        self.assertIn('out/720p_%05d.ts', args)
+        self.assertIn('out/360p_%05d.ts', args)
+        self.assertNotIn('out/master.m3u8', args)
+
+    def test_dash_renditions_share_the_manifest(self):
+        args = _arguments(
+            _request(LadderRequest.DASH, 'out/manifest.mpd', audio_bitrate=128))
+        self.assertEqual(args[-1], 'out/manifest.mpd')
+        self.assertEqual(args.count('out/manifest.mpd'), 1)
+        for option in ('-c:v:0', '-b:v:0', '-c:v:1', '-crf:v:1',
+                       '-force_key_frames:v:1'):
+            self.assertIn(option, args)
+        self.assertEqual(args[args.index('-b:a') + 1], '128k')
+        self.assertEqual(args[args.index('-seg_duration') + 1], '6')
+
+
+class ValidateTest(unittest.TestCase):
+    """Ladders that cannot be compiled."""
+
+    def assert_invalid(self, request):
+        with self.assertRaises(LadderError):
+            ladder.compile_request(request)
+
+    def test_missing_input_or_renditions(self):
+        self.assert_invalid(LadderRequest(input='in.mp4'))
+        request = _request()
+        request.input = ''
+        self.assert_invalid(request)
+
+    def test_manifest_must_match_packaging(self):
+        self.assert_invalid(_request(manifest='out/master.m3u8'))
+        self.assert_invalid(_request(LadderRequest.HLS))
+        self.assert_invalid(_request(LadderRequest.HLS, 'out/manifest.mpd'))
+        self.assert_invalid(_request(LadderRequest.DASH, 'out/master.m3u8'))
+
+    def test_duplicate_names(self):
+        request = _request()
+        request.renditions[1].height = 720
+        self.assert_invalid(request)
+
+    def test_rendition_without_size(self):
+        request = _request()
+        request.renditions[1].height = 0
+        self.assert_invalid(request)
+
+    def test_negative_settings(self):
+        self.assert_invalid(_request(audio_bitrate=-1))
+        request = _request()
+        request.renditions[1].crf = -1
+        self.assert_invalid(request)
+
+    def test_outputs_must_match_packaging(self):
+        request = _request()
+        request.renditions[0].output = ''
+        self.assert_invalid(request)
+        request = _request(LadderRequest.DASH, 'out/manifest.mpd')
+        request.renditions[0].output = 'out/720p.mp4'
+        self.assert_invalid(request)
+        request = _request(LadderRequest.HLS, 'out/master.m3u8')
+        request.renditions[0].output = 'out/720p.mp4'
+        self.assert_invalid(request)
+
+    def test_hls_needs_bitrates(self):
+        request = _request(LadderRequest.HLS, 'out/master.m3u8')
+        request.renditions[1].video_bitrate = 0
+        self.assert_invalid(request)
+
+
+class FinishTest(unittest.TestCase):
+    """Results of ladders whose command has succeeded."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, size):
+        with open(os.path.join(self.directory, name), 'wb') as output:
+            output.write(b'\0' * size)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_hls_master_playlist_lists_the_renditions(self):
+        request = _request(LadderRequest.HLS, self.path('master.m3u8'),
+                           audio_bitrate=128)
+        request.renditions[0].output = self.path('720p.m3u8')
+        request.renditions[1].output = self.path('360p.m3u8')
+        for name, size in (('720p.m3u8', 10), ('720p_00000.ts', 100),
+                           ('720p_00001.ts', 50), ('360p.m3u8', 10)):
+            self.write(name, size)
+        result = ladder.finish(request)
+        with open(self.path('master.m3u8')) as playlist:
+            self.assertEqual(
+                playlist.read(), '#EXTM3U\n#EXT-X-VERSION:3\n'
+                '#EXT-X-STREAM-INF:BANDWIDTH=3128000,RESOLUTION=1280x720\n'
+                '720p.m3u8\n'
+                '#EXT-X-STREAM-INF:BANDWIDTH=928000\n'
+                '360p.m3u8\n')
+        self.assertEqual(
+            [(rendition.name, rendition.size, rendition.files)
+             for rendition in result.renditions], [('720p', 160, 3),
+                                                   ('360p', 10, 1)])
+
+    def test_dash_renditions_are_found_by_stream(self):
+        request = _request(LadderRequest.DASH, self.path('manifest.mpd'))
+        for name, size in (('init-stream0.m4s', 10),
+                           ('chunk-stream0-00001.m4s', 100),
+                           ('chunk-stream1-00001.m4s', 40)):
+            self.write(name, size)
+        result = ladder.finish(request)
+        self.assertEqual(
+            [(rendition.output, rendition.size, rendition.files)
+             for rendition in result.renditions],
+            [(self.path('manifest.mpd'), 110, 2),
+             (self.path('manifest.mpd'), 40, 1)])
+
+    def test_missing_outputs_are_not_counted(self):
+        request = _request()
+        request.renditions[0].output = self.path('720p.mp4')
+        request.renditions[1].output = self.path('360p.mp4')
+        self.write('720p.mp4', 10)
+        result = ladder.finish(request)
+        self.assertEqual([(rendition.size, rendition.files)
+                          for rendition in result.renditions], [(10, 1),
+                                                                (0, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
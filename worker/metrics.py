@@ -0,0 +1,227 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Metrics in the Prometheus text format.
+
+Counters, gauges and histograms are updated without taking a lock: every
+thread updates its own cells, which are only summed when the metrics are
+scraped. The cells of finished threads are folded into a single cell then, so
+short-lived threads do not accumulate.
+"""
+
+import bisect
+import http.server
+import math
+import threading
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Cells:
+    """Per-thread lists of numbers that are summed when read."""
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._retired = [0] * size
+
+    def get(self) -> List[float]:
+        """Returns the calling thread's cells."""
+        try:
+            return self._local.cells
+        except AttributeError:
+            cells = [0] * self._size
+            self._local.cells = cells
+            with self._lock:
+                self._threads.append((threading.current_thread(), cells))
+            return cells
+
+    def sum(self) -> List[float]:
+        """Returns the sums of the cells of every thread."""
+        with self._lock:
+            alive = []
+            for thread, cells in self._threads:
+                if thread.is_alive():
+                    alive.append((thread, cells))
+                else:
+                    self._retired = [
+                        total + value
+                        for total, value in zip(self._retired, cells)
+                    ]
+            self._threads = alive
+            totals = list(self._retired)
+        for _, cells in alive:
+            totals = [total + value for total, value in zip(totals, cells)]
+        return totals
+
+
+class Counter:
+    """A count that only increases."""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name + '_total'
+        self.documentation = documentation
+        self._cells = _Cells(1)
+
+    def inc(self, amount: float = 1):
+        """Adds amount to the count."""
+        self._cells.get()[0] += amount
+
+    def value(self) -> float:
+        """Returns the count."""
+        return self._cells.sum()[0]
+
+    def samples(self):
+        """Yields the name and value of every sample."""
+        yield self.name, self.value()
+
+
+class Gauge:
+    """A value that goes up and down, or is read from a function."""
+
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 function: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.documentation = documentation
+        self._function = function
+        self._cells = _Cells(1)
+
+    def inc(self, amount: float = 1):
+        """Adds amount to the value."""
+        self._cells.get()[0] += amount
+
+    def dec(self, amount: float = 1):
+        """Subtracts amount from the value."""
+        self._cells.get()[0] -= amount
+
+    def value(self) -> float:
+        """Returns the value."""
+        if self._function is not None:
+            return self._function()
+        return self._cells.sum()[0]
+
+    def samples(self):
+        """Yields the name and value of every sample."""
+        yield self.name, self.value()
+
+
+class Histogram:
+    """Counts observations in buckets with the given upper bounds."""
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self._buckets = sorted(buckets)
+        # A count for every bucket and +Inf, then the sum of the observations.
+        self._cells = _Cells(len(self._buckets) + 2)
+
+    def observe(self, value: float):
+        """Adds an observation."""
+        cells = self._cells.get()
+        cells[bisect.bisect_left(self._buckets, value)] += 1
+        cells[-1] += value
+
+    def samples(self):
+        """Yields the name and value of every sample."""
+        totals = self._cells.sum()
+        count = 0
+        for bound, bucket_count in zip([*self._buckets, math.inf], totals):
+            count += bucket_count
+            yield f'{self.name}_bucket{{le="{_format(bound)}"}}', count
+        yield self.name + '_sum', totals[-1]
+        yield self.name + '_count', count
+
+
+class Registry:
+    """Creates metrics and renders them for Prometheus."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        """Creates a counter, whose samples get a _total suffix."""
+        return self._register(Counter(name, documentation))
+
+    def gauge(self,
+              name: str,
+              documentation: str,
+              function: Optional[Callable[[], float]] = None) -> Gauge:
+        """Creates a gauge that is set through inc and dec, or by function."""
+        return self._register(Gauge(name, documentation, function))
+
+    def histogram(self, name: str, documentation: str,
+                  buckets: Sequence[float]) -> Histogram:
+        """Creates a histogram with the given bucket upper bounds."""
+        return self._register(Histogram(name, documentation, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            metric_type = type(metric).__name__.lower()
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric_type}')
+            for name, value in metric.samples():
+                lines.append(f'{name} {_format(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def start_http_server(registry: Registry,
+                      port: int) -> http.server.ThreadingHTTPServer:
+    """Serves the registry's metrics at /metrics on a daemon thread."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', _CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_):  # pylint: disable=arguments-differ
+            pass
+
+    server = http.server.ThreadingHTTPServer(('', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
@@ -0,0 +1,145 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""A local stand-in for the custom metrics adapter of the autoscaler.
+
+In a cluster, Prometheus scrapes the workers and prometheus-adapter serves
+their autoscaling metrics to the HorizontalPodAutoscaler, as configured in
+prometheus-adapter-config.yaml. This server instead scrapes the workers
+itself whenever it is asked for a metric, and serves the values in the shape
+of the custom metrics API, so that the signals can be watched without a
+cluster. It also logs the number of replicas that the autoscaler would ask
+for, using the targets of ffmpeg-worker-hpa.yaml.
+
+The following command serves the metrics of two local workers:
+python3 -m worker.metrics_adapter --worker localhost:9090 \
+    --worker localhost:9091
+
+The metrics can then be read at
+http://localhost:8081/apis/custom.metrics.k8s.io/v1beta1/namespaces/default/pods/*/ffmpeg_worker_load
+"""
+
+import argparse
+import http.server
+import json
+import logging
+import math
+import re
+import time
+import urllib.error
+import urllib.request
+from typing import Dict
+from typing import List
+from typing import Optional
+
+_LOGGER = logging.getLogger(__name__)
+# The target average of every metric, as in ffmpeg-worker-hpa.yaml.
+TARGETS = {
+    'ffmpeg_worker_load': 0.8,
+    'ffmpeg_worker_backlog_seconds': 120,
+}
+_PATH = re.compile(r'^/apis/custom\.metrics\.k8s\.io/v1beta1/namespaces/'
+                   r'(?P<namespace>[^/]+)/pods/(?P<pod>[^/]+)/(?P<metric>[^/?]+)')
+_SCRAPE_TIMEOUT = 5
+
+
+def scrape(worker: str) -> Optional[Dict[str, float]]:
+    """Returns the autoscaling metrics of a worker, or None if it is down."""
+    try:
+        with urllib.request.urlopen(f'http://{worker}/metrics',
+                                    timeout=_SCRAPE_TIMEOUT) as response:
+            text = response.read().decode()
+    except (OSError, urllib.error.URLError) as error:
+        _LOGGER.warning('Failed to scrape %s: %s', worker, error)
+        return None
+    values = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(' ')
+        if name in TARGETS:
+            values[name] = float(value)
+    return values
+
+
+def desired_replicas(values: List[float], target: float) -> int:
+    """Computes the replicas the autoscaler wants for an average target."""
+    if not values:
+        return 0
+    return math.ceil(sum(values) / target)
+
+
+def main(args):
+    """Serves the metrics of the workers until interrupted."""
+    workers = args.worker
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            match = _PATH.match(self.path)
+            if match is None or match['metric'] not in TARGETS:
+                self.send_error(404)
+                return
+            metric = match['metric']
+            timestamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            items = []
+            reported = []
+            for worker in workers:
+                values = scrape(worker)
+                if values is None or metric not in values:
+                    continue
+                reported.append(values[metric])
+                items.append({
+                    'describedObject': {
+                        'kind': 'Pod',
+                        'namespace': match['namespace'],
+                        'name': worker,
+                        'apiVersion': '/v1',
+                    },
+                    'metricName': metric,
+                    'timestamp': timestamp,
+                    'value': f'{round(values[metric] * 1000)}m',
+                })
+            _LOGGER.info(
+                '%s: %d of %d workers reporting, %d replicas desired.', metric,
+                len(reported), len(workers),
+                desired_replicas(reported, TARGETS[metric]))
+            body = json.dumps({
+                'kind': 'MetricValueList',
+                'apiVersion': 'custom.metrics.k8s.io/v1beta1',
+                'metadata': {},
+                'items': items,
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_):  # pylint: disable=arguments-differ
+            pass
+
+    server = http.server.ThreadingHTTPServer(('', args.port), Handler)
+    _LOGGER.info('Serving the metrics of %s on port %d.', ', '.join(workers),
+                 args.port)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--worker',
+                        action='append',
+                        required=True,
+                        help='host:port of a worker\'s metrics; repeatable')
+    parser.add_argument('--port', default=8081, type=int)
+    main(parser.parse_args())
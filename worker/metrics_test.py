@@ -0,0 +1,122 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the Prometheus metrics.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.metrics_test
+"""
+
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+from worker import metrics
+
+
+class RegistryTest(unittest.TestCase):
+    """Metrics rendered in the Prometheus text format."""
+
+    def test_render(self):
+        registry = metrics.Registry()
+        counter = registry.counter('requests', 'Requests served.')
+        gauge = registry.gauge('in_flight', 'Requests in flight.')
+        registry.gauge('load', 'The load.', lambda: 0.25)
+        histogram = registry.histogram('duration_seconds', 'Durations.',
+                                       [10, 1])
+        counter.inc()
+        counter.inc(2)
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        for value in (0.5, 1, 5, 20):
+            histogram.observe(value)
+        self.assertEqual(
+            registry.render(), '# HELP requests_total Requests served.\n'
+            '# TYPE requests_total counter\n'
+            'requests_total 3\n'
+            '# HELP in_flight Requests in flight.\n'
+            '# TYPE in_flight gauge\n'
+            'in_flight 1\n'
+            '# HELP load The load.\n'
+            '# TYPE load gauge\n'
+            'load 0.25\n'
+            '# HELP duration_seconds Durations.\n'
+            '# TYPE duration_seconds histogram\n'
+            'duration_seconds_bucket{le="1"} 2\n'
+            'duration_seconds_bucket{le="10"} 3\n'
+            'duration_seconds_bucket{le="+Inf"} 4\n'
+            'duration_seconds_sum 26.5\n'
+            'duration_seconds_count 4\n')
+
+    def test_updates_of_every_thread_are_counted(self):
+        registry = metrics.Registry()
+        counter = registry.counter('events', 'Events.')
+        histogram = registry.histogram('sizes', 'Sizes.', [1])
+        barrier = threading.Barrier(4)
+
+        def update():
+            for _ in range(1000):
+                counter.inc()
+                histogram.observe(2)
+            barrier.wait()
+
+        threads = [threading.Thread(target=update) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        # Every thread is alive and has its own cells.
+        self.assertEqual(counter.value(), 3000)
+        for thread in threads:
+            thread.join()
+        # The cells of the finished threads are folded into one.
+        self.assertEqual(counter.value(), 3000)
+        counter.inc()
+        self.assertEqual(counter.value(), 3001)
+        self.assertEqual(
+            dict(histogram.samples()), {
+                'sizes_bucket{le="1"}': 0,
+                'sizes_bucket{le="+Inf"}': 3000,
+                'sizes_sum': 6000,
+                'sizes_count': 3000
+            })
+
+
+class HttpServerTest(unittest.TestCase):
+    """Metrics served over HTTP."""
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+        self.registry.counter('requests', 'Requests served.').inc()
+        server = metrics.start_http_server(self.registry, 0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    def test_metrics_are_served(self):
+        with urllib.request.urlopen(self.url + '/metrics?name=x') as response:
+            self.assertEqual(response.headers['Content-Type'],
+                             'text/plain; version=0.0.4; charset=utf-8')
+            self.assertEqual(response.read().decode(), self.registry.render())
+
+    def test_other_paths_are_not_found(self):
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(self.url + '/')
+        self.assertEqual(context.exception.code, 404)
+        context.exception.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Preempts running jobs of low priority for queued jobs of higher priority.
+
+The scheduler admits queued jobs of higher priority first, but a job that
+arrives while every slot runs a long job of lower priority still waits for
+one of them to finish. With preemption, a job that has to queue marks the
+running job of the lowest priority below its own as preempted, the most
+recently started one if there are several. The preempted job gives up its
+slot and queues ahead of the other jobs of its priority:
+
+- Under SUSPEND, its ffmpeg is stopped with SIGSTOP and continued with
+  SIGCONT once the job gets a slot again. The process keeps its memory and
+  CPUs while it is stopped.
+- Under REQUEUE, its ffmpeg is killed and run again from the start once the
+  job gets a slot again, overwriting the outputs of the killed run. The work
+  done so far is lost, but the memory is freed.
+
+The preemptor only marks jobs; they give up their slots themselves as they
+read ffmpeg's output.
+"""
+
+import threading
+from typing import List
+
+SUSPEND = 'suspend'
+REQUEUE = 'requeue'
+POLICIES = (SUSPEND, REQUEUE)
+
+
+class PreemptibleJob:  # pylint: disable=too-few-public-methods
+    """A running job that can be asked to give up its slot.
+
+    Attributes:
+        priority: The priority of the job, where higher values go first.
+        preempt_event: Set when the job should give up its slot. The job
+            clears it once it holds a slot again.
+        preemptions: The number of times the job has given up its slot.
+    """
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.preempt_event = threading.Event()
+        self.preemptions = 0
+
+
+class Preemptor:
+    """Tracks the running jobs that can be preempted and picks victims."""
+
+    def __init__(self, policy: str):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown preemption policy {policy}.')
+        self.policy = policy
+        self._lock = threading.Lock()
+        # Running jobs in the order they started.
+        self._jobs: List[PreemptibleJob] = []
+
+    def start(self, priority: int) -> PreemptibleJob:
+        """Registers a job that has started running."""
+        job = PreemptibleJob(priority)
+        with self._lock:
+            self._jobs.append(job)
+        return job
+
+    def finish(self, job: PreemptibleJob):
+        """Forgets a job that has finished."""
+        with self._lock:
+            self._jobs.remove(job)
+
+    def request(self, priority: int):
+        """Preempts a running job for a job of the priority that has to queue.
+
+        Jobs that are already preempted are skipped, so that every queued
+        job preempts at most one. Nothing is preempted if every running job
+        has at least the priority.
+        """
+        with self._lock:
+            candidates = [
+                job for job in reversed(self._jobs)
+                if job.priority < priority and not job.preempt_event.is_set()
+            ]
+            if not candidates:
+                return
+            # min returns the most recently started of the lowest jobs.
+            victim = min(candidates, key=lambda job: job.priority)
+            victim.preempt_event.set()
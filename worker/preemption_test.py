@@ -0,0 +1,76 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the preemptor.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.preemption_test
+"""
+
+import unittest
+
+from worker.preemption import Preemptor
+from worker.preemption import REQUEUE
+from worker.preemption import SUSPEND
+
+
+class PreemptorTest(unittest.TestCase):
+    """Victims picked among the running jobs."""
+
+    def preempted(self, preemptor, jobs):
+        return [job.preempt_event.is_set() for job in jobs]
+
+    def test_lowest_priority_is_preempted(self):
+        preemptor = Preemptor(SUSPEND)
+        jobs = [preemptor.start(priority) for priority in (1, 0, 2)]
+        preemptor.request(3)
+        self.assertEqual(self.preempted(preemptor, jobs), [False, True, False])
+
+    def test_most_recent_of_the_lowest_is_preempted(self):
+        preemptor = Preemptor(REQUEUE)
+        jobs = [preemptor.start(0) for _ in range(3)]
+        preemptor.request(1)
+        self.assertEqual(self.preempted(preemptor, jobs), [False, False, True])
+
+    def test_each_request_preempts_another_job(self):
+        preemptor = Preemptor(SUSPEND)
+        jobs = [preemptor.start(priority) for priority in (0, 1)]
+        preemptor.request(2)
+        preemptor.request(2)
+        self.assertEqual(self.preempted(preemptor, jobs), [True, True])
+        preemptor.request(2)
+        self.assertEqual(self.preempted(preemptor, jobs), [True, True])
+
+    def test_jobs_of_equal_or_higher_priority_are_kept(self):
+        preemptor = Preemptor(SUSPEND)
+        jobs = [preemptor.start(priority) for priority in (1, 2)]
+        preemptor.request(1)
+        self.assertEqual(self.preempted(preemptor, jobs), [False, False])
+
+    def test_finished_jobs_are_not_preempted(self):
+        preemptor = Preemptor(SUSPEND)
+        first = preemptor.start(0)
+        second = preemptor.start(0)
+        preemptor.finish(second)
+        preemptor.request(1)
+        self.assertEqual(self.preempted(preemptor, [first, second]),
+                         [True, False])
+
+    def test_unknown_policy_is_rejected(self):
+        with self.assertRaises(ValueError):
+            Preemptor('kill')
+
+
+if __name__ == '__main__':
+    unittest.main()
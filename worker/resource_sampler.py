@@ -0,0 +1,134 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Samples the resource usage of a running process from /proc.
+
+The rusage of a process is only known once it has exited, and not at all if
+it is killed for running out of memory along with its container. Sampling
+/proc while the process runs shows how its memory, CPU use and I/O evolve.
+
+A sample reads /proc/<pid>/stat, status and io, and the status of every
+thread for its context switches. The sampler is not a thread of its own: the
+reader of the process's output takes a sample whenever one is due.
+"""
+
+import os
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from worker.ffmpeg_worker_pb2 import ResourceSample
+
+MIN_INTERVAL = 0.1
+MAX_SAMPLES = 128
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+class ResourceSampler:
+    """Takes samples of a process at an interval and keeps their history.
+
+    The history is downsampled as it grows: once it holds twice max_samples
+    samples, every other sample is dropped and only every other later sample
+    is kept, so that it stays evenly spaced over the whole run.
+    """
+
+    def __init__(self,
+                 pid: int,
+                 interval: float,
+                 max_samples: int = MAX_SAMPLES):
+        self._pid = pid
+        self._interval = max(interval, MIN_INTERVAL)
+        self._max_samples = max_samples
+        self._start_time = time.monotonic()
+        self._next_time = self._start_time + self._interval
+        self._cpu_time = 0
+        self._cpu_sample_time = self._start_time
+        self._history: List[ResourceSample] = []
+        self._stride = 1
+        self._count = 0
+
+    def timeout(self) -> float:
+        """Returns the seconds until the next sample is due."""
+        return max(0, self._next_time - time.monotonic())
+
+    def sample_if_due(self) -> Optional[ResourceSample]:
+        """Takes a sample if one is due.
+
+        Returns:
+            The sample, or None if none was due or the process has exited.
+        """
+        now = time.monotonic()
+        if now < self._next_time:
+            return None
+        # Samples that were missed are skipped rather than taken late.
+        while self._next_time <= now:
+            self._next_time += self._interval
+        try:
+            sample = self._read(now)
+        except (OSError, KeyError, ValueError, IndexError):
+            return None
+        if self._count % self._stride == 0:
+            self._history.append(sample)
+            if len(self._history) >= 2 * self._max_samples:
+                del self._history[1::2]
+                self._stride *= 2
+        self._count += 1
+        return sample
+
+    def history(self) -> List[ResourceSample]:
+        """Returns at most max_samples evenly spaced samples of the run."""
+        step = -(-len(self._history) // self._max_samples)
+        return self._history[::step or 1]
+
+    def _read(self, now: float) -> ResourceSample:
+        proc = f'/proc/{self._pid}'
+        with open(f'{proc}/stat') as stat_file:
+            # The command name may contain spaces, so fields are counted from
+            # the parenthesis that ends it.
+            fields = stat_file.read().rpartition(')')[2].split()
+        # utime and stime are the 14th and 15th fields.
+        cpu_time = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+        status = _read_fields(f'{proc}/status')
+        io = _read_fields(f'{proc}/io')
+        voluntary = involuntary = 0
+        for task in os.listdir(f'{proc}/task'):
+            try:
+                task_status = _read_fields(f'{proc}/task/{task}/status')
+            except OSError:
+                continue  # The thread has exited.
+            voluntary += int(task_status['voluntary_ctxt_switches'])
+            involuntary += int(task_status['nonvoluntary_ctxt_switches'])
+        elapsed = now - self._cpu_sample_time
+        cpu_percent = 100 * (cpu_time - self._cpu_time) / elapsed
+        self._cpu_time = cpu_time
+        self._cpu_sample_time = now
+        return ResourceSample(
+            time=now - self._start_time,
+            cpu_percent=cpu_percent,
+            # VmRSS is in kilobytes.
+            rss=int(status.get('VmRSS', '0 kB').split()[0]) * 1024,
+            read_bytes=int(io['rchar']),
+            write_bytes=int(io['wchar']),
+            voluntary_context_switches=voluntary,
+            involuntary_context_switches=involuntary)
+
+
+def _read_fields(path: str) -> Dict[str, str]:
+    """Reads a /proc file of "name: value" lines."""
+    with open(path) as proc_file:
+        return {
+            name: value.strip()
+            for name, _, value in (line.partition(':') for line in proc_file)
+        }
@@ -0,0 +1,100 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the resource sampler.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.resource_sampler_test
+"""
+
+import os
+import unittest
+from unittest import mock
+
+from worker import resource_sampler
+from worker.ffmpeg_worker_pb2 import ResourceSample
+from worker.resource_sampler import ResourceSampler
+
+
+class ResourceSamplerTest(unittest.TestCase):
+    """Samples of a process taken at an interval."""
+
+    def setUp(self):
+        patcher = mock.patch.object(resource_sampler.time,
+                                    'monotonic',
+                                    return_value=100.0)
+        self.monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _fake_sampler(self, interval, **kwargs):
+        """Returns a sampler whose samples record the time they were taken."""
+        sampler = ResourceSampler(os.getpid(), interval, **kwargs)
+        # pylint: disable=protected-access
+        sampler._read = lambda now: ResourceSample(time=now - 100)
+        return sampler
+
+    def test_samples_are_taken_when_due(self):
+        sampler = self._fake_sampler(1)
+        self.assertEqual(sampler.timeout(), 1)
+        self.assertIsNone(sampler.sample_if_due())
+        self.monotonic.return_value = 101.5
+        self.assertEqual(sampler.sample_if_due().time, 1.5)
+        self.assertIsNone(sampler.sample_if_due())
+        self.assertEqual(sampler.timeout(), 0.5)
+        # Missed samples are skipped.
+        self.monotonic.return_value = 104.5
+        self.assertEqual(sampler.sample_if_due().time, 4.5)
+        self.assertEqual(sampler.timeout(), 0.5)
+
+    def test_interval_has_a_minimum(self):
+        sampler = self._fake_sampler(0)
+        self.assertAlmostEqual(sampler.timeout(),
+                               resource_sampler.MIN_INTERVAL)
+
+    def test_history_is_downsampled_evenly(self):
+        sampler = self._fake_sampler(1, max_samples=4)
+        for second in range(1, 17):
+            self.monotonic.return_value = 100.0 + second
+            sampler.sample_if_due()
+        self.assertEqual([sample.time for sample in sampler.history()],
+                         [1, 5, 9, 13])
+        for second in range(17, 21):
+            self.monotonic.return_value = 100.0 + second
+            sampler.sample_if_due()
+        self.assertEqual([sample.time for sample in sampler.history()],
+                         [1, 9, 17])
+
+    def test_process_is_read_from_proc(self):
+        sampler = ResourceSampler(os.getpid(), 1)
+        self.monotonic.return_value = 101.0
+        sample = sampler.sample_if_due()
+        self.assertEqual(sample.time, 1)
+        self.assertGreater(sample.rss, 0)
+        self.assertGreater(sample.read_bytes, 0)
+        self.assertGreater(
+            sample.voluntary_context_switches +
+            sample.involuntary_context_switches, 0)
+        self.assertGreaterEqual(sample.cpu_percent, 0)
+        self.assertEqual(sampler.history(), [sample])
+
+    def test_exited_process_has_no_samples(self):
+        with mock.patch.object(resource_sampler, 'open', side_effect=OSError):
+            sampler = ResourceSampler(os.getpid(), 1)
+            self.monotonic.return_value = 101.0
+            self.assertIsNone(sampler.sample_if_due())
+        self.assertEqual(sampler.history(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
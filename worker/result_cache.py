@@ -0,0 +1,213 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""A content-addressed cache of transcode results.
+
+An entry is keyed on the normalized ffmpeg arguments and the identity of every
+input file, and holds copies of the output files and the ExitStatus of the run
+that produced them. Only commands whose inputs and outputs are all regular
+files are cached.
+
+Outputs are copied rather than hardlinked in both directions because ffmpeg
+truncates and rewrites existing outputs in place, which would corrupt a
+linked cache entry.
+
+Outputs are stored in the background, once the client may already have read
+or replaced them, so an output that has changed by the time it is copied is
+not stored.
+"""
+
+import collections
+from concurrent import futures
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import List
+from typing import Optional
+
+from worker.ffmpeg_args import FFmpegArguments
+from worker.ffmpeg_args import is_file_url
+from worker.ffmpeg_worker_pb2 import ExitStatus
+
+_LOGGER = logging.getLogger(__name__)
+_EXIT_STATUS_FILE = 'exit_status.pb'
+_HASH_CHUNK_SIZE = 2**20
+
+
+class ResultCache:
+    """Stores the outputs of successful ffmpeg runs on local disk.
+
+    Entries are evicted in least recently used order once their total size
+    exceeds max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, hash_inputs=False):
+        """Initializes the cache with the entries already in directory.
+
+        Args:
+            directory: The directory that holds the cache entries.
+            max_bytes: The maximum total size of the cached outputs.
+            hash_inputs: Whether to include a hash of the content of each
+                input in the key, in addition to its size and mtime.
+        """
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._hash_inputs = hash_inputs
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        # Entries are stored one at a time, after the requests have finished.
+        self._executor = futures.ThreadPoolExecutor(max_workers=1)
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def key(self, ffmpeg_arguments: List[str]) -> Optional[str]:
+        """Returns the cache key of a command, or None if it is not cacheable."""
+        arguments = FFmpegArguments(ffmpeg_arguments)
+        if not arguments.outputs or not all(
+                is_file_url(output) and '%' not in output
+                for output in arguments.outputs):
+            return None
+        inputs = []
+        for path in arguments.inputs:
+            if not is_file_url(path):
+                return None
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+            identity = [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+            if self._hash_inputs:
+                identity.append(_hash_file(path))
+            inputs.append(identity)
+        if not inputs:
+            return None
+        key = json.dumps([arguments.normalized(), inputs])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def replay(self, key: str, outputs: List[str]) -> Optional[ExitStatus]:
+        """Copies the cached outputs of an entry to the given paths.
+
+        Returns:
+            The stored exit status with cached set, or None on a miss.
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        entry = os.path.join(self._directory, key)
+        try:
+            # The modification time orders entries when they are reloaded.
+            os.utime(entry)
+            for index, output in enumerate(outputs):
+                shutil.copyfile(os.path.join(entry, str(index)), output)
+            with open(os.path.join(entry, _EXIT_STATUS_FILE), 'rb') as status:
+                exit_status = ExitStatus.FromString(status.read())
+        except OSError:
+            # The entry was evicted while it was being copied.
+            _LOGGER.exception('Failed to replay cache entry %s.', key)
+            return None
+        exit_status.cached = True
+        return exit_status
+
+    def store(self, key: str, outputs: List[str],
+              exit_status: ExitStatus) -> futures.Future:
+        """Adds the outputs of a successful run to the cache in the background.
+
+        Returns:
+            A future that is done once the entry is stored or discarded.
+        """
+        try:
+            identities = [_identity(output) for output in outputs]
+        except OSError:
+            _LOGGER.exception('Failed to store cache entry %s.', key)
+            discarded = futures.Future()
+            discarded.set_result(None)
+            return discarded
+        return self._executor.submit(self._store, key, outputs, identities,
+                                     exit_status)
+
+    def _store(self, key, outputs, identities, exit_status):
+        """Copies outputs into a new entry unless they have changed."""
+        temp_entry = tempfile.mkdtemp(prefix='tmp', dir=self._directory)
+        try:
+            size = 0
+            for index, output in enumerate(outputs):
+                destination = os.path.join(temp_entry, str(index))
+                shutil.copyfile(output, destination)
+                if _identity(output) != identities[index]:
+                    _LOGGER.info('Not caching %s, which changed after the run.',
+                                 output)
+                    shutil.rmtree(temp_entry)
+                    return
+                size += os.path.getsize(destination)
+            with open(os.path.join(temp_entry, _EXIT_STATUS_FILE), 'wb') as status:
+                status.write(exit_status.SerializeToString())
+            if size > self._max_bytes:
+                shutil.rmtree(temp_entry)
+                return
+            with self._lock:
+                if key in self._entries:
+                    shutil.rmtree(temp_entry)
+                    return
+                os.rename(temp_entry, os.path.join(self._directory, key))
+                self._entries[key] = size
+                self._size += size
+                self._evict()
+        except OSError:
+            _LOGGER.exception('Failed to store cache entry %s.', key)
+            shutil.rmtree(temp_entry, ignore_errors=True)
+
+    def _evict(self):
+        while self._size > self._max_bytes:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            shutil.rmtree(os.path.join(self._directory, key), ignore_errors=True)
+
+    def _load(self):
+        """Indexes the entries left by a previous server, oldest first."""
+        entries = []
+        for name in os.listdir(self._directory):
+            path = os.path.join(self._directory, name)
+            if name.startswith('tmp') or not os.path.exists(
+                    os.path.join(path, _EXIT_STATUS_FILE)):
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(path, file_name))
+                for file_name in os.listdir(path)
+                if file_name != _EXIT_STATUS_FILE)
+            entries.append((os.path.getmtime(path), name, size))
+        for _, name, size in sorted(entries):
+            self._entries[name] = size
+            self._size += size
+        self._evict()
+
+
+def _identity(path: str):
+    """Returns what changes when a file is rewritten."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,73 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the result cache.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.result_cache_test
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+
+from worker.ffmpeg_worker_pb2 import ExitStatus
+from worker.result_cache import ResultCache
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.input = self.write('in.mp4', b'input')
+        self.output = self.write('out.mp4', b'output')
+        self.args = ['-i', self.input, self.output]
+        self.cache = ResultCache(os.path.join(self.directory, 'cache'), 2**20)
+        self.key = self.cache.key(self.args)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as output:
+            output.write(data)
+        return path
+
+    def test_stored_outputs_are_replayed(self):
+        self.cache.store(self.key, [self.output],
+                         ExitStatus(exit_code=0)).result()
+        os.remove(self.output)
+        exit_status = self.cache.replay(self.key, [self.output])
+        self.assertTrue(exit_status.cached)
+        with open(self.output, 'rb') as output:
+            self.assertEqual(output.read(), b'output')
+
+    def test_unknown_key_is_a_miss(self):
+        self.assertIsNone(self.cache.replay(self.key, [self.output]))
+
+    def test_output_changed_before_it_is_stored_is_not_cached(self):
+        # Holds the background store until the output has been replaced.
+        replaced = threading.Event()
+        self.cache._executor.submit(replaced.wait)
+        stored = self.cache.store(self.key, [self.output], ExitStatus())
+        os.remove(self.output)
+        self.write('out.mp4', b'replaced by the client')
+        replaced.set()
+        stored.result()
+        self.assertIsNone(self.cache.replay(self.key, [self.output]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,474 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Admission control for the FFmpeg worker.
+
+The number of ffmpeg processes that run at once is derived from the CPU and
+memory limits of the container's cgroup. Requests beyond that number wait in
+a bounded queue, and requests beyond the queue are rejected.
+
+Queued requests of higher priority are admitted first. Within a priority,
+requests are admitted in arrival order, or, given their predicted runtimes,
+shortest job first. Shortest job first lowers the mean latency of a mix of
+short and long jobs, and its aging variant keeps long jobs from waiting
+forever behind a stream of short ones.
+"""
+
+import asyncio
+import collections
+import math
+import os
+import threading
+import time
+from typing import Callable
+from typing import Optional
+
+_CGROUP_ROOT = '/sys/fs/cgroup/'
+# A cgroup v1 memory limit at or above this value means there is no limit.
+_UNLIMITED_MEMORY = 2**60
+_POLL_INTERVAL = 0.5
+FIFO = 'fifo'
+SHORTEST_JOB_FIRST = 'sjf'
+AGING_SHORTEST_JOB_FIRST = 'aging-sjf'
+POLICIES = (FIFO, SHORTEST_JOB_FIRST, AGING_SHORTEST_JOB_FIRST)
+
+
+class QueueFullError(Exception):
+    """Raised when a request arrives while the queue is at its maximum depth."""
+
+
+def cpu_limit():
+    """Returns the number of CPUs the cgroup may use, or None if unlimited."""
+    try:  # cgroup v2
+        with open(os.path.join(_CGROUP_ROOT, 'cpu.max')) as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota == 'max':
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:  # cgroup v1
+        with open(os.path.join(_CGROUP_ROOT, 'cpu/cpu.cfs_quota_us')) as quota:
+            quota_us = int(quota.read())
+        with open(os.path.join(_CGROUP_ROOT, 'cpu/cpu.cfs_period_us')) as period:
+            period_us = int(period.read())
+    except (OSError, ValueError):
+        return None
+    if quota_us <= 0:
+        return None
+    return quota_us / period_us
+
+
+def memory_limit():
+    """Returns the cgroup memory limit in bytes, or None if unlimited."""
+    for path in ('memory.max', 'memory/memory.limit_in_bytes'):
+        try:
+            with open(os.path.join(_CGROUP_ROOT, path)) as limit_file:
+                limit = limit_file.read().strip()
+        except OSError:
+            continue
+        if limit == 'max':
+            return None
+        try:
+            limit = int(limit)
+        except ValueError:
+            continue
+        return limit if limit < _UNLIMITED_MEMORY else None
+    return None
+
+
+def available_slots(cpus_per_job=1.0, memory_per_job=None):
+    """Computes how many ffmpeg processes can run at once in this container.
+
+    Args:
+        cpus_per_job: The number of CPUs a single ffmpeg process is expected
+            to use.
+        memory_per_job: The number of bytes a single ffmpeg process is
+            expected to use, or None to ignore the memory limit.
+
+    Returns:
+        The number of job slots, which is always at least 1.
+    """
+    cpus = cpu_limit()
+    if cpus is None:
+        cpus = os.cpu_count() or 1
+    slots = math.floor(cpus / cpus_per_job)
+    memory = memory_limit()
+    if memory is not None and memory_per_job:
+        slots = min(slots, memory // memory_per_job)
+    return max(1, slots)
+
+
+class SlotScheduler:
+    """Limits the number of concurrently running jobs.
+
+    A job that cannot run immediately waits in a queue of at most
+    `max_queue_depth` jobs. Waiting jobs are represented by grant callbacks,
+    which are called once a slot has been reserved for the job, so that both
+    threads and coroutines can wait.
+
+    Waiting jobs of the highest priority are admitted first. Among them, under
+    the FIFO policy, jobs are admitted in arrival order. Under
+    SHORTEST_JOB_FIRST, the job with the lowest cost, its predicted runtime in
+    seconds, is admitted first. AGING_SHORTEST_JOB_FIRST lowers the cost of a
+    job by aging_rate for every second it has waited. Jobs submitted without a
+    cost are assumed to cost default_cost, and jobs of equal cost are admitted
+    in arrival order.
+
+    If on_queued is set, it is called with the priority of every job that has
+    to wait, outside of the scheduler's lock, so that running jobs of lower
+    priority can be asked to give up their slots with requeue.
+    """
+
+    def __init__(self,
+                 slots,
+                 max_queue_depth,
+                 policy=FIFO,
+                 aging_rate=1.0,
+                 default_cost=60.0,
+                 on_queued: Optional[Callable[[int], None]] = None):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown scheduling policy {policy}.')
+        self.slots = slots
+        self.max_queue_depth = max_queue_depth
+        self.policy = policy
+        self.on_queued = on_queued
+        self._aging_rate = aging_rate if policy == AGING_SHORTEST_JOB_FIRST else 0
+        self._default_cost = default_cost
+        self._running = 0
+        self._waiting = collections.deque()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        """The number of jobs holding a slot."""
+        return self._running
+
+    @property
+    def queued(self):
+        """The number of jobs waiting for a slot."""
+        return len(self._waiting)
+
+    def load(self) -> float:
+        """Returns running plus queued jobs per slot.
+
+        A load of 1 means that every slot is busy and nothing waits.
+        """
+        return (self._running + len(self._waiting)) / self.slots
+
+    def submit(self, grant, cost: Optional[float] = None, priority: int = 0):
+        """Reserves a slot now or queues grant to be called once one is free.
+
+        Args:
+            grant: A callable taking no arguments. It is called, possibly from
+                another thread, once a slot has been reserved.
+            cost: The predicted runtime of the job in seconds, if known.
+            priority: The priority of the job, where higher values go first.
+
+        Returns:
+            True if a slot was reserved immediately, in which case grant is
+            not called.
+
+        Raises:
+            QueueFullError: The queue is already at its maximum depth.
+        """
+        with self._lock:
+            if not self._waiting and self._running < self.slots:
+                self._running += 1
+                return True
+            if len(self._waiting) >= self.max_queue_depth:
+                raise QueueFullError()
+            self._waiting.append(_Waiter(grant, cost, priority))
+        if self.on_queued is not None:
+            self.on_queued(priority)
+        return False
+
+    def has_free_slot(self) -> bool:
+        """Returns whether a job would be admitted without waiting."""
+        return self.free_slots() > 0
+
+    def free_slots(self) -> int:
+        """Returns how many jobs would be admitted without waiting."""
+        with self._lock:
+            if self._waiting:
+                return 0
+            return max(0, self.slots - self._running)
+
+    def try_acquire(self) -> bool:
+        """Reserves a free slot without ever queueing.
+
+        Returns:
+            True if a slot was reserved, or False if every slot is taken or
+            jobs are waiting for one.
+        """
+        with self._lock:
+            if self._waiting or self._running >= self.slots:
+                return False
+            self._running += 1
+            return True
+
+    def withdraw(self, grant):
+        """Removes a queued grant callback.
+
+        Returns:
+            True if grant was still queued. False means that a slot has
+            already been reserved for it and must be released.
+        """
+        with self._lock:
+            for waiter in self._waiting:
+                if waiter.grant == grant:
+                    self._waiting.remove(waiter)
+                    return True
+            return False
+
+    def outranked(self, priority: int) -> bool:
+        """Returns whether a job of higher priority than priority waits."""
+        with self._lock:
+            return any(waiter.priority > priority for waiter in self._waiting)
+
+    def acquire(self,
+                *stop_events,
+                cost: Optional[float] = None,
+                priority: int = 0):
+        """Waits for a free slot in the calling thread.
+
+        Args:
+            stop_events: Events that abandon the wait when set.
+            cost: The predicted runtime of the job in seconds, if known.
+            priority: The priority of the job, where higher values go first.
+
+        Returns:
+            True if a slot was acquired, or False if one of the stop events
+            was set first.
+
+        Raises:
+            QueueFullError: The queue is already at its maximum depth.
+        """
+        granted = threading.Event()
+        if self.submit(granted.set, cost, priority):
+            return True
+        return self._wait(granted, stop_events)
+
+    def requeue(self,
+                *stop_events,
+                cost: Optional[float] = None,
+                priority: int = 0):
+        """Gives up a held slot to the queue and waits for one in the thread.
+
+        The job is queued ahead of the jobs of its priority, even if the queue
+        is at its maximum depth.
+
+        Args:
+            stop_events: Events that abandon the wait when set.
+            cost: The predicted runtime of the job in seconds, if known.
+            priority: The priority of the job, where higher values go first.
+
+        Returns:
+            True if a slot was acquired again, or False if one of the stop
+            events was set first. A slot is counted as held either way, so
+            that it is released as usual.
+        """
+        granted = threading.Event()
+        self._requeue(granted.set, cost, priority)
+        if self._wait(granted, stop_events):
+            return True
+        with self._lock:
+            self._running += 1
+        return False
+
+    def _wait(self, granted: threading.Event, stop_events) -> bool:
+        """Waits for a queued grant, returning False if it was withdrawn."""
+        while not granted.wait(_POLL_INTERVAL):
+            if any(event.is_set() for event in stop_events):
+                if self.withdraw(granted.set):
+                    return False
+                break
+        return True
+
+    async def acquire_async(self,
+                            *stop_events,
+                            cost: Optional[float] = None,
+                            priority: int = 0):
+        """Waits for a free slot in the running event loop.
+
+        If the waiting coroutine is cancelled, its place in the queue or its
+        slot is given up.
+
+        Args:
+            stop_events: Events that abandon the wait when set.
+            cost: The predicted runtime of the job in seconds, if known.
+            priority: The priority of the job, where higher values go first.
+
+        Returns:
+            True if a slot was acquired, or False if one of the stop events
+            was set first.
+
+        Raises:
+            QueueFullError: The queue is already at its maximum depth.
+        """
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant():
+            loop.call_soon_threadsafe(_set_done, granted)
+
+        if self.submit(grant, cost, priority):
+            return True
+        try:
+            while not granted.done():
+                await asyncio.wait([granted], timeout=_POLL_INTERVAL)
+                if (not granted.done() and
+                        any(event.is_set() for event in stop_events)):
+                    if self.withdraw(grant):
+                        return False
+                    await granted
+        except asyncio.CancelledError:
+            if not self.withdraw(grant):
+                self.release()
+            raise
+        return True
+
+    async def requeue_async(self,
+                            *stop_events,
+                            cost: Optional[float] = None,
+                            priority: int = 0):
+        """Gives up a held slot to the queue and waits for one in the loop.
+
+        Like requeue, a slot is counted as held once this returns, and also
+        if the waiting coroutine is cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant():
+            loop.call_soon_threadsafe(_set_done, granted)
+
+        self._requeue(grant, cost, priority)
+        try:
+            while not granted.done():
+                await asyncio.wait([granted], timeout=_POLL_INTERVAL)
+                if (not granted.done() and
+                        any(event.is_set() for event in stop_events)):
+                    break
+        except asyncio.CancelledError:
+            if self.withdraw(grant):
+                with self._lock:
+                    self._running += 1
+            raise
+        if granted.done() or not self.withdraw(grant):
+            return True
+        with self._lock:
+            self._running += 1
+        return False
+
+    def _requeue(self, grant, cost, priority):
+        """Queues grant at the front of its priority and frees its slot."""
+        with self._lock:
+            self._waiting.appendleft(_Waiter(grant, cost, priority))
+            self._running -= 1
+            self._admit()
+        if self.on_queued is not None:
+            self.on_queued(priority)
+
+    def release(self):
+        """Frees a slot acquired with submit, try_acquire or an acquire."""
+        with self._lock:
+            self._running -= 1
+            self._admit()
+
+    def _admit(self):
+        """Grants free slots to waiters. Must be called with the lock held."""
+        while self._waiting and self._running < self.slots:
+            self._running += 1
+            self._next_waiter().grant()
+
+    def _next_waiter(self) -> '_Waiter':
+        """Removes and returns the waiter to admit next under the policy."""
+        priority = max(waiter.priority for waiter in self._waiting)
+        candidates = [
+            waiter for waiter in self._waiting if waiter.priority == priority
+        ]
+        if self.policy == FIFO:
+            waiter = candidates[0]
+        else:
+            now = time.monotonic()
+            # min returns the earliest of waiters with equal rank.
+            waiter = min(candidates,
+                         key=lambda waiter: waiter.rank(
+                             now, self._aging_rate, self._default_cost))
+        self._waiting.remove(waiter)
+        return waiter
+
+
+class _Waiter:  # pylint: disable=too-few-public-methods
+    """A queued grant callback and the cost and priority of its job."""
+
+    def __init__(self, grant, cost, priority):
+        self.grant = grant
+        self.cost = cost
+        self.priority = priority
+        self.submit_time = time.monotonic()
+
+    def rank(self, now, aging_rate, default_cost):
+        """Returns the rank of the job in its priority, lowest going first."""
+        cost = default_cost if self.cost is None else self.cost
+        return cost - aging_rate * (now - self.submit_time)
+
+
+def _set_done(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LoadEstimator:
+    """Estimates the load of a SlotScheduler for autoscaling.
+
+    Unlike CPU utilization, which saturates as soon as one job runs, the load
+    keeps growing as requests queue up, so the number of workers can be
+    scaled in proportion to it.
+    """
+
+    def __init__(self, scheduler: SlotScheduler, job_seconds: float,
+                 smoothing: float = 0.1):
+        """Initializes the estimator.
+
+        Args:
+            scheduler: The scheduler whose jobs are estimated.
+            job_seconds: The expected duration of a job until jobs finish.
+            smoothing: The weight of each finished job in the exponential
+                moving average of job durations.
+        """
+        self._scheduler = scheduler
+        self._smoothing = smoothing
+        self.job_seconds = job_seconds
+
+    def record_job(self, seconds: float):
+        """Adds the duration of a finished job to the average.
+
+        Concurrent calls may lose an update, which only makes the average
+        slightly less smooth, so no lock is taken.
+        """
+        self.job_seconds += self._smoothing * (seconds - self.job_seconds)
+
+    def load(self) -> float:
+        """Returns the load of the scheduler, as in SlotScheduler.load."""
+        return self._scheduler.load()
+
+    def backlog_seconds(self) -> float:
+        """Estimates how long the slots need to finish the current jobs.
+
+        Running jobs are assumed to be half done.
+        """
+        jobs = self._scheduler.queued + self._scheduler.running / 2
+        return jobs * self.job_seconds / self._scheduler.slots
@@ -0,0 +1,341 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the slot scheduler.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.scheduler_test
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from worker import scheduler as scheduler_module
+from worker.scheduler import AGING_SHORTEST_JOB_FIRST
+from worker.scheduler import LoadEstimator
+from worker.scheduler import QueueFullError
+from worker.scheduler import SHORTEST_JOB_FIRST
+from worker.scheduler import SlotScheduler
+
+
+class CgroupTest(unittest.TestCase):
+    """Job slots derived from the limits of the container's cgroup."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        patcher = mock.patch.object(scheduler_module, '_CGROUP_ROOT',
+                                    self.root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, path, contents):
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as cgroup_file:
+            cgroup_file.write(contents)
+
+    def test_cgroup_v2_limits(self):
+        self.write('cpu.max', '250000 100000\n')
+        self.write('memory.max', '4294967296\n')
+        self.assertEqual(scheduler_module.cpu_limit(), 2.5)
+        self.assertEqual(scheduler_module.memory_limit(), 2**32)
+
+    def test_cgroup_v2_without_limits(self):
+        self.write('cpu.max', 'max 100000\n')
+        self.write('memory.max', 'max\n')
+        self.assertIsNone(scheduler_module.cpu_limit())
+        self.assertIsNone(scheduler_module.memory_limit())
+
+    def test_cgroup_v1_limits(self):
+        self.write('cpu/cpu.cfs_quota_us', '300000\n')
+        self.write('cpu/cpu.cfs_period_us', '100000\n')
+        self.write('memory/memory.limit_in_bytes', '1073741824\n')
+        self.assertEqual(scheduler_module.cpu_limit(), 3)
+        self.assertEqual(scheduler_module.memory_limit(), 2**30)
+
+    def test_cgroup_v1_without_limits(self):
+        self.write('cpu/cpu.cfs_quota_us', '-1\n')
+        self.write('cpu/cpu.cfs_period_us', '100000\n')
+        self.write('memory/memory.limit_in_bytes', '9223372036854771712\n')
+        self.assertIsNone(scheduler_module.cpu_limit())
+        self.assertIsNone(scheduler_module.memory_limit())
+
+    def test_slots_are_limited_by_cpus_and_memory(self):
+        self.write('cpu.max', '800000 100000\n')
+        self.write('memory.max', str(3 * 2**30))
+        self.assertEqual(scheduler_module.available_slots(2), 4)
+        self.assertEqual(scheduler_module.available_slots(2, 2**30), 3)
+
+    def test_there_is_always_a_slot(self):
+        self.write('cpu.max', '50000 100000\n')
+        self.write('memory.max', str(2**20))
+        self.assertEqual(scheduler_module.available_slots(1, 2**30), 1)
+
+
+class SlotSchedulerTest(unittest.TestCase):
+    """Slots and the bounded queue of jobs waiting for them."""
+
+    def test_jobs_beyond_the_queue_are_rejected(self):
+        scheduler = SlotScheduler(1, 1)
+        self.assertTrue(scheduler.submit(lambda: None))
+        self.assertFalse(scheduler.submit(lambda: None))
+        with self.assertRaises(QueueFullError):
+            scheduler.submit(lambda: None)
+        self.assertEqual((scheduler.running, scheduler.queued), (1, 1))
+        self.assertEqual(scheduler.load(), 2)
+
+    def test_waiting_jobs_are_admitted_in_arrival_order(self):
+        scheduler = SlotScheduler(1, 3)
+        scheduler.try_acquire()
+        granted = []
+        for name in 'abc':
+            scheduler.submit(lambda name=name: granted.append(name))
+        for _ in range(3):
+            scheduler.release()
+        self.assertEqual(granted, ['a', 'b', 'c'])
+        self.assertEqual(scheduler.running, 1)
+
+    def test_withdrawn_job_is_not_admitted(self):
+        scheduler = SlotScheduler(1, 1)
+        scheduler.try_acquire()
+        granted = []
+
+        def grant():
+            granted.append(True)
+
+        scheduler.submit(grant)
+        self.assertTrue(scheduler.withdraw(grant))
+        self.assertFalse(scheduler.withdraw(grant))
+        scheduler.release()
+        self.assertEqual((granted, scheduler.running), ([], 0))
+
+    def test_acquire_waits_for_a_release(self):
+        scheduler = SlotScheduler(1, 1)
+        scheduler.try_acquire()
+        timer = threading.Timer(0.05, scheduler.release)
+        timer.start()
+        self.addCleanup(timer.join)
+        self.assertTrue(scheduler.acquire(threading.Event()))
+        self.assertEqual((scheduler.running, scheduler.queued), (1, 0))
+
+    def test_stop_event_abandons_the_wait(self):
+        scheduler = SlotScheduler(1, 1)
+        scheduler.try_acquire()
+        stop_event = threading.Event()
+        stop_event.set()
+        with mock.patch.object(scheduler_module, '_POLL_INTERVAL', 0.01):
+            self.assertFalse(scheduler.acquire(stop_event))
+        self.assertEqual((scheduler.running, scheduler.queued), (1, 0))
+
+    def test_cancelled_coroutine_gives_up_its_place(self):
+        scheduler = SlotScheduler(1, 1)
+        scheduler.try_acquire()
+
+        async def acquire():
+            task = asyncio.ensure_future(scheduler.acquire_async())
+            await asyncio.sleep(0.01)
+            self.assertEqual(scheduler.queued, 1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(acquire())
+        self.assertEqual((scheduler.running, scheduler.queued), (1, 0))
+
+    def test_coroutine_is_granted_a_released_slot(self):
+        scheduler = SlotScheduler(1, 1)
+        scheduler.try_acquire()
+
+        async def acquire():
+            asyncio.get_running_loop().call_later(0.01, scheduler.release)
+            return await scheduler.acquire_async()
+
+        self.assertTrue(asyncio.run(acquire()))
+        self.assertEqual((scheduler.running, scheduler.queued), (1, 0))
+
+
+class PriorityTest(unittest.TestCase):
+    """Waiting jobs of higher priority and jobs that give up their slot."""
+
+    def test_higher_priority_goes_first(self):
+        scheduler = SlotScheduler(1, 3)
+        scheduler.try_acquire()
+        granted = []
+        for name, priority in (('a', 0), ('b', 2), ('c', 1)):
+            scheduler.submit(lambda name=name: granted.append(name),
+                             priority=priority)
+        for _ in range(3):
+            scheduler.release()
+        self.assertEqual(granted, ['b', 'c', 'a'])
+
+    def test_queued_jobs_are_reported(self):
+        queued = []
+        scheduler = SlotScheduler(1, 2, on_queued=queued.append)
+        scheduler.submit(lambda: None, priority=5)
+        scheduler.submit(lambda: None, priority=3)
+        self.assertEqual(queued, [3])
+        self.assertTrue(scheduler.outranked(2))
+        self.assertFalse(scheduler.outranked(3))
+
+    def test_requeued_job_gives_its_slot_to_a_higher_priority(self):
+        scheduler = SlotScheduler(1, 1)
+        scheduler.try_acquire()
+        granted = []
+        scheduler.submit(lambda: granted.append('high'), priority=1)
+        requeued = threading.Thread(target=scheduler.requeue,
+                                    args=(threading.Event(),))
+        requeued.start()
+        while not granted:
+            threading.Event().wait(0.01)
+        self.assertEqual(scheduler.queued, 1)
+        scheduler.release()
+        requeued.join()
+        self.assertEqual((scheduler.running, scheduler.queued), (1, 0))
+
+    def test_requeued_job_goes_ahead_of_its_priority(self):
+        scheduler = SlotScheduler(1, 1)
+        scheduler.try_acquire()
+        granted = []
+        scheduler.submit(lambda: granted.append('queued'))
+        # The slot given up goes back to the requeued job, ahead of the job
+        # that was already queued, even though the queue is full.
+        self.assertTrue(asyncio.run(scheduler.requeue_async()))
+        self.assertEqual((granted, scheduler.running, scheduler.queued),
+                         ([], 1, 1))
+        scheduler.release()
+        self.assertEqual(granted, ['queued'])
+
+    def test_stopped_requeue_still_holds_a_slot(self):
+        scheduler = SlotScheduler(1, 1)
+        scheduler.try_acquire()
+        granted = []
+        scheduler.submit(lambda: granted.append('high'), priority=1)
+        stop_event = threading.Event()
+        stop_event.set()
+        with mock.patch.object(scheduler_module, '_POLL_INTERVAL', 0.01):
+            self.assertFalse(scheduler.requeue(stop_event))
+        self.assertEqual(granted, ['high'])
+        self.assertEqual((scheduler.running, scheduler.queued), (2, 0))
+
+
+class ShortestJobFirstTest(unittest.TestCase):
+    """Waiting jobs admitted by their predicted runtime."""
+
+    def admit(self, scheduler, costs, wait=None):
+        """Queues jobs of the costs and returns the order they are admitted.
+
+        If wait is set, it is called after the first job has been queued.
+        """
+        scheduler.try_acquire()
+        granted = []
+        for index, cost in enumerate(costs):
+            scheduler.submit(lambda index=index: granted.append(index), cost)
+            if index == 0 and wait is not None:
+                wait()
+        for _ in costs:
+            scheduler.release()
+        return granted
+
+    def test_shortest_job_goes_first(self):
+        scheduler = SlotScheduler(1, 4, policy=SHORTEST_JOB_FIRST,
+                                  default_cost=30)
+        self.assertEqual(self.admit(scheduler, [60, 10, None, 10]),
+                         [1, 3, 2, 0])
+
+    def test_waiting_lowers_the_cost_of_a_job(self):
+        with mock.patch.object(scheduler_module.time, 'monotonic',
+                               return_value=0.0) as monotonic:
+
+            def wait():
+                monotonic.return_value = 50.0
+
+            self.assertEqual(
+                self.admit(SlotScheduler(1, 2,
+                                         policy=AGING_SHORTEST_JOB_FIRST,
+                                         aging_rate=1),
+                           [60, 20],
+                           wait=wait), [0, 1])
+
+    def test_shortest_job_first_does_not_age(self):
+        with mock.patch.object(scheduler_module.time, 'monotonic',
+                               return_value=0.0) as monotonic:
+
+            def wait():
+                monotonic.return_value = 50.0
+
+            self.assertEqual(
+                self.admit(SlotScheduler(1, 2, policy=SHORTEST_JOB_FIRST),
+                           [60, 20],
+                           wait=wait), [1, 0])
+
+    def test_unknown_policy_is_rejected(self):
+        with self.assertRaises(ValueError):
+            SlotScheduler(1, 1, policy='lifo')
+
+
+class LoadEstimatorTest(unittest.TestCase):
+    """Load reported to the autoscaler."""
+
+    def test_backlog_counts_queued_and_half_of_running_jobs(self):
+        scheduler = SlotScheduler(2, 4)
+        for _ in range(5):
+            scheduler.submit(lambda: None)
+        estimator = LoadEstimator(scheduler, job_seconds=60)
+        self.assertEqual(estimator.load(), 2.5)
+        self.assertEqual(estimator.backlog_seconds(), (3 + 2 / 2) * 60 / 2)
+
+    def test_job_duration_is_a_moving_average(self):
+        estimator = LoadEstimator(SlotScheduler(1, 0),
+                                  job_seconds=60,
+                                  smoothing=0.5)
+        estimator.record_job(20)
+        estimator.record_job(20)
+        self.assertEqual(estimator.job_seconds, 30)
+
+
+class TryAcquireTest(unittest.TestCase):
+    """Slots reserved by pullers that must not queue."""
+
+    def test_free_slot_is_reserved(self):
+        scheduler = SlotScheduler(1, 1)
+        self.assertTrue(scheduler.has_free_slot())
+        self.assertTrue(scheduler.try_acquire())
+        self.assertEqual(scheduler.running, 1)
+        self.assertFalse(scheduler.has_free_slot())
+
+    def test_busy_scheduler_is_not_queued_for(self):
+        scheduler = SlotScheduler(1, 1)
+        scheduler.try_acquire()
+        self.assertFalse(scheduler.try_acquire())
+        self.assertEqual(scheduler.queued, 0)
+        self.assertEqual(scheduler.load(), 1)
+
+    def test_waiting_jobs_go_first(self):
+        scheduler = SlotScheduler(1, 1)
+        scheduler.try_acquire()
+        granted = []
+        scheduler.submit(lambda: granted.append(True))
+        scheduler.release()
+        self.assertEqual(granted, [True])
+        self.assertFalse(scheduler.try_acquire())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,302 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Transcodes a single input in concurrently encoded segments.
+
+The input is split at video keyframes, so that every segment starts with a
+frame that can be decoded on its own. The segments are encoded with the
+command's own output options and joined with ffmpeg's concat demuxer without
+re-encoding.
+
+Only the neighbourhood of each split point is probed, so that splitting a long
+input on the gcsfuse mount does not read the whole file.
+"""
+
+import bisect
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from worker.ffmpeg_args import FFmpegArguments
+from worker.ffmpeg_args import is_file_url
+from worker.ffmpeg_worker_pb2 import ExitStatus
+from worker.ffmpeg_worker_pb2 import FFmpegResponse
+from worker.ffmpeg_worker_pb2 import Progress
+
+# The environment ffmpeg runs in.
+_PROBE_ENV = {'LD_LIBRARY_PATH': '/usr/grte/v4/lib64/'}
+# The number of seconds after each ideal split point searched for a keyframe.
+_PROBE_WINDOW = 20
+# Input options that select a time range, which segmenting replaces.
+_RANGE_OPTIONS = ('ss', 'sseof', 't', 'to')
+
+
+class SegmentationError(Exception):
+    """Raised when a command cannot be transcoded in segments."""
+
+
+class SegmentPlan:
+    """The commands that transcode an input in segments and join them.
+
+    Attributes:
+        segments: The ffmpeg arguments of each segment, in order.
+        concat_arguments: The ffmpeg arguments that join the outputs of the
+            segments, or None if the input is not split.
+    """
+
+    def __init__(self, segments: List[List[str]],
+                 concat_arguments: Optional[List[str]] = None,
+                 temporary_files: Iterable[str] = ()):
+        self.segments = segments
+        self.concat_arguments = concat_arguments
+        self._temporary_files = list(temporary_files)
+
+    def cleanup(self):
+        """Removes the outputs of the segments and the concat list."""
+        for path in self._temporary_files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def plan(ffmpeg_arguments: List[str], segments: int) -> SegmentPlan:
+    """Splits a command into up to the given number of segments.
+
+    Fewer segments are planned if the input has too few keyframes.
+
+    Raises:
+        SegmentationError: The command cannot be segmented, or its input
+            could not be probed.
+    """
+    arguments = FFmpegArguments(ffmpeg_arguments)
+    if len(arguments.inputs) != 1 or len(arguments.outputs) != 1:
+        raise SegmentationError(
+            'Only commands with one input and one output can be segmented.')
+    output = arguments.outputs[0]
+    if not is_file_url(output) or '%' in output:
+        raise SegmentationError('The output of a segmented command must be a file.')
+    if any(arguments.has_option(option) for option in _RANGE_OPTIONS):
+        raise SegmentationError(
+            'Segmented commands cannot select a time range with -ss, -sseof, -t '
+            'or -to.')
+    input_url = arguments.inputs[0]
+    duration = probe_duration(input_url)
+    targets = [duration * index / segments for index in range(1, segments)]
+    points = split_points(probe_keyframes(input_url, targets), targets)
+    if not points:
+        return SegmentPlan([list(arguments.args)])
+
+    base, extension = os.path.splitext(output)
+    directory, name = os.path.split(base)
+    segment_outputs = [
+        os.path.join(directory, f'.{name}.segment{index}{extension}')
+        for index in range(len(points) + 1)
+    ]
+    input_option = arguments.input_indices[0] - 1
+    output_index = arguments.output_indices[0]
+    overwrite = ['-y'] if arguments.has_option('y') else []
+    # The outputs of the segments are our own temporary files, so they are
+    # overwritten rather than letting ffmpeg ask about a file left by a failed
+    # run.
+    segment_overwrite = [] if overwrite else ['-y']
+    commands = []
+    for index, segment_output in enumerate(segment_outputs):
+        start = points[index - 1] if index > 0 else 0
+        time_range = ['-ss', f'{start:.6f}']
+        if index < len(points):
+            time_range += ['-t', f'{points[index] - start:.6f}']
+        args = list(arguments.args)
+        args[output_index] = segment_output
+        commands.append([
+            *segment_overwrite, *args[:input_option], *time_range,
+            *args[input_option:]
+        ])
+
+    list_fd, list_path = tempfile.mkstemp(prefix='concat', suffix='.txt')
+    with os.fdopen(list_fd, 'w') as concat_list:
+        for segment_output in segment_outputs:
+            escaped = os.path.abspath(segment_output).replace("'", "'\\''")
+            concat_list.write(f"file '{escaped}'\n")
+    concat_arguments = [
+        *overwrite, '-f', 'concat', '-safe', '0', '-i', list_path, '-map', '0',
+        '-c', 'copy', output
+    ]
+    return SegmentPlan(commands, concat_arguments, [*segment_outputs, list_path])
+
+
+def probe_duration(input_url: str) -> float:
+    """Returns the duration of an input in seconds."""
+    output = _probe(['-show_entries', 'format=duration', input_url])
+    try:
+        return float(output.split()[0])
+    except (IndexError, ValueError):
+        raise SegmentationError(f'The duration of {input_url} is unknown.')
+
+
+def probe_keyframes(input_url: str, targets: List[float]) -> List[float]:
+    """Returns the sorted times of the video keyframes after each target."""
+    if not targets:
+        return []
+    intervals = ','.join(f'{target:.6f}%+{_PROBE_WINDOW}' for target in targets)
+    output = _probe([
+        '-select_streams', 'v:0', '-read_intervals', intervals,
+        '-show_entries', 'packet=pts_time,flags', input_url
+    ])
+    keyframes = set()
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' not in flags:
+            continue
+        try:
+            keyframes.add(float(pts_time))
+        except ValueError:  # N/A
+            continue
+    return sorted(keyframes)
+
+
+def split_points(keyframes: List[float], targets: List[float]) -> List[float]:
+    """Chooses the first keyframe at or after each target.
+
+    Targets without a later keyframe, and keyframes chosen for an earlier
+    target, are skipped, so the result is strictly increasing and never
+    starts at 0.
+    """
+    points = []
+    for target in targets:
+        index = bisect.bisect_left(keyframes, target)
+        if index == len(keyframes):
+            continue
+        point = keyframes[index]
+        if point > 0 and (not points or point > points[-1]):
+            points.append(point)
+    return points
+
+
+def _probe(args: List[str]) -> str:
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-of', 'csv=p=0', *args],
+            env=_PROBE_ENV,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True)
+    except (OSError, subprocess.CalledProcessError) as error:
+        raise SegmentationError(f'Failed to probe the input: {error}')
+    return result.stdout.decode('utf-8', 'replace')
+
+
+# Runs the ffmpeg arguments of a segment until one of the events is set, and
+# yields its responses. The last response must carry the exit status.
+SegmentRunner = Callable[[List[str], Tuple[threading.Event, ...]],
+                         Iterator[FFmpegResponse]]
+
+
+def run_segments(segments: List[List[str]], run_segment: SegmentRunner,
+                 *stop_events: threading.Event
+                ) -> Iterator[Tuple[int, FFmpegResponse]]:
+    """Runs every segment on its own thread.
+
+    Yields:
+        The index of a segment and one of its responses, in the order in
+        which the responses arrive.
+
+    Raises:
+        Any exception raised by run_segment. The other segments are stopped
+        when this happens or when the generator is closed, and this generator
+        only returns once their threads have finished.
+    """
+    responses = queue.Queue()
+    stop_event = threading.Event()
+    events = (stop_event, *stop_events)
+
+    def run(index, arguments):
+        error = None
+        try:
+            for response in run_segment(arguments, events):
+                responses.put((index, response, None))
+        except Exception as exception:  # pylint: disable=broad-except
+            error = exception
+        responses.put((index, None, error))
+
+    threads = [
+        threading.Thread(target=run, args=(index, arguments), daemon=True)
+        for index, arguments in enumerate(segments)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        running = len(threads)
+        while running:
+            index, response, error = responses.get()
+            if error is not None:
+                raise error
+            if response is None:
+                running -= 1
+                continue
+            yield index, response
+    finally:
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+
+
+def sum_progress(reports: Iterable[Progress]) -> Progress:
+    """Combines the latest progress reports of concurrent segments.
+
+    Counts, times and rates are summed, since the segments encode different
+    parts of the output at the same time. The bitrate is recomputed from the
+    combined size and time.
+    """
+    total = Progress()
+    out_time_us = 0
+    for report in reports:
+        total.frame += report.frame
+        total.fps += report.fps
+        total.speed += report.speed
+        total.total_size += report.total_size
+        out_time_us += report.out_time.ToMicroseconds()
+    total.out_time.FromMicroseconds(out_time_us)
+    if out_time_us:
+        total.bitrate = total.total_size * 8 / 1000 / (out_time_us / 10**6)
+    return total
+
+
+def sum_exit_statuses(statuses: Iterable[ExitStatus]) -> ExitStatus:
+    """Combines the exit statuses of the segments and the concat step.
+
+    The exit code is the first non-zero one. Resource usage is summed, except
+    for ru_maxrss, which is the largest of the segments' since they may run on
+    different workers. real_time is left to the caller.
+    """
+    total = ExitStatus()
+    usage = total.resource_usage
+    for status in statuses:
+        if not total.exit_code:
+            total.exit_code = status.exit_code
+        for field, value in status.resource_usage.ListFields():
+            if field.name == 'ru_maxrss':
+                usage.ru_maxrss = max(usage.ru_maxrss, value)
+            else:
+                setattr(usage, field.name, getattr(usage, field.name) + value)
+    return total
@@ -0,0 +1,254 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the segmenter.
+
+This should be run when `ffmpeg-on-cloud` is the working directory:
+python3 -m unittest worker.segmenter_test
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from worker import segmenter
+from worker.ffmpeg_worker_pb2 import ExitStatus
+from worker.ffmpeg_worker_pb2 import FFmpegResponse
+from worker.ffmpeg_worker_pb2 import Progress
+from worker.ffmpeg_worker_pb2 import ResourceUsage
+from worker.segmenter import SegmentationError
+
+
+class SplitPointsTest(unittest.TestCase):
+    """Keyframes chosen as the boundaries of segments."""
+
+    def test_first_keyframe_after_each_target(self):
+        self.assertEqual(
+            segmenter.split_points([0, 4, 8, 12, 16], [5, 10, 15]),
+            [8, 12, 16])
+
+    def test_keyframe_at_the_target(self):
+        self.assertEqual(segmenter.split_points([0, 5, 10], [5]), [5])
+
+    def test_keyframes_are_not_chosen_twice(self):
+        self.assertEqual(segmenter.split_points([0, 20], [5, 10, 15]), [20])
+
+    def test_targets_after_the_last_keyframe_are_skipped(self):
+        self.assertEqual(segmenter.split_points([0, 6], [5, 10]), [6])
+        self.assertEqual(segmenter.split_points([], [5]), [])
+
+    def test_input_is_not_split_at_its_start(self):
+        self.assertEqual(segmenter.split_points([0], [0]), [])
+
+
+class ProbeTest(unittest.TestCase):
+    """ffprobe output parsed into durations and keyframes."""
+
+    def test_duration(self):
+        with mock.patch.object(segmenter, '_probe',
+                               return_value='12.500000\n'):
+            self.assertEqual(segmenter.probe_duration('in.mp4'), 12.5)
+
+    def test_unknown_duration(self):
+        with mock.patch.object(segmenter, '_probe', return_value='N/A\n'):
+            with self.assertRaises(SegmentationError):
+                segmenter.probe_duration('in.mp4')
+
+    def test_keyframes_near_the_targets(self):
+        with mock.patch.object(
+                segmenter,
+                '_probe',
+                return_value='10.0,K_\n10.5,__\nN/A,K_\n20.0,K_\n10.0,K_\n'
+        ) as probe:
+            self.assertEqual(segmenter.probe_keyframes('in.mp4', [10, 20]),
+                             [10.0, 20.0])
+        self.assertIn('10.000000%+20,20.000000%+20', probe.call_args[0][0])
+
+    def test_no_targets_are_not_probed(self):
+        with mock.patch.object(segmenter, '_probe') as probe:
+            self.assertEqual(segmenter.probe_keyframes('in.mp4', []), [])
+        probe.assert_not_called()
+
+    def test_missing_ffprobe(self):
+        with mock.patch.object(segmenter.subprocess, 'run',
+                               side_effect=OSError('not found')):
+            with self.assertRaises(SegmentationError):
+                segmenter.probe_duration('in.mp4')
+
+
+class PlanTest(unittest.TestCase):
+    """Segment commands planned for inputs with known keyframes."""
+
+    def setUp(self):
+        for name, value in (('probe_duration', 30.0),
+                            ('probe_keyframes', [0, 9, 12, 21, 27])):
+            patcher = mock.patch.object(segmenter, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def plan(self, ffmpeg_arguments, segments):
+        segment_plan = segmenter.plan(ffmpeg_arguments, segments)
+        self.addCleanup(segment_plan.cleanup)
+        return segment_plan
+
+    def test_segments_cover_the_input(self):
+        segment_plan = self.plan(
+            ['-y', '-i', 'in.mp4', '-c:v', 'libx264', 'out/video.mp4'], 3)
+        self.assertEqual(segment_plan.segments, [
+            [
+                '-y', '-ss', '0.000000', '-t', '12.000000', '-i', 'in.mp4',
+                '-c:v', 'libx264', 'out/.video.segment0.mp4'
+            ],
+            [
+                '-y', '-ss', '12.000000', '-t', '9.000000', '-i', 'in.mp4',
+                '-c:v', 'libx264', 'out/.video.segment1.mp4'
+            ],
+            [
+                '-y', '-ss', '21.000000', '-i', 'in.mp4', '-c:v', 'libx264',
+                'out/.video.segment2.mp4'
+            ],
+        ])
+        concat = segment_plan.concat_arguments
+        self.assertEqual(concat[:5], ['-y', '-f', 'concat', '-safe', '0'])
+        self.assertEqual(concat[-5:], ['-map', '0', '-c', 'copy',
+                                       'out/video.mp4'])
+
+    def test_concat_list_names_the_segments(self):
+        segment_plan = self.plan(['-i', 'in.mp4', "it's.mp4"], 2)
+        concat = segment_plan.concat_arguments
+        self.assertNotIn('-y', concat)
+        self.assertEqual(segment_plan.segments[0][0], '-y')
+        with open(concat[concat.index('-i') + 1]) as concat_list:
+            self.assertEqual(
+                concat_list.read(),
+                f"file '{os.path.abspath('.it')}'\\''s.segment0.mp4'\n"
+                f"file '{os.path.abspath('.it')}'\\''s.segment1.mp4'\n")
+
+    def test_input_without_split_points_is_one_segment(self):
+        segmenter.probe_keyframes.return_value = [0]
+        segment_plan = self.plan(['-i', 'in.mp4', 'out.mp4'], 4)
+        self.assertEqual(segment_plan.segments, [['-i', 'in.mp4', 'out.mp4']])
+        self.assertIsNone(segment_plan.concat_arguments)
+
+    def test_unsupported_commands(self):
+        for ffmpeg_arguments in (
+            ['-i', 'a.mp4', '-i', 'b.mp4', 'out.mp4'],
+            ['-i', 'in.mp4', 'a.mp4', 'b.mp4'],
+            ['-i', 'in.mp4', 'out_%03d.png'],
+            ['-i', 'in.mp4', 'https://example.com/out.mp4'],
+            ['-ss', '10', '-i', 'in.mp4', 'out.mp4'],
+            ['-i', 'in.mp4', '-t', '10', 'out.mp4'],
+        ):
+            with self.assertRaises(SegmentationError, msg=ffmpeg_arguments):
+                segmenter.plan(ffmpeg_arguments, 2)
+
+    def test_cleanup_removes_the_temporary_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'out.mp4')
+            segment_plan = segmenter.plan(['-i', 'in.mp4', output], 2)
+            concat = segment_plan.concat_arguments
+            concat_list = concat[concat.index('-i') + 1]
+            for segment in segment_plan.segments:
+                open(segment[-1], 'w').close()
+            segment_plan.cleanup()
+            self.assertEqual(os.listdir(directory), [])
+            self.assertFalse(os.path.exists(concat_list))
+
+
+class RunSegmentsTest(unittest.TestCase):
+    """Segments run on threads of their own."""
+
+    def test_responses_of_every_segment(self):
+
+        def run_segment(arguments, _):
+            yield FFmpegResponse(log_line=arguments[0])
+            yield FFmpegResponse(exit_status=ExitStatus())
+
+        responses = list(segmenter.run_segments([['a'], ['b']], run_segment))
+        self.assertEqual(
+            sorted((index, response.WhichOneof('status'))
+                   for index, response in responses),
+            [(0, 'exit_status'), (0, 'log_line'), (1, 'exit_status'),
+             (1, 'log_line')])
+        self.assertEqual(
+            sorted((index, response.log_line)
+                   for index, response in responses
+                   if response.HasField('log_line')), [(0, 'a'), (1, 'b')])
+
+    def test_error_stops_the_other_segments(self):
+        stopped = threading.Event()
+
+        def run_segment(arguments, stop_events):
+            if arguments == ['fail']:
+                raise ValueError('segment failed')
+            while not any(event.is_set() for event in stop_events):
+                stop_events[0].wait(0.01)
+            stopped.set()
+            return iter(())
+
+        with self.assertRaisesRegex(ValueError, 'segment failed'):
+            list(segmenter.run_segments([['wait'], ['fail']], run_segment))
+        self.assertTrue(stopped.is_set())
+
+    def test_stop_event_is_passed_on(self):
+        stop_event = threading.Event()
+        stop_event.set()
+        seen = []
+
+        def run_segment(_, stop_events):
+            seen.append(stop_events[1])
+            return iter(())
+
+        list(segmenter.run_segments([['a']], run_segment, stop_event))
+        self.assertEqual(seen, [stop_event])
+
+
+class SumTest(unittest.TestCase):
+    """Reports of the segments combined into one for the request."""
+
+    def test_progress_is_summed(self):
+        first = Progress(frame=100, fps=30, speed=1.5, total_size=1000000)
+        first.out_time.FromSeconds(4)
+        second = Progress(frame=50, fps=20, speed=1, total_size=500000)
+        second.out_time.FromSeconds(2)
+        total = segmenter.sum_progress([first, second])
+        self.assertEqual((total.frame, total.fps, total.speed,
+                          total.total_size), (150, 50, 2.5, 1500000))
+        self.assertEqual(total.out_time.ToSeconds(), 6)
+        self.assertEqual(total.bitrate, 2000)
+
+    def test_progress_without_time_has_no_bitrate(self):
+        self.assertEqual(segmenter.sum_progress([Progress(frame=1)]).bitrate,
+                         0)
+
+    def test_exit_statuses_are_summed(self):
+        total = segmenter.sum_exit_statuses([
+            ExitStatus(resource_usage=ResourceUsage(
+                ru_utime=1, ru_stime=0.5, ru_maxrss=100)),
+            ExitStatus(exit_code=1 << 8,
+                       resource_usage=ResourceUsage(ru_utime=2,
+                                                    ru_maxrss=300)),
+            ExitStatus(exit_code=2 << 8,
+                       resource_usage=ResourceUsage(ru_maxrss=200)),
+        ])
+        self.assertEqual(total.exit_code, 1 << 8)
+        self.assertEqual(total.resource_usage,
+                         ResourceUsage(ru_utime=3, ru_stime=0.5,
+                                       ru_maxrss=300))
+
+
+if __name__ == '__main__':
+    unittest.main()